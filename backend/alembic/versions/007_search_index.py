@@ -0,0 +1,67 @@
+"""Full-text + trigram search index for merchants, offers and products
+
+Stored tsvector columns (generated, so writes keep them current without
+triggers) with GIN indexes, and pg_trgm GIN indexes on the display names for
+typo-tolerant and substring matching. Indexes are built CONCURRENTLY so the
+migration does not block writes on large catalogs.
+
+Revision ID: 007_search_index
+Revises: 006_blog_posts
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "007_search_index"
+down_revision = "006_blog_posts"
+branch_labels = None
+depends_on = None
+
+
+# table -> (tsvector expression, trigram column)
+SEARCH_COLUMNS = {
+    "merchants": (
+        "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+        "name",
+    ),
+    "offers": (
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(code, '')), 'C')",
+        "title",
+    ),
+    "products": (
+        "setweight(to_tsvector('english', coalesce(name, '')), 'A')",
+        "name",
+    ),
+}
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table, (expression, _) in SEARCH_COLUMNS.items():
+        op.execute(
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            f"GENERATED ALWAYS AS ({expression}) STORED"
+        )
+    with op.get_context().autocommit_block():
+        for table, (_, trigram_column) in SEARCH_COLUMNS.items():
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table}_search_vector "
+                f"ON {table} USING gin (search_vector)"
+            )
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table}_{trigram_column}_trgm "
+                f"ON {table} USING gin ({trigram_column} gin_trgm_ops)"
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table, (_, trigram_column) in SEARCH_COLUMNS.items():
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS ix_{table}_{trigram_column}_trgm")
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS ix_{table}_search_vector")
+    for table in SEARCH_COLUMNS:
+        op.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector")
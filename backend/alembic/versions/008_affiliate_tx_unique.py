@@ -0,0 +1,37 @@
+"""Unique (network, external_transaction_id) on affiliate_transactions
+
+Lets the affiliate import upsert with INSERT ... ON CONFLICT. Duplicate rows
+left by earlier syncs are collapsed onto the oldest one first.
+
+Revision ID: 008_affiliate_tx_unique
+Revises: 007_search_index
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "008_affiliate_tx_unique"
+down_revision = "007_search_index"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "DELETE FROM affiliate_transactions a USING affiliate_transactions b "
+        "WHERE a.network = b.network "
+        "AND a.external_transaction_id = b.external_transaction_id "
+        "AND a.id > b.id"
+    )
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_affiliate_transactions_network_external_id "
+            "ON affiliate_transactions (network, external_transaction_id)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS uq_affiliate_transactions_network_external_id")
@@ -0,0 +1,44 @@
+"""Link cashback_events to the affiliate transaction they pay out
+
+The set-based cashback generator (app/tasks/cashback.py) inserts one event
+per confirmed transaction; the unique index makes that idempotent across
+concurrent workers. The (status, created_at) index serves the auto-approval
+batches.
+
+Revision ID: 009_cashback_event_source
+Revises: 008_affiliate_tx_unique
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "009_cashback_event_source"
+down_revision = "008_affiliate_tx_unique"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "cashback_events",
+        sa.Column("affiliate_transaction_id", sa.Integer(), sa.ForeignKey("affiliate_transactions.id"), nullable=True),
+    )
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_cashback_events_affiliate_transaction_id "
+            "ON cashback_events (affiliate_transaction_id)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_cashback_events_status_created_at "
+            "ON cashback_events (status, created_at)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_cashback_events_status_created_at")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS uq_cashback_events_affiliate_transaction_id")
+    op.drop_column("cashback_events", "affiliate_transaction_id")
@@ -0,0 +1,35 @@
+"""Per-user wallet reconciliation checkpoints
+
+Each row holds the ledger total of a user's wallet_transactions up to
+last_transaction_id, so the nightly reconciliation only aggregates newer rows.
+
+Revision ID: 010_wallet_checkpoints
+Revises: 009_cashback_event_source
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "010_wallet_checkpoints"
+down_revision = "009_cashback_event_source"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "wallet_checkpoints",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("last_transaction_id", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("total", sa.Numeric(14, 2), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index("ix_wallet_checkpoints_last_transaction_id", "wallet_checkpoints", ["last_transaction_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_wallet_checkpoints_last_transaction_id", table_name="wallet_checkpoints")
+    op.drop_table("wallet_checkpoints")
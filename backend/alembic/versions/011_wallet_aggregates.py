@@ -0,0 +1,63 @@
+"""Materialized per-user wallet totals
+
+lifetime_credit / lifetime_debit are the sums of positive / negative
+wallet_transactions amounts and total_withdrawn the sum of approved
+withdrawals, kept current by the wallet write paths so the wallet summary
+reads one row. Backfilled from the existing ledger. Also adds the
+(user_id, created_at, id) index behind keyset pagination of a user's
+transactions.
+
+Revision ID: 011_wallet_aggregates
+Revises: 010_wallet_checkpoints
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "011_wallet_aggregates"
+down_revision = "010_wallet_checkpoints"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "wallet_aggregates",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("lifetime_credit", sa.Numeric(14, 2), nullable=False, server_default="0"),
+        sa.Column("lifetime_debit", sa.Numeric(14, 2), nullable=False, server_default="0"),
+        sa.Column("total_withdrawn", sa.Numeric(14, 2), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+    op.execute(
+        """
+        INSERT INTO wallet_aggregates (user_id, lifetime_credit, lifetime_debit, total_withdrawn)
+        SELECT u.id, coalesce(t.credit, 0), coalesce(t.debit, 0), coalesce(w.withdrawn, 0)
+        FROM users u
+        LEFT JOIN (
+            SELECT user_id,
+                   sum(CASE WHEN amount > 0 THEN amount ELSE 0 END) AS credit,
+                   sum(CASE WHEN amount < 0 THEN -amount ELSE 0 END) AS debit
+            FROM wallet_transactions GROUP BY user_id
+        ) t ON t.user_id = u.id
+        LEFT JOIN (
+            SELECT user_id, sum(amount) AS withdrawn
+            FROM withdrawals WHERE status = 'approved' GROUP BY user_id
+        ) w ON w.user_id = u.id
+        WHERE t.user_id IS NOT NULL OR w.user_id IS NOT NULL
+        """
+    )
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_wallet_transactions_user_created_id "
+            "ON wallet_transactions (user_id, created_at, id)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_wallet_transactions_user_created_id")
+    op.drop_table("wallet_aggregates")
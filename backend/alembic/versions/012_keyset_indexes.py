@@ -0,0 +1,44 @@
+"""Composite indexes behind keyset pagination of listings
+
+Each listing seeks on a row value of its sort key, so each gets an index in
+that column order: active offers by (priority, created_at, id), also per
+merchant; a user's orders by (created_at, id); withdrawals by
+(created_at, id). Merchants page by name, which is already uniquely indexed.
+NULL sort keys are backfilled first, since a row value holding NULL never
+matches the seek predicate.
+
+Revision ID: 012_keyset_indexes
+Revises: 011_wallet_aggregates
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "012_keyset_indexes"
+down_revision = "011_wallet_aggregates"
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    "ix_offers_active_priority_created_id": "offers (priority, created_at, id) WHERE is_active",
+    "ix_offers_merchant_priority_created_id": "offers (merchant_id, priority, created_at, id) WHERE is_active",
+    "ix_orders_user_created_id": "orders (user_id, created_at, id)",
+    "ix_withdrawals_created_id": "withdrawals (created_at, id)",
+}
+
+
+def upgrade() -> None:
+    op.execute("UPDATE offers SET priority = 0 WHERE priority IS NULL")
+    for table in ("offers", "orders", "withdrawals"):
+        op.execute(f"UPDATE {table} SET created_at = now() WHERE created_at IS NULL")
+    with op.get_context().autocommit_block():
+        for name, definition in INDEXES.items():
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
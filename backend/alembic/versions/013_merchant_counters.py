@@ -0,0 +1,38 @@
+"""Denormalized active offer count per merchant
+
+merchants.active_offers_count is maintained with offer writes (see
+app/services/merchant_counters.py) so merchant cards no longer count offers
+per request. Backfilled here; the daily reconciler corrects any drift.
+
+Revision ID: 013_merchant_counters
+Revises: 012_keyset_indexes
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "013_merchant_counters"
+down_revision = "012_keyset_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "merchants",
+        sa.Column("active_offers_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.execute(
+        """
+        UPDATE merchants m SET active_offers_count = c.n
+        FROM (SELECT merchant_id, count(*) AS n FROM offers WHERE is_active GROUP BY merchant_id) c
+        WHERE c.merchant_id = m.id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("merchants", "active_offers_count")
@@ -0,0 +1,100 @@
+"""Newsletter fan-out checkpoints
+
+newsletter_campaigns gains the checkpoint the chunked fan-out resumes from
+(see app/tasks/newsletter_delivery.py). The newsletter tables were so far only
+created by ``create_all`` at startup, so they are created here where missing.
+
+Revision ID: 014_newsletter_fanout
+Revises: 013_merchant_counters
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "014_newsletter_fanout"
+down_revision = "013_merchant_counters"
+branch_labels = None
+depends_on = None
+
+
+def _create_tables() -> None:
+    op.create_table(
+        "newsletter_subscribers",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("email", sa.String(length=255), nullable=False),
+        sa.Column("name", sa.String(length=255), nullable=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("status", sa.String(length=50), nullable=False),
+        sa.Column("source", sa.String(length=100), nullable=True),
+        sa.Column("tags", sa.Text(), nullable=True),
+        sa.Column("subscribed_at", sa.DateTime(), nullable=False),
+        sa.Column("unsubscribed_at", sa.DateTime(), nullable=True),
+        sa.Column("confirmed_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_newsletter_subscribers_email", "newsletter_subscribers", ["email"], unique=True)
+    op.create_index("ix_newsletter_subscribers_user_id", "newsletter_subscribers", ["user_id"])
+
+    op.create_table(
+        "newsletter_campaigns",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("subject", sa.String(length=255), nullable=False),
+        sa.Column("preview_text", sa.String(length=255), nullable=True),
+        sa.Column("html_content", sa.Text(), nullable=False),
+        sa.Column("plain_text_content", sa.Text(), nullable=True),
+        sa.Column("status", sa.String(length=50), nullable=False),
+        sa.Column("send_at", sa.DateTime(), nullable=True),
+        sa.Column("sent_at", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.Column("total_recipients", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("sent_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("opened_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("clicked_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("bounced_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("unsubscribed_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+    op.create_table(
+        "newsletter_deliveries",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("campaign_id", sa.Integer(), sa.ForeignKey("newsletter_campaigns.id"), nullable=False),
+        sa.Column("subscriber_id", sa.Integer(), sa.ForeignKey("newsletter_subscribers.id"), nullable=False),
+        sa.Column("status", sa.String(length=50), nullable=False),
+        sa.Column("sent_at", sa.DateTime(), nullable=True),
+        sa.Column("opened_at", sa.DateTime(), nullable=True),
+        sa.Column("clicked_at", sa.DateTime(), nullable=True),
+        sa.Column("bounced_at", sa.DateTime(), nullable=True),
+        sa.Column("error_message", sa.Text(), nullable=True),
+    )
+    op.create_index("ix_newsletter_deliveries_campaign_id", "newsletter_deliveries", ["campaign_id"])
+    op.create_index("ix_newsletter_deliveries_subscriber_id", "newsletter_deliveries", ["subscriber_id"])
+
+
+def upgrade() -> None:
+    if not sa.inspect(op.get_bind()).has_table("newsletter_campaigns"):
+        _create_tables()
+
+    op.add_column(
+        "newsletter_campaigns",
+        sa.Column("last_subscriber_id", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column("newsletter_campaigns", sa.Column("started_at", sa.DateTime(), nullable=True))
+    op.add_column("newsletter_campaigns", sa.Column("checkpoint_at", sa.DateTime(), nullable=True))
+    # The fan-out streams active subscribers in id order past the checkpoint
+    op.create_index(
+        "ix_newsletter_subscribers_active_id",
+        "newsletter_subscribers",
+        ["id"],
+        postgresql_where=sa.text("status = 'active'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_newsletter_subscribers_active_id", table_name="newsletter_subscribers")
+    op.drop_column("newsletter_campaigns", "checkpoint_at")
+    op.drop_column("newsletter_campaigns", "started_at")
+    op.drop_column("newsletter_campaigns", "last_subscriber_id")
@@ -0,0 +1,109 @@
+"""Native range partitioning for offer_clicks and order_items
+
+005 partitioned both tables with a BEFORE INSERT trigger that ran CREATE
+TABLE IF NOT EXISTS and a dynamic INSERT for every row, into inheritance
+children the planner mostly could not prune. Both become native
+``PARTITION BY RANGE (created_at)`` tables with monthly partitions
+(``<table>_pYYYYMM``) plus a default partition that should stay empty;
+workers/cron_jobs.py (app/tasks/partitions.py) keeps future months created
+and detaches and archives old ones.
+
+The primary key becomes (id, created_at), as Postgres requires the partition
+key in unique constraints; nothing references either table by id. Rows
+(including the trigger's inheritance children) are copied into the new
+tables, so this takes an exclusive lock on both for the duration of the copy.
+
+Revision ID: 015_native_partitioning
+Revises: 014_newsletter_fanout
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "015_native_partitioning"
+down_revision = "014_newsletter_fanout"
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+
+TABLES = {
+    "offer_clicks": {
+        "foreign_keys": [("offer_id", "offers"), ("user_id", "users")],
+        "indexes": [["offer_id"], ["created_at"], ["offer_id", "created_at"]],
+    },
+    "order_items": {
+        "foreign_keys": [("order_id", "orders"), ("product_id", "products"), ("variant_id", "product_variants")],
+        "indexes": [["order_id"], ["product_id"]],
+    },
+}
+
+
+def _create_monthly_partitions(table: str) -> None:
+    # One partition per month from the oldest row to MONTHS_AHEAD months out
+    op.execute(
+        f"""
+        DO $$
+        DECLARE
+          month date := date_trunc('month', coalesce((SELECT min(created_at) FROM {table}_legacy), now()))::date;
+          last_month date := (date_trunc('month', now()) + INTERVAL '{MONTHS_AHEAD} months')::date;
+        BEGIN
+          WHILE month <= last_month LOOP
+            EXECUTE format(
+              'CREATE TABLE %I PARTITION OF {table} FOR VALUES FROM (%L) TO (%L)',
+              '{table}_p' || to_char(month, 'YYYYMM'), month, (month + INTERVAL '1 month')::date
+            );
+            month := (month + INTERVAL '1 month')::date;
+          END LOOP;
+        END$$;
+        """
+    )
+
+
+def upgrade() -> None:
+    for table, spec in TABLES.items():
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{table}_partition ON {table}")
+        op.execute(f"DROP FUNCTION IF EXISTS ensure_{table}_partition()")
+        op.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+        op.execute(
+            f"CREATE TABLE {table} (LIKE {table}_legacy INCLUDING DEFAULTS INCLUDING GENERATED) "
+            "PARTITION BY RANGE (created_at)"
+        )
+        op.execute(f"UPDATE {table}_legacy SET created_at = now() WHERE created_at IS NULL")
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN created_at SET NOT NULL, ALTER COLUMN created_at SET DEFAULT now()")
+        _create_monthly_partitions(table)
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+        # Copies the trigger's inheritance children too; the id sequence moves over with the rows
+        op.execute(f"INSERT INTO {table} SELECT * FROM {table}_legacy")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+        op.execute(f"DROP TABLE {table}_legacy CASCADE")
+
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, created_at)")
+        for column, target in spec["foreign_keys"]:
+            op.execute(
+                f"ALTER TABLE {table} ADD CONSTRAINT fk_{table}_{column} "
+                f"FOREIGN KEY ({column}) REFERENCES {target} (id)"
+            )
+        for columns in spec["indexes"]:
+            op.create_index(f"ix_{table}_{'_'.join(columns)}", table, columns)
+
+
+def downgrade() -> None:
+    # Back to plain tables; 005's triggers are not restored
+    for table, spec in TABLES.items():
+        op.execute(f"ALTER TABLE {table} RENAME TO {table}_partitioned")
+        op.execute(f"CREATE TABLE {table} (LIKE {table}_partitioned INCLUDING DEFAULTS INCLUDING GENERATED)")
+        op.execute(f"INSERT INTO {table} SELECT * FROM {table}_partitioned")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+        op.execute(f"DROP TABLE {table}_partitioned CASCADE")
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id)")
+        for column, target in spec["foreign_keys"]:
+            op.execute(
+                f"ALTER TABLE {table} ADD CONSTRAINT fk_{table}_{column} "
+                f"FOREIGN KEY ({column}) REFERENCES {target} (id)"
+            )
+        for columns in spec["indexes"]:
+            op.create_index(f"ix_{table}_{'_'.join(columns)}", table, columns)
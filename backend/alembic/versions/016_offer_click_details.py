@@ -0,0 +1,42 @@
+"""Offer uuids and click details
+
+The redirector links and queues offers by ``offers.uuid``, and the click
+workers store the visitor's IP, user agent, referrer and device with each
+click. Both were so far only added by the Bun services' SQL migration
+(services/workers/migrations/001_queue_tables.sql), so they are added here
+where missing. On the partitioned offer_clicks the new columns reach every
+partition.
+
+Revision ID: 016_offer_click_details
+Revises: 015_native_partitioning
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "016_offer_click_details"
+down_revision = "015_native_partitioning"
+branch_labels = None
+depends_on = None
+
+CLICK_COLUMNS = {
+    "ip_address": "INET",
+    "user_agent": "TEXT",
+    "referrer_url": "TEXT",
+    "device_type": "VARCHAR(20)",
+}
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE offers ADD COLUMN IF NOT EXISTS uuid UUID DEFAULT gen_random_uuid()")
+    op.execute("UPDATE offers SET uuid = gen_random_uuid() WHERE uuid IS NULL")
+    op.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_offers_uuid ON offers (uuid)")
+    for column, type_ in CLICK_COLUMNS.items():
+        op.execute(f"ALTER TABLE offer_clicks ADD COLUMN IF NOT EXISTS {column} {type_}")
+
+
+def downgrade() -> None:
+    # The columns may predate this revision (Bun services' migration), so they are kept
+    op.execute("DROP INDEX IF EXISTS ix_offers_uuid")
@@ -4,16 +4,22 @@ from sqlalchemy import select, func, desc, and_
 from datetime import datetime
 from typing import Optional
 
-from ...redis_client import cache_invalidate, cache_invalidate_prefix, rk, redis_client, publish
-from ...database import get_db
-from ...models import User, Withdrawal, WalletTransaction, Order, Merchant, Offer, Product, ProductVariant
+from ...redis_client import rk, redis_client, publish
+from ...cache import invalidate, invalidate_tags, bump_version
+from ...database import get_db, get_read_db
+from ...models import User, Withdrawal, Order, Merchant, Offer, Product, ProductVariant
 from ...schemas.wallet_transaction import WithdrawalRead, WithdrawalStatusUpdate
 from ...queue import push_email_job, push_sms_job
+from ...services import autocomplete, wallet_ledger
+from ...tasks import wallet_reconciliation
 from ...config import get_settings
+from ...pagination import Keyset, page_info, wants_total
 from pydantic import BaseModel, Field
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
+WITHDRAWALS_KEYSET = Keyset("admin_withdrawals", Withdrawal.created_at, Withdrawal.id)
+
 def verify_admin_ip(request: Request):
     """Enforce optional admin IP whitelist.
     Uses ADMIN_IP_WHITELIST env (comma-separated). Always allow localhost loopback.
@@ -107,7 +113,9 @@ def create_merchant(
     db.refresh(merchant)
     
     # Invalidate cache
-    cache_invalidate_prefix(rk("cache", "merchants"))
+    invalidate_tags("merchants:list")
+    bump_version("homepage")
+    autocomplete.index_merchant(merchant)
     
     return {
         "success": True,
@@ -211,9 +219,10 @@ def update_merchant(
     db.commit()
     db.refresh(merchant)
     
-    # Invalidate caches
-    cache_invalidate_prefix(rk("cache", "merchants"))
-    cache_invalidate_prefix(rk("cache", "merchant"))
+    # Invalidate caches (offer listings embed merchant name/logo)
+    invalidate_tags("merchants:list", f"merchant:{merchant.id}", "offers:list")
+    bump_version("homepage")
+    autocomplete.index_merchant(merchant)
     
     return {
         "success": True,
@@ -241,8 +250,9 @@ def delete_merchant(
     db.commit()
     
     # Invalidate caches
-    cache_invalidate_prefix(rk("cache", "merchants"))
-    cache_invalidate_prefix(rk("cache", "merchant"))
+    invalidate_tags("merchants:list", f"merchant:{merchant.id}", "offers:list")
+    bump_version("homepage")
+    autocomplete.remove(f"merchant:{merchant.id}")
     
     return {
         "success": True,
@@ -274,7 +284,8 @@ def create_offer(
     db.commit()
     db.refresh(offer)
     
-    cache_invalidate_prefix(rk("cache", "offers"))
+    invalidate_tags("offers:list", f"merchant:{offer.merchant_id}")
+    bump_version("homepage")
     
     return {
         "success": True,
@@ -299,6 +310,7 @@ def update_offer(
     if not offer:
         raise HTTPException(status_code=404, detail="Offer not found")
     
+    previous_merchant_id = offer.merchant_id
     # Update fields
     offer.merchant_id = payload.merchant_id
     offer.title = payload.title
@@ -309,7 +321,8 @@ def update_offer(
     
     db.commit()
     
-    cache_invalidate_prefix(rk("cache", "offers"))
+    invalidate_tags("offers:list", f"merchant:{previous_merchant_id}", f"merchant:{offer.merchant_id}")
+    bump_version("homepage")
     
     return {
         "success": True,
@@ -332,7 +345,8 @@ def delete_offer(
     offer.is_active = False
     db.commit()
     
-    cache_invalidate_prefix(rk("cache", "offers"))
+    invalidate_tags("offers:list", f"merchant:{offer.merchant_id}")
+    bump_version("homepage")
     
     return {"success": True, "message": "Offer deleted successfully"}
 
@@ -367,7 +381,9 @@ def create_product(
     db.commit()
     db.refresh(product)
     
-    cache_invalidate_prefix(rk("cache", "products"))
+    invalidate(rk("cache", "products", "catalog"))
+    bump_version("homepage")
+    autocomplete.index_product(product)
     
     return {
         "success": True,
@@ -413,8 +429,9 @@ def update_product(
     
     db.commit()
     
-    cache_invalidate_prefix(rk("cache", "products"))
-    cache_invalidate_prefix(rk("cache", "product"))
+    invalidate(rk("cache", "products", "catalog"))
+    bump_version("homepage")
+    autocomplete.index_product(product)
     
     return {
         "success": True,
@@ -447,7 +464,7 @@ def add_variant(
     db.commit()
     db.refresh(variant)
     
-    cache_invalidate_prefix(rk("cache", "product"))
+    invalidate(rk("cache", "products", "catalog"))
     
     return {
         "success": True,
@@ -463,8 +480,9 @@ def add_variant(
 @router.post("/merchants/{slug}/invalidate", response_model=dict)
 def invalidate_merchant_cache(slug: str):
     """Invalidate merchant cache"""
-    cache_invalidate_prefix(rk("cache", "merchant"))
-    cache_invalidate_prefix(rk("cache", "merchants"))
+    invalidate(rk("cache", "merchant", slug))
+    invalidate_tags("merchants:list")
+    bump_version("homepage")
     publish("events:cache_invalidate", {"entity": "merchant", "slug": slug})
     return {"success": True, "message": f"Cache invalidated for merchant {slug}"}
 
@@ -499,11 +517,19 @@ def reject_cashback(id: int, _: bool = Depends(require_admin)):
     return {"success": True, "data": {"id": id, "status": "rejected"}}
 
 
+@router.get("/wallets/reconciliation", response_model=dict)
+def wallet_reconciliation_report(_: bool = Depends(require_admin)):
+    """Latest nightly wallet reconciliation report (discrepancies found and fixed)."""
+    return {"success": True, "data": {"report": wallet_reconciliation.last_report()}}
+
+
 @router.get("/withdrawals", response_model=dict)
 def list_withdrawals(
     status_filter: Optional[str] = None,
     page: int = 1,
     limit: int = 20,
+    cursor: Optional[str] = None,
+    include_total: Optional[bool] = None,
     _: bool = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
@@ -514,16 +540,19 @@ def list_withdrawals(
     if status_filter:
         query = query.where(Withdrawal.status == status_filter)
     
-    # Get total count
-    total_count = db.scalar(
-        select(func.count()).select_from(query.subquery())
-    )
+    # Get total count (only when asked, or for page-number clients)
+    total_count = None
+    if wants_total(include_total, cursor):
+        total_count = db.scalar(
+            select(func.count()).select_from(query.subquery())
+        )
     
-    # Apply pagination and ordering
-    query = query.order_by(desc(Withdrawal.created_at))
-    query = query.offset((page - 1) * limit).limit(limit)
+    # Apply pagination and ordering, seeking past the cursor
+    if page > 1 and not cursor:
+        query = query.offset((page - 1) * limit)
+    query = WITHDRAWALS_KEYSET.apply(query, cursor, limit)
     
-    withdrawals = db.scalars(query).all()
+    withdrawals, next_cursor = WITHDRAWALS_KEYSET.page(db.scalars(query).all(), limit)
     
     return {
         "success": True,
@@ -531,12 +560,7 @@ def list_withdrawals(
             "withdrawals": [
                 WithdrawalRead.model_validate(w) for w in withdrawals
             ],
-            "pagination": {
-                "current_page": page,
-                "total_pages": (total_count + limit - 1) // limit,
-                "total_items": total_count,
-                "per_page": limit,
-            }
+            "pagination": page_info(page, limit, next_cursor, total_count),
         }
     }
 
@@ -574,6 +598,7 @@ def approve_withdrawal(
     withdrawal.admin_notes = payload.admin_notes
     withdrawal.transaction_id = payload.transaction_id
     withdrawal.processed_at = datetime.utcnow()
+    wallet_ledger.bump(db, user.id, withdrawn=withdrawal.amount)
     
     db.commit()
     db.refresh(withdrawal)
@@ -646,8 +671,9 @@ def reject_withdrawal(
     withdrawal.admin_notes = payload.admin_notes
     withdrawal.processed_at = datetime.utcnow()
     
-    # Create refund transaction
-    transaction = WalletTransaction(
+    # Create refund transaction (and count it in the wallet totals)
+    wallet_ledger.record_transaction(
+        db,
         user_id=user.id,
         amount=withdrawal.amount,
         type="withdrawal_refund",
@@ -655,7 +681,6 @@ def reject_withdrawal(
         description=f"Withdrawal #{id} rejected - Amount refunded",
         balance_after=new_balance
     )
-    db.add(transaction)
     
     db.commit()
     db.refresh(withdrawal)
@@ -698,7 +723,7 @@ def complete_withdrawal(id: int, _: bool = Depends(require_admin)):
 
 
 @router.get("/analytics/dashboard", response_model=dict)
-def analytics_dashboard(_: bool = Depends(require_admin), db: Session = Depends(get_db)):
+def analytics_dashboard(_: bool = Depends(require_admin), db: Session = Depends(get_read_db)):
     """Get admin dashboard metrics"""
     from datetime import datetime, timedelta
     
@@ -824,7 +849,7 @@ def analytics_dashboard(_: bool = Depends(require_admin), db: Session = Depends(
 def analytics_revenue(
     days: int = 30,
     _: bool = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get daily revenue for the last N days"""
     from datetime import datetime, timedelta
@@ -872,7 +897,7 @@ def analytics_revenue(
 def analytics_top_merchants(
     limit: int = 10,
     _: bool = Depends(require_admin),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get top merchants by order count"""
     from sqlalchemy.orm import joinedload
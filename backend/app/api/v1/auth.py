@@ -2,7 +2,8 @@ from fastapi import APIRouter, HTTPException, status, Header, Depends
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr, Field
 from ...security import create_access_token, get_password_hash, verify_password, revoke_token, decode_token
-from ...redis_client import rk, cache_set, cache_get, cache_invalidate, rate_limit
+from ...redis_client import rk, cache_set, cache_get, cache_invalidate
+from ...rate_limiter import check as rate_limit_check
 from ...queue import push_email_job, push_sms_job
 from ...otp import request_otp as create_otp, verify_and_consume_otp
 from ...sms import send_otp_sms
@@ -130,7 +131,7 @@ def login(payload: LoginRequest, db: Session = Depends(get_db)):
     if not payload.identifier or not payload.password:
         raise HTTPException(status_code=400, detail="Missing credentials")
     
-    allowed, remaining, ttl = rate_limit(f"login:{payload.identifier}", 5, 300)
+    allowed, remaining, ttl = rate_limit_check("login", payload.identifier)
     if not allowed:
         raise HTTPException(status_code=429, detail=f"Too many attempts. Try again in {ttl}s")
     
@@ -190,7 +191,7 @@ def request_otp_endpoint(payload: OTPRequest, db: Session = Depends(get_db)):
     if not mobile.startswith("+"):
         mobile = "+91" + mobile  # Default to India
     
-    allowed, remaining, ttl = rate_limit(f"otp:{mobile}", 5, 300)
+    allowed, remaining, ttl = rate_limit_check("otp", mobile)
     if not allowed:
         raise HTTPException(status_code=429, detail=f"OTP limit reached. Try again in {ttl}s")
     
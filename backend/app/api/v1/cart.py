@@ -1,6 +1,6 @@
 """Cart validation, Redis cart persistence, and checkout endpoints."""
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from typing import Dict
 from datetime import datetime
 from decimal import Decimal
@@ -8,6 +8,7 @@ import hmac
 import hashlib
 
 from ...database import get_db
+from ...loaders import Loader
 from ...dependencies import get_current_user
 from ...models import User, Product, ProductVariant, Order, OrderItem, PromoCode, Payment, WalletBalance
 from ...schemas.cart import (
@@ -68,9 +69,15 @@ def validate_cart(
     errors = []
     subtotal = 0.0
     
+    # Products (with merchants) and variants for every line, one query each
+    products = Loader.for_session(db, Product.id, joinedload(Product.merchant))
+    variants = Loader.for_session(db, ProductVariant.id)
+    products.load_many(item.product_id for item in request.items)
+    variants.load_many(item.variant_id for item in request.items)
+    
     # Validate each item
     for item in request.items:
-        product = db.query(Product).filter(Product.id == item.product_id).first()
+        product = products.load(item.product_id)
         
         if not product:
             errors.append(f"Product {item.product_id} not found")
@@ -86,12 +93,9 @@ def validate_cart(
         unit_price = float(product.price)
         
         if item.variant_id:
-            variant = db.query(ProductVariant).filter(
-                ProductVariant.id == item.variant_id,
-                ProductVariant.product_id == product.id
-            ).first()
+            variant = variants.load(item.variant_id)
             
-            if not variant:
+            if not variant or variant.product_id != product.id:
                 errors.append(f"Variant {item.variant_id} not found for {product.name}")
                 continue
             
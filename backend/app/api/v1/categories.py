@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends
-from ...redis_client import cache_get, cache_set, rk
+from ...redis_client import rk
+from ...cache import read_through
 from ...dependencies import rate_limit_dependency
 import json, hashlib
 
@@ -13,10 +14,11 @@ def list_categories(
     _: dict = Depends(rate_limit_dependency("categories:list", limit=60, window_seconds=60)),
 ):
     key = rk("cache", "categories", hashlib.md5(json.dumps({"type": type, "is_featured": is_featured}, sort_keys=True).encode()).hexdigest())
-    cached = cache_get(key)
-    if cached:
-        return cached
-    response = {
+    return read_through(key, lambda _session: _build_categories(type, is_featured), ttl=600, namespace="categories")
+
+
+def _build_categories(type: str | None, is_featured: bool | None) -> dict:
+    return {
         "success": True,
         "data": {
             "categories": [
@@ -33,5 +35,3 @@ def list_categories(
             ]
         },
     }
-    cache_set(key, response, 600)
-    return response
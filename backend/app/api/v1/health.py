@@ -3,14 +3,13 @@ from fastapi import APIRouter, Depends
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 from ...database import get_db
-from ...queue import get_queue_stats
-from ...redis_client import redis_client
+from ...redis_async import get_queue_stats, ping
 
 router = APIRouter(prefix="/health", tags=["health"])
 
 
 @router.get("")
-async def health_check(db: Session = Depends(get_db)):
+def health_check(db: Session = Depends(get_db)):
     """Basic health check for API and database"""
     try:
         # Check database connection
@@ -30,8 +29,8 @@ async def health_check(db: Session = Depends(get_db)):
 async def redis_health():
     """Redis health check with queue statistics (updated structure)."""
     try:
-        redis_client.ping()
-        stats = get_queue_stats()
+        await ping()
+        stats = await get_queue_stats()
         return {
             "status": "healthy",
             "redis": "connected",
@@ -39,6 +38,7 @@ async def redis_health():
             "total": {
                 "pending": stats["email"]["pending"] + stats["sms"]["pending"],
                 "processing": stats["email"]["processing"] + stats["sms"]["processing"],
+                "scheduled": stats["email"]["scheduled"] + stats["sms"]["scheduled"],
                 "dead_letter": stats["email"]["dead_letter"] + stats["sms"]["dead_letter"],
             },
         }
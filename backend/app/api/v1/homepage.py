@@ -1,36 +1,36 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from ...database import get_db
+from ...database import get_async_read_db
 from ...models import Merchant, Offer
-from ...redis_client import cache_get, cache_set, rk
+from ...cache import read_through_async, versioned_key_async
 
 router = APIRouter(prefix="/homepage", tags=["Homepage"])
 
 @router.get("/")
-def homepage_snapshot(limit_merchants: int = 12, limit_featured_offers: int = 8, limit_exclusive_offers: int = 6, limit_products: int = 8, db: Session = Depends(get_db)):
+async def homepage_snapshot(limit_merchants: int = 12, limit_featured_offers: int = 8, limit_exclusive_offers: int = 6, limit_products: int = 8, db: AsyncSession = Depends(get_async_read_db)):
     """Return aggregated homepage data in one round trip.
     Featured merchants: newest active merchants.
     Featured offers: highest priority active offers.
     Exclusive offers: priority > 0.
-    Each segment cached individually to maximize reuse.
+    Each segment cached individually to maximize reuse; admin writes bump the
+    "homepage" cache version to drop every segment at once.
     """
     # Merchants
-    m_key = rk("cache","homepage","featured_merchants",str(limit_merchants))
-    merchants_payload = cache_get(m_key)
-    if merchants_payload is None:
+    async def load_merchants(session: AsyncSession):
         m_query = select(Merchant).where(Merchant.is_active == True).order_by(Merchant.created_at.desc()).limit(limit_merchants)
-        merchants = db.scalars(m_query).all()
-        merchants_payload = [
+        merchants = (await session.scalars(m_query)).all()
+        return [
             {"id": m.id, "name": m.name, "slug": m.slug, "logo_url": m.logo_url, "description": m.description}
             for m in merchants
         ]
-        cache_set(m_key, merchants_payload, 300)
+
+    merchants_payload = await read_through_async(
+        await versioned_key_async("homepage", "featured_merchants", str(limit_merchants)), load_merchants, ttl=300, db=db, namespace="homepage"
+    )
 
     # Featured offers
-    f_key = rk("cache","homepage","featured_offers",str(limit_featured_offers))
-    featured_offers_payload = cache_get(f_key)
-    if featured_offers_payload is None:
+    async def load_featured_offers(session: AsyncSession):
         f_query = (
             select(Offer, Merchant)
             .join(Merchant)
@@ -38,17 +38,18 @@ def homepage_snapshot(limit_merchants: int = 12, limit_featured_offers: int = 8,
             .order_by(Offer.priority.desc(), Offer.created_at.desc())
             .limit(limit_featured_offers)
         )
-        f_results = db.execute(f_query).all()
-        featured_offers_payload = [
+        f_results = (await session.execute(f_query)).all()
+        return [
             {"id": o.id, "title": o.title, "code": o.code, "merchant_id": o.merchant_id, "priority": o.priority, "merchant": {"id": m.id, "name": m.name, "slug": m.slug, "logo_url": m.logo_url}}  # noqa: E501
             for o, m in f_results
         ]
-        cache_set(f_key, featured_offers_payload, 300)
+
+    featured_offers_payload = await read_through_async(
+        await versioned_key_async("homepage", "featured_offers", str(limit_featured_offers)), load_featured_offers, ttl=300, db=db, namespace="homepage"
+    )
 
     # Exclusive offers
-    e_key = rk("cache","homepage","exclusive_offers",str(limit_exclusive_offers))
-    exclusive_offers_payload = cache_get(e_key)
-    if exclusive_offers_payload is None:
+    async def load_exclusive_offers(session: AsyncSession):
         e_query = (
             select(Offer, Merchant)
             .join(Merchant)
@@ -56,27 +57,31 @@ def homepage_snapshot(limit_merchants: int = 12, limit_featured_offers: int = 8,
             .order_by(Offer.priority.desc(), Offer.created_at.desc())
             .limit(limit_exclusive_offers)
         )
-        e_results = db.execute(e_query).all()
-        exclusive_offers_payload = [
+        e_results = (await session.execute(e_query)).all()
+        return [
             {"id": o.id, "title": o.title, "code": o.code, "merchant_id": o.merchant_id, "priority": o.priority, "merchant": {"id": m.id, "name": m.name, "slug": m.slug, "logo_url": m.logo_url}}  # noqa: E501
             for o, m in e_results
         ]
-        cache_set(e_key, exclusive_offers_payload, 300)
+
+    exclusive_offers_payload = await read_through_async(
+        await versioned_key_async("homepage", "exclusive_offers", str(limit_exclusive_offers)), load_exclusive_offers, ttl=300, db=db, namespace="homepage"
+    )
 
     # Featured products (from in-memory sample generator in products router)
-    # Import lazily to avoid circular dependency at module import time.
-    from .products import _get_catalog  # type: ignore
-    p_key = rk("cache","homepage","featured_products",str(limit_products))
-    featured_products_payload = cache_get(p_key)
-    if featured_products_payload is None:
-        catalog = _get_catalog()
+    async def load_featured_products(_session):
+        # Import lazily to avoid circular dependency at module import time.
+        from .products import _get_catalog_async  # type: ignore
+        catalog = await _get_catalog_async()
         fp = [p for p in catalog if p.get("is_featured")]
         fp.sort(key=lambda x: x.get("sales_count",0), reverse=True)
-        featured_products_payload = [
+        return [
             {"id": p["id"], "name": p["name"], "slug": p["slug"], "image_url": p["image_url"], "merchant": p.get("merchant"), "variants": p.get("variants", [])[:4], "sales_count": p.get("sales_count")}
             for p in fp[:limit_products]
         ]
-        cache_set(p_key, featured_products_payload, 300)
+
+    featured_products_payload = await read_through_async(
+        await versioned_key_async("homepage", "featured_products", str(limit_products)), load_featured_products, ttl=300, namespace="homepage"
+    )
 
     return {
         "success": True,
@@ -1,16 +1,21 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
-from ...database import get_db
-from ...models import Merchant, Offer
-from ...redis_client import cache_get, cache_set, cache_invalidate, cache_invalidate_prefix, rk
+from ...database import get_read_db, get_async_read_db
+from ...models import Merchant
+from ...redis_client import rk
+from ...cache import read_through_async
 from ...dependencies import rate_limit_dependency
+from ...pagination import Keyset, page_info, wants_total
+from ...services import merchant_counters
 from pydantic import BaseModel
-from math import ceil
 import json, hashlib
 
 router = APIRouter(prefix="/merchants", tags=["Merchants"])
 
+MERCHANTS_KEYSET = Keyset("merchants", Merchant.name, Merchant.id, descending=False)
+
 class MerchantFilters(BaseModel):
     page: int = 1
     limit: int = 20
@@ -20,20 +25,37 @@ class MerchantFilters(BaseModel):
 
 
 @router.get("/")
-def list_merchants(
+async def list_merchants(
     page: int = 1,
     limit: int = 20,
     is_featured: bool | None = None,
     search: str | None = None,
-    db: Session = Depends(get_db),
+    cursor: str | None = None,
+    include_total: bool | None = None,
+    db: AsyncSession = Depends(get_async_read_db),
     _: dict = Depends(rate_limit_dependency("merchants:list", limit=60, window_seconds=60))
 ):
     """List all merchants with filtering and pagination"""
-    cache_key = rk("cache", "merchants", hashlib.md5(json.dumps({"page": page, "limit": limit, "is_featured": is_featured, "search": search}, sort_keys=True).encode()).hexdigest())
-    cached = cache_get(cache_key)
-    if cached:
-        return cached
+    cache_key = rk("cache", "merchants", hashlib.md5(json.dumps({"page": page, "limit": limit, "is_featured": is_featured, "search": search, "cursor": cursor, "include_total": include_total}, sort_keys=True).encode()).hexdigest())
+    return await read_through_async(
+        cache_key,
+        lambda session: _load_merchant_list(session, page, limit, is_featured, search, cursor, include_total),
+        ttl=300,
+        db=db,
+        namespace="merchants",
+        tags=lambda response: ["merchants:list", *(f"merchant:{m['id']}" for m in response["data"]["merchants"])],
+    )
 
+
+async def _load_merchant_list(
+    db: AsyncSession,
+    page: int,
+    limit: int,
+    is_featured: bool | None,
+    search: str | None,
+    cursor: str | None = None,
+    include_total: bool | None = None,
+) -> dict:
     query = select(Merchant).where(Merchant.is_active == True)
     
     if is_featured is not None:
@@ -42,80 +64,74 @@ def list_merchants(
     if search:
         query = query.where(Merchant.name.ilike(f"%{search}%"))
     
-    # Count total
-    total = db.scalar(select(func.count()).select_from(query.subquery()))
+    # Count total (only when asked, or for page-number clients)
+    total = None
+    if wants_total(include_total, cursor):
+        total = await db.scalar(select(func.count()).select_from(query.subquery()))
     
-    # Paginate
-    offset = (page - 1) * limit
-    query = query.offset(offset).limit(limit)
+    # Paginate alphabetically, seeking past the cursor
+    if page > 1 and not cursor:
+        query = query.offset((page - 1) * limit)
+    query = MERCHANTS_KEYSET.apply(query, cursor, limit)
     
-    merchants = db.scalars(query).all()
+    merchants, next_cursor = MERCHANTS_KEYSET.page((await db.scalars(query)).all(), limit)
     
+    # Denormalized counters: a column and one Redis round trip, nothing aggregated here
+    activity = await merchant_counters.window_counts([m.id for m in merchants])
     merchants_data = []
     for m in merchants:
-        offers_count = db.scalar(select(func.count(Offer.id)).where(
-            Offer.merchant_id == m.id,
-            Offer.is_active == True
-        ))
         merchants_data.append({
             "id": m.id,
             "name": m.name,
             "slug": m.slug,
             "logo_url": m.logo_url,
             "description": m.description,
-            "offers_count": offers_count,
+            "offers_count": m.active_offers_count,
+            **activity[m.id],
         })
     
-    response = {
+    return {
         "success": True,
         "data": {
             "merchants": merchants_data,
-            "pagination": {
-                "current_page": page,
-                "total_pages": ceil(total / limit) if total else 0,
-                "total_items": total,
-                "per_page": limit,
-            },
+            "pagination": page_info(page, limit, next_cursor, total),
         },
     }
-    cache_set(cache_key, response, 300)
-    return response
 
 
 @router.get("/featured")
-def featured_merchants(limit: int = 12, db: Session = Depends(get_db)):
+async def featured_merchants(limit: int = 12, db: AsyncSession = Depends(get_async_read_db)):
     """Return featured merchants. Currently approximated using newest active merchants.
     When an explicit feature flag is added, filter on that instead.
     Cached for 5 minutes.
     """
-    cache_key = rk("cache","merchants","featured",str(limit))
-    cached = cache_get(cache_key)
-    if cached:
-        return cached
-    query = (
-        select(Merchant)
-        .where(Merchant.is_active == True)
-        .order_by(Merchant.created_at.desc())
-        .limit(limit)
+    async def load(session: AsyncSession):
+        query = (
+            select(Merchant)
+            .where(Merchant.is_active == True)
+            .order_by(Merchant.created_at.desc())
+            .limit(limit)
+        )
+        merchants = (await session.scalars(query)).all()
+        data = [
+            {
+                "id": m.id,
+                "name": m.name,
+                "slug": m.slug,
+                "logo_url": m.logo_url,
+                "description": m.description,
+            }
+            for m in merchants
+        ]
+        return {"success": True, "data": data}
+
+    return await read_through_async(
+        rk("cache","merchants","featured",str(limit)), load, ttl=300, db=db, namespace="merchants", tags=["merchants:list"]
     )
-    merchants = db.scalars(query).all()
-    data = [
-        {
-            "id": m.id,
-            "name": m.name,
-            "slug": m.slug,
-            "logo_url": m.logo_url,
-            "description": m.description,
-        }
-        for m in merchants
-    ]
-    response = {"success": True, "data": data}
-    cache_set(cache_key, response, 300)
-    return response
 
 
 @router.get("/featured")
-def featured_merchants(limit: int = 12, db: Session = Depends(get_db)):
+def featured_merchants(limit: int = 12, db: Session = Depends(get_read_db)):
     """Return a lightweight list of featured merchants.
 
     NOTE: The current schema does not include an explicit `is_featured` flag.
@@ -144,30 +160,34 @@ def featured_merchants(limit: int = 12, db: Session = Depends(get_db)):
 
 
 @router.get("/{slug}")
-def get_merchant(slug: str, db: Session = Depends(get_db)):
+async def get_merchant(slug: str, db: AsyncSession = Depends(get_async_read_db)):
     """Get merchant by slug"""
-    key = rk("cache", "merchant", slug)
-    cached = cache_get(key)
-    if cached:
-        return {"success": True, "data": cached, "cache": True}
-    
-    merchant = db.scalar(select(Merchant).where(Merchant.slug == slug, Merchant.is_active == True))
-    if not merchant:
+    data = await read_through_async(
+        rk("cache", "merchant", slug),
+        lambda session: _load_merchant_detail(session, slug),
+        ttl=3600,
+        db=db,
+        namespace="merchant",
+        tags=lambda detail: [f"merchant:{detail['id']}"],
+    )
+    if data is None:
         return {"success": False, "error": "Merchant not found"}
+    return {"success": True, "data": data}
+
+
+async def _load_merchant_detail(db: AsyncSession, slug: str) -> dict | None:
+    merchant = await db.scalar(select(Merchant).where(Merchant.slug == slug, Merchant.is_active == True))
+    if not merchant:
+        return None
     
-    offers_count = db.scalar(select(func.count(Offer.id)).where(
-        Offer.merchant_id == merchant.id,
-        Offer.is_active == True
-    ))
-    
-    data = {
+    return {
         "id": merchant.id,
         "name": merchant.name,
         "slug": merchant.slug,
         "description": merchant.description,
         "logo_url": merchant.logo_url,
-        "active_offers_count": offers_count,
-        "is_featured": merchant.is_featured,
+        "active_offers_count": merchant.active_offers_count,
+        **(await merchant_counters.window_counts([merchant.id]))[merchant.id],
+        # Merchant has no is_featured column yet (see featured_merchants)
+        "is_featured": getattr(merchant, "is_featured", False),
     }
-    cache_set(key, data, 3600)
-    return {"success": True, "data": data, "cache": False}
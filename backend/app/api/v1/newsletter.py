@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
 from sqlalchemy import select, func, desc
 from pydantic import BaseModel, EmailStr
@@ -8,9 +8,10 @@ import uuid
 
 from ...database import get_db
 from ...models import User
-from ...models.newsletter import NewsletterSubscriber, NewsletterCampaign, NewsletterDelivery
-from ...security import get_current_user
+from ...models.newsletter import NewsletterSubscriber, NewsletterCampaign
+from ...dependencies import require_admin
 from ...queue import push_email_job
+from ...tasks.newsletter_delivery import campaign_progress, start_campaign
 
 router = APIRouter(prefix="/newsletter", tags=["Newsletter"])
 
@@ -168,7 +169,8 @@ def get_subscription_status(
 @router.post("/admin/campaigns", response_model=dict)
 def create_campaign(
     payload: CampaignCreate,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    _: object = Depends(require_admin)
 ):
     """Create a newsletter campaign (Admin only)"""
 
@@ -202,7 +204,8 @@ def list_campaigns(
     page: int = 1,
     limit: int = 20,
     status: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    _: object = Depends(require_admin)
 ):
     """List all campaigns (Admin only)"""
 
@@ -250,12 +253,16 @@ def list_campaigns(
 
 
 @router.post("/admin/campaigns/{id}/send", response_model=dict)
-async def send_campaign(
+def send_campaign(
     id: int,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    _: object = Depends(require_admin)
 ):
-    """Send a campaign immediately (Admin only)"""
+    """Send a campaign immediately (Admin only)
+
+    The fan-out itself runs in the cron worker (app/tasks/newsletter_delivery.py),
+    in resumable chunks; follow it with GET /admin/campaigns/{id}/progress.
+    """
 
     campaign = db.scalar(select(NewsletterCampaign).where(NewsletterCampaign.id == id))
     if not campaign:
@@ -264,61 +271,31 @@ async def send_campaign(
     if campaign.status not in ["draft", "scheduled"]:
         raise HTTPException(status_code=400, detail="Campaign already sent or sending")
 
-    # Get active subscribers
-    subscribers = db.scalars(
-        select(NewsletterSubscriber).where(NewsletterSubscriber.status == "active")
-    ).all()
-
-    if not subscribers:
+    recipients = start_campaign(db, campaign)
+    if not recipients:
         raise HTTPException(status_code=400, detail="No active subscribers")
 
-    # Update campaign status
-    campaign.status = "sending"
-    campaign.total_recipients = len(subscribers)
-    db.commit()
+    return {
+        "success": True,
+        "message": f"Campaign queued for delivery to {recipients} subscribers"
+    }
 
-    # Queue emails in background
-    async def send_to_subscribers():
-        for subscriber in subscribers:
-            try:
-                # Track delivery
-                delivery = NewsletterDelivery(
-                    campaign_id=campaign.id,
-                    subscriber_id=subscriber.id,
-                    status="sent",
-                    sent_at=datetime.utcnow()
-                )
-                db.add(delivery)
-
-                # Queue email
-                push_email_job(
-                    "newsletter_campaign",
-                    subscriber.email,
-                    {
-                        "subject": campaign.subject,
-                        "preview_text": campaign.preview_text,
-                        "html_content": campaign.html_content,
-                        "campaign_id": campaign.id,
-                        "subscriber_id": subscriber.id
-                    }
-                )
-
-                campaign.sent_count += 1
-
-            except Exception as e:
-                print(f"Failed to send to {subscriber.email}: {e}")
-                campaign.bounced_count += 1
-
-        # Update campaign status
-        campaign.status = "sent"
-        campaign.sent_at = datetime.utcnow()
-        db.commit()
-
-    background_tasks.add_task(send_to_subscribers)
+
+@router.get("/admin/campaigns/{id}/progress", response_model=dict)
+def get_campaign_progress(
+    id: int,
+    db: Session = Depends(get_db),
+    _: object = Depends(require_admin)
+):
+    """Delivery progress of a campaign (Admin only)"""
+
+    campaign = db.scalar(select(NewsletterCampaign).where(NewsletterCampaign.id == id))
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
 
     return {
         "success": True,
-        "message": f"Campaign queued for delivery to {len(subscribers)} subscribers"
+        "data": campaign_progress(campaign)
     }
 
 
@@ -327,7 +304,8 @@ def list_subscribers(
     page: int = 1,
     limit: int = 50,
     status: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    _: object = Depends(require_admin)
 ):
     """List all subscribers (Admin only)"""
 
@@ -371,7 +349,8 @@ def list_subscribers(
 
 @router.get("/admin/stats", response_model=dict)
 def get_newsletter_stats(
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    _: object = Depends(require_admin)
 ):
     """Get newsletter statistics (Admin only)"""
 
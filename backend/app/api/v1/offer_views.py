@@ -4,6 +4,7 @@ from ...database import get_db
 from ...models import OfferView
 from ...schemas import OfferViewRead, OfferViewCreate
 from ...dependencies import require_internal_service
+from ...services.trending import record_view
 
 router = APIRouter(prefix="/offer-views", tags=["OfferViews"])
 
@@ -17,4 +18,5 @@ def create_view(payload: OfferViewCreate, db: Session = Depends(get_db), _: bool
     db.add(ov)
     db.commit()
     db.refresh(ov)
+    record_view(ov.offer_id)
     return ov
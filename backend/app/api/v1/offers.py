@@ -1,15 +1,19 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
-from ...database import get_db
+from ...database import get_async_read_db
 from ...models import Offer, Merchant
 from pydantic import BaseModel
-from ...redis_client import cache_get, cache_set, cache_invalidate_prefix, rk
+from ...redis_client import rk
+from ...cache import read_through_async
 from ...dependencies import rate_limit_dependency
+from ...pagination import Keyset, wants_total
 import json, hashlib
 
 router = APIRouter(prefix="/offers", tags=["Offers"])
 
+OFFERS_KEYSET = Keyset("offers", Offer.priority, Offer.created_at, Offer.id)
+
 class OfferFilters(BaseModel):
     page: int = 1
     limit: int = 20
@@ -18,29 +22,52 @@ class OfferFilters(BaseModel):
 
 
 @router.get("/")
-def list_offers(
+async def list_offers(
     page: int = 1,
     limit: int = 20,
     merchant_id: int | None = None,
     search: str | None = None,
-    db: Session = Depends(get_db),
+    cursor: str | None = None,
+    include_total: bool | None = None,
+    db: AsyncSession = Depends(get_async_read_db),
     _: dict = Depends(rate_limit_dependency("offers:list", limit=100, window_seconds=60))
 ):
-    """List all offers with filtering and pagination"""
+    """List all offers with filtering and pagination.
+
+    Pass the returned ``next_cursor`` back as ``cursor`` for the next page.
+    """
     cache_key = rk(
         "cache",
         "offers",
         hashlib.md5(
             json.dumps(
-                {"page": page, "limit": limit, "merchant_id": merchant_id, "search": search},
+                {
+                    "page": page, "limit": limit, "merchant_id": merchant_id, "search": search,
+                    "cursor": cursor, "include_total": include_total,
+                },
                 sort_keys=True,
             ).encode()
         ).hexdigest(),
     )
-    cached = cache_get(cache_key)
-    if cached:
-        return cached
+    return await read_through_async(
+        cache_key,
+        lambda session: _load_offer_list(session, page, limit, merchant_id, search, cursor, include_total),
+        ttl=300,
+        db=db,
+        namespace="offers",
+        tags=["offers:list"],
+    )
 
+
+async def _load_offer_list(
+    db: AsyncSession,
+    page: int,
+    limit: int,
+    merchant_id: int | None,
+    search: str | None,
+    cursor: str | None = None,
+    include_total: bool | None = None,
+) -> dict:
     query = select(Offer, Merchant).join(Merchant).where(Offer.is_active == True)
     
     if merchant_id:
@@ -48,21 +75,21 @@ def list_offers(
     if search:
         query = query.where(Offer.title.ilike(f"%{search}%"))
     
-    # Order by priority and created date
-    query = query.order_by(Offer.priority.desc(), Offer.created_at.desc())
-    
-    # Count total
-    count_query = select(func.count()).select_from(Offer).where(Offer.is_active == True)
-    if merchant_id:
-        count_query = count_query.where(Offer.merchant_id == merchant_id)
-    if search:
-        count_query = count_query.where(Offer.title.ilike(f"%{search}%"))
-    
-    total = db.scalar(count_query)
+    # Count total (only when asked, or for page-number clients)
+    total = None
+    if wants_total(include_total, cursor):
+        count_query = select(func.count()).select_from(Offer).where(Offer.is_active == True)
+        if merchant_id:
+            count_query = count_query.where(Offer.merchant_id == merchant_id)
+        if search:
+            count_query = count_query.where(Offer.title.ilike(f"%{search}%"))
+        total = await db.scalar(count_query)
     
-    # Paginate
-    offset = (page - 1) * limit
-    results = db.execute(query.offset(offset).limit(limit)).all()
+    # Order by priority and created date, seeking past the cursor
+    if page > 1 and not cursor:
+        query = query.offset((page - 1) * limit)
+    query = OFFERS_KEYSET.apply(query, cursor, limit)
+    results, next_cursor = OFFERS_KEYSET.page((await db.execute(query)).all(), limit, entity=lambda row: row.Offer)
     
     # Format response
     offers = []
@@ -86,22 +113,25 @@ def list_offers(
             }
         })
     
-    response = {
+    pagination = {
+        "page": page,
+        "limit": limit,
+        "has_more": next_cursor is not None,
+        "next_cursor": next_cursor,
+    }
+    if total is not None:
+        pagination["total"] = total
+        pagination["pages"] = (total + limit - 1) // limit
+    
+    return {
         "success": True,
         "data": offers,
-        "pagination": {
-            "page": page,
-            "limit": limit,
-            "total": total,
-            "pages": (total + limit - 1) // limit
-        }
+        "pagination": pagination,
     }
-    cache_set(cache_key, response, 300)
-    return response
 
 
 @router.get("/featured")
-def featured_offers(limit: int = 12, db: Session = Depends(get_db)):
+async def featured_offers(limit: int = 12, db: AsyncSession = Depends(get_async_read_db)):
     """Return a list of 'featured' offers (highest priority first)."""
     query = (
         select(Offer, Merchant)
@@ -110,7 +140,7 @@ def featured_offers(limit: int = 12, db: Session = Depends(get_db)):
         .order_by(Offer.priority.desc(), Offer.created_at.desc())
         .limit(limit)
     )
-    results = db.execute(query).all()
+    results = (await db.execute(query)).all()
     data = [
         {
             "id": o.id,
@@ -128,7 +158,7 @@ def featured_offers(limit: int = 12, db: Session = Depends(get_db)):
 
 
 @router.get("/exclusive")
-def exclusive_offers(limit: int = 12, db: Session = Depends(get_db)):
+async def exclusive_offers(limit: int = 12, db: AsyncSession = Depends(get_async_read_db)):
     """Return a list of 'exclusive' offers approximated by priority > 0."""
     query = (
         select(Offer, Merchant)
@@ -137,7 +167,7 @@ def exclusive_offers(limit: int = 12, db: Session = Depends(get_db)):
         .order_by(Offer.priority.desc(), Offer.created_at.desc())
         .limit(limit)
     )
-    results = db.execute(query).all()
+    results = (await db.execute(query)).all()
     data = [
         {
             "id": o.id,
@@ -155,13 +185,13 @@ def exclusive_offers(limit: int = 12, db: Session = Depends(get_db)):
 
 
 @router.get("/{offer_id}")
-def get_offer(offer_id: int, db: Session = Depends(get_db)):
+async def get_offer(offer_id: int, db: AsyncSession = Depends(get_async_read_db)):
     """Get single offer by ID"""
-    result = db.execute(
+    result = (await db.execute(
         select(Offer, Merchant)
         .join(Merchant)
         .where(Offer.id == offer_id)
-    ).first()
+    )).first()
     
     if not result:
         return {"success": False, "error": "Offer not found"}
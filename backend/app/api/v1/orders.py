@@ -16,15 +16,21 @@ from ...schemas.order import (
 from ...sms import send_voucher_sms
 from ...email import send_voucher_email
 from ...events import publish_order_event
+from ...pagination import Keyset, page_info, wants_total
+from ...loaders import count_of
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
 
+ORDERS_KEYSET = Keyset("orders", Order.created_at, Order.id)
+
 
 @router.get("/", response_model=dict)
 def list_orders(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
     status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    include_total: Optional[bool] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -35,17 +41,21 @@ def list_orders(
     if status:
         query = query.filter(Order.status == status)
     
-    # Get total count
-    total_items = query.count()
+    # Get total count (only when asked, or for page-number clients)
+    total_items = query.count() if wants_total(include_total, cursor) else None
+    
+    # Paginate newest first, seeking past the cursor
+    if page > 1 and not cursor:
+        query = query.offset((page - 1) * limit)
+    query = ORDERS_KEYSET.apply(query, cursor, limit)
     
-    # Paginate
-    offset = (page - 1) * limit
-    orders = query.order_by(Order.created_at.desc()).offset(offset).limit(limit).all()
+    # Item counts ride along in the page query
+    query = query.add_columns(count_of(OrderItem.order_id, Order.id).label("items_count"))
+    rows, next_cursor = ORDERS_KEYSET.page(query.all(), limit, entity=lambda row: row.Order)
     
     # Convert to summaries
     order_summaries = []
-    for order in orders:
-        items_count = db.query(OrderItem).filter(OrderItem.order_id == order.id).count()
+    for order, items_count in rows:
         order_summaries.append(OrderSummary(
             id=order.id,
             order_number=order.order_number,
@@ -58,18 +68,11 @@ def list_orders(
             created_at=order.created_at
         ))
     
-    total_pages = (total_items + limit - 1) // limit
-    
     return {
         "success": True,
         "data": {
             "orders": [o.model_dump() for o in order_summaries],
-            "pagination": {
-                "current_page": page,
-                "total_pages": total_pages,
-                "total_items": total_items,
-                "per_page": limit,
-            },
+            "pagination": page_info(page, limit, next_cursor, total_items),
         },
     }
 
@@ -148,13 +151,12 @@ def fulfill_order(
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    # Update order items with voucher codes
+    # Update order items with voucher codes (one query for all of the order's items)
+    all_items = db.query(OrderItem).filter(OrderItem.order_id == order_id).all()
+    items_by_id = {item.id: item for item in all_items}
     fulfilled_items = []
     for voucher_data in vouchers:
-        item = db.query(OrderItem).filter(
-            OrderItem.id == voucher_data.order_item_id,
-            OrderItem.order_id == order_id
-        ).first()
+        item = items_by_id.get(voucher_data.order_item_id)
         
         if not item:
             continue
@@ -164,7 +166,6 @@ def fulfill_order(
         fulfilled_items.append(item)
     
     # Update order status
-    all_items = db.query(OrderItem).filter(OrderItem.order_id == order_id).all()
     if all(item.fulfillment_status == "delivered" for item in all_items):
         order.fulfillment_status = "delivered"
         order.status = "fulfilled"
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel
 import json, hashlib, random, time
-from ...redis_client import cache_get, cache_set, rk
+from ...redis_client import rk
+from ... import redis_async
 from ...dependencies import rate_limit_dependency
 
 router = APIRouter(prefix="/products", tags=["Products"])
@@ -87,21 +88,21 @@ def _generate_samples(total: int = 40):
 
 _PRODUCT_CACHE_KEY = rk("cache","products","catalog")
 
-def _get_catalog():
-    cached = cache_get(_PRODUCT_CACHE_KEY)
+async def _get_catalog_async():
+    cached = await redis_async.cache_get(_PRODUCT_CACHE_KEY)
     if cached:
         return cached
     data = _generate_samples()
-    cache_set(_PRODUCT_CACHE_KEY, data, 300)
+    await redis_async.cache_set(_PRODUCT_CACHE_KEY, data, 300)
     return data
 
 
 @router.get("/", response_model=dict)
-def list_products(
+async def list_products(
     filters: ProductFilters = ProductFilters(),
     _: dict = Depends(rate_limit_dependency("products:list", limit=100, window_seconds=60)),
 ):
-    catalog = _get_catalog()
+    catalog = await _get_catalog_async()
     # basic filtering
     items = catalog
     if filters.category_id:
@@ -137,21 +138,21 @@ def list_products(
 
 
 @router.get("/{slug}", response_model=dict)
-def get_product(slug: str):
-    for p in _get_catalog():
+async def get_product(slug: str):
+    for p in await _get_catalog_async():
         if p["slug"] == slug:
             return {"success": True, "data": p}
     return {"success": False, "data": None}
 
 @router.get("/featured", response_model=dict)
-def featured_products(limit: int = 8):
-    catalog = _get_catalog()
+async def featured_products(limit: int = 8):
+    catalog = await _get_catalog_async()
     featured = [p for p in catalog if p["is_featured"]]
     featured.sort(key=lambda x: x["sales_count"], reverse=True)
     return {"success": True, "data": featured[:limit]}
 
 @router.get("/bestsellers", response_model=dict)
-def bestseller_products(limit: int = 8):
-    catalog = _get_catalog()
+async def bestseller_products(limit: int = 8):
+    catalog = await _get_catalog_async()
     sorted_catalog = sorted(catalog, key=lambda x: x["sales_count"], reverse=True)
     return {"success": True, "data": sorted_catalog[:limit]}
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import select, func, update
 from pydantic import BaseModel
 from datetime import datetime
 from typing import Dict, Optional
@@ -8,8 +8,9 @@ from typing import Dict, Optional
 from ...database import get_db
 from ...models import User
 from ...models.push_subscription import PushSubscription, PushNotification
-from ...security import get_current_user
-from ...push_notifications import send_web_push, create_notification_payload
+from ...dependencies import get_current_user, require_admin
+from ...push_notifications import EXPIRED, SENT, WebPushSender, create_notification_payload, notification_payload
+from ...queue import push_broadcast_job
 
 router = APIRouter(prefix="/push", tags=["Push Notifications"])
 
@@ -154,32 +155,37 @@ async def send_push_notification(
     if not subscriptions:
         raise HTTPException(status_code=404, detail="No active subscriptions found")
 
-    sent_count = 0
-    failed_subscriptions = []
-
-    for subscription in subscriptions:
-        subscription_info = {
-            "endpoint": subscription.endpoint,
-            "p256dh_key": subscription.p256dh_key,
-            "auth_key": subscription.auth_key
-        }
-
-        success = send_web_push(
-            subscription_info,
-            payload.title,
-            payload.body,
-            payload.icon,
-            payload.image,
-            payload.url,
-            payload.data
+    sender = WebPushSender()
+    try:
+        outcomes = await sender.send_many(
+            [
+                {
+                    "id": subscription.id,
+                    "endpoint": subscription.endpoint,
+                    "p256dh_key": subscription.p256dh_key,
+                    "auth_key": subscription.auth_key
+                }
+                for subscription in subscriptions
+            ],
+            notification_payload(payload.title, payload.body, payload.icon, payload.image, payload.url, payload.data)
+        )
+    finally:
+        await sender.aclose()
+
+    sent_count = len(outcomes[SENT])
+    failed_count = len(subscriptions) - sent_count
+    if outcomes[SENT]:
+        db.execute(
+            update(PushSubscription)
+            .where(PushSubscription.id.in_(outcomes[SENT]))
+            .values(last_used_at=datetime.utcnow())
+        )
+    if outcomes[EXPIRED]:
+        db.execute(
+            update(PushSubscription)
+            .where(PushSubscription.id.in_(outcomes[EXPIRED]))
+            .values(is_active=False)
         )
-
-        if success:
-            sent_count += 1
-            subscription.last_used_at = datetime.utcnow()
-        else:
-            failed_subscriptions.append(subscription.endpoint)
-            subscription.is_active = False
 
     # Create notification record
     notification = PushNotification(
@@ -201,7 +207,7 @@ async def send_push_notification(
         "message": f"Notification sent to {sent_count} device(s)",
         "data": {
             "sent_count": sent_count,
-            "failed_count": len(failed_subscriptions)
+            "failed_count": failed_count
         }
     }
 
@@ -256,73 +262,31 @@ def get_notification_history(
 
 # Admin endpoint to send notifications to all users or specific users
 @router.post("/admin/broadcast", response_model=dict)
-async def broadcast_notification(
+def broadcast_notification(
     payload: SendNotificationRequest,
     user_ids: Optional[list[int]] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    _: object = Depends(require_admin)
 ):
     """Broadcast push notification to users (Admin only)"""
-    # TODO: Add admin authentication
-
-    query = select(PushSubscription).where(PushSubscription.is_active == True)
+    query = select(func.count()).select_from(PushSubscription).where(PushSubscription.is_active == True)
 
     if user_ids:
         query = query.where(PushSubscription.user_id.in_(user_ids))
 
-    subscriptions = db.scalars(query).all()
+    total_subscriptions = db.scalar(query)
 
-    if not subscriptions:
+    if not total_subscriptions:
         raise HTTPException(status_code=404, detail="No active subscriptions found")
 
-    sent_count = 0
-    failed_count = 0
-
-    for subscription in subscriptions:
-        subscription_info = {
-            "endpoint": subscription.endpoint,
-            "p256dh_key": subscription.p256dh_key,
-            "auth_key": subscription.auth_key
-        }
-
-        success = send_web_push(
-            subscription_info,
-            payload.title,
-            payload.body,
-            payload.icon,
-            payload.image,
-            payload.url,
-            payload.data
-        )
-
-        if success:
-            sent_count += 1
-            subscription.last_used_at = datetime.utcnow()
-
-            # Create notification record
-            notification = PushNotification(
-                user_id=subscription.user_id,
-                title=payload.title,
-                body=payload.body,
-                icon=payload.icon,
-                image=payload.image,
-                url=payload.url,
-                data=str(payload.data) if payload.data else None,
-                status="sent",
-                sent_at=datetime.utcnow()
-            )
-            db.add(notification)
-        else:
-            failed_count += 1
-            subscription.is_active = False
-
-    db.commit()
+    # Delivered by workers/push_worker.py
+    job_id = push_broadcast_job(payload.model_dump(), user_ids)
 
     return {
         "success": True,
-        "message": f"Broadcast sent to {sent_count} subscribers",
+        "message": f"Broadcast queued for {total_subscriptions} subscriptions",
         "data": {
-            "sent_count": sent_count,
-            "failed_count": failed_count,
-            "total_subscriptions": len(subscriptions)
+            "job_id": job_id,
+            "total_subscriptions": total_subscriptions
         }
     }
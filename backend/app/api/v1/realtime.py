@@ -5,34 +5,44 @@ order and cashback events. Extend by publishing to `events:*` channels.
 import asyncio
 import json
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from ...redis_client import redis_client
-from ...queue import get_queue_stats
+from ...redis_async import get_async_redis, get_queue_stats
 
 router = APIRouter(prefix="/realtime", tags=["System"])
 
+EMPTY_QUEUE_STATS = {
+    "email": {"pending": 0, "processing": 0, "scheduled": 0, "dead_letter": 0},
+    "sms": {"pending": 0, "processing": 0, "scheduled": 0, "dead_letter": 0},
+}
+
 
 @router.websocket("/ws")
 async def realtime_ws(ws: WebSocket):
     await ws.accept()
-    pubsub = redis_client.pubsub()
+    pubsub = get_async_redis().pubsub()
     channels = ["events:orders", "events:cashback"]
-    pubsub.subscribe(*channels)
     try:
+        await pubsub.subscribe(*channels)
         while True:
-            # Non-blocking check for messages
-            message = pubsub.get_message(ignore_subscribe_messages=True, timeout=0.5)
+            # Awaits on the socket, so idle connections cost no event-loop time
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
             if message:
                 try:
                     data = json.loads(message["data"]) if isinstance(message["data"], str) else message["data"]
                 except Exception:
                     data = {"raw": message["data"]}
                 await ws.send_json({"channel": message["channel"], "data": data})
-            await asyncio.sleep(0.25)
     except WebSocketDisconnect:
-        pubsub.close()
+        pass
     except Exception:
-        pubsub.close()
-        await ws.close(code=1011)
+        try:
+            await ws.close(code=1011)
+        except Exception:
+            pass
+    finally:
+        try:
+            await pubsub.aclose()
+        except Exception:
+            pass
 
 
 @router.websocket("/queue/ws")
@@ -42,17 +52,17 @@ async def queue_stats_ws(ws: WebSocket):
     try:
         # Immediate first payload for tests / initial UI render
         try:
-            first_stats = get_queue_stats()
+            first_stats = await get_queue_stats()
         except Exception:
-            first_stats = {"email": {"pending": 0, "processing": 0, "dlq": 0}, "sms": {"pending": 0, "processing": 0, "dlq": 0}}
+            first_stats = EMPTY_QUEUE_STATS
         await ws.send_json({"type": "queue_stats", "data": first_stats})
         # Continue periodic updates
         while True:
             await asyncio.sleep(5)
             try:
-                stats = get_queue_stats()
+                stats = await get_queue_stats()
             except Exception:
-                stats = {"email": {"pending": 0, "processing": 0, "dlq": 0}, "sms": {"pending": 0, "processing": 0, "dlq": 0}}
+                stats = EMPTY_QUEUE_STATS
             await ws.send_json({"type": "queue_stats", "data": stats})
     except WebSocketDisconnect:
         pass
@@ -60,4 +70,4 @@ async def queue_stats_ws(ws: WebSocket):
         try:
             await ws.close(code=1011)
         except Exception:
-            pass
\ No newline at end of file
+            pass
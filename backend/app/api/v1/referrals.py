@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from ...database import get_db
+from ...loaders import Loader
 from ...models import User, Referral
 from ...dependencies import get_current_user
 from ...gamification import (
@@ -31,15 +32,12 @@ def my_code(user: User = Depends(get_current_user)):
 def leaderboard(limit: int = Query(10, ge=1, le=100), db: Session = Depends(get_db)):
     rows = leaderboard_top(limit)
     # Fetch minimal user info
-    user_map = {}
-    if rows:
-        user_ids = [uid for uid, _ in rows]
-        for u in db.query(User).filter(User.id.in_(user_ids)).all():
-            user_map[u.id] = {"id": u.id, "name": u.full_name}
+    users = Loader.for_session(db, User.id).load_many(uid for uid, _ in rows)
     leaderboard_rows = []
     for uid, score in rows:
+        u = users.get(uid)
         leaderboard_rows.append({
-            "user": user_map.get(uid, {"id": uid, "name": "Unknown"}),
+            "user": {"id": u.id, "name": u.full_name} if u else {"id": uid, "name": "Unknown"},
             "earnings": score,
         })
     return {"success": True, "data": {"rows": leaderboard_rows}}
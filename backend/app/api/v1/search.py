@@ -1,17 +1,25 @@
 """Search API for merchants, offers, and products"""
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import select, func, or_, and_, desc, text
+from fastapi import APIRouter, Depends, Header, Query, Request
+from jose import JWTError, jwt
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, or_, and_, desc, text
 from typing import Optional, List
 from datetime import datetime, timedelta
 
-from ...database import get_db
+from ...config import get_settings
+from ...database import get_async_read_db
 from ...models import Merchant, Offer, Product, OfferClick, OfferView
-from ...redis_client import redis_client, rk, cache_get, cache_set
+from ...redis_client import rk
+from ...redis_async import cache_get, cache_set
+from ...cache import read_through_async
 from pydantic import BaseModel
 from ...dependencies import rate_limit_dependency
+from ...services import autocomplete as autocomplete_index
+from ...services import trending
+from ...services.search import search_catalog
 
 router = APIRouter(prefix="/search", tags=["Search"])
+settings = get_settings()
 
 
 class SearchResult(BaseModel):
@@ -30,182 +38,84 @@ class AutocompleteResult(BaseModel):
     count: int
 
 
+def _searcher(request: Request, authorization: str | None) -> str:
+    """Who ran a search, for counting distinct searchers: the signed-in user, else the client IP.
+    Only the token's signature is checked; it decides whose count this is, not access.
+    """
+    if authorization and authorization.startswith("Bearer "):
+        try:
+            payload = jwt.decode(authorization.split()[1], settings.SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+            return f"u{payload['sub']}"
+        except (JWTError, KeyError):
+            pass
+    return request.client.host if request.client else "unknown"
+
+
 @router.get("/", response_model=dict)
-def search_all(
-    q: str = Query(..., min_length=2, description="Search query"),
-    type: Optional[str] = Query(None, description="Filter by type: merchant, offer, product"),
+async def search_all(
+    request: Request,
+    q: str = Query(..., min_length=2, max_length=100, description="Search query"),
+    type: Optional[str] = Query(None, pattern="^(merchant|offer|product)$", description="Filter by type: merchant, offer, product"),
     limit: int = Query(20, ge=1, le=100),
-    offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db),
+    offset: int = Query(0, ge=0, le=1000),
+    db: AsyncSession = Depends(get_async_read_db),
+    authorization: str | None = Header(None),
     _: dict = Depends(rate_limit_dependency("search", limit=60, window_seconds=60))
 ):
     """
     Universal search across merchants, offers, and products.
-    Uses PostgreSQL full-text search with ranking.
+    Ranked full-text + trigram matching in one indexed query (app/services/search.py);
+    tolerates small typos and paginates with limit/offset.
     """
-    results = []
-    
-    # Search merchants
-    if not type or type == "merchant":
-        merchants = db.execute(
-            select(
-                Merchant.id,
-                Merchant.name,
-                Merchant.description,
-                Merchant.logo_url,
-                Merchant.slug,
-                func.ts_rank(
-                    func.to_tsvector('english', Merchant.name + ' ' + func.coalesce(Merchant.description, '')),
-                    func.plainto_tsquery('english', q)
-                ).label('rank')
-            )
-            .where(
-                and_(
-                    Merchant.is_active == True,
-                    or_(
-                        Merchant.name.ilike(f"%{q}%"),
-                        Merchant.description.ilike(f"%{q}%")
-                    )
-                )
-            )
-            .order_by(desc('rank'))
-            .limit(limit // 3)
-        ).all()
-        
-        for m in merchants:
-            results.append({
-                "type": "merchant",
-                "id": m.id,
-                "title": m.name,
-                "description": m.description,
-                "image_url": m.logo_url,
-                "url": f"/merchants/{m.slug}",
-                "relevance": float(m.rank) if m.rank else 0.0
-            })
-    
-    # Search offers
-    if not type or type == "offer":
-        offers = db.execute(
-            select(
-                Offer.id,
-                Offer.title,
-                Offer.description,
-                Offer.discount_text,
-                Merchant.name.label('merchant_name'),
-                Merchant.slug.label('merchant_slug'),
-                func.ts_rank(
-                    func.to_tsvector('english', 
-                        Offer.title + ' ' + 
-                        func.coalesce(Offer.description, '') + ' ' + 
-                        func.coalesce(Offer.discount_text, '')
-                    ),
-                    func.plainto_tsquery('english', q)
-                ).label('rank')
-            )
-            .join(Merchant, Offer.merchant_id == Merchant.id)
-            .where(
-                and_(
-                    Offer.is_active == True,
-                    Merchant.is_active == True,
-                    or_(
-                        Offer.title.ilike(f"%{q}%"),
-                        Offer.description.ilike(f"%{q}%"),
-                        Offer.discount_text.ilike(f"%{q}%")
-                    )
-                )
-            )
-            .order_by(desc('rank'))
-            .limit(limit // 3)
-        ).all()
-        
-        for o in offers:
-            results.append({
-                "type": "offer",
-                "id": o.id,
-                "title": o.title,
-                "description": o.description or o.discount_text,
-                "image_url": None,
-                "url": f"/merchants/{o.merchant_slug}#offer-{o.id}",
-                "relevance": float(o.rank) if o.rank else 0.0,
-                "merchant": o.merchant_name
-            })
-    
-    # Search products
-    if not type or type == "product":
-        products = db.execute(
-            select(
-                Product.id,
-                Product.name,
-                Product.description,
-                Product.slug,
-                Product.image_url,
-                Merchant.name.label('merchant_name'),
-                func.ts_rank(
-                    func.to_tsvector('english', Product.name + ' ' + func.coalesce(Product.description, '')),
-                    func.plainto_tsquery('english', q)
-                ).label('rank')
-            )
-            .join(Merchant, Product.merchant_id == Merchant.id)
-            .where(
-                and_(
-                    Product.is_active == True,
-                    Merchant.is_active == True,
-                    or_(
-                        Product.name.ilike(f"%{q}%"),
-                        Product.description.ilike(f"%{q}%")
-                    )
-                )
-            )
-            .order_by(desc('rank'))
-            .limit(limit // 3)
-        ).all()
-        
-        for p in products:
-            results.append({
-                "type": "product",
-                "id": p.id,
-                "title": p.name,
-                "description": p.description,
-                "image_url": p.image_url,
-                "url": f"/products/{p.slug}",
-                "relevance": float(p.rank) if p.rank else 0.0,
-                "merchant": p.merchant_name
-            })
-    
-    # Sort by relevance
-    results.sort(key=lambda x: x['relevance'], reverse=True)
-    
+    page = await search_catalog(db, q.strip(), type, limit, offset)
+    if page["total"] and offset == 0:
+        await autocomplete_index.record_query(q, _searcher(request, authorization))
     return {
         "success": True,
-        "data": {
-            "results": results[:limit],
-            "total": len(results),
-            "query": q
-        }
+        "data": {**page, "query": q}
     }
 
 
 @router.get("/autocomplete", response_model=dict)
-def autocomplete(
+async def autocomplete(
     q: str = Query(..., min_length=2, description="Search query"),
     limit: int = Query(10, ge=1, le=20),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Autocomplete suggestions for search.
-    Returns merchants, popular offers, and products matching the query.
+    Served from the Redis prefix index (app/services/autocomplete.py): merchants,
+    products and popular queries ranked by popularity. Falls back to SQL when
+    the index is unavailable or not built yet.
     """
+    suggestions = await autocomplete_index.suggest(q, limit)
+    if suggestions is None:
+        suggestions = await _autocomplete_from_db(db, q, limit)
     
-    # Check cache first
-    cache_key = rk("autocomplete", q.lower())
-    cached = cache_get(cache_key)
-    if cached:
-        return {"success": True, "data": cached}
-    
+    return {
+        "success": True,
+        "data": {
+            "suggestions": suggestions,
+            "query": q
+        }
+    }
+
+
+async def _autocomplete_from_db(db: AsyncSession, q: str, limit: int) -> list[dict]:
+    return await read_through_async(
+        rk("autocomplete", q.lower(), str(limit)),
+        lambda session: _load_autocomplete(session, q, limit),
+        ttl=300,
+        db=db,
+        namespace="autocomplete",
+    )
+
+
+async def _load_autocomplete(db: AsyncSession, q: str, limit: int) -> list[dict]:
     suggestions = []
     
     # Merchant suggestions
-    merchants = db.execute(
+    merchants = (await db.execute(
         select(Merchant.name, Merchant.slug)
         .where(
             and_(
@@ -215,7 +125,7 @@ def autocomplete(
         )
         .order_by(Merchant.name)
         .limit(limit // 2)
-    ).all()
+    )).all()
     
     for m in merchants:
         suggestions.append({
@@ -225,7 +135,7 @@ def autocomplete(
         })
     
     # Product suggestions (popular products)
-    products = db.execute(
+    products = (await db.execute(
         select(Product.name, Product.slug)
         .where(
             and_(
@@ -235,7 +145,7 @@ def autocomplete(
         )
         .order_by(Product.name)
         .limit(limit // 2)
-    ).all()
+    )).all()
     
     for p in products:
         suggestions.append({
@@ -244,80 +154,82 @@ def autocomplete(
             "url": f"/products/{p.slug}"
         })
     
-    # Cache for 5 minutes
-    cache_set(cache_key, {"suggestions": suggestions}, 300)
-    
-    return {
-        "success": True,
-        "data": {
-            "suggestions": suggestions[:limit],
-            "query": q
-        }
-    }
+    return suggestions[:limit]
 
 
 @router.get("/trending", response_model=dict)
-def get_trending_offers(
+async def get_trending_offers(
     limit: int = Query(10, ge=1, le=50),
     days: int = Query(7, ge=1, le=30),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Get trending offers based on click-through rate and recent activity.
-    Calculated from clicks and views in the last N days.
+    Served from the top list materialized from hourly click/view counters
+    (app/services/trending.py); ``days`` rounds up to the next materialized window.
     """
+    window = trending.window_for(days)
+    offers = await trending.get_top(window, limit)
+    if offers is None:
+        # Never materialized (fresh deploy) or Redis unavailable
+        offers = await _trending_from_db(db, window, limit)
     
-    # Check cache
-    cache_key = rk("trending", "offers", str(days))
-    cached = cache_get(cache_key)
+    return {
+        "success": True,
+        "data": {
+            "offers": offers,
+            "period_days": window
+        }
+    }
+
+
+async def _trending_from_db(db: AsyncSession, days: int, limit: int) -> list[dict]:
+    cache_key = rk("trending", "offers", str(days), str(limit))
+    cached = await cache_get(cache_key)
     if cached:
-        return {"success": True, "data": cached}
+        return cached
     
     cutoff_date = datetime.utcnow() - timedelta(days=days)
     
-    # Get offers with click and view counts
-    trending = db.execute(
+    # Clicks and views are aggregated separately so the join never multiplies them
+    trending_rows = (await db.execute(
         text("""
+        WITH v AS (
+            SELECT offer_id, COUNT(*) AS views FROM offer_views
+            WHERE created_at >= :cutoff_date GROUP BY offer_id HAVING COUNT(*) >= :min_views
+        ), c AS (
+            SELECT offer_id, COUNT(*) AS clicks FROM offer_clicks
+            WHERE created_at >= :cutoff_date AND offer_id IN (SELECT offer_id FROM v) GROUP BY offer_id
+        )
         SELECT 
             o.id,
             o.title,
-            o.description,
-            o.discount_text,
             o.code,
+            o.image_url,
             m.name as merchant_name,
             m.slug as merchant_slug,
             m.logo_url as merchant_logo,
-            COUNT(DISTINCT oc.id) as clicks,
-            COUNT(DISTINCT ov.id) as views,
-            CASE 
-                WHEN COUNT(DISTINCT ov.id) > 0 
-                THEN CAST(COUNT(DISTINCT oc.id) AS FLOAT) / COUNT(DISTINCT ov.id)
-                ELSE 0 
-            END as ctr
-        FROM offers o
+            COALESCE(c.clicks, 0) as clicks,
+            v.views,
+            CAST(COALESCE(c.clicks, 0) AS FLOAT) / v.views as ctr
+        FROM v
+        JOIN offers o ON o.id = v.offer_id
         JOIN merchants m ON o.merchant_id = m.id
-        LEFT JOIN offer_clicks oc ON o.id = oc.offer_id 
-            AND oc.created_at >= :cutoff_date
-        LEFT JOIN offer_views ov ON o.id = ov.offer_id 
-            AND ov.created_at >= :cutoff_date
+        LEFT JOIN c ON c.offer_id = v.offer_id
         WHERE o.is_active = true 
             AND m.is_active = true
-        GROUP BY o.id, o.title, o.description, o.discount_text, o.code, 
-                 m.name, m.slug, m.logo_url
-        HAVING COUNT(DISTINCT ov.id) >= 5
         ORDER BY ctr DESC, clicks DESC
         LIMIT :limit
         """),
-        {"cutoff_date": cutoff_date, "limit": limit}
-    ).fetchall()
+        {"cutoff_date": cutoff_date, "min_views": settings.TRENDING_MIN_VIEWS, "limit": limit}
+    )).fetchall()
     
     results = [
         {
             "id": row.id,
             "title": row.title,
-            "description": row.description,
-            "discount_text": row.discount_text,
             "code": row.code,
+            "image_url": row.image_url,
             "merchant": {
                 "name": row.merchant_name,
                 "slug": row.merchant_slug,
@@ -326,29 +238,22 @@ def get_trending_offers(
             "stats": {
                 "clicks": row.clicks,
                 "views": row.views,
-                "ctr": float(row.ctr)
+                "ctr": round(float(row.ctr), 4)
             }
         }
-        for row in trending
+        for row in trending_rows
     ]
     
-    # Cache for 1 hour
-    cache_set(cache_key, {"offers": results, "period_days": days}, 3600)
-    
-    return {
-        "success": True,
-        "data": {
-            "offers": results,
-            "period_days": days
-        }
-    }
+    # Short TTL: the materialized list takes over once the worker runs
+    await cache_set(cache_key, results, 300)
+    return results
 
 
 @router.get("/expiring-soon", response_model=dict)
-def get_expiring_offers(
+async def get_expiring_offers(
     limit: int = Query(20, ge=1, le=50),
     days: int = Query(7, ge=1, le=30),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Get offers expiring in the next N days.
@@ -357,14 +262,14 @@ def get_expiring_offers(
     
     # Check cache
     cache_key = rk("expiring", "offers", str(days))
-    cached = cache_get(cache_key)
+    cached = await cache_get(cache_key)
     if cached:
         return {"success": True, "data": cached}
     
     now = datetime.utcnow()
     cutoff_date = now + timedelta(days=days)
     
-    expiring = db.execute(
+    expiring = (await db.execute(
         select(
             Offer.id,
             Offer.title,
@@ -388,7 +293,7 @@ def get_expiring_offers(
         )
         .order_by(Offer.expires_at)
         .limit(limit)
-    ).all()
+    )).all()
     
     results = [
         {
@@ -409,7 +314,7 @@ def get_expiring_offers(
     ]
     
     # Cache for 30 minutes
-    cache_set(cache_key, {"offers": results, "expires_within_days": days}, 1800)
+    await cache_set(cache_key, {"offers": results, "expires_within_days": days}, 1800)
     
     return {
         "success": True,
@@ -421,10 +326,10 @@ def get_expiring_offers(
 
 
 @router.get("/recommendations", response_model=dict)
-def get_personalized_recommendations(
+async def get_personalized_recommendations(
     user_id: Optional[int] = Query(None, description="User ID for personalization"),
     limit: int = Query(10, ge=1, le=50),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """
     Get personalized offer recommendations.
@@ -434,14 +339,14 @@ def get_personalized_recommendations(
     if user_id:
         # Check cache for user-specific recommendations
         cache_key = rk("recommendations", "user", str(user_id))
-        cached = cache_get(cache_key)
+        cached = await cache_get(cache_key)
         if cached:
             return {"success": True, "data": cached}
         
         # Get user's click history (last 30 days)
         cutoff = datetime.utcnow() - timedelta(days=30)
         
-        user_clicks = db.execute(
+        user_clicks = (await db.execute(
             text("""
             SELECT DISTINCT m.id as merchant_id, c.id as category_id
             FROM offer_clicks oc
@@ -452,7 +357,7 @@ def get_personalized_recommendations(
                 AND oc.created_at >= :cutoff
             """),
             {"user_id": user_id, "cutoff": cutoff}
-        ).fetchall()
+        )).fetchall()
         
         merchant_ids = [row.merchant_id for row in user_clicks if row.merchant_id]
         category_ids = [row.category_id for row in user_clicks if row.category_id]
@@ -509,7 +414,7 @@ def get_personalized_recommendations(
             )
         ).order_by(desc(Offer.priority), desc(Offer.created_at)).limit(limit)
     
-    recommendations = db.execute(query).all()
+    recommendations = (await db.execute(query)).all()
     
     results = [
         {
@@ -529,7 +434,7 @@ def get_personalized_recommendations(
     
     # Cache for 15 minutes
     if user_id:
-        cache_set(cache_key, {"offers": results, "personalized": True}, 900)
+        await cache_set(cache_key, {"offers": results, "personalized": True}, 900)
     
     return {
         "success": True,
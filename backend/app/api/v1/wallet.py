@@ -20,9 +20,13 @@ from ...dependencies import get_current_user
 from ...queue import push_email_job, push_sms_job
 from ...config import get_settings
 from ...redis_client import redis_client
+from ...pagination import Keyset, page_info, wants_total
+from ...services import wallet_ledger
 
 router = APIRouter(prefix="/wallet", tags=["Wallet"])
 
+TRANSACTIONS_KEYSET = Keyset("wallet_transactions", WalletTransaction.created_at, WalletTransaction.id)
+
 settings = get_settings()
 
 def acquire_lock(key: str, timeout: int = 10) -> bool:
@@ -43,35 +47,16 @@ def get_wallet_summary(
 ):
     """Get wallet balance and summary"""
     
-    # Calculate lifetime earnings (all positive transactions)
-    lifetime_earnings = db.scalar(
-        select(func.coalesce(func.sum(WalletTransaction.amount), 0))
-        .where(
-            and_(
-                WalletTransaction.user_id == current_user.id,
-                WalletTransaction.amount > 0
-            )
-        )
-    ) or 0.0
-    
-    # Calculate total withdrawn (approved withdrawals)
-    total_withdrawn = db.scalar(
-        select(func.coalesce(func.sum(Withdrawal.amount), 0))
-        .where(
-            and_(
-                Withdrawal.user_id == current_user.id,
-                Withdrawal.status == "approved"
-            )
-        )
-    ) or 0.0
+    # Materialized totals: one primary-key read instead of SUMs over the history
+    totals = wallet_ledger.totals(db, current_user.id)
     
     return {
         "success": True,
         "data": {
             "balance": float(current_user.wallet_balance),
             "pending_cashback": float(current_user.pending_cashback or 0),
-            "lifetime_earnings": float(lifetime_earnings),
-            "total_withdrawn": float(total_withdrawn),
+            "lifetime_earnings": totals["lifetime_credit"],
+            "total_withdrawn": totals["total_withdrawn"],
         }
     }
 
@@ -106,16 +91,20 @@ def list_wallet_transactions(
         except ValueError:
             pass
     
-    # Get total count
-    total_count = db.scalar(
-        select(func.count()).select_from(query.subquery())
-    )
+    # Exact totals cost a COUNT over the whole history; cursor pages skip it unless asked
+    total_count = None
+    if wants_total(filters.include_total, filters.cursor):
+        total_count = db.scalar(
+            select(func.count()).select_from(query.subquery())
+        )
     
-    # Apply pagination and ordering
-    query = query.order_by(desc(WalletTransaction.created_at))
-    query = query.offset((filters.page - 1) * filters.limit).limit(filters.limit)
+    # Keyset pagination: seek past the cursor on (user_id, created_at, id)
+    if filters.page > 1 and not filters.cursor:
+        # Legacy page numbers still work, at OFFSET cost
+        query = query.offset((filters.page - 1) * filters.limit)
+    query = TRANSACTIONS_KEYSET.apply(query, filters.cursor, filters.limit)
     
-    transactions = db.scalars(query).all()
+    transactions, next_cursor = TRANSACTIONS_KEYSET.page(db.scalars(query).all(), filters.limit)
     
     return {
         "success": True,
@@ -123,12 +112,7 @@ def list_wallet_transactions(
             "transactions": [
                 WalletTransactionRead.model_validate(txn) for txn in transactions
             ],
-            "pagination": {
-                "current_page": filters.page,
-                "total_pages": (total_count + filters.limit - 1) // filters.limit,
-                "total_items": total_count,
-                "per_page": filters.limit,
-            }
+            "pagination": page_info(filters.page, filters.limit, next_cursor, total_count),
         }
     }
 
@@ -176,15 +160,15 @@ def convert_cashback_to_wallet(
         current_user.wallet_balance = Decimal(current_user.wallet_balance) + amount_dec
         new_balance = float(current_user.wallet_balance)
         
-        # Create transaction record
-        transaction = WalletTransaction(
+        # Create transaction record (and count it in the wallet totals)
+        transaction = wallet_ledger.record_transaction(
+            db,
             user_id=current_user.id,
             amount=amount_to_convert,
             type="cashback_converted",
             description=f"Converted ₹{amount_to_convert:.2f} from pending cashback to wallet",
             balance_after=new_balance
         )
-        db.add(transaction)
         db.commit()
         db.refresh(transaction)
         
@@ -291,9 +275,11 @@ def request_withdrawal(
             bank_account_name=request.bank_account_name
         )
         db.add(withdrawal)
+        db.flush()  # assigns withdrawal.id for the reference
         
-        # Create transaction record
-        transaction = WalletTransaction(
+        # Create transaction record (and count it in the wallet totals)
+        wallet_ledger.record_transaction(
+            db,
             user_id=current_user.id,
             amount=-request.amount,
             type="withdrawal",
@@ -301,7 +287,6 @@ def request_withdrawal(
             description=f"Withdrawal request - {request.method}",
             balance_after=new_balance
         )
-        db.add(transaction)
         
         db.commit()
         db.refresh(withdrawal)
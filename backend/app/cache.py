@@ -0,0 +1,644 @@
+"""Two-tier read-through cache used by the hot listing endpoints.
+
+Lookups resolve in order: a bounded in-process LRU/TTL tier, then Redis, then
+the caller's loader. The local tier holds already-decoded objects, so a hot hit
+costs neither a Redis round trip nor a ``json.loads``.
+
+- Misses are single-flighted per key: concurrent callers in this process wait
+  for one loader call instead of each querying the database.
+- Entries past their fresh TTL are served for ``CACHE_STALE_TTL_SECONDS`` while
+  one background thread revalidates them (stale-while-revalidate).
+- Redis stores a small envelope ``{"v": value, "fresh_until": ..., "stale_until": ...}``
+  whose key TTL covers the stale window.
+
+Invalidation is targeted rather than scan-based:
+
+- Tags: entries are registered under tags such as ``merchant:12`` or
+  ``offers:list`` (a Redis sorted set per tag, scored by each key's expiry),
+  and ``invalidate_tags`` deletes exactly the registered keys in one
+  server-side script. Registering prunes members that have expired and keeps
+  the set's own TTL at its longest-lived member's, so a hot tag does not
+  accumulate dead keys.
+- Version stamps: ``versioned_key(namespace, ...)`` embeds the namespace's
+  current version in the key; ``bump_version`` increments it, orphaning the
+  whole family at once. Orphans age out through their own TTL.
+
+``read_through_async`` is the same cache for ``async def`` routes: Redis via
+the asyncio client, coroutine loaders, per-event-loop single flight.
+
+Values are shared between requests; treat them as read-only.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Iterable, NamedTuple
+
+from .config import get_settings
+from .metrics import observe_cache
+from .redis_client import redis_client, rk, cache_invalidate, cache_invalidate_prefix, publish
+from .redis_async import get_async_redis
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "events:cache_invalidate"
+LOADER_WAIT_SECONDS = 10.0
+
+Tags = Iterable[str] | Callable[[Any], Iterable[str]]
+
+
+class CacheEntry(NamedTuple):
+    value: Any
+    fresh_until: float
+    stale_until: float
+    tags: tuple[str, ...] = ()
+
+
+class LocalCache:
+    """Thread-safe LRU keyed by cache key, bounded by entry count and TTL."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, CacheEntry]] = OrderedDict()
+        self._tags: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, now: float | None = None) -> CacheEntry | None:
+        now = time.time() if now is None else now
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, entry = item
+            if now >= expires_at:
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: CacheEntry, now: float | None = None) -> None:
+        now = time.time() if now is None else now
+        expires_at = min(now + self.ttl, entry.stale_until)
+        with self._lock:
+            self._remove(key)
+            self._data[key] = (expires_at, entry)
+            for tag in entry.tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._data) > self.max_entries:
+                self._remove(next(iter(self._data)))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def delete_prefix(self, prefix: str) -> None:
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                self._remove(key)
+
+    def delete_tags(self, tags: Iterable[str]) -> None:
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+
+    def _remove(self, key: str) -> None:
+        item = self._data.pop(key, None)
+        if item is None:
+            return
+        for tag in item[1].tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+local_cache = LocalCache(settings.CACHE_LOCAL_MAX_ENTRIES, settings.CACHE_LOCAL_TTL_SECONDS)
+
+# Bumped on every invalidation so an in-flight load never repopulates the
+# local tier with a value computed before the invalidation.
+_generation = 0
+
+_flights: dict[str, "_Flight"] = {}
+_flights_lock = threading.Lock()
+
+_refreshing: set[str] = set()
+_refresh_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+
+
+class _Flight:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: BaseException | None = None
+
+
+# Redis tier (fail open: a Redis outage degrades to local tier + loader)
+def _decode(raw: str | None) -> CacheEntry | None:
+    if raw is None:
+        return None
+    try:
+        payload = json.loads(raw)
+        return CacheEntry(
+            payload["v"],
+            float(payload["fresh_until"]),
+            float(payload["stale_until"]),
+            tuple(payload.get("tags", ())),
+        )
+    except Exception:
+        # Not an envelope (written by plain cache_set); treat as absent
+        return None
+
+
+def _encode(entry: CacheEntry) -> str:
+    envelope = {"v": entry.value, "fresh_until": entry.fresh_until, "stale_until": entry.stale_until}
+    if entry.tags:
+        envelope["tags"] = list(entry.tags)
+    return json.dumps(envelope)
+
+
+def _redis_get(key: str) -> CacheEntry | None:
+    try:
+        raw = redis_client.get(key)
+    except Exception:
+        return None
+    return _decode(raw)
+
+
+def tag_key(tag: str) -> str:
+    return rk("cache", "tag", tag)
+
+
+# Registers ARGV[1] (expiring at epoch ARGV[2]) under each tag set in KEYS,
+# drops members expired by ARGV[3] (now) and stretches the set's TTL to cover
+# its newest member. Sets written before tags were scored (plain SETs) are
+# converted, their members kept until this entry's expiry.
+_REGISTER_TAGS_LUA = """
+local expires_at, now = tonumber(ARGV[2]), tonumber(ARGV[3])
+for _, tag in ipairs(KEYS) do
+    if redis.call('TYPE', tag).ok == 'set' then
+        local members = redis.call('SMEMBERS', tag)
+        redis.call('DEL', tag)
+        for _, member in ipairs(members) do
+            redis.call('ZADD', tag, expires_at, member)
+        end
+    end
+    redis.call('ZADD', tag, 'GT', expires_at, ARGV[1])
+    redis.call('ZREMRANGEBYSCORE', tag, '-inf', now)
+    if redis.call('TTL', tag) < expires_at - now then
+        redis.call('EXPIRE', tag, expires_at - now)
+    end
+end
+return #KEYS
+"""
+_register_tags_script = redis_client.register_script(_REGISTER_TAGS_LUA)
+
+
+def _tag_args(key: str, ttl_seconds: int) -> list:
+    now = int(time.time())
+    return [key, now + ttl_seconds, now]
+
+
+def _redis_set(key: str, entry: CacheEntry, ttl_seconds: int) -> None:
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.setex(key, ttl_seconds, _encode(entry))
+        if entry.tags:
+            _register_tags_script(keys=[tag_key(t) for t in entry.tags], args=_tag_args(key, ttl_seconds), client=pipe)
+        pipe.execute()
+    except Exception:
+        return
+
+
+# Deletes every key registered under the given tag sets, then the sets.
+# UNLINK frees memory off the main thread; chunks keep unpack() in bounds.
+_INVALIDATE_TAGS_LUA = """
+local removed = 0
+for _, tag in ipairs(KEYS) do
+    local members
+    if redis.call('TYPE', tag).ok == 'set' then
+        members = redis.call('SMEMBERS', tag)
+    else
+        members = redis.call('ZRANGE', tag, 0, -1)
+    end
+    for i = 1, #members, 500 do
+        redis.call('UNLINK', unpack(members, i, math.min(i + 499, #members)))
+    end
+    removed = removed + #members
+    redis.call('DEL', tag)
+end
+return removed
+"""
+_invalidate_tags_script = redis_client.register_script(_INVALIDATE_TAGS_LUA)
+
+
+def _single_flight(key: str, fn: Callable[[], Any]) -> Any:
+    """Run ``fn`` once per key for all concurrent callers in this process."""
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+    if not leader:
+        if flight.done.wait(LOADER_WAIT_SECONDS):
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        # Leader is stuck; do not hold this request hostage
+        return fn()
+    try:
+        flight.value = fn()
+        return flight.value
+    except BaseException as exc:
+        flight.error = exc
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
+
+
+def _resolve_tags(tags: Tags | None, value: Any) -> tuple[str, ...]:
+    if tags is None:
+        return ()
+    if callable(tags):
+        tags = tags(value)
+    return tuple(dict.fromkeys(tags))
+
+
+def _load_and_store(key: str, loader: Callable[[Any], Any], db: Any, ttl: int, stale_ttl: int, tags: Tags | None) -> Any:
+    generation = _generation
+    value = loader(db)
+    if value is None:
+        return None
+    now = time.time()
+    entry = CacheEntry(value, now + ttl, now + ttl + stale_ttl, _resolve_tags(tags, value))
+    _redis_set(key, entry, ttl + stale_ttl)
+    if generation == _generation:
+        local_cache.set(key, entry, now)
+    return value
+
+
+def _refresh(key: str, loader: Callable[[Any], Any], uses_db: bool, ttl: int, stale_ttl: int, tags: Tags | None) -> None:
+    # The request's session is closed by the time this runs; open our own.
+    from .database import read_session
+
+    db = read_session() if uses_db else None
+    try:
+        _single_flight(key, lambda: _load_and_store(key, loader, db, ttl, stale_ttl, tags))
+    except Exception as e:
+        logger.warning(f"Cache revalidation failed for {key}: {e}")
+    finally:
+        if db is not None:
+            db.close()
+        with _flights_lock:
+            _refreshing.discard(key)
+
+
+def _schedule_refresh(key: str, loader: Callable[[Any], Any], uses_db: bool, ttl: int, stale_ttl: int, tags: Tags | None) -> None:
+    with _flights_lock:
+        if key in _refreshing or key in _flights:
+            return
+        _refreshing.add(key)
+    _refresh_pool.submit(_refresh, key, loader, uses_db, ttl, stale_ttl, tags)
+
+
+def read_through(
+    key: str,
+    loader: Callable[[Any], Any],
+    ttl: int,
+    db: Any = None,
+    *,
+    namespace: str = "default",
+    stale_ttl: int | None = None,
+    tags: Tags | None = None,
+) -> Any:
+    """Return the cached value for ``key``, calling ``loader(db)`` on a miss.
+
+    ``db`` is handed to the loader on a foreground miss; background
+    revalidation opens its own session when ``db`` was given. A loader
+    returning ``None`` is not cached. ``tags`` is a list of tags or a callable
+    deriving them from the loaded value (e.g. one ``merchant:<id>`` per row).
+    """
+    start = time.perf_counter()
+    stale_ttl = settings.CACHE_STALE_TTL_SECONDS if stale_ttl is None else stale_ttl
+    now = time.time()
+
+    result = "local_hit"
+    entry = local_cache.get(key, now)
+    if entry is None:
+        entry = _redis_get(key)
+        result = "redis_hit"
+        if entry is not None and now >= entry.stale_until:
+            entry = None
+        elif entry is not None:
+            local_cache.set(key, entry, now)
+
+    if entry is not None:
+        if now >= entry.fresh_until:
+            result = "stale_hit"
+            _schedule_refresh(key, loader, db is not None, ttl, stale_ttl, tags)
+        value = entry.value
+    else:
+        result = "miss"
+        value = _single_flight(key, lambda: _load_and_store(key, loader, db, ttl, stale_ttl, tags))
+
+    try:
+        observe_cache(namespace, result, time.perf_counter() - start, len(local_cache))
+    except Exception:
+        pass
+    return value
+
+
+# Asyncio path: same tiers and envelope, for ``async def`` routes. Loaders are
+# coroutine functions taking an AsyncSession.
+_async_flights: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Future]]" = weakref.WeakKeyDictionary()
+_refresh_tasks: set[asyncio.Task] = set()
+
+
+async def _redis_get_async(key: str) -> CacheEntry | None:
+    try:
+        raw = await get_async_redis().get(key)
+    except Exception:
+        return None
+    return _decode(raw)
+
+
+async def _redis_set_async(key: str, entry: CacheEntry, ttl_seconds: int) -> None:
+    try:
+        async with get_async_redis().pipeline(transaction=False) as pipe:
+            pipe.setex(key, ttl_seconds, _encode(entry))
+            if entry.tags:
+                keys = [tag_key(t) for t in entry.tags]
+                pipe.eval(_REGISTER_TAGS_LUA, len(keys), *keys, *_tag_args(key, ttl_seconds))
+            await pipe.execute()
+    except Exception:
+        return
+
+
+async def _single_flight_async(key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+    """Await ``fn`` once per key for all concurrent callers on this event loop."""
+    loop = asyncio.get_running_loop()
+    flights = _async_flights.setdefault(loop, {})
+    flight = flights.get(key)
+    if flight is not None:
+        try:
+            return await asyncio.wait_for(asyncio.shield(flight), LOADER_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            # Leader is stuck; do not hold this request hostage
+            return await fn()
+        except asyncio.CancelledError:
+            if flight.cancelled():
+                return await fn()
+            raise
+    flight = flights[key] = loop.create_future()
+    try:
+        value = await fn()
+        flight.set_result(value)
+        return value
+    except asyncio.CancelledError:
+        flight.cancel()
+        raise
+    except BaseException as exc:
+        flight.set_exception(exc)
+        flight.exception()  # mark retrieved when nobody else was waiting
+        raise
+    finally:
+        flights.pop(key, None)
+
+
+async def _load_and_store_async(key: str, loader: Callable[[Any], Awaitable[Any]], db: Any, ttl: int, stale_ttl: int, tags: Tags | None) -> Any:
+    generation = _generation
+    value = await loader(db)
+    if value is None:
+        return None
+    now = time.time()
+    entry = CacheEntry(value, now + ttl, now + ttl + stale_ttl, _resolve_tags(tags, value))
+    await _redis_set_async(key, entry, ttl + stale_ttl)
+    if generation == _generation:
+        local_cache.set(key, entry, now)
+    return value
+
+
+async def _refresh_async(key: str, loader: Callable[[Any], Awaitable[Any]], uses_db: bool, ttl: int, stale_ttl: int, tags: Tags | None) -> None:
+    from .database import async_read_session
+
+    db = async_read_session() if uses_db else None
+    try:
+        await _single_flight_async(key, lambda: _load_and_store_async(key, loader, db, ttl, stale_ttl, tags))
+    except Exception as e:
+        logger.warning(f"Cache revalidation failed for {key}: {e}")
+    finally:
+        if db is not None:
+            await db.close()
+        with _flights_lock:
+            _refreshing.discard(key)
+
+
+def _schedule_refresh_async(key: str, loader: Callable[[Any], Awaitable[Any]], uses_db: bool, ttl: int, stale_ttl: int, tags: Tags | None) -> None:
+    with _flights_lock:
+        if key in _refreshing or key in _flights:
+            return
+        _refreshing.add(key)
+    task = asyncio.get_running_loop().create_task(_refresh_async(key, loader, uses_db, ttl, stale_ttl, tags))
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+
+async def read_through_async(
+    key: str,
+    loader: Callable[[Any], Awaitable[Any]],
+    ttl: int,
+    db: Any = None,
+    *,
+    namespace: str = "default",
+    stale_ttl: int | None = None,
+    tags: Tags | None = None,
+) -> Any:
+    """``read_through`` for the event loop: ``await loader(db)`` on a miss.
+
+    Shares the local tier, Redis envelope and invalidation with the sync path;
+    background revalidation opens its own AsyncSession when ``db`` was given.
+    """
+    start = time.perf_counter()
+    stale_ttl = settings.CACHE_STALE_TTL_SECONDS if stale_ttl is None else stale_ttl
+    now = time.time()
+
+    result = "local_hit"
+    entry = local_cache.get(key, now)
+    if entry is None:
+        entry = await _redis_get_async(key)
+        result = "redis_hit"
+        if entry is not None and now >= entry.stale_until:
+            entry = None
+        elif entry is not None:
+            local_cache.set(key, entry, now)
+
+    if entry is not None:
+        if now >= entry.fresh_until:
+            result = "stale_hit"
+            _schedule_refresh_async(key, loader, db is not None, ttl, stale_ttl, tags)
+        value = entry.value
+    else:
+        result = "miss"
+        value = await _single_flight_async(key, lambda: _load_and_store_async(key, loader, db, ttl, stale_ttl, tags))
+
+    try:
+        observe_cache(namespace, result, time.perf_counter() - start, len(local_cache))
+    except Exception:
+        pass
+    return value
+
+
+# Invalidation
+def _drop_local(key: str | None = None, prefix: str | None = None, tags: Iterable[str] | None = None) -> None:
+    global _generation
+    _generation += 1
+    if prefix is not None:
+        local_cache.delete_prefix(prefix)
+    elif key is not None:
+        local_cache.delete(key)
+    if tags:
+        local_cache.delete_tags(tags)
+
+
+def invalidate(key: str) -> None:
+    """Drop one key from every tier and tell other processes to do the same."""
+    _drop_local(key=key)
+    cache_invalidate(key)
+    publish(INVALIDATION_CHANNEL, {"key": key})
+
+
+def invalidate_prefix(prefix: str) -> None:
+    """Drop every key under ``prefix`` from every tier, cluster-wide.
+
+    Walks the keyspace; prefer ``invalidate_tags`` or ``bump_version``.
+    """
+    _drop_local(prefix=prefix)
+    cache_invalidate_prefix(prefix)
+    publish(INVALIDATION_CHANNEL, {"prefix": prefix})
+
+
+def invalidate_tags(*tags: str) -> int:
+    """Drop every entry registered under any of ``tags``; returns Redis keys removed."""
+    if not tags:
+        return 0
+    _drop_local(tags=tags)
+    removed = 0
+    try:
+        removed = int(_invalidate_tags_script(keys=[tag_key(t) for t in tags]))
+    except Exception:
+        pass
+    publish(INVALIDATION_CHANNEL, {"tags": list(tags)})
+    return removed
+
+
+# Version stamps: namespace -> (version, checked_until)
+_versions: dict[str, tuple[int, float]] = {}
+
+
+def _version_key(namespace: str) -> str:
+    return rk("cache", "ver", namespace)
+
+
+def namespace_version(namespace: str) -> int:
+    """Current version of ``namespace``, re-read from Redis at most every local TTL."""
+    now = time.time()
+    known = _versions.get(namespace)
+    if known is not None and now < known[1]:
+        return known[0]
+    try:
+        version = int(redis_client.get(_version_key(namespace)) or 0)
+    except Exception:
+        version = known[0] if known is not None else 0
+    _versions[namespace] = (version, now + settings.CACHE_LOCAL_TTL_SECONDS)
+    return version
+
+
+def versioned_key(namespace: str, *parts: str) -> str:
+    """Build ``cache:<namespace>:v<version>:<parts>`` for a versioned key family."""
+    return rk("cache", namespace, f"v{namespace_version(namespace)}", *parts)
+
+
+async def versioned_key_async(namespace: str, *parts: str) -> str:
+    """``versioned_key`` that re-reads the version with the asyncio client."""
+    now = time.time()
+    known = _versions.get(namespace)
+    if known is None or now >= known[1]:
+        try:
+            version = int(await get_async_redis().get(_version_key(namespace)) or 0)
+        except Exception:
+            version = known[0] if known is not None else 0
+        known = _versions[namespace] = (version, now + settings.CACHE_LOCAL_TTL_SECONDS)
+    return rk("cache", namespace, f"v{known[0]}", *parts)
+
+
+def bump_version(namespace: str) -> int:
+    """Orphan every key built with ``versioned_key(namespace, ...)`` in one INCR."""
+    try:
+        version = int(redis_client.incr(_version_key(namespace)))
+    except Exception:
+        version = namespace_version(namespace) + 1
+    _versions[namespace] = (version, time.time() + settings.CACHE_LOCAL_TTL_SECONDS)
+    _drop_local(prefix=rk("cache", namespace) + ":")
+    publish(INVALIDATION_CHANNEL, {"version": namespace})
+    return version
+
+
+def start_invalidation_listener() -> threading.Thread:
+    """Subscribe to invalidation broadcasts so this process drops local copies."""
+
+    def _listen():
+        while True:
+            pubsub = None
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if not message:
+                        continue
+                    try:
+                        payload = json.loads(message["data"])
+                    except Exception:
+                        continue
+                    if "prefix" in payload:
+                        _drop_local(prefix=payload["prefix"])
+                    elif "key" in payload:
+                        _drop_local(key=payload["key"])
+                    elif "tags" in payload:
+                        _drop_local(tags=payload["tags"])
+                    elif "version" in payload:
+                        _versions.pop(payload["version"], None)
+                        _drop_local(prefix=rk("cache", payload["version"]) + ":")
+            except Exception:
+                # Redis unavailable; local TTL bounds staleness until we reconnect
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+                time.sleep(5)
+
+    thread = threading.Thread(target=_listen, name="cache-invalidation", daemon=True)
+    thread.start()
+    return thread
@@ -1,18 +1,243 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+import random
+import time
+
+from fastapi import Depends
+from sqlalchemy import create_engine, Delete, Insert, Update
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker, DeclarativeBase, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from .config import get_settings
+from .metrics import observe_db_checkout, set_db_pool_usage, increment_db_pool_timeout
 
 settings = get_settings()
 
-engine = create_engine(settings.DATABASE_URL, echo=settings.DEBUG, future=True)
+
+class _PoolMetricsMixin:
+    """Exports checkout latency, usage and timeouts to Prometheus."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except sa_exc.TimeoutError:
+            increment_db_pool_timeout(self.logging_name)
+            raise
+        observe_db_checkout(self.logging_name, time.perf_counter() - start)
+        self._report_usage()
+        return conn
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        self._report_usage()
+
+    def _report_usage(self):
+        try:
+            set_db_pool_usage(self.logging_name, self.checkedout(), self.size() + self._max_overflow)
+        except Exception:
+            pass
+
+
+class InstrumentedQueuePool(_PoolMetricsMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_PoolMetricsMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _pool_kwargs(name: str, poolclass) -> dict:
+    connect_args = {}
+    if settings.DB_STATEMENT_TIMEOUT_MS:
+        # Applies to every statement on connections from this pool
+        connect_args["options"] = f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"
+    return dict(
+        poolclass=poolclass,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        pool_pre_ping=True,
+        pool_logging_name=name,
+        connect_args=connect_args,
+    )
+
+
+def _create_engine(url: str, name: str):
+    if url.startswith("sqlite"):
+        return create_engine(url, echo=settings.DB_ECHO, future=True)
+    return create_engine(url, echo=settings.DB_ECHO, future=True, **_pool_kwargs(name, InstrumentedQueuePool))
+
+
+def _async_url(url: str) -> str:
+    """Same database through an asyncio driver (psycopg 3 serves both)."""
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+
+def _create_async_engine(url: str, name: str):
+    url = _async_url(url)
+    try:
+        if url.startswith("sqlite"):
+            return create_async_engine(url, echo=settings.DB_ECHO)
+        return create_async_engine(url, echo=settings.DB_ECHO, **_pool_kwargs(name, InstrumentedAsyncQueuePool))
+    except ImportError:
+        # e.g. SQLite without aiosqlite; the async routes report it on first use
+        return None
+
+
+engine = _create_engine(settings.DATABASE_URL, "primary")
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
 
+replica_engines = [
+    _create_engine(url.strip(), f"replica{i}")
+    for i, url in enumerate(settings.DATABASE_REPLICA_URLS.split(","))
+    if url.strip()
+]
+
+
+class RoutingSession(Session):
+    """Sends reads to a replica; flushes, DML and SELECT ... FOR UPDATE go to the primary.
+
+    The replica is picked at random on the first read and kept until the
+    session closes, so one request's reads (and a transaction's statements)
+    see a single replica's snapshot rather than several lagging by different
+    amounts.
+    """
+
+    def _primary(self):
+        return engine
+
+    def _replicas(self):
+        return replica_engines
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replicas = self._replicas()
+        if (
+            not replicas
+            or self._flushing
+            or isinstance(clause, (Insert, Update, Delete))
+            or getattr(clause, "_for_update_arg", None) is not None
+        ):
+            return self._primary()
+        if "replica" not in self.info:
+            self.info["replica"] = random.choice(replicas)
+        return self.info["replica"]
+
+    def close(self):
+        super().close()
+        self.info.pop("replica", None)
+
+
+ReadSessionLocal = sessionmaker(
+    bind=engine, class_=RoutingSession, autoflush=False, autocommit=False, expire_on_commit=False
+)
+
+# Asyncio engines for routes that run on the event loop: a request waiting on
+# Postgres holds a connection but no threadpool thread.
+async_engine = _create_async_engine(settings.DATABASE_URL, "primary_async")
+async_replica_engines = [
+    e for e in (
+        _create_async_engine(url.strip(), f"replica{i}_async")
+        for i, url in enumerate(settings.DATABASE_REPLICA_URLS.split(","))
+        if url.strip()
+    )
+    if e is not None
+]
+
+
+class AsyncRoutingSession(RoutingSession):
+    """RoutingSession over the asyncio engines (AsyncSession drives it through greenlets)."""
+
+    def _primary(self):
+        return async_engine.sync_engine
+
+    def _replicas(self):
+        return [e.sync_engine for e in async_replica_engines]
+
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(
+    async_engine, sync_session_class=AsyncRoutingSession, autoflush=False, expire_on_commit=False
+)
+
+
 class Base(DeclarativeBase):
     pass
 
+
+def upsert_insert(db: Session, table):
+    """Dialect insert() for ``table`` that supports ON CONFLICT (Postgres in production, SQLite in tests)."""
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect.insert(table)
+
+def copy_rows(db: Session, table, columns: list[str], rows) -> int:
+    """Bulk-load ``rows`` (tuples in ``columns`` order) into ``table`` inside the session's transaction.
+
+    Postgres gets ``COPY ... FROM STDIN`` over the session's own connection (so
+    it commits or rolls back with the session); other dialects (SQLite in
+    tests) fall back to an executemany INSERT.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    connection = db.connection()
+    if connection.dialect.name == "postgresql":
+        column_list = ", ".join(columns)
+        with connection.connection.driver_connection.cursor() as cursor:
+            with cursor.copy(f"COPY {table.name} ({column_list}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(row)
+    else:
+        db.execute(table.insert(), [dict(zip(columns, row)) for row in rows])
+    return len(rows)
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def get_read_db(db: Session = Depends(get_db)):
+    """Session for read-only routes; served by replicas when DATABASE_REPLICA_URLS is set.
+    Replicas lag the primary, so never use this where a request must read its own writes.
+    The primary session from get_db is lazy and never connects unless it is the one used.
+    """
+    if not replica_engines:
+        yield db
+        return
+    read_db = ReadSessionLocal()
+    try:
+        yield read_db
+    finally:
+        read_db.close()
+
+def read_session() -> Session:
+    """Read-only session outside a request (cache revalidation, reports)."""
+    return ReadSessionLocal() if replica_engines else SessionLocal()
+
+async def get_async_db():
+    """AsyncSession for ``async def`` routes; the asyncio counterpart of get_db."""
+    if async_engine is None:
+        raise RuntimeError(f"No asyncio driver available for {settings.DATABASE_URL.split(':', 1)[0]}")
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db(db: AsyncSession = Depends(get_async_db)):
+    """Asyncio counterpart of get_read_db."""
+    if not async_replica_engines:
+        yield db
+        return
+    async with AsyncReadSessionLocal() as read_db:
+        yield read_db
+
+def async_read_session() -> AsyncSession:
+    """Read-only AsyncSession outside a request (cache revalidation)."""
+    return AsyncReadSessionLocal() if async_replica_engines else AsyncSessionLocal()
@@ -3,7 +3,8 @@ from sqlalchemy.orm import Session
 from jose import jwt, JWTError
 from .config import get_settings
 from .database import get_db
-from .redis_client import rk, cache_get, rate_limit
+from .redis_client import rk, cache_get
+from .rate_limiter import check_async, get_policy
 from .models import User
 
 settings = get_settings()
@@ -44,12 +45,14 @@ def require_internal_service(x_internal_key: str | None = Header(None)):
     return True
 
 def rate_limit_dependency(scope: str, limit: int, window_seconds: int):
-    """Factory to create a per-endpoint rate limiter dependency."""
-    def _rl(request: Request):
-        identifier = f"{scope}:{request.client.host}"
-        allowed, remaining, ttl = rate_limit(identifier, limit, window_seconds)
+    """Factory to create a per-endpoint rate limiter dependency.
+    limit/window_seconds are defaults; RATE_LIMIT_POLICIES can override them per scope.
+    """
+    policy = get_policy(scope, limit, window_seconds)
+
+    async def _rl(request: Request):
+        allowed, remaining, ttl = await check_async(scope, request.client.host, policy)
         if not allowed:
-            raise HTTPException(status_code=429, detail="Rate limit exceeded")
-        # Optional: could add headers here if needed
+            raise HTTPException(status_code=429, detail="Rate limit exceeded", headers={"Retry-After": str(ttl)})
         return {"remaining": remaining, "ttl": ttl}
     return _rl
@@ -2,6 +2,7 @@
 import logging
 from typing import Optional
 from .config import get_settings
+from .templating import render_email
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
@@ -52,42 +53,14 @@ class EmailService:
         
         return True, "Email sent (simulated)"
     
+    def send_template(self, to_email: str, email_type: str, data: dict, locale: Optional[str] = None) -> tuple[bool, str]:
+        """Render ``email_type`` from the shared templates (app/templating.py) and send it."""
+        rendered = render_email(email_type, data, locale)
+        return self.send_email(to_email, rendered.subject, rendered.html)
+
     def send_welcome_email(self, email: str, verification_url: str = None) -> tuple[bool, str]:
         """Send welcome email with verification link to new user."""
-        subject = "Welcome to CouponAli - Verify Your Email"
-        
-        verify_section = ""
-        if verification_url:
-            verify_section = f"""
-            <div style="background-color: #f0f8ff; padding: 20px; margin: 20px 0; border-radius: 5px;">
-                <h2>Verify Your Email</h2>
-                <p>Please click the button below to verify your email address:</p>
-                <a href="{verification_url}" style="display: inline-block; padding: 12px 24px; background-color: #007bff; color: white; text-decoration: none; border-radius: 5px; margin: 10px 0;">Verify Email</a>
-                <p style="color: #666; font-size: 12px;">Or copy and paste this link: {verification_url}</p>
-                <p style="color: #666; font-size: 12px;">This link will expire in 24 hours.</p>
-            </div>
-            """
-        
-        html_content = f"""
-        <html>
-            <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-                <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                    <h1 style="color: #007bff;">Welcome to CouponAli!</h1>
-                    <p>Thank you for joining us. Start saving on gift cards and earning cashback today!</p>
-                    {verify_section}
-                    <h3>What's Next?</h3>
-                    <ul>
-                        <li>Browse thousands of gift cards</li>
-                        <li>Earn cashback on every purchase</li>
-                        <li>Track your orders and wallet</li>
-                        <li>Refer friends and earn rewards</li>
-                    </ul>
-                    <p>Best regards,<br><strong>CouponAli Team</strong></p>
-                </div>
-            </body>
-        </html>
-        """
-        return self.send_email(email, subject, html_content)
+        return self.send_template(email, "welcome", {"verification_url": verification_url})
     
     def send_order_confirmation(
         self,
@@ -97,45 +70,11 @@ class EmailService:
         items: list
     ) -> tuple[bool, str]:
         """Send order confirmation email."""
-        subject = f"Order Confirmation - {order_number}"
-        
-        items_html = ""
-        for item in items:
-            items_html += f"""
-            <tr>
-                <td>{item['product_name']}</td>
-                <td>{item['quantity']}</td>
-                <td>₹{item['unit_price']:.2f}</td>
-                <td>₹{item['subtotal']:.2f}</td>
-            </tr>
-            """
-        
-        html_content = f"""
-        <html>
-            <body>
-                <h1>Order Confirmed!</h1>
-                <p>Your order <strong>{order_number}</strong> has been confirmed.</p>
-                
-                <h2>Order Details</h2>
-                <table border="1" cellpadding="10">
-                    <tr>
-                        <th>Product</th>
-                        <th>Quantity</th>
-                        <th>Unit Price</th>
-                        <th>Subtotal</th>
-                    </tr>
-                    {items_html}
-                </table>
-                
-                <h3>Total: ₹{total_amount:.2f}</h3>
-                
-                <p>You will receive your voucher codes shortly.</p>
-                
-                <p>Best regards,<br>CouponAli Team</p>
-            </body>
-        </html>
-        """
-        return self.send_email(email, subject, html_content)
+        return self.send_template(
+            email,
+            "order_confirmation",
+            {"order_number": order_number, "total_amount": total_amount, "items": items},
+        )
     
     def send_voucher_email(
         self,
@@ -144,34 +83,7 @@ class EmailService:
         vouchers: list
     ) -> tuple[bool, str]:
         """Send email with voucher codes."""
-        subject = f"Your Voucher Codes - {order_number}"
-        
-        vouchers_html = ""
-        for voucher in vouchers:
-            vouchers_html += f"""
-            <div style="margin: 20px 0; padding: 15px; border: 2px solid #4CAF50; border-radius: 5px;">
-                <h3>{voucher['product_name']}</h3>
-                <p><strong>Voucher Code:</strong> <span style="font-size: 20px; color: #4CAF50;">{voucher['code']}</span></p>
-                <p><strong>Value:</strong> ₹{voucher['value']:.2f}</p>
-                {f"<p>{voucher.get('instructions', '')}</p>" if voucher.get('instructions') else ""}
-            </div>
-            """
-        
-        html_content = f"""
-        <html>
-            <body>
-                <h1>Your Voucher Codes Are Ready!</h1>
-                <p>Order: <strong>{order_number}</strong></p>
-                
-                {vouchers_html}
-                
-                <p><strong>Important:</strong> Keep these codes safe and do not share them with anyone.</p>
-                
-                <p>Best regards,<br>CouponAli Team</p>
-            </body>
-        </html>
-        """
-        return self.send_email(email, subject, html_content)
+        return self.send_template(email, "voucher_delivery", {"order_number": order_number, "vouchers": vouchers})
     
     def send_cashback_notification(
         self,
@@ -180,18 +92,7 @@ class EmailService:
         description: str
     ) -> tuple[bool, str]:
         """Send cashback credit notification."""
-        subject = "Cashback Credited to Your Wallet!"
-        html_content = f"""
-        <html>
-            <body>
-                <h1>Cashback Credited!</h1>
-                <p>₹{amount:.2f} has been credited to your CouponAli wallet.</p>
-                <p>{description}</p>
-                <p>Best regards,<br>CouponAli Team</p>
-            </body>
-        </html>
-        """
-        return self.send_email(email, subject, html_content)
+        return self.send_template(email, "cashback_confirmed", {"amount": amount, "description": description})
     
     def send_withdrawal_notification(
         self,
@@ -201,27 +102,15 @@ class EmailService:
         reference: Optional[str] = None
     ) -> tuple[bool, str]:
         """Send withdrawal status notification."""
-        subject = f"Withdrawal {status.title()}"
-        
         if status == "approved":
-            message = f"Your withdrawal request of ₹{amount:.2f} has been approved and processed."
-            if reference:
-                message += f" Reference: {reference}"
-        elif status == "rejected":
-            message = f"Your withdrawal request of ₹{amount:.2f} has been rejected. Please contact support for details."
-        else:
-            message = f"Your withdrawal request of ₹{amount:.2f} status: {status}"
-        
-        html_content = f"""
-        <html>
-            <body>
-                <h1>Withdrawal Update</h1>
-                <p>{message}</p>
-                <p>Best regards,<br>CouponAli Team</p>
-            </body>
-        </html>
-        """
-        return self.send_email(email, subject, html_content)
+            return self.send_template(email, "withdrawal_processed", {"amount": amount, "reference": reference})
+        if status == "rejected":
+            return self.send_template(email, "withdrawal_rejected", {"amount": amount})
+        return self.send_template(
+            email,
+            "generic",
+            {"subject": f"Withdrawal {status.title()}", "message": f"Your withdrawal request of ₹{amount:.2f} status: {status}"},
+        )
 
 
 # Singleton instance
@@ -229,9 +118,9 @@ email_service = EmailService()
 
 
 # Convenience functions
-def send_welcome_email(email: str, name: str) -> tuple[bool, str]:
+def send_welcome_email(email: str, verification_url: str = None) -> tuple[bool, str]:
     """Send welcome email to new user."""
-    return email_service.send_welcome_email(email, name)
+    return email_service.send_welcome_email(email, verification_url)
 
 
 def send_order_confirmation(
@@ -0,0 +1,262 @@
+"""Reliable Redis job queues for the email/SMS worker.
+
+Queue ``email`` (likewise ``sms``) is a handful of keys:
+
+- ``queue:email``: pending jobs. Producers RPUSH here as before.
+- ``queue:email:processing:<worker>``: jobs one worker has claimed. BLMOVE
+  (or ``claim_many``, a batch of LMOVEs in one script) takes the oldest
+  pending jobs into this list atomically, so no job is lost between the pop
+  and the bookkeeping.
+- ``queue:email:workers``: ZSET of worker id -> last heartbeat (epoch seconds).
+- ``queue:email:scheduled``: ZSET of retries -> due time (epoch seconds).
+- ``queue:email:dlq``: jobs out of attempts.
+
+Workers heartbeat while they run. ``reap`` hands the processing list of every
+worker silent for QUEUE_VISIBILITY_TIMEOUT_SECONDS back to the head of the
+queue, which recovers the jobs of workers that died. The heartbeat is per
+worker, not per job, so a job whose handler hangs in a live worker is not
+reclaimed; handlers bound their own calls with timeouts. Jobs are acked,
+retried or dead-lettered only if they are still in the worker's processing
+list, so a job finished after its worker was reaped is not scheduled twice;
+delivery is at least once.
+
+Failed jobs wait QUEUE_RETRY_BACKOFF_SECONDS * 2**(attempts - 1) (capped at
+QUEUE_RETRY_MAX_BACKOFF_SECONDS) in the scheduled set; ``promote_due`` moves
+due ones back to pending in one script, so any number of workers can promote
+concurrently.
+
+``migrate_legacy`` requeues members of the old ``queue:<name>:processing``
+SET, which pre-BLMOVE workers filled and never reclaimed. Legacy workers still
+running hold their in-flight jobs there, so it only runs from the one-off
+scripts/migrate_legacy_queues.py, once they are stopped.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+
+import redis
+
+from .config import get_settings
+from .redis_client import redis_client, rk
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Move a claimed job to its next place only if this worker still holds it
+_SETTLE = """
+if redis.call('LREM', KEYS[1], 1, ARGV[1]) == 0 then
+    return 0
+end
+if ARGV[3] ~= '' then
+    redis.call('ZADD', KEYS[2], ARGV[3], ARGV[2])
+elseif ARGV[2] ~= '' then
+    redis.call('RPUSH', KEYS[2], ARGV[2])
+end
+return 1
+"""
+
+_CLAIM = """
+local jobs = {}
+for i = 1, tonumber(ARGV[1]) do
+    local job = redis.call('LMOVE', KEYS[1], KEYS[2], 'LEFT', 'RIGHT')
+    if not job then
+        break
+    end
+    jobs[i] = job
+end
+return jobs
+"""
+
+_PROMOTE = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, job in ipairs(due) do
+    redis.call('ZREM', KEYS[1], job)
+    redis.call('RPUSH', KEYS[2], job)
+end
+return #due
+"""
+
+PROMOTE_BATCH = 100
+
+# Outcomes for JobQueue.settle_many
+ACK, RETRY, DEAD = "ack", "retry", "dead"
+
+
+def claim_from(queues: list["JobQueue"], limits: list[int]) -> list[list[str]]:
+    """Claim up to ``limits[i]`` jobs from each of ``queues`` (one client) in one round trip."""
+    pipe = queues[0].client.pipeline(transaction=False)
+    for queue, limit in zip(queues, limits):
+        queue.claim_many(limit, pipe=pipe)
+    return [jobs or [] for jobs in pipe.execute()]
+
+
+def blocking_client(block_seconds: float) -> redis.Redis:
+    """A client for workers that ``claim`` with a blocking BLMOVE.
+
+    The shared ``redis_client`` gives up on a reply after half a second and
+    retries: a longer BLMOVE would time out client-side and be reissued, and a
+    job the server moved meanwhile would sit unseen in the (heartbeating)
+    worker's processing list, where the reaper never looks. This client waits
+    out the block and does not retry timeouts.
+    """
+    return redis.Redis.from_url(
+        settings.REDIS_URL,
+        decode_responses=True,
+        socket_timeout=block_seconds + 5,
+        socket_connect_timeout=0.5,
+        health_check_interval=30,
+    )
+
+
+def new_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds before retry number ``attempts`` (1-based)."""
+    delay = settings.QUEUE_RETRY_BACKOFF_SECONDS * 2 ** max(attempts - 1, 0)
+    return min(delay, settings.QUEUE_RETRY_MAX_BACKOFF_SECONDS)
+
+
+class JobQueue:
+    """One named queue as seen by one worker (or by monitoring, without ``worker_id``)."""
+
+    def __init__(self, name: str, client=None, worker_id: str | None = None):
+        self.name = name
+        self.client = client if client is not None else redis_client
+        self.worker_id = worker_id
+        self.key = rk("queue", name)
+        self.dlq_key = rk("queue", name, "dlq")
+        self.scheduled_key = rk("queue", name, "scheduled")
+        self.workers_key = rk("queue", name, "workers")
+        self.legacy_processing_key = rk("queue", name, "processing")
+        self._claim = self.client.register_script(_CLAIM)
+        self._settle = self.client.register_script(_SETTLE)
+        self._promote = self.client.register_script(_PROMOTE)
+
+    def processing_key(self, worker_id: str | None = None) -> str:
+        return rk("queue", self.name, "processing", worker_id or self.worker_id)
+
+    # ---------------- Worker side ----------------
+
+    def heartbeat(self, now: float | None = None) -> None:
+        self.client.zadd(self.workers_key, {self.worker_id: now or time.time()})
+
+    def claim(self, timeout: float) -> str | None:
+        """Block up to ``timeout`` seconds for the oldest pending job; it stays claimed until settled.
+
+        Needs a client whose socket timeout outlasts ``timeout`` (see ``blocking_client``).
+        """
+        return self.client.blmove(self.key, self.processing_key(), timeout, "LEFT", "RIGHT")
+
+    def claim_many(self, limit: int, pipe=None) -> list[str] | None:
+        """Claim up to ``limit`` pending jobs without blocking; queued on ``pipe`` when given."""
+        return self._claim(keys=[self.key, self.processing_key()], args=[limit], client=pipe)
+
+    def ack(self, raw_job: str) -> bool:
+        """Drop a finished job. False if it was reaped meanwhile (and requeued for someone else)."""
+        return self.settle_many([(raw_job, ACK, None)])[0]
+
+    def retry(self, raw_job: str, job: dict, now: float | None = None) -> bool:
+        """Schedule ``job`` (attempts already incremented) after its backoff."""
+        return self.settle_many([(raw_job, RETRY, job)], now)[0]
+
+    def dead_letter(self, raw_job: str, job: dict) -> bool:
+        return self.settle_many([(raw_job, DEAD, job)])[0]
+
+    def settle_many(self, outcomes: list[tuple[str, str, dict | None]], now: float | None = None) -> list[bool]:
+        """Apply (raw_job, ACK | RETRY | DEAD, job) outcomes in one round trip; False where reaped meanwhile."""
+        now = now or time.time()
+        pipe = self.client.pipeline(transaction=False)
+        for raw_job, action, job in outcomes:
+            if action == ACK:
+                dest, payload, score = self.key, "", ""
+            elif action == RETRY:
+                dest, payload = self.scheduled_key, json.dumps(job)
+                score = repr(now + retry_delay(job.get("attempts", 1)))
+            else:
+                dest, payload, score = self.dlq_key, json.dumps(job), ""
+            self._settle(keys=[self.processing_key(), dest], args=[raw_job, payload, score], client=pipe)
+        return [bool(result) for result in pipe.execute()]
+
+    def ack_claimed(self, pipe=None) -> None:
+        """Drop everything this worker holds at once (a batch consumer that settles all it claimed)."""
+        (pipe if pipe is not None else self.client).delete(self.processing_key())
+
+    def requeue_claimed(self) -> int:
+        """Hand everything this worker holds back to the head of the queue, in order."""
+        return self._requeue(self.processing_key())
+
+    def dead_letter_claimed(self) -> int:
+        """Move everything this worker holds to the DLQ as-is (a batch consumer giving up on a batch)."""
+        moved = 0
+        while self.client.lmove(self.processing_key(), self.dlq_key, "LEFT", "RIGHT") is not None:
+            moved += 1
+        return moved
+
+    def release(self) -> int:
+        """Graceful shutdown: requeue whatever this worker still holds and deregister."""
+        moved = self.requeue_claimed()
+        self.client.zrem(self.workers_key, self.worker_id)
+        return moved
+
+    # ---------------- Housekeeping (any worker) ----------------
+
+    def promote_due(self, now: float | None = None) -> int:
+        """Move retries whose backoff has elapsed back to pending."""
+        return int(self._promote(keys=[self.scheduled_key, self.key], args=[repr(now or time.time()), PROMOTE_BATCH]))
+
+    def reap(self, now: float | None = None) -> int:
+        """Requeue jobs held by workers silent for longer than the visibility timeout."""
+        cutoff = (now or time.time()) - settings.QUEUE_VISIBILITY_TIMEOUT_SECONDS
+        moved = 0
+        for worker_id in self.client.zrangebyscore(self.workers_key, "-inf", cutoff):
+            held = self._requeue(self.processing_key(worker_id))
+            self.client.zrem(self.workers_key, worker_id)
+            if held:
+                logger.warning("Requeued %d %s job(s) from silent worker %s", held, self.name, worker_id)
+            moved += held
+        return moved
+
+    def migrate_legacy(self) -> int:
+        """Requeue jobs left in the pre-BLMOVE processing SET, then drop it."""
+        members = self.client.smembers(self.legacy_processing_key)
+        if not members:
+            return 0
+        pipe = self.client.pipeline()
+        pipe.lpush(self.key, *members)
+        pipe.delete(self.legacy_processing_key)
+        pipe.execute()
+        logger.warning("Requeued %d %s job(s) from the legacy processing set", len(members), self.name)
+        return len(members)
+
+    def _requeue(self, processing_key: str) -> int:
+        # Newest first onto the head, so requeued jobs keep their order and run next
+        moved = 0
+        while self.client.lmove(processing_key, self.key, "RIGHT", "LEFT") is not None:
+            moved += 1
+        return moved
+
+    # ---------------- Monitoring ----------------
+
+    def stats(self) -> dict:
+        workers = self.client.zrange(self.workers_key, 0, -1)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.llen(self.key)
+        pipe.scard(self.legacy_processing_key)
+        for worker_id in workers:
+            pipe.llen(self.processing_key(worker_id))
+        pipe.zcard(self.scheduled_key)
+        pipe.llen(self.dlq_key)
+        pending, legacy, *held, scheduled, dead = pipe.execute()
+        return {
+            "pending": pending,
+            "processing": legacy + sum(held),
+            "scheduled": scheduled,
+            "dead_letter": dead,
+        }
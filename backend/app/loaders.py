@@ -0,0 +1,73 @@
+"""Query shaping: per-row counts and lookups without a query per row.
+
+Two N+1 shapes recur in the API: a count per listed row (active offers per
+merchant, items per order) and a lookup per row (the product behind each cart
+line). Counts go into the page query itself as correlated subqueries,
+``count_of(Offer.merchant_id, Merchant.id, Offer.is_active == True)``, which
+Postgres evaluates as one index probe per row of the page. Lookups go through
+a ``Loader``, which batches the keys a request needs into one ``IN`` query and
+memoizes the rows for the rest of the request:
+
+    products = Loader.for_session(db, Product.id, joinedload(Product.merchant))
+    products.load_many(item.product_id for item in items)   # one query
+    product = products.load(item.product_id)                 # cache hit
+"""
+from __future__ import annotations
+
+from typing import Any, Hashable, Iterable
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+
+def count_of(column, key, *criteria):
+    """Correlated ``count(*)`` of rows whose ``column`` equals the outer ``key``, as a select column."""
+    return (
+        select(func.count())
+        .select_from(column.class_)
+        .where(column == key, *criteria)
+        .correlate(key.class_)
+        .scalar_subquery()
+    )
+
+
+class Loader:
+    """Rows of one model by a unique key column, fetched in batches and kept for the request.
+
+    Loaders live in ``Session.info``, so one request (one session) shares them
+    and nothing outlives it.
+    """
+
+    def __init__(self, db: Session, column, *options):
+        self.db = db
+        self.column = column
+        self.options = options
+        self._rows: dict[Hashable, Any] = {}
+
+    @classmethod
+    def for_session(cls, db: Session, column, *options) -> "Loader":
+        loaders = db.info.setdefault("loaders", {})
+        key = (column.class_, column.key)
+        if key not in loaders:
+            loaders[key] = cls(db, column, *options)
+        return loaders[key]
+
+    def load_many(self, keys: Iterable[Hashable]) -> dict[Hashable, Any]:
+        """Rows for ``keys`` (None where missing), querying only keys not seen yet."""
+        keys = [key for key in keys if key is not None]
+        missing = {key for key in keys if key not in self._rows}
+        if missing:
+            query = select(self.column.class_).where(self.column.in_(missing)).options(*self.options)
+            for row in self.db.scalars(query).unique():
+                self._rows[getattr(row, self.column.key)] = row
+            for key in missing:
+                self._rows.setdefault(key, None)
+        return {key: self._rows[key] for key in keys}
+
+    def load(self, key: Hashable) -> Any:
+        if key is None:
+            return None
+        return self.load_many([key])[key]
+
+    def clear(self) -> None:
+        self._rows.clear()
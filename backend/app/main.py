@@ -40,6 +40,8 @@ from .api.v1 import (
     blog,
     blog_uploads,
     homepage,
+    newsletter,
+    push,
 )
 from fastapi.openapi.utils import get_openapi
 from fastapi.staticfiles import StaticFiles
@@ -68,9 +70,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Rate limiting middleware using Redis
-from .redis_client import rate_limit, redis_client
-from fastapi import Request, HTTPException
+# Rate limiting middleware using Redis (asyncio client: must not block the event loop)
+from .redis_async import memory_and_dead_letter_depths, close_async_redis
+from .rate_limiter import check_async, get_policy
+from fastapi import Request
+from fastapi.responses import JSONResponse
 import time, uuid, logging, os
 from .logging_config import log, with_request_id
 from .metrics import observe_request, set_redis_memory, set_dead_letter
@@ -83,9 +87,15 @@ async def rate_limit_middleware(request: Request, call_next):
         return await call_next(request)
     client_ip = request.client.host or "unknown"
     start = time.time()
-    allowed, remaining, ttl = rate_limit(client_ip, limit=100, window_seconds=60)
+    limit = str(get_policy("global").limit)
+    allowed, remaining, ttl = await check_async("global", client_ip)
     if not allowed:
-        raise HTTPException(status_code=429, detail="Too many requests. Slow down.")
+        # HTTPException raised from middleware bypasses the exception handlers and surfaces as a 500
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "Too many requests. Slow down."},
+            headers={"Retry-After": str(ttl), "X-RateLimit-Limit": limit, "X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(ttl)},
+        )
     request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
     logger = with_request_id(log, request_id)
     response = await call_next(request)
@@ -95,7 +105,7 @@ async def rate_limit_middleware(request: Request, call_next):
     except Exception:
         pass
     response.headers["X-Request-ID"] = request_id
-    response.headers["X-RateLimit-Limit"] = "100"
+    response.headers["X-RateLimit-Limit"] = limit
     response.headers["X-RateLimit-Remaining"] = str(remaining)
     response.headers["X-RateLimit-Reset"] = str(ttl)
     return response
@@ -118,13 +128,9 @@ try:
     async def metrics_refresher():
         while True:
             try:
-                info = redis_client.info()
-                used = info.get("used_memory", 0)
-                set_redis_memory(int(used))
-                # Dead letter queues
-                for q in ["email", "sms", "cashback"]:
-                    dlq_key = f"queue:{q}:dlq"
-                    depth = redis_client.llen(dlq_key)
+                used, depths = await memory_and_dead_letter_depths(["email", "sms", "cashback"])
+                set_redis_memory(used)
+                for q, depth in depths.items():
                     set_dead_letter(q, depth)
             except Exception:
                 pass
@@ -132,26 +138,54 @@ try:
     @app.on_event("startup")
     async def start_metrics_refresher():
         asyncio.create_task(metrics_refresher())
+
+    @app.on_event("shutdown")
+    async def close_redis_pool():
+        await close_async_redis()
 except Exception:
     pass
 
+# Drop in-process cache entries when another worker invalidates them
+from .cache import start_invalidation_listener
+
+@app.on_event("startup")
+async def start_cache_invalidation_listener():
+    start_invalidation_listener()
+
+# Compile email/SMS templates before the first send needs them
+from . import templating  # noqa: E402
+
+@app.on_event("startup")
+async def precompile_templates():
+    templating.precompile()
+
+# Publishes cashback rule edits so workers recompile their rule index
+from .services import cashback_rules  # noqa: E402,F401
+# Keeps merchants.active_offers_count in step with offer writes
+from .services import merchant_counters  # noqa: E402,F401
+
 # Periodic affiliate sync scheduler (simple loop). Interval configurable via AFFILIATE_SYNC_INTERVAL_MINUTES.
 try:
     from .tasks.affiliate_sync import sync_affiliate_transactions
     from .database import SessionLocal
     AFFILIATE_INTERVAL_MINUTES = float(os.getenv("AFFILIATE_SYNC_INTERVAL_MINUTES", "1440"))  # default daily
 
+    def _run_affiliate_sync():
+        session = SessionLocal()
+        try:
+            return sync_affiliate_transactions(session)
+        finally:
+            session.close()
+
     async def affiliate_sync_scheduler():
         while True:
             start_ts = time.time()
-            session = SessionLocal()
             try:
-                result = sync_affiliate_transactions(session)
+                # Blocking DB work and its own event loop: keep it off the server loop
+                result = await asyncio.to_thread(_run_affiliate_sync)
                 log.info(f"Affiliate periodic sync imported={result['imported']} updated={result['updated']} total={result['total']}")
             except Exception as e:
                 log.error(f"Affiliate periodic sync failed: {e}")
-            finally:
-                session.close()
             # Sleep remaining interval (convert minutes to seconds)
             elapsed = time.time() - start_ts
             sleep_for = max(5.0, AFFILIATE_INTERVAL_MINUTES * 60 - elapsed)
@@ -218,6 +252,8 @@ app.include_router(realtime.router, prefix="/api/v1")
 app.include_router(blog.router, prefix="/api/v1")
 app.include_router(blog_uploads.router, prefix="/api/v1")
 app.include_router(homepage.router, prefix="/api/v1")
+app.include_router(newsletter.router, prefix="/api/v1")
+app.include_router(push.router, prefix="/api/v1")
 
 
 GROUP_ORDER = [
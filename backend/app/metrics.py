@@ -52,6 +52,103 @@ affiliate_transactions_fetched_total = Counter(
     "Total raw affiliate transactions fetched before dedupe"
 )
 
+# Read-through cache metrics
+cache_requests_total = Counter(
+    "app_cache_requests_total",
+    "Cache lookups by namespace and outcome (local_hit, redis_hit, stale_hit, miss)",
+    ["namespace", "result"]
+)
+
+cache_lookup_duration_seconds = Histogram(
+    "app_cache_lookup_duration_seconds",
+    "Time spent resolving a cached value, including the loader on a miss",
+    ["namespace", "result"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+)
+
+cache_local_entries = Gauge(
+    "app_cache_local_entries",
+    "Entries held in the in-process cache tier"
+)
+
+rate_limit_decisions_total = Counter(
+    "app_rate_limit_decisions_total",
+    "Rate limit checks by scope and outcome (allowed, denied, local_denied)",
+    ["scope", "result"]
+)
+
+# Database connection pool metrics
+db_pool_checkout_seconds = Histogram(
+    "app_db_pool_checkout_seconds",
+    "Time waiting for a pooled database connection",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)
+)
+
+db_pool_checked_out = Gauge(
+    "app_db_pool_checked_out",
+    "Connections currently checked out of the pool",
+    ["pool"]
+)
+
+db_pool_saturation_ratio = Gauge(
+    "app_db_pool_saturation_ratio",
+    "Checked-out connections over pool_size + max_overflow",
+    ["pool"]
+)
+
+db_pool_timeouts_total = Counter(
+    "app_db_pool_timeouts_total",
+    "Checkouts that gave up after pool_timeout",
+    ["pool"]
+)
+
+# Web push broadcast metrics (workers/push_worker.py)
+push_deliveries_total = Counter(
+    "app_push_deliveries_total",
+    "Web push sends by outcome (sent, expired, failed)",
+    ["result"]
+)
+
+push_broadcast_duration_seconds = Histogram(
+    "app_push_broadcast_duration_seconds",
+    "Wall time of one broadcast job",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800)
+)
+
+push_broadcast_throughput = Gauge(
+    "app_push_broadcast_throughput_per_second",
+    "Sends per second over the last finished broadcast"
+)
+
+push_subscriptions_pruned_total = Counter(
+    "app_push_subscriptions_pruned_total",
+    "Subscriptions deactivated after a 404/410 from their push service"
+)
+
+# Click ingestion metrics (workers/click_ingest_worker.py)
+clicks_ingested_total = Counter(
+    "app_clicks_ingested_total",
+    "Queued clicks by outcome (stored, duplicate, bot, invalid, unknown_offer)",
+    ["result"]
+)
+
+click_ingest_lag_seconds = Gauge(
+    "app_click_ingest_lag_seconds",
+    "Age of the oldest click in the last stored batch"
+)
+
+click_ingest_batch_seconds = Histogram(
+    "app_click_ingest_batch_seconds",
+    "Time to dedupe, COPY and count one batch of clicks",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+
+click_queue_depth = Gauge(
+    "app_click_queue_depth",
+    "Clicks waiting in queue:clicks after the last batch"
+)
+
 # Helper update functions
 
 def observe_request(method: str, path: str, status: int, duration: float):
@@ -85,3 +182,51 @@ def observe_affiliate_sync(imported: int, updated: int, total_fetched: int):
         affiliate_transactions_updated_total.inc(updated)
     if total_fetched:
         affiliate_transactions_fetched_total.inc(total_fetched)
+
+
+def observe_cache(namespace: str, result: str, duration: float, local_entries: int):
+    """Record one read-through cache lookup."""
+    cache_requests_total.labels(namespace=namespace, result=result).inc()
+    cache_lookup_duration_seconds.labels(namespace=namespace, result=result).observe(duration)
+    cache_local_entries.set(local_entries)
+
+
+def observe_rate_limit(scope: str, result: str):
+    rate_limit_decisions_total.labels(scope=scope, result=result).inc()
+
+
+def observe_db_checkout(pool: str, duration: float):
+    db_pool_checkout_seconds.labels(pool=pool).observe(duration)
+
+
+def set_db_pool_usage(pool: str, checked_out: int, capacity: int):
+    db_pool_checked_out.labels(pool=pool).set(checked_out)
+    db_pool_saturation_ratio.labels(pool=pool).set(checked_out / capacity if capacity else 0)
+
+
+def increment_db_pool_timeout(pool: str):
+    db_pool_timeouts_total.labels(pool=pool).inc()
+
+
+def observe_push_chunk(outcomes: dict[str, int]):
+    """Record one chunk of broadcast sends, e.g. {"sent": 1990, "expired": 8, "failed": 2}."""
+    for result, count in outcomes.items():
+        if count:
+            push_deliveries_total.labels(result=result).inc(count)
+    if outcomes.get("expired"):
+        push_subscriptions_pruned_total.inc(outcomes["expired"])
+
+
+def observe_push_broadcast(sends: int, duration: float):
+    push_broadcast_duration_seconds.observe(duration)
+    push_broadcast_throughput.set(sends / duration if duration > 0 else 0)
+
+
+def observe_click_batch(outcomes: dict[str, int], lag: float, duration: float, depth: int):
+    """Record one ingested batch of clicks."""
+    for result, count in outcomes.items():
+        if count:
+            clicks_ingested_total.labels(result=result).inc(count)
+    click_ingest_lag_seconds.set(lag)
+    click_ingest_batch_seconds.observe(duration)
+    click_queue_depth.set(depth)
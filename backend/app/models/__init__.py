@@ -8,6 +8,8 @@ from .offer_click import OfferClick
 from .product_variant import ProductVariant
 from .order_item import OrderItem
 from .wallet_balance import WalletBalance
+from .wallet_checkpoint import WalletCheckpoint
+from .wallet_aggregate import WalletAggregate
 from .category import Category
 from .access_control import Role, Permission, RolePermission, Department, UserRole, UserDepartment
 from .gift_card import GiftCard
@@ -33,3 +35,4 @@ from .affiliate_transaction import AffiliateTransaction
 from .affiliate_merchant_map import AffiliateMerchantMap
 from .cashback_rule import CashbackRule
 from .blog_post import BlogPost
+from . import search_index  # noqa: F401  (search_vector DDL hooks)
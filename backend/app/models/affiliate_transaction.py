@@ -1,10 +1,14 @@
-from sqlalchemy import ForeignKey, DateTime, String, Numeric
+from sqlalchemy import ForeignKey, DateTime, String, Numeric, Index
 from sqlalchemy.orm import Mapped, mapped_column
 from datetime import datetime
 from ..database import Base
 
 class AffiliateTransaction(Base):
     __tablename__ = "affiliate_transactions"
+    __table_args__ = (
+        # Conflict target for the import upsert (app/tasks/affiliate_sync.py)
+        Index("uq_affiliate_transactions_network_external_id", "network", "external_transaction_id", unique=True),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int | None] = mapped_column(ForeignKey("users.id"), index=True)
@@ -1,14 +1,20 @@
-from sqlalchemy import ForeignKey, DateTime, String, Numeric
+from sqlalchemy import ForeignKey, DateTime, String, Numeric, Index
 from sqlalchemy.orm import Mapped, mapped_column
 from datetime import datetime
 from ..database import Base
 
 class CashbackEvent(Base):
     __tablename__ = "cashback_events"
+    __table_args__ = (
+        # One event per affiliate transaction (app/tasks/cashback.py)
+        Index("uq_cashback_events_affiliate_transaction_id", "affiliate_transaction_id", unique=True),
+        Index("ix_cashback_events_status_created_at", "status", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
     order_id: Mapped[int | None] = mapped_column(ForeignKey("orders.id"))
+    affiliate_transaction_id: Mapped[int | None] = mapped_column(ForeignKey("affiliate_transactions.id"))
     amount: Mapped[float] = mapped_column(Numeric(10,2))
     status: Mapped[str] = mapped_column(String(30), default="pending")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
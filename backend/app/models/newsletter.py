@@ -45,6 +45,11 @@ class NewsletterCampaign(Base):
     bounced_count: Mapped[int] = mapped_column(Integer, default=0)
     unsubscribed_count: Mapped[int] = mapped_column(Integer, default=0)
 
+    # Fan-out progress (app/tasks/newsletter_delivery.py)
+    last_subscriber_id: Mapped[int] = mapped_column(Integer, default=0, server_default="0")  # enqueued up to here
+    started_at: Mapped[datetime | None] = mapped_column(DateTime)
+    checkpoint_at: Mapped[datetime | None] = mapped_column(DateTime)
+
 
 class NewsletterDelivery(Base):
     __tablename__ = "newsletter_deliveries"
@@ -52,7 +57,7 @@ class NewsletterDelivery(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     campaign_id: Mapped[int] = mapped_column(ForeignKey("newsletter_campaigns.id"), index=True)
     subscriber_id: Mapped[int] = mapped_column(ForeignKey("newsletter_subscribers.id"), index=True)
-    status: Mapped[str] = mapped_column(String(50))  # sent, opened, clicked, bounced, failed
+    status: Mapped[str] = mapped_column(String(50))  # queued, sent, opened, clicked, bounced, failed
     sent_at: Mapped[datetime | None] = mapped_column(DateTime)
     opened_at: Mapped[datetime | None] = mapped_column(DateTime)
     clicked_at: Mapped[datetime | None] = mapped_column(DateTime)
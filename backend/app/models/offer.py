@@ -1,17 +1,32 @@
-from sqlalchemy import String, Boolean, DateTime, ForeignKey, Integer
+from sqlalchemy import String, Boolean, DateTime, ForeignKey, Index, Integer, Uuid, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime
+from uuid import uuid4
 from ..database import Base
 
 class Offer(Base):
     __tablename__ = "offers"
+    __table_args__ = (
+        # Keyset pagination of active offers (see app.pagination)
+        Index(
+            "ix_offers_active_priority_created_id", "priority", "created_at", "id",
+            postgresql_where=text("is_active"),
+        ),
+        Index(
+            "ix_offers_merchant_priority_created_id", "merchant_id", "priority", "created_at", "id",
+            postgresql_where=text("is_active"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
-    merchant_id: Mapped[int] = mapped_column(ForeignKey("merchants.id"), index=True)
+    # Public id in redirect links (/out/<merchant>/<uuid>) and click payloads
+    uuid: Mapped[str] = mapped_column(Uuid(as_uuid=False), unique=True, index=True, default=lambda: str(uuid4()))
+    # active_history: the merchant counters need the previous value on change
+    merchant_id: Mapped[int] = mapped_column(ForeignKey("merchants.id"), index=True, active_history=True)
     title: Mapped[str] = mapped_column(String(255), index=True)
     code: Mapped[str | None] = mapped_column(String(100), index=True)
     image_url: Mapped[str | None] = mapped_column(String(500))
-    is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    is_active: Mapped[bool] = mapped_column(Boolean, default=True, active_history=True)
     priority: Mapped[int] = mapped_column(Integer, default=0)
     starts_at: Mapped[datetime | None] = mapped_column(DateTime)
     ends_at: Mapped[datetime | None] = mapped_column(DateTime)
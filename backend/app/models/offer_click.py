@@ -1,12 +1,19 @@
-from sqlalchemy import DateTime, ForeignKey, Integer
+from sqlalchemy import DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy.dialects.postgresql import INET
 from sqlalchemy.orm import Mapped, mapped_column
 from datetime import datetime
 from ..database import Base
 
 class OfferClick(Base):
+    # Range-partitioned by month on created_at in Postgres, with primary key
+    # (id, created_at) there (migration 015, app/tasks/partitions.py)
     __tablename__ = "offer_clicks"
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     offer_id: Mapped[int] = mapped_column(ForeignKey("offers.id"), index=True)
     user_id: Mapped[int | None] = mapped_column(ForeignKey("users.id"))
+    ip_address: Mapped[str | None] = mapped_column(String(45).with_variant(INET(), "postgresql"))
+    user_agent: Mapped[str | None] = mapped_column(Text)
+    referrer_url: Mapped[str | None] = mapped_column(Text)
+    device_type: Mapped[str | None] = mapped_column(String(20))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
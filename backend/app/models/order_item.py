@@ -4,6 +4,8 @@ from datetime import datetime
 from ..database import Base
 
 class OrderItem(Base):
+    # Range-partitioned by month on created_at in Postgres, with primary key
+    # (id, created_at) there (migration 015, app/tasks/partitions.py)
     __tablename__ = "order_items"
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
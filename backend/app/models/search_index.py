@@ -0,0 +1,39 @@
+"""Search columns and indexes that live outside the ORM mappings.
+
+Migration 007_search_index creates these on migrated databases; the hooks below
+give tables built with ``Base.metadata.create_all`` (dev startup, tests) the
+same ``search_vector`` columns and GIN indexes. PostgreSQL only.
+"""
+from sqlalchemy import DDL, event
+
+from .merchant import Merchant
+from .offer import Offer
+from .product import Product
+
+# model -> (tsvector expression, trigram column); keep in step with 007_search_index
+SEARCH_COLUMNS = {
+    Merchant: (
+        "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+        "name",
+    ),
+    Offer: (
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(code, '')), 'C')",
+        "title",
+    ),
+    Product: (
+        "setweight(to_tsvector('english', coalesce(name, '')), 'A')",
+        "name",
+    ),
+}
+
+for model, (expression, trigram_column) in SEARCH_COLUMNS.items():
+    table = model.__tablename__
+    for statement in (
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({expression}) STORED",
+        f"CREATE INDEX IF NOT EXISTS ix_{table}_search_vector ON {table} USING gin (search_vector)",
+        f"CREATE INDEX IF NOT EXISTS ix_{table}_{trigram_column}_trgm ON {table} USING gin ({trigram_column} gin_trgm_ops)",
+    ):
+        event.listen(model.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
@@ -1,10 +1,14 @@
-from sqlalchemy import String, DateTime, ForeignKey, Integer, Numeric, Text
+from sqlalchemy import String, DateTime, ForeignKey, Integer, Numeric, Text, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime
 from ..database import Base
 
 class WalletTransaction(Base):
     __tablename__ = "wallet_transactions"
+    __table_args__ = (
+        # Keyset pagination of a user's history (app/api/v1/wallet.py)
+        Index("ix_wallet_transactions_user_created_id", "user_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
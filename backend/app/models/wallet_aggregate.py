@@ -0,0 +1,14 @@
+from sqlalchemy import Numeric, ForeignKey, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime
+from ..database import Base
+
+class WalletAggregate(Base):
+    """Running wallet totals per user, maintained by app/services/wallet_ledger.py."""
+    __tablename__ = "wallet_aggregates"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    lifetime_credit: Mapped[float] = mapped_column(Numeric(14,2), default=0)
+    lifetime_debit: Mapped[float] = mapped_column(Numeric(14,2), default=0)
+    total_withdrawn: Mapped[float] = mapped_column(Numeric(14,2), default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
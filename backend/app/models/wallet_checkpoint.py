@@ -0,0 +1,13 @@
+from sqlalchemy import Numeric, Integer, ForeignKey, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime
+from ..database import Base
+
+class WalletCheckpoint(Base):
+    """Reconciled ledger total per user up to ``last_transaction_id`` (app/tasks/wallet_reconciliation.py)."""
+    __tablename__ = "wallet_checkpoints"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    last_transaction_id: Mapped[int] = mapped_column(Integer, default=0, index=True)
+    total: Mapped[float] = mapped_column(Numeric(14,2), default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
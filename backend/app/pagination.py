@@ -0,0 +1,152 @@
+"""Keyset (cursor) pagination.
+
+A page is fetched with an index-backed seek, ``WHERE (a, b, id) < (:a, :b, :id)
+ORDER BY a DESC, b DESC, id DESC LIMIT n + 1``, so page 1000 costs the same as
+page 1 and nothing is counted. The client gets an opaque ``next_cursor``: the
+last row's sort key, JSON-encoded and signed with SECRET_KEY under the
+endpoint's scope, so it cannot be forged or replayed against another listing.
+
+    keyset = Keyset("wallet_transactions", WalletTransaction.created_at, WalletTransaction.id)
+    query = keyset.apply(query, cursor, limit)
+    rows, next_cursor = keyset.page(db.scalars(query).all(), limit)
+
+The last column must be unique (normally the primary key) so the order is
+total. All columns sort in one direction, which lets Postgres compare the row
+value against a composite index. Sort columns must not be NULL: a row value
+holding NULL never compares true, so such rows would fall out of every page.
+
+Exact totals need a COUNT over the whole filtered set, so listings only run it
+when asked (``include_total=true``) or, by default, for clients still paging by
+number, whose pagers need ``total_pages``.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from math import ceil
+from typing import Any, Callable, Sequence
+
+from fastapi import HTTPException, status
+from sqlalchemy import Select, tuple_
+
+from .config import get_settings
+
+settings = get_settings()
+
+SIGNATURE_BYTES = 12
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(scope: str, payload: bytes) -> bytes:
+    key = f"{settings.SECRET_KEY}:cursor:{scope}".encode()
+    return hmac.new(key, payload, hashlib.sha256).digest()[:SIGNATURE_BYTES]
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"n": str(value)}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+        if "n" in value:
+            return Decimal(value["n"])
+    return value
+
+
+def encode_cursor(scope: str, values: Sequence[Any]) -> str:
+    payload = json.dumps([_encode_value(v) for v in values], separators=(",", ":")).encode()
+    return _b64encode(_sign(scope, payload) + payload)
+
+
+def decode_cursor(scope: str, cursor: str, size: int) -> list[Any]:
+    """Sort key carried by ``cursor``; 400 if it is malformed, tampered with or from another listing."""
+    try:
+        raw = _b64decode(cursor)
+        signature, payload = raw[:SIGNATURE_BYTES], raw[SIGNATURE_BYTES:]
+        if not hmac.compare_digest(signature, _sign(scope, payload)):
+            raise ValueError("bad signature")
+        values = [_decode_value(v) for v in json.loads(payload)]
+        if len(values) != size:
+            raise ValueError("wrong arity")
+        return values
+    except (ValueError, TypeError, json.JSONDecodeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor")
+
+
+class Keyset:
+    """Sort key of one listing: its columns, direction and cursor scope."""
+
+    def __init__(self, scope: str, *columns, descending: bool = True):
+        self.scope = scope
+        self.columns = columns
+        self.descending = descending
+        self.keys = [column.key for column in columns]
+
+    def apply(self, query: Select, cursor: str | None, limit: int) -> Select:
+        """Order ``query`` by the key, seek past ``cursor`` and fetch one extra row to detect a next page."""
+        if cursor:
+            key = tuple_(*self.columns)
+            values = tuple_(*decode_cursor(self.scope, cursor, len(self.columns)))
+            query = query.where(key < values if self.descending else key > values)
+        order = [column.desc() if self.descending else column.asc() for column in self.columns]
+        return query.order_by(*order).limit(limit + 1)
+
+    def cursor_for(self, row: Any) -> str:
+        return encode_cursor(self.scope, [getattr(row, key) for key in self.keys])
+
+    def page(
+        self, rows: Sequence[Any], limit: int, entity: Callable[[Any], Any] | None = None
+    ) -> tuple[list[Any], str | None]:
+        """Trim the look-ahead row; returns (rows, next_cursor or None on the last page).
+
+        ``entity`` picks the object carrying the sort columns out of a result
+        row, for queries selecting more than one entity.
+        """
+        rows = list(rows)
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        last = entity(rows[-1]) if entity else rows[-1]
+        return rows, self.cursor_for(last)
+
+
+def wants_total(include_total: bool | None, cursor: str | None) -> bool:
+    """Whether to count: as requested, else only for requests paging by number."""
+    if include_total is not None:
+        return include_total
+    return cursor is None
+
+
+def page_info(page: int, limit: int, next_cursor: str | None, total: int | None = None) -> dict:
+    """The ``pagination`` block of a listing response."""
+    info = {
+        "current_page": page,
+        "per_page": limit,
+        "has_more": next_cursor is not None,
+        "next_cursor": next_cursor,
+    }
+    if total is not None:
+        info["total_items"] = total
+        info["total_pages"] = ceil(total / limit) if total else 0
+    return info
@@ -1,10 +1,96 @@
-from pywebpush import webpush, WebPushException
+"""Web push and FCM notifications.
+
+``send_web_push`` sends one notification synchronously. Broadcasts go through
+``WebPushSender``: payloads are encrypted per subscription and POSTed to the
+push services over one pooled async client, with at most PUSH_CONCURRENCY
+requests in flight. Either way the VAPID JWT is signed once per push service
+origin and reused until shortly before it expires, instead of once per
+message.
+"""
+import asyncio
 import json
+import logging
+import time
 from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import httpx
+from py_vapid import Vapid02
+from pywebpush import webpush, WebPusher, WebPushException
+
 from .config import get_settings
 
+logger = logging.getLogger(__name__)
 settings = get_settings()
 
+VAPID_TOKEN_LIFETIME_SECONDS = 12 * 60 * 60
+VAPID_RESIGN_MARGIN_SECONDS = 60 * 60  # re-sign an hour before the token expires
+EXPIRED_STATUSES = (404, 410)  # the subscription is gone for good
+
+# Outcomes of WebPushSender.send
+SENT, EXPIRED, FAILED = "sent", "expired", "failed"
+
+_vapid_key: Vapid02 | None = None
+_vapid_headers: dict[str, tuple[float, dict]] = {}
+
+
+def _origin(endpoint: str) -> str:
+    url = urlparse(endpoint)
+    return f"{url.scheme}://{url.netloc}"
+
+
+def vapid_headers(endpoint: str, now: float | None = None) -> dict:
+    """VAPID Authorization header for ``endpoint``'s push service, signed once per origin."""
+    global _vapid_key
+    now = now or time.time()
+    origin = _origin(endpoint)
+    cached = _vapid_headers.get(origin)
+    if cached and cached[0] - VAPID_RESIGN_MARGIN_SECONDS > now:
+        return cached[1]
+    if _vapid_key is None:
+        _vapid_key = Vapid02.from_string(private_key=settings.VAPID_PRIVATE_KEY)
+    expires = int(now) + VAPID_TOKEN_LIFETIME_SECONDS
+    headers = _vapid_key.sign({"aud": origin, "exp": expires, "sub": f"mailto:{settings.VAPID_CLAIM_EMAIL}"})
+    _vapid_headers[origin] = (expires, headers)
+    return headers
+
+
+def _subscription(subscription_info: Dict[str, str]) -> dict:
+    return {
+        "endpoint": subscription_info["endpoint"],
+        "keys": {
+            "p256dh": subscription_info["p256dh_key"],
+            "auth": subscription_info["auth_key"]
+        }
+    }
+
+
+def notification_payload(
+    title: str,
+    body: str,
+    icon: Optional[str] = None,
+    image: Optional[str] = None,
+    url: Optional[str] = None,
+    data: Optional[Dict] = None
+) -> dict:
+    payload = {
+        "title": title,
+        "body": body,
+        "icon": icon or "/logo.png",
+        "badge": "/badge.png",
+    }
+
+    if image:
+        payload["image"] = image
+
+    if url:
+        payload["url"] = url
+
+    if data:
+        payload["data"] = data
+
+    return payload
+
 
 def send_web_push(
     subscription_info: Dict[str, str],
@@ -18,52 +104,89 @@ def send_web_push(
     """Send a web push notification"""
 
     try:
-        payload = {
-            "title": title,
-            "body": body,
-            "icon": icon or "/logo.png",
-            "badge": "/badge.png",
-        }
-
-        if image:
-            payload["image"] = image
-
-        if url:
-            payload["url"] = url
-
-        if data:
-            payload["data"] = data
-
-        subscription = {
-            "endpoint": subscription_info["endpoint"],
-            "keys": {
-                "p256dh": subscription_info["p256dh_key"],
-                "auth": subscription_info["auth_key"]
-            }
-        }
+        payload = notification_payload(title, body, icon, image, url, data)
 
         webpush(
-            subscription_info=subscription,
+            subscription_info=_subscription(subscription_info),
             data=json.dumps(payload),
-            vapid_private_key=settings.VAPID_PRIVATE_KEY,
-            vapid_claims={
-                "sub": f"mailto:{settings.VAPID_CLAIM_EMAIL}"
-            }
+            headers=vapid_headers(subscription_info["endpoint"]),
+            ttl=settings.PUSH_TTL_SECONDS
         )
 
         return True
 
     except WebPushException as e:
-        print(f"Web push failed: {e}")
+        logger.warning(f"Web push failed: {e}")
         if e.response and e.response.status_code in [404, 410]:
             # Subscription expired or invalid
             return False
         return False
     except Exception as e:
-        print(f"Push notification error: {e}")
+        logger.exception(f"Push notification error: {e}")
         return False
 
 
+class WebPushSender:
+    """Concurrent web push delivery over one pooled async HTTP client."""
+
+    def __init__(
+        self,
+        concurrency: int | None = None,
+        timeout: float | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.concurrency = concurrency or settings.PUSH_CONCURRENCY
+        self.timeout = timeout or settings.PUSH_REQUEST_TIMEOUT_SECONDS
+        self.transport = transport
+        self._http: httpx.AsyncClient | None = None
+        self._slots: asyncio.Semaphore | None = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None:
+            limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+            self._http = httpx.AsyncClient(timeout=self.timeout, limits=limits, transport=self.transport)
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def send(self, subscription_info: Dict[str, str], data: bytes) -> str:
+        """Deliver ``data`` to one subscription: SENT, EXPIRED (404/410) or FAILED."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        endpoint = subscription_info["endpoint"]
+        try:
+            encrypted = WebPusher(_subscription(subscription_info)).encode(data, "aes128gcm")["body"]
+            headers = {
+                **vapid_headers(endpoint),
+                "TTL": str(settings.PUSH_TTL_SECONDS),
+                "Content-Encoding": "aes128gcm",
+                "Content-Type": "application/octet-stream",
+            }
+        except Exception:  # malformed subscription keys
+            return FAILED
+        async with self._slots:
+            try:
+                response = await self.http.post(endpoint, content=encrypted, headers=headers)
+            except httpx.HTTPError:
+                return FAILED
+        if response.status_code <= 202:
+            return SENT
+        return EXPIRED if response.status_code in EXPIRED_STATUSES else FAILED
+
+    async def send_many(self, subscriptions: List[Dict], payload: dict) -> dict[str, list]:
+        """Deliver ``payload`` to every subscription (dicts with "id"); ids grouped by outcome."""
+        data = json.dumps(payload).encode()
+        outcomes = await asyncio.gather(*(self.send(subscription, data) for subscription in subscriptions))
+        grouped: dict[str, list] = {SENT: [], EXPIRED: [], FAILED: []}
+        for subscription, outcome in zip(subscriptions, outcomes):
+            grouped[outcome].append(subscription["id"])
+        return grouped
+
+
 async def send_fcm_notification(
     fcm_token: str,
     title: str,
@@ -99,7 +222,7 @@ async def send_fcm_notification(
             return response.status_code == 200
 
     except Exception as e:
-        print(f"FCM notification error: {e}")
+        logger.exception(f"FCM notification error: {e}")
         return False
 
 
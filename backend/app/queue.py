@@ -2,13 +2,14 @@
 from typing import Any
 from datetime import datetime, timezone
 import json
+import uuid
+from .job_queue import JobQueue
 from .redis_client import redis_client, rk, cache_get, cache_set
 
 # Queue key helpers
 EMAIL_QUEUE = rk("queue", "email")
 SMS_QUEUE = rk("queue", "sms")
-EMAIL_PROCESSING = rk("queue", "email", "processing")
-SMS_PROCESSING = rk("queue", "sms", "processing")
+PUSH_QUEUE = rk("queue", "push")
 EMAIL_DLQ = rk("queue", "email", "dlq")
 SMS_DLQ = rk("queue", "sms", "dlq")
 
@@ -69,8 +70,9 @@ def remove_item(user_id: int, variant_id: int):
 
 # ---------------- Job Queue Helpers ----------------
 
-def push_email_job(email_type: str, to_email: str, data: dict):
+def push_email_job(email_type: str, to_email: str, data: dict, job_id: str | None = None) -> str:
     job = {
+        "id": job_id or f"email_{uuid.uuid4().hex}",
         "type": email_type,
         "to": to_email,
         "data": data,
@@ -78,10 +80,47 @@ def push_email_job(email_type: str, to_email: str, data: dict):
         "attempts": 0,
     }
     redis_client.rpush(EMAIL_QUEUE, json.dumps(job))
+    return job["id"]
+
+
+def email_batch_job(
+    email_type: str,
+    recipients: list[dict],
+    data: dict,
+    job_id: str | None = None,
+    subject: str | None = None,
+    html: str | None = None,
+) -> dict:
+    """One job for many recipients of the same email: ``recipients`` are {"to", "substitutions"}.
+
+    With ``subject`` and ``html`` (an already rendered body) the worker sends those as-is
+    instead of rendering ``email_type`` from ``data``.
+    """
+    job = {
+        "id": job_id or f"email_{uuid.uuid4().hex}",
+        "type": email_type,
+        "recipients": recipients,
+        "data": data,
+        "enqueued_at": _now_iso(),
+        "attempts": 0,
+    }
+    if html is not None:
+        job.update(subject=subject, html=html)
+    return job
+
+
+def push_email_jobs(jobs: list[dict], pipe=None) -> None:
+    """RPUSH prepared jobs in one round trip; queued on ``pipe`` when given."""
+    target = pipe if pipe is not None else redis_client.pipeline(transaction=False)
+    for job in jobs:
+        target.rpush(EMAIL_QUEUE, json.dumps(job))
+    if pipe is None:
+        target.execute()
 
 
-def push_sms_job(sms_type: str, mobile: str, data: dict):
+def push_sms_job(sms_type: str, mobile: str, data: dict, job_id: str | None = None) -> str:
     job = {
+        "id": job_id or f"sms_{uuid.uuid4().hex}",
         "type": sms_type,
         "mobile": mobile,
         "data": data,
@@ -89,21 +128,24 @@ def push_sms_job(sms_type: str, mobile: str, data: dict):
         "attempts": 0,
     }
     redis_client.rpush(SMS_QUEUE, json.dumps(job))
+    return job["id"]
 
 
-def get_queue_stats() -> dict:
-    return {
-        "email": {
-            "pending": redis_client.llen(EMAIL_QUEUE),
-            "processing": redis_client.scard(EMAIL_PROCESSING),
-            "dlq": redis_client.llen(EMAIL_DLQ),
-        },
-        "sms": {
-            "pending": redis_client.llen(SMS_QUEUE),
-            "processing": redis_client.scard(SMS_PROCESSING),
-            "dlq": redis_client.llen(SMS_DLQ),
-        },
+def push_broadcast_job(notification: dict, user_ids: list[int] | None = None, job_id: str | None = None) -> str:
+    """Queue a web push broadcast (workers/push_worker.py) to ``user_ids``, or every active subscription."""
+    job = {
+        "id": job_id or f"push_{uuid.uuid4().hex}",
+        "notification": notification,
+        "user_ids": user_ids,
+        "enqueued_at": _now_iso(),
+        "attempts": 0,
     }
+    redis_client.rpush(PUSH_QUEUE, json.dumps(job))
+    return job["id"]
+
+
+def get_queue_stats() -> dict:
+    return {name: JobQueue(name).stats() for name in ("email", "sms")}
 
 
 def _dlq_key(queue_name: str) -> str:
@@ -127,16 +169,25 @@ def get_dead_letter_jobs(queue_name: str) -> list[dict]:
 
 def retry_dead_letter_job(queue_name: str, index: int) -> bool:
     dlq = _dlq_key(queue_name)
-    items = redis_client.lrange(dlq, 0, -1)
-    if index < 0 or index >= len(items):
+    job_str = redis_client.lindex(dlq, index) if index >= 0 else None
+    if job_str is None:
         return False
-    job_str = items.pop(index)
-    # Push back to main queue
-    redis_client.rpush(_queue_key(queue_name), job_str)
-    # Rebuild DLQ list
-    redis_client.delete(dlq)
-    for item in items:
-        redis_client.rpush(dlq, item)
+    try:
+        job = json.loads(job_str)
+        job["attempts"] = 0
+        for key in ("error", "failed_at", "failedAt"):
+            job.pop(key, None)
+        job_str = json.dumps(job)
+    except Exception:
+        pass
+    # Tombstone + LREM instead of rewriting the list, which would drop jobs
+    # workers dead-letter meanwhile
+    tombstone = f"__retried__:{uuid.uuid4().hex}"
+    pipe = redis_client.pipeline()
+    pipe.lset(dlq, index, tombstone)
+    pipe.lrem(dlq, 1, tombstone)
+    pipe.rpush(_queue_key(queue_name), job_str)
+    pipe.execute()
     return True
 
 
@@ -0,0 +1,257 @@
+"""Rate limiting engine: one atomic Lua script per check.
+
+Three algorithms, selected per scope:
+
+* ``sliding_log``    -- exact; a ZSET of request timestamps. Memory grows with
+  the limit, so keep it for small limits (login, OTP).
+* ``sliding_window`` -- two fixed buckets weighted by overlap. O(1) memory and
+  no 2x burst at window boundaries. The default.
+* ``gcra``           -- token bucket expressed as a theoretical arrival time;
+  one integer per identifier, smooth spacing with ``limit`` requests of burst.
+
+Scripts read the clock with ``TIME`` so app servers with skewed clocks agree.
+Identifiers denied by Redis are remembered in-process until their retry time,
+so a client hammering a blocked endpoint costs no Redis round trips. Every
+check fails open if Redis is unavailable.
+"""
+import threading
+import time
+import uuid
+from typing import NamedTuple
+
+from redis.exceptions import NoScriptError
+
+from .config import get_settings
+from .metrics import observe_rate_limit
+from .redis_client import redis_client, rk
+
+settings = get_settings()
+
+ALGORITHMS = ("sliding_log", "sliding_window", "gcra")
+
+
+class RateLimitPolicy(NamedTuple):
+    limit: int
+    window_seconds: int
+    algorithm: str = "sliding_window"
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    remaining: int
+    reset: int  # seconds until a request is allowed again (denied) or the window clears (allowed)
+
+
+# Defaults per scope; RATE_LIMIT_POLICIES overrides these, e.g.
+# "global=200/60,search=30/10/gcra,login=5/300/sliding_log"
+DEFAULT_POLICIES: dict[str, RateLimitPolicy] = {
+    "global": RateLimitPolicy(100, 60),
+    "login": RateLimitPolicy(5, 300, "sliding_log"),
+    "otp": RateLimitPolicy(5, 300, "sliding_log"),
+}
+
+
+def parse_policies(spec: str) -> dict[str, RateLimitPolicy]:
+    """Parse ``scope=limit/window[/algorithm]`` entries separated by commas."""
+    policies = {}
+    for entry in (spec or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        scope, _, rule = entry.partition("=")
+        parts = rule.strip().split("/")
+        if len(parts) not in (2, 3):
+            raise ValueError(f"Invalid rate limit policy: {entry!r}")
+        algorithm = parts[2] if len(parts) == 3 else settings.RATE_LIMIT_DEFAULT_ALGORITHM
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown rate limit algorithm {algorithm!r} for scope {scope!r}")
+        policies[scope.strip()] = RateLimitPolicy(int(parts[0]), int(parts[1]), algorithm)
+    return policies
+
+
+POLICIES: dict[str, RateLimitPolicy] = {**DEFAULT_POLICIES, **parse_policies(settings.RATE_LIMIT_POLICIES)}
+
+
+def get_policy(scope: str, limit: int | None = None, window_seconds: int | None = None) -> RateLimitPolicy:
+    """Configured policy for scope, else one built from the call-site defaults."""
+    if scope in POLICIES:
+        return POLICIES[scope]
+    if limit is None or window_seconds is None:
+        return POLICIES["global"]
+    return RateLimitPolicy(limit, window_seconds, settings.RATE_LIMIT_DEFAULT_ALGORITHM)
+
+
+# ---------------- Lua scripts ----------------
+# KEYS[1] = counter key; ARGV[1] = limit, ARGV[2] = window in ms, ARGV[3] = unique member.
+# Each returns {allowed (0/1), remaining, reset_ms}.
+
+_SLIDING_LOG = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+if count < limit then
+  redis.call('ZADD', KEYS[1], now, ARGV[3])
+  redis.call('PEXPIRE', KEYS[1], window)
+  return {1, limit - count - 1, window}
+end
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+return {0, 0, math.max(1, tonumber(oldest[2]) + window - now)}
+"""
+
+_SLIDING_WINDOW = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local current = math.floor(now / window)
+local elapsed = now - current * window
+local state = redis.call('HMGET', KEYS[1], 'w', 'c', 'p')
+local w = tonumber(state[1])
+local c = tonumber(state[2]) or 0
+local p = tonumber(state[3]) or 0
+if w ~= current then
+  if w == current - 1 then p = c else p = 0 end
+  c = 0
+end
+local weighted = p * (window - elapsed) / window + c
+if weighted + 1 > limit then
+  local retry
+  if c + 1 <= limit then
+    -- wait for the previous bucket's weight to decay enough
+    retry = math.ceil(window - elapsed - (limit - c - 1) * window / p)
+  else
+    -- wait for the next bucket, then for this one's weight to decay
+    retry = window - elapsed + math.ceil(window * (1 - (limit - 1) / c))
+  end
+  retry = math.max(1, retry)
+  return {0, 0, retry}
+end
+c = c + 1
+redis.call('HSET', KEYS[1], 'w', current, 'c', c, 'p', p)
+redis.call('PEXPIRE', KEYS[1], window * 2)
+return {1, math.floor(limit - weighted - 1), window - elapsed}
+"""
+
+_GCRA = """
+local limit = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local interval = period / limit
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then tat = now end
+local new_tat = tat + interval
+local allow_at = new_tat - period
+if now < allow_at then
+  return {0, 0, math.ceil(allow_at - now)}
+end
+redis.call('SET', KEYS[1], math.ceil(new_tat), 'PX', math.ceil(new_tat - now))
+return {1, math.floor((now - allow_at) / interval), math.ceil(new_tat - now)}
+"""
+
+_SCRIPTS = {"sliding_log": _SLIDING_LOG, "sliding_window": _SLIDING_WINDOW, "gcra": _GCRA}
+_sync_scripts = {name: redis_client.register_script(src) for name, src in _SCRIPTS.items()}
+
+
+# ---------------- Local pre-check ----------------
+
+class BlockList:
+    """Identifiers Redis has denied, with the monotonic time they unblock."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._until: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def blocked_for(self, identifier: str, now: float | None = None) -> float:
+        until = self._until.get(identifier)
+        if until is None:
+            return 0.0
+        remaining = until - (now if now is not None else time.monotonic())
+        if remaining <= 0:
+            with self._lock:
+                self._until.pop(identifier, None)
+            return 0.0
+        return remaining
+
+    def block(self, identifier: str, seconds: float, now: float | None = None) -> None:
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            if len(self._until) >= self.max_entries:
+                self._until = {k: v for k, v in self._until.items() if v > now}
+                if len(self._until) >= self.max_entries:
+                    return
+            self._until[identifier] = now + seconds
+
+    def clear(self) -> None:
+        with self._lock:
+            self._until.clear()
+
+
+blocked = BlockList(settings.RATE_LIMIT_LOCAL_BLOCK_MAX_ENTRIES)
+
+
+def _key(policy: RateLimitPolicy, identifier: str) -> str:
+    # Algorithm in the key so a policy change never meets a value of the wrong type
+    return rk("rate_limit", policy.algorithm, identifier)
+
+
+def _args(policy: RateLimitPolicy) -> list:
+    return [policy.limit, policy.window_seconds * 1000, uuid.uuid4().hex]
+
+
+def _precheck(scope: str, identifier: str) -> RateLimitResult | None:
+    remaining = blocked.blocked_for(identifier)
+    if remaining:
+        observe_rate_limit(scope, "local_denied")
+        return RateLimitResult(False, 0, max(1, int(remaining + 0.999)))
+    return None
+
+
+def _finish(scope: str, identifier: str, raw) -> RateLimitResult:
+    allowed, remaining, reset_ms = (int(v) for v in raw)
+    reset = max(1, -(-reset_ms // 1000))
+    if not allowed:
+        blocked.block(identifier, reset_ms / 1000)
+    observe_rate_limit(scope, "allowed" if allowed else "denied")
+    return RateLimitResult(bool(allowed), remaining, reset)
+
+
+def check(scope: str, client_id: str, policy: RateLimitPolicy | None = None) -> RateLimitResult:
+    """Count one request for client_id under scope (sync client, for threadpool code)."""
+    policy = policy or get_policy(scope)
+    identifier = f"{scope}:{client_id}"
+    local = _precheck(scope, identifier)
+    if local:
+        return local
+    try:
+        raw = _sync_scripts[policy.algorithm](keys=[_key(policy, identifier)], args=_args(policy))
+    except Exception:
+        # Fail open if Redis is unavailable
+        return RateLimitResult(True, policy.limit, policy.window_seconds)
+    return _finish(scope, identifier, raw)
+
+
+async def check_async(scope: str, client_id: str, policy: RateLimitPolicy | None = None) -> RateLimitResult:
+    """Event-loop variant of ``check`` using the asyncio client."""
+    from .redis_async import get_async_redis
+
+    policy = policy or get_policy(scope)
+    identifier = f"{scope}:{client_id}"
+    local = _precheck(scope, identifier)
+    if local:
+        return local
+    script = _sync_scripts[policy.algorithm]
+    keys, args = [_key(policy, identifier)], _args(policy)
+    try:
+        client = get_async_redis()
+        try:
+            raw = await client.evalsha(script.sha, 1, *keys, *args)
+        except NoScriptError:
+            raw = await client.eval(script.script, 1, *keys, *args)
+    except Exception:
+        return RateLimitResult(True, policy.limit, policy.window_seconds)
+    return _finish(scope, identifier, raw)
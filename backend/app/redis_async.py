@@ -0,0 +1,123 @@
+"""Asyncio Redis helpers for code running on the event loop.
+
+Middleware, websockets, startup tasks and ``async def`` routes must not use the
+synchronous ``redis_client``: every call blocks the loop for a network round
+trip. They use ``get_async_redis()`` instead, which shares the ``rk`` key scheme
+and fail-open behaviour of ``app.redis_client``. Sync routes (run in the
+threadpool) keep using the sync helpers.
+"""
+import asyncio
+import json
+import weakref
+from typing import Any
+
+import redis.asyncio as aioredis
+
+from .config import get_settings
+from .redis_client import rk
+
+settings = get_settings()
+
+# One pool per event loop: asyncio connections are bound to the loop that opened
+# them. In production that is one pool per worker; test clients that spin up a
+# fresh loop per request get their own pool instead of a broken shared one.
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aioredis.Redis]" = weakref.WeakKeyDictionary()
+
+
+def get_async_redis() -> aioredis.Redis:
+    """Return the pooled asyncio client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = aioredis.Redis.from_url(
+            settings.REDIS_URL,
+            decode_responses=True,
+            socket_timeout=0.5,
+            socket_connect_timeout=0.5,
+            health_check_interval=30,
+            retry_on_timeout=True,
+            max_connections=settings.REDIS_ASYNC_MAX_CONNECTIONS,
+        )
+        _clients[loop] = client
+    return client
+
+
+async def close_async_redis() -> None:
+    """Release the running loop's pool (called on application shutdown)."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+# Cache helpers, mirroring redis_client.cache_get / cache_set
+async def cache_get(key: str) -> Any:
+    try:
+        raw = await get_async_redis().get(key)
+    except Exception:
+        return None
+    if raw is None:
+        return None
+    try:
+        return json.loads(raw)
+    except Exception:
+        return raw
+
+
+async def cache_set(key: str, value: Any, ttl: int) -> None:
+    try:
+        payload = json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+        await get_async_redis().setex(key, ttl, payload)
+    except Exception:
+        return
+
+
+async def ping() -> bool:
+    """Raise if Redis is unreachable; used by health checks that report the error."""
+    return await get_async_redis().ping()
+
+
+async def get_queue_stats() -> dict:
+    """Pending / processing / scheduled / dead-letter depth of the email and SMS queues.
+
+    Two round trips: the registered workers first, then every depth including
+    each worker's processing list (see app/job_queue.py).
+    """
+    from .job_queue import JobQueue
+
+    client = get_async_redis()
+    queues = [JobQueue(name) for name in ("email", "sms")]
+    async with client.pipeline(transaction=False) as pipe:
+        for q in queues:
+            pipe.zrange(q.workers_key, 0, -1)
+        workers = await pipe.execute()
+    async with client.pipeline(transaction=False) as pipe:
+        for q, worker_ids in zip(queues, workers):
+            pipe.llen(q.key)
+            pipe.scard(q.legacy_processing_key)
+            for worker_id in worker_ids:
+                pipe.llen(q.processing_key(worker_id))
+            pipe.zcard(q.scheduled_key)
+            pipe.llen(q.dlq_key)
+        values = iter(await pipe.execute())
+    stats = {}
+    for q, worker_ids in zip(queues, workers):
+        pending, legacy = next(values), next(values)
+        held = sum(next(values) for _ in worker_ids)
+        stats[q.name] = {
+            "pending": pending,
+            "processing": legacy + held,
+            "scheduled": next(values),
+            "dead_letter": next(values),
+        }
+    return stats
+
+
+async def memory_and_dead_letter_depths(queues: list[str]) -> tuple[int, dict[str, int]]:
+    """Used memory plus DLQ depth per queue, for the Prometheus refresher."""
+    client = get_async_redis()
+    info = await client.info("memory")
+    async with client.pipeline(transaction=False) as pipe:
+        for q in queues:
+            pipe.llen(rk("queue", q, "dlq"))
+        depths = await pipe.execute()
+    return int(info.get("used_memory", 0)), dict(zip(queues, depths))
@@ -54,52 +54,59 @@ def cache_invalidate(key: str) -> None:
         return
 
 
-def cache_invalidate_prefix(prefix: str) -> None:
-    """Delete all keys matching a prefix; use sparingly to clear listing caches."""
+def cache_invalidate_prefix(prefix: str, batch_size: int = 500) -> None:
+    """Delete all keys matching a prefix; walks the whole keyspace, so use sparingly.
+    Listing caches should use tags or version stamps from app.cache instead.
+    """
     try:
-        keys = list(redis_client.scan_iter(match=f"{prefix}*"))
-        if keys:
-            redis_client.delete(*keys)
+        batch = []
+        for key in redis_client.scan_iter(match=f"{prefix}*", count=1000):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                redis_client.unlink(*batch)
+                batch = []
+        if batch:
+            redis_client.unlink(*batch)
     except Exception:
         return
 
 
-# Rate limiting (fixed window)
+# Rate limiting
 def rate_limit(identifier: str, limit: int, window_seconds: int) -> tuple[bool, int, int]:
-    """Increment counter for identifier; return (allowed, remaining, ttl)."""
-    key = rk("rate_limit", identifier)
-    try:
-        pipe = redis_client.pipeline()
-        pipe.incr(key, 1)
-        pipe.ttl(key)
-        results = pipe.execute()
-        count, ttl = results
-        if ttl == -1:
-            redis_client.expire(key, window_seconds)
-            ttl = window_seconds
-        allowed = count <= limit
-        remaining = max(0, limit - count)
-        return allowed, remaining, ttl
-    except Exception:
-        # Fail open if Redis is unavailable
-        return True, limit, window_seconds
+    """Count one request for identifier; return (allowed, remaining, ttl).
+    Thin wrapper over app.rate_limiter, which new code should use directly.
+    """
+    from .rate_limiter import RateLimitPolicy, check
+
+    scope, _, client_id = identifier.rpartition(":")
+    return tuple(check(scope or "default", client_id, RateLimitPolicy(limit, window_seconds)))
 
 
 # Offer click tracking + trending
-def track_offer_click(offer_id: int, user_id: int | None = None) -> None:
+def track_offer_click(offer_id: int, user_id: int | None = None, pipe=None) -> None:
+    """Count one click (all-time counter, viewers, trending bucket) in one round trip; queued on ``pipe`` when given."""
+    from .services.trending import record_click
+
     try:
-        redis_client.incr(rk("offer", str(offer_id), "clicks"))
-        redis_client.zincrby(rk("offers", "trending"), 1, str(offer_id))
+        target = pipe if pipe is not None else redis_client.pipeline(transaction=False)
+        target.incr(rk("offer", str(offer_id), "clicks"))
         if user_id:
-            redis_client.sadd(rk("offer", str(offer_id), "viewers"), str(user_id))
+            target.sadd(rk("offer", str(offer_id), "viewers"), str(user_id))
+        # Hourly buckets that age out, instead of an all-time counter
+        record_click(offer_id, pipe=target)
+        if pipe is None:
+            target.execute()
     except Exception:
         return
 
 
 def get_trending_offer_ids(limit: int = 10) -> list[int]:
+    """Offer ids from the shortest materialized trending window (see app.services.trending)."""
+    from .services.trending import WINDOWS_DAYS, top_key
+
     try:
-        ids = redis_client.zrevrange(rk("offers", "trending"), 0, limit - 1)
-        return [int(i) for i in ids]
+        members = redis_client.zrevrange(top_key(WINDOWS_DAYS[0]), 0, limit - 1)
+        return [json.loads(m)["id"] for m in members]
     except Exception:
         return []
 
@@ -24,6 +24,8 @@ class WalletTransactionRead(WalletTransactionBase):
 class WalletTransactionFilters(BaseModel):
     page: int = Field(1, ge=1)
     limit: int = Field(20, ge=1, le=100)
+    cursor: Optional[str] = Field(None, description="next_cursor from the previous page")
+    include_total: Optional[bool] = Field(None, description="Also count all matching transactions (default: only without a cursor)")
     type: Optional[str] = None
     from_date: Optional[str] = None
     to_date: Optional[str] = None
@@ -5,6 +5,15 @@ Real implementations for fetching transactions from:
 - VCommission (API Key)
 - CueLinks (API Key)
 
+Each client keeps one pooled ``httpx.AsyncClient`` (HTTP/2 when ``h2`` is
+installed) for its lifetime, fetches up to AFFILIATE_FETCH_CONCURRENCY pages
+at a time, and retries 429/5xx/transport errors with exponential backoff,
+waiting as long as Retry-After / X-RateLimit-Reset ask. Admitad access tokens
+are cached until shortly before they expire.
+
+``fetch_all_networks`` runs all networks concurrently and yields their
+transactions as they arrive, so a sync takes as long as the slowest network.
+
 Environment Variables Required:
     ADMITAD_CLIENT_ID, ADMITAD_CLIENT_SECRET, ADMITAD_REFRESH_TOKEN
     VCOMMISSION_API_KEY
@@ -12,14 +21,28 @@ Environment Variables Required:
 """
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
+import random
+import time
+from collections import deque
 from datetime import datetime, timezone
-from typing import AsyncIterator, Dict, Any
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, Any
 
 import httpx
 
+from ..config import get_settings
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:  # pragma: no cover - optional
+    HTTP2_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 # Admitad OAuth2 Configuration
 ADMITAD_CLIENT_ID = os.getenv("ADMITAD_CLIENT_ID")
@@ -37,29 +60,162 @@ CUELINKS_API_KEY = os.getenv("CUELINKS_API_KEY")
 CUELINKS_PUBLISHER_ID = os.getenv("CUELINKS_PUBLISHER_ID")
 CUELINKS_BASE_URL = "https://api.cuelinks.com"
 
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+PAGE_SIZE = 500
+
+
+class NetworkAPIError(Exception):
+    """A network request failed for good (non-retryable status or retries exhausted)."""
+
+
+def retry_delay(response: httpx.Response | None, attempt: int, now: float | None = None) -> float:
+    """Seconds to wait before retry ``attempt`` (1-based): what the server asked for, else backoff."""
+    now = now if now is not None else time.time()
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(float(retry_after), settings.AFFILIATE_HTTP_MAX_BACKOFF_SECONDS)
+            except ValueError:
+                try:
+                    at = parsedate_to_datetime(retry_after).timestamp()
+                    return min(max(0.0, at - now), settings.AFFILIATE_HTTP_MAX_BACKOFF_SECONDS)
+                except (TypeError, ValueError):
+                    pass
+        reset = response.headers.get("X-RateLimit-Reset") or response.headers.get("RateLimit-Reset")
+        if reset and response.headers.get("X-RateLimit-Remaining", response.headers.get("RateLimit-Remaining")) in ("0", None):
+            try:
+                value = float(reset)
+                # Epoch timestamp or delta seconds, depending on the network
+                wait = value - now if value > 1e9 else value
+                return min(max(0.0, wait), settings.AFFILIATE_HTTP_MAX_BACKOFF_SECONDS)
+            except ValueError:
+                pass
+    backoff = settings.AFFILIATE_HTTP_BACKOFF_SECONDS * 2 ** (attempt - 1)
+    return min(backoff, settings.AFFILIATE_HTTP_MAX_BACKOFF_SECONDS) * random.uniform(0.5, 1.0)
+
+
+class NetworkClient:
+    """Shared plumbing: pooled HTTP client, retries, concurrent pagination."""
 
-class AdmitadClient:
+    network = ""
+
+    def __init__(self, max_concurrency: int | None = None, transport: httpx.AsyncBaseTransport | None = None):
+        self.max_concurrency = max_concurrency or settings.AFFILIATE_FETCH_CONCURRENCY
+        self._transport = transport
+        self._http: httpx.AsyncClient | None = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE and self._transport is None,
+                timeout=httpx.Timeout(60, connect=10),
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency * 2,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+                transport=self._transport,
+            )
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send with retries; returns the first non-retryable response."""
+        attempt = 0
+        while True:
+            attempt += 1
+            response = None
+            try:
+                response = await self.http.request(method, url, **kwargs)
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                reason = f"HTTP {response.status_code}"
+            except httpx.TransportError as e:
+                reason = f"{type(e).__name__}: {e}"
+            if attempt > settings.AFFILIATE_HTTP_MAX_RETRIES:
+                raise NetworkAPIError(f"{self.network} {method} {url} failed after {attempt} attempts ({reason})")
+            delay = retry_delay(response, attempt)
+            logger.warning(f"{self.network} {reason}; retry {attempt} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def _paginate(self, fetch_page: Callable[[int], Awaitable[list[dict]]]) -> AsyncIterator[Dict[str, Any]]:
+        """Yield rows of pages 0, 1, 2... in order, keeping up to max_concurrency pages in flight.
+        The first page is fetched alone; later ones are requested ahead until a short page ends it.
+        """
+        in_flight: deque[asyncio.Task] = deque()
+        next_page = 0
+        try:
+            while True:
+                limit = 1 if next_page == 0 else self.max_concurrency
+                while len(in_flight) < limit:
+                    in_flight.append(asyncio.create_task(fetch_page(next_page)))
+                    next_page += 1
+                rows = await in_flight.popleft()
+                for row in rows:
+                    yield row
+                if len(rows) < PAGE_SIZE:
+                    break
+        finally:
+            for task in in_flight:
+                task.cancel()
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
+    def _check(self, response: httpx.Response) -> bool:
+        if response.status_code != 200:
+            logger.error(f"{self.network} API error: {response.status_code} {response.text}")
+            return False
+        return True
+
+
+class AdmitadClient(NetworkClient):
     """Admitad API client with OAuth2 authentication."""
-    
+
+    network = "admitad"
+
+    # (client_id, refresh_token) -> (access_token, expires_at); outlives client instances
+    _tokens: dict[tuple[str, str], tuple[str, float]] = {}
+
     def __init__(
         self,
         client_id: str = ADMITAD_CLIENT_ID,
         client_secret: str = ADMITAD_CLIENT_SECRET,
         refresh_token: str = ADMITAD_REFRESH_TOKEN,
+        **kwargs,
     ):
+        super().__init__(**kwargs)
         self.client_id = client_id
         self.client_secret = client_secret
         self.refresh_token = refresh_token
-        self.access_token: str | None = None
         self.base_url = ADMITAD_BASE_URL
-    
-    async def _get_access_token(self) -> str:
-        """Get or refresh OAuth2 access token."""
-        if self.access_token:
+        self._token_lock = asyncio.Lock()
+
+    @property
+    def access_token(self) -> str | None:
+        cached = self._tokens.get((self.client_id, self.refresh_token))
+        if cached and cached[1] > time.time():
+            return cached[0]
+        return None
+
+    async def _get_access_token(self, force: bool = False) -> str:
+        """Cached OAuth2 access token, refreshed when expired (one refresh at a time)."""
+        if not force and self.access_token:
             return self.access_token
-        
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.post(
+        async with self._token_lock:
+            if not force and self.access_token:
+                return self.access_token
+            response = await self._request(
+                "POST",
                 ADMITAD_TOKEN_URL,
                 data={
                     "grant_type": "refresh_token",
@@ -68,18 +224,19 @@ class AdmitadClient:
                     "refresh_token": self.refresh_token,
                 },
             )
-            
+
             if response.status_code != 200:
                 logger.error(f"Admitad token refresh failed: {response.status_code} {response.text}")
-                raise Exception(f"Failed to refresh Admitad token: {response.status_code}")
-            
+                raise NetworkAPIError(f"Failed to refresh Admitad token: {response.status_code}")
+
             data = response.json()
-            self.access_token = data["access_token"]
+            # Refresh a minute early so a token never expires mid-request
+            expires_at = time.time() + max(0, int(data.get("expires_in", 3600)) - 60)
+            self._tokens[(self.client_id, self.refresh_token)] = (data["access_token"], expires_at)
             # Note: You should also update refresh_token if it changes
             # self.refresh_token = data.get("refresh_token", self.refresh_token)
-            
-            return self.access_token
-    
+            return data["access_token"]
+
     async def fetch_transactions(
         self,
         start_date: datetime,
@@ -87,75 +244,68 @@ class AdmitadClient:
         status: str = "approved",
     ) -> AsyncIterator[Dict[str, Any]]:
         """Fetch transactions from Admitad API.
-        
+
         Args:
             start_date: Start date for transaction query
             end_date: End date for transaction query
             status: Transaction status filter (approved, pending, declined)
-            
+
         Yields:
             Transaction dictionaries
         """
         if not all([self.client_id, self.client_secret, self.refresh_token]):
             logger.warning("Admitad credentials not configured, skipping...")
             return
-        
-        try:
-            token = await self._get_access_token()
-            
-            url = f"{self.base_url}/statistics/actions/"
-            headers = {"Authorization": f"Bearer {token}"}
+
+        url = f"{self.base_url}/statistics/actions/"
+
+        async def fetch_page(page: int) -> list[dict]:
             params = {
                 "date_start": start_date.strftime("%d.%m.%Y"),
                 "date_end": end_date.strftime("%d.%m.%Y"),
                 "status": status,
-                "limit": 500,
-                "offset": 0,
+                "limit": PAGE_SIZE,
+                "offset": page * PAGE_SIZE,
             }
-            
-            async with httpx.AsyncClient(timeout=60) as client:
-                while True:
-                    response = await client.get(url, headers=headers, params=params)
-                    
-                    if response.status_code != 200:
-                        logger.error(f"Admitad API error: {response.status_code} {response.text}")
-                        break
-                    
-                    data = response.json()
-                    results = data.get("results", [])
-                    
-                    if not results:
-                        break
-                    
-                    for row in results:
-                        yield {
-                            "external_id": str(row.get("action_id")),
-                            "status": row.get("status"),
-                            "commission_amount": float(row.get("payment", 0) or 0),
-                            "order_amount": float(row.get("cart", 0) or 0),
-                            "merchant_ext_id": str(row.get("advertiser_id")),
-                            "click_ext_id": str(row.get("click_id")),
-                            "transaction_date": row.get("action_date"),
-                            "network": "admitad",
-                        }
-                    
-                    # Pagination
-                    if len(results) < params["limit"]:
-                        break
-                    
-                    params["offset"] += params["limit"]
-        
+            token = await self._get_access_token()
+            response = await self._request("GET", url, headers={"Authorization": f"Bearer {token}"}, params=params)
+            if response.status_code == 401:
+                # Revoked or expired early: refresh once and retry
+                token = await self._get_access_token(force=True)
+                response = await self._request("GET", url, headers={"Authorization": f"Bearer {token}"}, params=params)
+            if not self._check(response):
+                return []
+            return [
+                {
+                    "external_id": str(row.get("action_id")),
+                    "status": row.get("status"),
+                    "commission_amount": float(row.get("payment", 0) or 0),
+                    "order_amount": float(row.get("cart", 0) or 0),
+                    "merchant_ext_id": str(row.get("advertiser_id")),
+                    "click_ext_id": str(row.get("click_id")),
+                    "transaction_date": row.get("action_date"),
+                    "network": "admitad",
+                }
+                for row in response.json().get("results", [])
+            ]
+
+        try:
+            async for row in self._paginate(fetch_page):
+                yield row
         except Exception as e:
             logger.error(f"Admitad fetch failed: {e}", exc_info=True)
 
 
-class VCommissionClient:
+class VCommissionClient(NetworkClient):
     """VCommission API client."""
-    
-    def __init__(self, api_key: str = VCOMMISSION_API_KEY):
+
+    network = "vcommission"
+
+    def __init__(self, api_key: str = VCOMMISSION_API_KEY, **kwargs):
+        super().__init__(**kwargs)
         self.api_key = api_key
         self.base_url = VCOMMISSION_BASE_URL
-    
+
     async def fetch_transactions(
         self,
         start_date: datetime,
@@ -163,78 +313,70 @@ class VCommissionClient:
         status: str = "approved",
     ) -> AsyncIterator[Dict[str, Any]]:
         """Fetch transactions from VCommission API.
-        
+
         Args:
             start_date: Start date for transaction query
             end_date: End date for transaction query
             status: Transaction status filter
-            
+
         Yields:
             Transaction dictionaries
         """
         if not self.api_key:
             logger.warning("VCommission API key not configured, skipping...")
             return
-        
-        try:
-            url = f"{self.base_url}/v2/transactions"
+
+        url = f"{self.base_url}/v2/transactions"
+
+        async def fetch_page(page: int) -> list[dict]:
             params = {
                 "apiKey": self.api_key,
                 "start_date": start_date.strftime("%Y-%m-%d"),
                 "end_date": end_date.strftime("%Y-%m-%d"),
                 "status": status,
-                "page": 1,
-                "limit": 500,
+                "page": page + 1,
+                "limit": PAGE_SIZE,
             }
-            
-            async with httpx.AsyncClient(timeout=60) as client:
-                while True:
-                    response = await client.get(url, params=params)
-                    
-                    if response.status_code != 200:
-                        logger.error(f"VCommission API error: {response.status_code} {response.text}")
-                        break
-                    
-                    data = response.json()
-                    transactions = data.get("transactions", [])
-                    
-                    if not transactions:
-                        break
-                    
-                    for row in transactions:
-                        yield {
-                            "external_id": str(row.get("transaction_id")),
-                            "status": row.get("status"),
-                            "commission_amount": float(row.get("commission", 0) or 0),
-                            "order_amount": float(row.get("sale_amount", 0) or 0),
-                            "merchant_ext_id": str(row.get("merchant_id")),
-                            "click_ext_id": str(row.get("click_id")),
-                            "transaction_date": row.get("transaction_date"),
-                            "network": "vcommission",
-                        }
-                    
-                    # Pagination
-                    if len(transactions) < params["limit"]:
-                        break
-                    
-                    params["page"] += 1
-        
+            response = await self._request("GET", url, params=params)
+            if not self._check(response):
+                return []
+            return [
+                {
+                    "external_id": str(row.get("transaction_id")),
+                    "status": row.get("status"),
+                    "commission_amount": float(row.get("commission", 0) or 0),
+                    "order_amount": float(row.get("sale_amount", 0) or 0),
+                    "merchant_ext_id": str(row.get("merchant_id")),
+                    "click_ext_id": str(row.get("click_id")),
+                    "transaction_date": row.get("transaction_date"),
+                    "network": "vcommission",
+                }
+                for row in response.json().get("transactions", [])
+            ]
+
+        try:
+            async for row in self._paginate(fetch_page):
+                yield row
         except Exception as e:
             logger.error(f"VCommission fetch failed: {e}", exc_info=True)
 
 
-class CueLinksClient:
+class CueLinksClient(NetworkClient):
     """CueLinks API client."""
-    
+
+    network = "cuelinks"
+
     def __init__(
         self,
         api_key: str = CUELINKS_API_KEY,
         publisher_id: str = CUELINKS_PUBLISHER_ID,
+        **kwargs,
     ):
+        super().__init__(**kwargs)
         self.api_key = api_key
         self.publisher_id = publisher_id
         self.base_url = CUELINKS_BASE_URL
-    
+
     async def fetch_transactions(
         self,
         start_date: datetime,
@@ -242,81 +384,123 @@ class CueLinksClient:
         status: str = "approved",
     ) -> AsyncIterator[Dict[str, Any]]:
         """Fetch transactions from CueLinks API.
-        
+
         Args:
             start_date: Start date for transaction query
             end_date: End date for transaction query
             status: Transaction status filter
-            
+
         Yields:
             Transaction dictionaries
         """
         if not all([self.api_key, self.publisher_id]):
             logger.warning("CueLinks credentials not configured, skipping...")
             return
-        
-        try:
-            url = f"{self.base_url}/api/v2/getTransactionDetails"
-            headers = {"X-API-KEY": self.api_key}
+
+        url = f"{self.base_url}/api/v2/getTransactionDetails"
+
+        async def fetch_page(page: int) -> list[dict]:
             params = {
                 "publisherId": self.publisher_id,
                 "startDate": start_date.strftime("%Y-%m-%d"),
                 "endDate": end_date.strftime("%Y-%m-%d"),
                 "status": status,
-                "page": 1,
-                "limit": 500,
+                "page": page + 1,
+                "limit": PAGE_SIZE,
             }
-            
-            async with httpx.AsyncClient(timeout=60) as client:
-                while True:
-                    response = await client.get(url, headers=headers, params=params)
-                    
-                    if response.status_code != 200:
-                        logger.error(f"CueLinks API error: {response.status_code} {response.text}")
-                        break
-                    
-                    data = response.json()
-                    
-                    if data.get("status") != "success":
-                        logger.error(f"CueLinks API returned error: {data.get('message')}")
-                        break
-                    
-                    transactions = data.get("data", {}).get("transactions", [])
-                    
-                    if not transactions:
-                        break
-                    
-                    for row in transactions:
-                        yield {
-                            "external_id": str(row.get("transactionId")),
-                            "status": row.get("status"),
-                            "commission_amount": float(row.get("publisherCommission", 0) or 0),
-                            "order_amount": float(row.get("saleAmount", 0) or 0),
-                            "merchant_ext_id": str(row.get("merchantId")),
-                            "click_ext_id": str(row.get("clickId")),
-                            "transaction_date": row.get("transactionDate"),
-                            "network": "cuelinks",
-                        }
-                    
-                    # Pagination
-                    if len(transactions) < params["limit"]:
-                        break
-                    
-                    params["page"] += 1
-        
+            response = await self._request("GET", url, headers={"X-API-KEY": self.api_key}, params=params)
+            if not self._check(response):
+                return []
+            data = response.json()
+            if data.get("status") != "success":
+                logger.error(f"CueLinks API returned error: {data.get('message')}")
+                return []
+            return [
+                {
+                    "external_id": str(row.get("transactionId")),
+                    "status": row.get("status"),
+                    "commission_amount": float(row.get("publisherCommission", 0) or 0),
+                    "order_amount": float(row.get("saleAmount", 0) or 0),
+                    "merchant_ext_id": str(row.get("merchantId")),
+                    "click_ext_id": str(row.get("clickId")),
+                    "transaction_date": row.get("transactionDate"),
+                    "network": "cuelinks",
+                }
+                for row in data.get("data", {}).get("transactions", [])
+            ]
+
+        try:
+            async for row in self._paginate(fetch_page):
+                yield row
         except Exception as e:
             logger.error(f"CueLinks fetch failed: {e}", exc_info=True)
 
 
+def default_clients() -> dict[str, NetworkClient]:
+    """One client per network, configured from settings/environment."""
+    return {
+        "admitad": AdmitadClient(
+            settings.ADMITAD_CLIENT_ID or ADMITAD_CLIENT_ID,
+            settings.ADMITAD_CLIENT_SECRET or ADMITAD_CLIENT_SECRET,
+            settings.ADMITAD_TOKEN or ADMITAD_REFRESH_TOKEN,
+        ),
+        "vcommission": VCommissionClient(settings.VCOMMISSION_API_KEY or VCOMMISSION_API_KEY),
+        "cuelinks": CueLinksClient(settings.CUELINKS_API_KEY or CUELINKS_API_KEY),
+    }
+
+
+async def fetch_all_networks(
+    start_date: datetime,
+    end_date: datetime,
+    clients: dict[str, NetworkClient] | None = None,
+) -> AsyncIterator[tuple[str, Dict[str, Any]]]:
+    """Yield (network, transaction) from all networks concurrently, as pages arrive.
+
+    A bounded queue (AFFILIATE_FETCH_QUEUE_SIZE) applies backpressure, so a slow
+    consumer pauses the fetchers instead of buffering whole networks. Clients
+    are closed when the iteration ends.
+    """
+    clients = clients if clients is not None else default_clients()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=settings.AFFILIATE_FETCH_QUEUE_SIZE)
+    done = object()
+
+    async def pump(network: str, client: NetworkClient) -> None:
+        started = time.perf_counter()
+        count = 0
+        try:
+            async for tx in client.fetch_transactions(start_date, end_date):
+                await queue.put((network, tx))
+                count += 1
+        except Exception as e:
+            logger.error(f"{network} fetch failed: {e}", exc_info=True)
+        logger.info(f"Fetched {count} {network} transactions in {time.perf_counter() - started:.1f}s")
+        await queue.put((network, done))
+
+    tasks = [asyncio.create_task(pump(network, client)) for network, client in clients.items()]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            network, item = await queue.get()
+            if item is done:
+                remaining -= 1
+                continue
+            yield network, item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.gather(*(client.aclose() for client in clients.values()), return_exceptions=True)
+
+
 # Convenience functions for workers
 async def fetch_admitad_transactions(
     start_date: datetime,
     end_date: datetime,
 ) -> AsyncIterator[Dict[str, Any]]:
     """Fetch Admitad transactions."""
-    client = AdmitadClient()
-    async for transaction in client.fetch_transactions(start_date, end_date):
-        yield transaction
+    async with AdmitadClient() as client:
+        async for transaction in client.fetch_transactions(start_date, end_date):
+            yield transaction
 
 
 async def fetch_vcommission_transactions(
@@ -324,9 +508,9 @@ async def fetch_vcommission_transactions(
     end_date: datetime,
 ) -> AsyncIterator[Dict[str, Any]]:
     """Fetch VCommission transactions."""
-    client = VCommissionClient()
-    async for transaction in client.fetch_transactions(start_date, end_date):
-        yield transaction
+    async with VCommissionClient() as client:
+        async for transaction in client.fetch_transactions(start_date, end_date):
+            yield transaction
 
 
 async def fetch_cuelinks_transactions(
@@ -334,7 +518,6 @@ async def fetch_cuelinks_transactions(
     end_date: datetime,
 ) -> AsyncIterator[Dict[str, Any]]:
     """Fetch CueLinks transactions."""
-    client = CueLinksClient()
-    async for transaction in client.fetch_transactions(start_date, end_date):
-        yield transaction
-
+    async with CueLinksClient() as client:
+        async for transaction in client.fetch_transactions(start_date, end_date):
+            yield transaction
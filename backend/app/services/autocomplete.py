@@ -0,0 +1,278 @@
+"""Search-as-you-type index: one Redis sorted set per prefix.
+
+Keys (all under ``autocomplete_index:``):
+
+- ``autocomplete_index:prefix:<prefix>`` -- ZSET of entry ids (``merchant:12``,
+  ``product:7``, ``query:echo dot``) scored by popularity, trimmed to the
+  AUTOCOMPLETE_MAX_PER_PREFIX best entries.
+- ``autocomplete_index:entries`` -- HASH entry id -> JSON ``{text, type, url}``.
+- ``autocomplete_index:queries`` -- ZSET of normalised search queries that returned
+  results, scored by how many searchers (user, else IP) ran them; a searcher
+  counts once a day per query (``autocomplete_index:seen:<hash>`` markers),
+  so one client repeating a query cannot push it into the suggestions.
+- ``autocomplete_index:built`` -- set once a full build has run; until then the
+  endpoint falls back to SQL.
+
+An entry is reachable from every prefix of its name and of each later word
+("Amazon Echo Dot" answers "am", "ech", "dot"). A lookup is one Lua call
+(ZREVRANGE + HMGET), so a keystroke costs a single round trip and
+O(log N + limit) work in Redis.
+
+Admin writes update the index incrementally; ``rebuild_index`` (hourly from
+workers.cron_jobs) rescores everything from click and order data, adds the
+queries run by at least AUTOCOMPLETE_MIN_QUERY_COUNT searchers, drops entries
+that are no longer active and trims each prefix to its best entries.
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+from redis.exceptions import NoScriptError
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ..config import get_settings
+from ..models import AffiliateClick, Merchant, Offer, OfferClick, OrderItem, Product
+from ..redis_client import redis_client, rk
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+MIN_PREFIX_LENGTH = 2
+SEEN_TTL_SECONDS = 86400
+
+ENTRIES_KEY = rk("autocomplete_index", "entries")
+QUERIES_KEY = rk("autocomplete_index", "queries")
+BUILT_KEY = rk("autocomplete_index", "built")
+
+
+def prefix_key(prefix: str) -> str:
+    return rk("autocomplete_index", "prefix", prefix)
+
+
+def normalize(value: str) -> str:
+    return " ".join(value.lower().split())
+
+
+def prefixes(value: str) -> set[str]:
+    """Prefixes of the whole name and of every word after the first."""
+    words = normalize(value).split(" ")
+    out = set()
+    for i in range(len(words)):
+        tail = " ".join(words[i:])[: settings.AUTOCOMPLETE_MAX_PREFIX_LENGTH]
+        out.update(tail[:n] for n in range(MIN_PREFIX_LENGTH, len(tail) + 1))
+    # "amazon " adds nothing over "amazon"
+    return {p for p in out if not p.endswith(" ")}
+
+
+def merchant_entry(merchant) -> tuple[str, dict]:
+    return f"merchant:{merchant.id}", {"text": merchant.name, "type": "merchant", "url": f"/merchants/{merchant.slug}"}
+
+
+def product_entry(product) -> tuple[str, dict]:
+    return f"product:{product.id}", {"text": product.name, "type": "product", "url": f"/products/{product.slug}"}
+
+
+def query_entry(query: str) -> tuple[str, dict]:
+    return f"query:{query}", {"text": query, "type": "query", "url": "/search?" + urlencode({"q": query})}
+
+
+# ---------------- Writes (sync: admin routes, cron) ----------------
+
+def _add(pipe, entry_id: str, doc: dict, score: float, keep_score: bool = False) -> None:
+    pipe.hset(ENTRIES_KEY, entry_id, json.dumps(doc))
+    for p in prefixes(doc["text"]):
+        key = prefix_key(p)
+        if keep_score:
+            # Incremental add at score 0: trimming here would evict it before it is ever ranked
+            pipe.zadd(key, {entry_id: score}, nx=True)
+        else:
+            pipe.zadd(key, {entry_id: score})
+            pipe.zremrangebyrank(key, 0, -settings.AUTOCOMPLETE_MAX_PER_PREFIX - 1)
+
+
+def _remove(pipe, entry_id: str, text: str) -> None:
+    pipe.hdel(ENTRIES_KEY, entry_id)
+    for p in prefixes(text):
+        pipe.zrem(prefix_key(p), entry_id)
+
+
+def _stored_text(entry_id: str) -> str | None:
+    raw = redis_client.hget(ENTRIES_KEY, entry_id)
+    return json.loads(raw)["text"] if raw else None
+
+
+def upsert(entry_id: str, doc: dict, active: bool = True) -> None:
+    """Index (or re-index after a rename) one entry; inactive entries are removed.
+    A new entry starts at score 0 and keeps any score it already has; rebuild_index ranks it.
+    """
+    try:
+        previous = _stored_text(entry_id)
+        pipe = redis_client.pipeline(transaction=False)
+        if previous is not None and (not active or normalize(previous) != normalize(doc["text"])):
+            _remove(pipe, entry_id, previous)
+        if active:
+            _add(pipe, entry_id, doc, 0, keep_score=True)
+        pipe.execute()
+    except Exception as e:
+        # The hourly rebuild repairs anything missed while Redis was down
+        logger.warning(f"Autocomplete update failed for {entry_id}: {e}")
+
+
+def remove(entry_id: str) -> None:
+    try:
+        previous = _stored_text(entry_id)
+        if previous is None:
+            return
+        pipe = redis_client.pipeline(transaction=False)
+        _remove(pipe, entry_id, previous)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Autocomplete removal failed for {entry_id}: {e}")
+
+
+def index_merchant(merchant) -> None:
+    entry_id, doc = merchant_entry(merchant)
+    upsert(entry_id, doc, active=merchant.is_active)
+
+
+def index_product(product) -> None:
+    entry_id, doc = product_entry(product)
+    upsert(entry_id, doc, active=product.is_active)
+
+
+def _merchant_scores(db: Session, since: datetime) -> dict[int, float]:
+    scores: dict[int, float] = {}
+    affiliate = db.execute(
+        select(AffiliateClick.merchant_id, func.count())
+        .where(AffiliateClick.merchant_id.is_not(None), AffiliateClick.created_at >= since)
+        .group_by(AffiliateClick.merchant_id)
+    ).all()
+    offer = db.execute(
+        select(Offer.merchant_id, func.count())
+        .join(OfferClick, OfferClick.offer_id == Offer.id)
+        .where(OfferClick.created_at >= since)
+        .group_by(Offer.merchant_id)
+    ).all()
+    for merchant_id, count in [*affiliate, *offer]:
+        scores[merchant_id] = scores.get(merchant_id, 0) + count
+    return scores
+
+
+def _product_scores(db: Session) -> dict[int, float]:
+    # Products have no click tracking; units sold is the closest popularity signal
+    rows = db.execute(
+        select(OrderItem.product_id, func.sum(OrderItem.quantity)).group_by(OrderItem.product_id)
+    ).all()
+    return {product_id: float(units or 0) for product_id, units in rows}
+
+
+def rebuild_index(db: Session) -> int:
+    """Rescore every active merchant, product and popular query; drop stale entries.
+    Returns the number of indexed entries.
+    """
+    since = datetime.utcnow() - timedelta(days=settings.AUTOCOMPLETE_POPULARITY_DAYS)
+    merchant_scores = _merchant_scores(db, since)
+    product_scores = _product_scores(db)
+
+    entries: dict[str, tuple[dict, float]] = {}
+    for merchant in db.scalars(select(Merchant).where(Merchant.is_active == True)):
+        entry_id, doc = merchant_entry(merchant)
+        entries[entry_id] = (doc, merchant_scores.get(merchant.id, 0))
+    for product in db.scalars(select(Product).where(Product.is_active == True)):
+        entry_id, doc = product_entry(product)
+        entries[entry_id] = (doc, product_scores.get(product.id, 0))
+
+    # Bound the query log, then index the queries searched often enough
+    redis_client.zremrangebyrank(QUERIES_KEY, 0, -settings.AUTOCOMPLETE_QUERY_LOG_SIZE - 1)
+    for query, count in redis_client.zrevrangebyscore(
+        QUERIES_KEY, "+inf", settings.AUTOCOMPLETE_MIN_QUERY_COUNT,
+        start=0, num=settings.AUTOCOMPLETE_MAX_QUERIES, withscores=True,
+    ):
+        entry_id, doc = query_entry(query)
+        entries[entry_id] = (doc, count)
+
+    # Entries that went inactive, or were renamed while Redis missed the update
+    stale = {}
+    for entry_id, raw in redis_client.hgetall(ENTRIES_KEY).items():
+        text = json.loads(raw)["text"]
+        if entry_id not in entries or normalize(text) != normalize(entries[entry_id][0]["text"]):
+            stale[entry_id] = text
+
+    pipe = redis_client.pipeline(transaction=False)
+    for i, (entry_id, text) in enumerate(stale.items(), 1):
+        _remove(pipe, entry_id, text)
+        if i % 500 == 0:
+            pipe.execute()
+    for i, (entry_id, (doc, score)) in enumerate(entries.items(), 1):
+        _add(pipe, entry_id, doc, score)
+        if i % 500 == 0:
+            pipe.execute()
+    pipe.set(BUILT_KEY, datetime.utcnow().isoformat())
+    pipe.execute()
+    return len(entries)
+
+
+# ---------------- Reads (async: search routes) ----------------
+
+# KEYS[1] = built marker, KEYS[2] = prefix ZSET, KEYS[3] = entries HASH; ARGV[1] = limit.
+# Returns false until the first build so callers can fall back to SQL.
+_SUGGEST = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+  return false
+end
+local ids = redis.call('ZREVRANGE', KEYS[2], 0, tonumber(ARGV[1]) - 1)
+if #ids == 0 then
+  return {}
+end
+return redis.call('HMGET', KEYS[3], unpack(ids))
+"""
+_suggest_script = redis_client.register_script(_SUGGEST)
+
+
+async def suggest(q: str, limit: int) -> list[dict] | None:
+    """Top entries for the prefix q, or None when the index is unavailable."""
+    from ..redis_async import get_async_redis
+
+    prefix = normalize(q)[: settings.AUTOCOMPLETE_MAX_PREFIX_LENGTH]
+    keys = [BUILT_KEY, prefix_key(prefix), ENTRIES_KEY]
+    try:
+        client = get_async_redis()
+        try:
+            # Headroom for popular queries that repeat a merchant or product name
+            raw = await client.evalsha(_suggest_script.sha, len(keys), *keys, limit * 2)
+        except NoScriptError:
+            raw = await client.eval(_SUGGEST, len(keys), *keys, limit * 2)
+    except Exception:
+        return None
+    if raw is None:
+        return None
+    entries = [json.loads(doc) for doc in raw if doc]
+    # A popular query that repeats a merchant or product name adds nothing
+    names = {normalize(e["text"]) for e in entries if e["type"] != "query"}
+    return [e for e in entries if e["type"] != "query" or normalize(e["text"]) not in names][:limit]
+
+
+def seen_key(query: str, searcher: str) -> str:
+    digest = hashlib.blake2b(f"{query}|{searcher}".encode(), digest_size=8).hexdigest()
+    return rk("autocomplete_index", "seen", digest)
+
+
+async def record_query(q: str, searcher: str) -> None:
+    """Count a search that returned results, once a day per searcher (``u<id>`` or an IP).
+
+    Queries run by AUTOCOMPLETE_MIN_QUERY_COUNT searchers join the index on rebuild.
+    """
+    from ..redis_async import get_async_redis
+
+    query = normalize(q)
+    if len(query) < MIN_PREFIX_LENGTH:
+        return
+    try:
+        client = get_async_redis()
+        if await client.set(seen_key(query, searcher), 1, nx=True, ex=SEEN_TTL_SECONDS):
+            await client.zincrby(QUERIES_KEY, 1, query)
+    except Exception:
+        return
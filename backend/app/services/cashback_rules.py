@@ -0,0 +1,187 @@
+"""Compiled cashback rate rules.
+
+Active ``cashback_rules`` are loaded once into a dict keyed by
+``(merchant_id, category_id)``. A transaction resolves through the fallback
+chain
+
+    (merchant, category) -> (merchant, any) -> (any, category) -> (any, any)
+    -> CASHBACK_DEFAULT_RATE_PERCENT
+
+with a dict probe per step, so evaluation is O(1) per transaction however many
+merchant rules exist. When several active rules share a key the newest wins.
+Resolved chains are memoized per key, so a batch pays for each distinct
+merchant/category once and everything else is a multiply and a cap.
+
+Committing a change to a ``CashbackRule`` through the ORM publishes on
+``RULES_CHANNEL``; processes running ``start_rules_listener`` drop their
+compiled copy and reload on next use. CASHBACK_RULES_TTL_SECONDS bounds
+staleness when a message is missed (Redis down, rules edited with raw SQL).
+"""
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Iterable, NamedTuple
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from ..config import get_settings
+from ..models import CashbackRule
+from ..redis_client import publish, redis_client
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+RULES_CHANNEL = "events:cashback_rules"
+CENT = Decimal("0.01")
+HUNDRED = Decimal(100)
+
+
+class Rate(NamedTuple):
+    factor: Decimal  # rate_percent / 100
+    cap: Decimal | None
+    rule_id: int | None  # None for the configured default
+
+
+class CompiledRules:
+    """Immutable lookup over one snapshot of the active rules."""
+
+    def __init__(self, rules: Iterable[tuple[int, int | None, int | None, Decimal, Decimal | None]], default_rate_percent: Decimal):
+        self.by_key: dict[tuple[int | None, int | None], Rate] = {}
+        # Ascending id, so the newest rule for a key overwrites older ones
+        for rule_id, merchant_id, category_id, rate_percent, max_cashback in sorted(rules, key=lambda r: r[0]):
+            self.by_key[(merchant_id, category_id)] = Rate(
+                Decimal(rate_percent or 0) / HUNDRED,
+                Decimal(max_cashback) if max_cashback is not None else None,
+                rule_id,
+            )
+        self.default = Rate(Decimal(default_rate_percent) / HUNDRED, None, None)
+        self._resolved: dict[tuple[int | None, int | None], Rate] = {}
+
+    def __len__(self) -> int:
+        return len(self.by_key)
+
+    def rate_for(self, merchant_id: int | None, category_id: int | None = None) -> Rate:
+        key = (merchant_id, category_id)
+        rate = self._resolved.get(key)
+        if rate is None:
+            by_key = self.by_key
+            rate = (
+                by_key.get(key)
+                or (merchant_id is not None and by_key.get((merchant_id, None)))
+                or (category_id is not None and by_key.get((None, category_id)))
+                or by_key.get((None, None))
+                or self.default
+            )
+            self._resolved[key] = rate
+        return rate
+
+    def evaluate(self, transactions: Iterable[tuple[Decimal, int | None, int | None]]) -> list[Decimal]:
+        """Cashback for each ``(commission, merchant_id, category_id)``, in order, rounded to cents."""
+        rate_for = self.rate_for
+        out = []
+        append = out.append
+        for commission, merchant_id, category_id in transactions:
+            rate = rate_for(merchant_id, category_id)
+            if not isinstance(commission, Decimal):
+                commission = Decimal(str(commission or 0))
+            amount = (commission * rate.factor).quantize(CENT, ROUND_HALF_UP)
+            if rate.cap is not None and amount > rate.cap:
+                amount = rate.cap
+            append(amount)
+        return out
+
+
+def compile_rules(db: Session) -> CompiledRules:
+    rows = db.execute(
+        select(
+            CashbackRule.id, CashbackRule.merchant_id, CashbackRule.category_id,
+            CashbackRule.rate_percent, CashbackRule.max_cashback,
+        ).where(CashbackRule.is_active.is_(True))
+    ).all()
+    return CompiledRules(rows, Decimal(str(settings.CASHBACK_DEFAULT_RATE_PERCENT)))
+
+
+# Process-wide compiled snapshot: (rules, loaded_at)
+_compiled: tuple[CompiledRules, float] | None = None
+_lock = threading.Lock()
+
+
+def get_rules(db: Session) -> CompiledRules:
+    """This process's compiled rules, reloaded after an invalidation or the TTL."""
+    global _compiled
+    current = _compiled
+    if current is not None and time.time() - current[1] < settings.CASHBACK_RULES_TTL_SECONDS:
+        return current[0]
+    with _lock:
+        if _compiled is current:
+            rules = compile_rules(db)
+            _compiled = (rules, time.time())
+            logger.info(f"Compiled {len(rules)} cashback rules")
+        return _compiled[0]
+
+
+def _drop_local() -> None:
+    global _compiled
+    _compiled = None
+
+
+def invalidate_rules() -> None:
+    """Drop the compiled rules here and in every listening process."""
+    _drop_local()
+    publish(RULES_CHANNEL, {"invalidate": True})
+
+
+@event.listens_for(Session, "after_flush")
+def _note_rule_changes(session, flush_context):
+    if any(isinstance(obj, CashbackRule) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info["cashback_rules_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_rule_changes(session):
+    if session.info.pop("cashback_rules_changed", False):
+        invalidate_rules()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rule_changes(session):
+    session.info.pop("cashback_rules_changed", None)
+
+
+def start_rules_listener() -> threading.Thread:
+    """Subscribe to rule invalidations so this process recompiles after edits elsewhere."""
+
+    def _listen():
+        while True:
+            pubsub = None
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(RULES_CHANNEL)
+                # Changes made while we were not subscribed are unseen; start fresh
+                _drop_local()
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if not message:
+                        continue
+                    try:
+                        json.loads(message["data"])
+                    except Exception:
+                        continue
+                    _drop_local()
+            except Exception:
+                # Redis unavailable; CASHBACK_RULES_TTL_SECONDS bounds staleness until we reconnect
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+                time.sleep(5)
+
+    thread = threading.Thread(target=_listen, name="cashback-rules-invalidation", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,169 @@
+"""Denormalized per-merchant counters for merchant cards.
+
+Listings read these instead of aggregating per request:
+
+- ``merchants.active_offers_count``, kept in step with offer writes in the
+  same transaction: a flush hook covers ORM writes (admin create, update,
+  delete, merchant moves), and bulk UPDATEs such as the expiry cron call
+  ``adjust_active_offers`` with what they changed.
+- Clicks and conversions over the last 24 hours, counted in hourly Redis
+  buckets (``counters:merchant:<kind>:<YYYYMMDDHH>``, member = merchant id)
+  that ``materialize`` folds into ``counters:merchant:<kind>:24h`` with
+  ZUNIONSTORE every MERCHANT_COUNTERS_REFRESH_MINUTES. A page reads its
+  merchants' values with one ZMSCORE per kind. The redirector's click worker
+  bumps the click buckets; affiliate imports bump the conversions.
+
+``reconcile`` recounts active offers with one UPDATE, correcting drift from
+writes that bypassed both paths.
+"""
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Iterable
+
+from sqlalchemy import bindparam, event, inspect, update
+from sqlalchemy.orm import Session
+
+from ..loaders import count_of
+from ..models import Merchant, Offer
+from ..redis_client import redis_client, rk
+
+logger = logging.getLogger(__name__)
+
+CLICKS = "clicks"
+CONVERSIONS = "conversions"
+KINDS = (CLICKS, CONVERSIONS)
+WINDOW_HOURS = 24
+
+
+def bucket_key(kind: str, hour: datetime) -> str:
+    return rk("counters", "merchant", kind, hour.strftime("%Y%m%d%H"))
+
+
+def window_key(kind: str) -> str:
+    return rk("counters", "merchant", kind, f"{WINDOW_HOURS}h")
+
+
+# ---------------- Active offers (database) ----------------
+
+_adjust = (
+    update(Merchant.__table__)
+    .where(Merchant.__table__.c.id == bindparam("merchant_id"))
+    .values(active_offers_count=Merchant.__table__.c.active_offers_count + bindparam("delta"))
+)
+
+
+def adjust_active_offers(db, deltas: dict[int, int]) -> None:
+    """Apply {merchant_id: +/-n} to the active offer counts inside the caller's transaction."""
+    params = [{"merchant_id": mid, "delta": delta} for mid, delta in deltas.items() if mid is not None and delta]
+    if params:
+        db.execute(_adjust, params)
+
+
+def _was(offer: Offer, attr: str):
+    """Value of ``attr`` before this flush, without loading anything."""
+    state = inspect(offer)
+    history = state.attrs[attr].history
+    return history.deleted[0] if history.deleted else state.dict.get(attr)
+
+
+def _is_active(value) -> bool:
+    # None only before the column default applies, which is active
+    return value is not False
+
+
+@event.listens_for(Session, "after_flush")
+def _track_offer_changes(session, flush_context):
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, Offer) and _is_active(obj.is_active):
+            deltas[obj.merchant_id] += 1
+    for obj in session.deleted:
+        if isinstance(obj, Offer) and _is_active(_was(obj, "is_active")):
+            deltas[_was(obj, "merchant_id")] -= 1
+    for obj in session.dirty:
+        if not isinstance(obj, Offer) or obj in session.new:
+            continue
+        before = (_was(obj, "merchant_id"), _is_active(_was(obj, "is_active")))
+        after = (obj.merchant_id, _is_active(obj.is_active))
+        if before == after:
+            continue
+        if before[1]:
+            deltas[before[0]] -= 1
+        if after[1]:
+            deltas[after[0]] += 1
+    if deltas:
+        adjust_active_offers(session.connection(), deltas)
+
+
+def reconcile(db: Session) -> int:
+    """Recount active offers for merchants whose stored count drifted; returns merchants fixed."""
+    actual = count_of(Offer.merchant_id, Merchant.id, Offer.is_active == True)
+    result = db.execute(
+        update(Merchant)
+        .where(Merchant.active_offers_count != actual)
+        .values(active_offers_count=actual)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return max(result.rowcount, 0)
+
+
+# ---------------- Clicks and conversions (Redis) ----------------
+
+def record(kind: str, merchant_ids: Iterable[int], now: datetime | None = None, pipe=None) -> None:
+    """Count events for merchants in the current hour's bucket; queued on ``pipe`` when given."""
+    counts = Counter(int(mid) for mid in merchant_ids if mid is not None)
+    if not counts:
+        return
+    key = bucket_key(kind, now or datetime.utcnow())
+    try:
+        target = pipe if pipe is not None else redis_client.pipeline(transaction=False)
+        for mid, n in counts.items():
+            target.zincrby(key, n, str(mid))
+        target.expire(key, (WINDOW_HOURS + 1) * 3600, nx=True)
+        if pipe is None:
+            target.execute()
+    except Exception:
+        # Fail open: a lost event only nudges a card's number until it ages out
+        return
+
+
+def record_clicks(merchant_ids: Iterable[int], now: datetime | None = None, pipe=None) -> None:
+    record(CLICKS, merchant_ids, now, pipe)
+
+
+def record_conversions(merchant_ids: Iterable[int], now: datetime | None = None, pipe=None) -> None:
+    record(CONVERSIONS, merchant_ids, now, pipe)
+
+
+def materialize(now: datetime | None = None) -> None:
+    """Fold the last WINDOW_HOURS hourly buckets of each kind into its window set."""
+    hour = (now or datetime.utcnow()).replace(minute=0, second=0, microsecond=0)
+    pipe = redis_client.pipeline()
+    for kind in KINDS:
+        keys = [bucket_key(kind, hour - timedelta(hours=age)) for age in range(WINDOW_HOURS)]
+        pipe.zunionstore(window_key(kind), keys)
+    pipe.execute()
+
+
+async def window_counts(merchant_ids: list[int]) -> dict[int, dict[str, int]]:
+    """Materialized 24h clicks and conversions for ``merchant_ids`` (zeros when unknown).
+
+    Read by the async merchant routes, so over the asyncio client.
+    """
+    from ..redis_async import get_async_redis
+
+    counts = {mid: {"clicks_24h": 0, "conversions_24h": 0} for mid in merchant_ids}
+    if not merchant_ids:
+        return counts
+    try:
+        pipe = get_async_redis().pipeline(transaction=False)
+        for kind in KINDS:
+            pipe.zmscore(window_key(kind), [str(mid) for mid in merchant_ids])
+        clicks, conversions = await pipe.execute()
+    except Exception:
+        return counts
+    for mid, c, v in zip(merchant_ids, clicks, conversions):
+        counts[mid] = {"clicks_24h": int(c or 0), "conversions_24h": int(v or 0)}
+    return counts
@@ -0,0 +1,118 @@
+"""Catalog search over merchants, offers and products.
+
+One round trip per page: a single ``UNION ALL`` over the three entity types,
+each branch matched through indexes only (see migration 007_search_index):
+
+- full text: ``search_vector @@ websearch_to_tsquery(q)`` (GIN on the stored
+  tsvector),
+- typos: ``q <% name`` word similarity (GIN trigram index),
+- substrings: ``name ILIKE '%q%'`` (same trigram index).
+
+Every branch emits the same columns, so ranking, ordering and pagination
+happen once in SQL: ``relevance = ts_rank_cd + SIMILARITY_WEIGHT * word_similarity``.
+``COUNT(*) OVER ()`` carries the total matches on each row, so no second query.
+"""
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import get_settings
+
+settings = get_settings()
+
+ENTITY_TYPES = ("merchant", "offer", "product")
+
+_BRANCHES = {
+    "merchant": """
+        SELECT 'merchant' AS type, m.id, m.name AS title, m.description, m.logo_url AS image_url,
+               '/merchants/' || m.slug AS url, NULL AS merchant,
+               ts_rank_cd(m.search_vector, query.ts, 32) AS text_rank,
+               word_similarity(:q, m.name) AS name_similarity
+        FROM merchants m, query
+        WHERE m.is_active
+          AND (m.search_vector @@ query.ts OR :q <% m.name OR m.name ILIKE :q_like)
+    """,
+    "offer": """
+        SELECT 'offer' AS type, o.id, o.title, NULL AS description, o.image_url,
+               '/merchants/' || m.slug || '#offer-' || o.id AS url, m.name AS merchant,
+               ts_rank_cd(o.search_vector, query.ts, 32) AS text_rank,
+               word_similarity(:q, o.title) AS name_similarity
+        FROM offers o JOIN merchants m ON m.id = o.merchant_id, query
+        WHERE o.is_active AND m.is_active
+          AND (o.search_vector @@ query.ts OR :q <% o.title OR o.title ILIKE :q_like)
+    """,
+    "product": """
+        SELECT 'product' AS type, p.id, p.name AS title, NULL AS description, p.image_url,
+               '/products/' || p.slug AS url, m.name AS merchant,
+               ts_rank_cd(p.search_vector, query.ts, 32) AS text_rank,
+               word_similarity(:q, p.name) AS name_similarity
+        FROM products p JOIN merchants m ON m.id = p.merchant_id, query
+        WHERE p.is_active AND m.is_active
+          AND (p.search_vector @@ query.ts OR :q <% p.name OR p.name ILIKE :q_like)
+    """,
+}
+
+
+def build_search_sql(types: tuple[str, ...] = ENTITY_TYPES) -> str:
+    """Assemble the UNION for the requested entity types (fixed fragments only)."""
+    union = " UNION ALL ".join(_BRANCHES[t] for t in types)
+    return f"""
+        WITH query AS (SELECT websearch_to_tsquery('english', :q) AS ts)
+        SELECT type, id, title, description, image_url, url, merchant,
+               text_rank + :similarity_weight * name_similarity AS relevance,
+               COUNT(*) OVER () AS total
+        FROM ({union}) hits
+        ORDER BY relevance DESC, type, id
+        LIMIT :limit OFFSET :offset
+    """
+
+
+def _like_pattern(q: str) -> str:
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+async def search_catalog(db: AsyncSession, q: str, type: str | None = None, limit: int = 20, offset: int = 0) -> dict:
+    """Return one page of ranked hits plus the total number of matches."""
+    types = (type,) if type else ENTITY_TYPES
+    search = text(build_search_sql(types))
+    # The setting is local to a transaction, so both statements run on the one
+    # connection (and replica) the session's transaction holds
+    conn = await db.connection(bind_arguments={"clause": search})
+    # Makes ``<%`` tolerate one or two typos
+    await conn.execute(
+        text("SELECT set_config('pg_trgm.word_similarity_threshold', :t, true)"),
+        {"t": str(settings.SEARCH_TRIGRAM_THRESHOLD)},
+    )
+    rows = (await conn.execute(
+        search,
+        {
+            "q": q,
+            "q_like": _like_pattern(q),
+            "similarity_weight": settings.SEARCH_SIMILARITY_WEIGHT,
+            "limit": limit,
+            "offset": offset,
+        },
+    )).all()
+
+    results = []
+    for row in rows:
+        hit = {
+            "type": row.type,
+            "id": row.id,
+            "title": row.title,
+            "description": row.description,
+            "image_url": row.image_url,
+            "url": row.url,
+            "relevance": round(float(row.relevance or 0.0), 4),
+        }
+        if row.merchant is not None:
+            hit["merchant"] = row.merchant
+        results.append(hit)
+
+    return {
+        "results": results,
+        # Past the last page there are no rows to carry the window count
+        "total": rows[0].total if rows else 0,
+        "limit": limit,
+        "offset": offset,
+    }
@@ -0,0 +1,195 @@
+"""Trending offers from time-bucketed click and view counters.
+
+Events only touch Redis: each click or view increments the offer in an hourly
+sorted set (``trending:clicks:<YYYYMMDDHH>``, ``trending:views:<...>``) that
+expires once it is older than the largest window.
+
+``materialize`` (every TRENDING_REFRESH_MINUTES from workers.cron_jobs) folds
+the hourly buckets of each window in TRENDING_WINDOWS_DAYS with ZUNIONSTORE:
+
+- weighted by exponential decay, half-life = window / TRENDING_DECAY_HALF_LIVES,
+  to get a CTR that favours recent activity;
+- unweighted, to get the raw counts shown to users and the TRENDING_MIN_VIEWS
+  cut-off.
+
+The top TRENDING_TOP_N active offers per window are written, already rendered,
+to ``trending:top:<days>d`` with their rank as score, so serving a page is one
+ZREVRANGE.
+"""
+import json
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..config import get_settings
+from ..models import Merchant, Offer
+from ..redis_client import redis_client, rk
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+CLICKS = "clicks"
+VIEWS = "views"
+
+WINDOWS_DAYS: tuple[int, ...] = tuple(sorted(int(d) for d in settings.TRENDING_WINDOWS_DAYS.split(",") if d.strip()))
+
+
+def bucket_key(kind: str, hour: datetime) -> str:
+    return rk("trending", kind, hour.strftime("%Y%m%d%H"))
+
+
+def top_key(days: int) -> str:
+    return rk("trending", "top", f"{days}d")
+
+
+def window_for(days: int) -> int:
+    """Smallest materialized window covering ``days`` (the largest one past it)."""
+    for window in WINDOWS_DAYS:
+        if window >= days:
+            return window
+    return WINDOWS_DAYS[-1]
+
+
+# ---------------- Counting ----------------
+
+def _record(kind: str, offer_ids: Iterable[int], now: datetime | None = None, pipe=None) -> None:
+    counts = Counter(int(offer_id) for offer_id in offer_ids)
+    if not counts:
+        return
+    key = bucket_key(kind, now or datetime.utcnow())
+    try:
+        target = pipe if pipe is not None else redis_client.pipeline(transaction=False)
+        for offer_id, n in counts.items():
+            target.zincrby(key, n, str(offer_id))
+        target.expire(key, (WINDOWS_DAYS[-1] + 1) * 86400, nx=True)
+        if pipe is None:
+            target.execute()
+    except Exception:
+        # Fail open: a lost event only nudges a ranking
+        return
+
+
+def record_click(offer_id: int, now: datetime | None = None, pipe=None) -> None:
+    _record(CLICKS, [offer_id], now, pipe)
+
+
+def record_clicks(offer_ids: Iterable[int], now: datetime | None = None, pipe=None) -> None:
+    """Count a batch of clicks in ``now``'s hourly bucket; queued on ``pipe`` when given."""
+    _record(CLICKS, offer_ids, now, pipe)
+
+
+def record_view(offer_id: int, now: datetime | None = None) -> None:
+    _record(VIEWS, [offer_id], now)
+
+
+# ---------------- Materialization (background) ----------------
+
+def _window_scores(days: int, hour: datetime) -> dict[int, dict]:
+    """Per offer: raw clicks/views, decayed CTR and decayed clicks over the window ending at ``hour``."""
+    hours = days * 24
+    half_life = hours / settings.TRENDING_DECAY_HALF_LIVES
+    weights = [0.5 ** (age / half_life) for age in range(hours)]
+
+    scratch = {
+        (kind, decayed): rk("trending", "tmp", f"{days}d", kind, "decayed" if decayed else "raw")
+        for kind in (CLICKS, VIEWS) for decayed in (True, False)
+    }
+    pipe = redis_client.pipeline(transaction=False)
+    for (kind, decayed), dest in scratch.items():
+        keys = [bucket_key(kind, hour - timedelta(hours=age)) for age in range(hours)]
+        pipe.zunionstore(dest, dict(zip(keys, weights)) if decayed else keys)
+    pipe.zrangebyscore(scratch[(VIEWS, False)], settings.TRENDING_MIN_VIEWS, "+inf", withscores=True)
+    pipe.zrange(scratch[(VIEWS, True)], 0, -1, withscores=True)
+    pipe.zrange(scratch[(CLICKS, True)], 0, -1, withscores=True)
+    pipe.zrange(scratch[(CLICKS, False)], 0, -1, withscores=True)
+    pipe.delete(*scratch.values())
+    *_, raw_views, decayed_views, decayed_clicks, raw_clicks, _ = pipe.execute()
+
+    decayed_views, decayed_clicks, raw_clicks = dict(decayed_views), dict(decayed_clicks), dict(raw_clicks)
+    scores = {}
+    for offer_id, views in raw_views:
+        weighted_views = decayed_views.get(offer_id, 0)
+        scores[int(offer_id)] = {
+            "clicks": int(raw_clicks.get(offer_id, 0)),
+            "views": int(views),
+            "ctr": decayed_clicks.get(offer_id, 0) / weighted_views if weighted_views else 0.0,
+            "recent_clicks": decayed_clicks.get(offer_id, 0),
+        }
+    return scores
+
+
+def _render(db: Session, ranked: list[int], scores: dict[int, dict]) -> list[dict]:
+    """Top N of ``ranked`` that are still active, in API shape."""
+    items = []
+    batch_size = settings.TRENDING_TOP_N * 2
+    for start in range(0, len(ranked), batch_size):
+        batch = ranked[start:start + batch_size]
+        rows = {
+            offer.id: (offer, merchant)
+            for offer, merchant in db.execute(
+                select(Offer, Merchant)
+                .join(Merchant, Offer.merchant_id == Merchant.id)
+                .where(Offer.id.in_(batch), Offer.is_active == True, Merchant.is_active == True)
+            ).all()
+        }
+        for offer_id in batch:
+            if offer_id not in rows:
+                continue
+            offer, merchant = rows[offer_id]
+            stats = scores[offer_id]
+            items.append({
+                "id": offer.id,
+                "title": offer.title,
+                "code": offer.code,
+                "image_url": offer.image_url,
+                "merchant": {"name": merchant.name, "slug": merchant.slug, "logo_url": merchant.logo_url},
+                "stats": {"clicks": stats["clicks"], "views": stats["views"], "ctr": round(stats["ctr"], 4)},
+            })
+            if len(items) == settings.TRENDING_TOP_N:
+                return items
+    return items
+
+
+def materialize(db: Session, now: datetime | None = None) -> dict[int, int]:
+    """Recompute the top offers of every window; returns {days: offers written}."""
+    hour = (now or datetime.utcnow()).replace(minute=0, second=0, microsecond=0)
+    written = {}
+    for days in WINDOWS_DAYS:
+        scores = _window_scores(days, hour)
+        # CTR first; among equals, the offer whose clicks are more recent
+        ranked = sorted(scores, key=lambda oid: (scores[oid]["ctr"], scores[oid]["recent_clicks"]), reverse=True)
+        items = _render(db, ranked, scores)
+
+        staging = rk("trending", "tmp", f"{days}d", "top")
+        pipe = redis_client.pipeline()
+        pipe.delete(staging)
+        if items:
+            # Score = rank, so ZREVRANGE returns them in order without tie-breaking on the JSON
+            pipe.zadd(staging, {json.dumps(item): len(items) - i for i, item in enumerate(items)})
+            pipe.rename(staging, top_key(days))
+        else:
+            pipe.delete(top_key(days))
+        pipe.set(rk("trending", "built", f"{days}d"), datetime.utcnow().isoformat())
+        pipe.execute()
+        written[days] = len(items)
+    return written
+
+
+# ---------------- Serving ----------------
+
+async def get_top(days: int, limit: int) -> list[dict] | None:
+    """Materialized top offers for the window, or None if it has never been built."""
+    from ..redis_async import get_async_redis
+
+    try:
+        client = get_async_redis()
+        members = await client.zrevrange(top_key(days), 0, limit - 1)
+        if not members and not await client.exists(rk("trending", "built", f"{days}d")):
+            return None
+    except Exception:
+        return None
+    return [json.loads(m) for m in members]
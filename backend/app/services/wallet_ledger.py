@@ -0,0 +1,75 @@
+"""Materialized wallet totals.
+
+``wallet_aggregates`` holds each user's lifetime credit, lifetime debit and
+approved withdrawals. Every write path bumps it in the same database
+transaction as the ledger row it describes, with an atomic
+``INSERT ... ON CONFLICT DO UPDATE SET x = x + :delta``, so concurrent writers
+never lose an increment and the wallet summary is a single-row read.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..database import upsert_insert
+from ..models import WalletAggregate, WalletTransaction
+
+_FIELDS = ("lifetime_credit", "lifetime_debit", "total_withdrawn")
+
+
+def _upsert(db: Session):
+    table = WalletAggregate.__table__
+    stmt = upsert_insert(db, table)
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={
+            **{field: table.c[field] + stmt.excluded[field] for field in _FIELDS},
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+
+
+def _deltas(user_id: int, credit=0, debit=0, withdrawn=0) -> dict:
+    return {
+        "user_id": user_id,
+        "lifetime_credit": Decimal(str(credit)),
+        "lifetime_debit": Decimal(str(debit)),
+        "total_withdrawn": Decimal(str(withdrawn)),
+        "updated_at": datetime.utcnow(),
+    }
+
+
+def bump(db: Session, user_id: int, *, credit=0, debit=0, withdrawn=0) -> None:
+    """Add to one user's totals inside the caller's transaction."""
+    db.execute(_upsert(db), [_deltas(user_id, credit, debit, withdrawn)])
+
+
+def bump_many(db: Session, deltas: Iterable[tuple[int, float]]) -> None:
+    """Apply signed ledger amounts for many users in one executemany."""
+    rows = [
+        _deltas(user_id, credit=amount if amount > 0 else 0, debit=-amount if amount < 0 else 0)
+        for user_id, amount in deltas
+    ]
+    if rows:
+        db.execute(_upsert(db), rows)
+
+
+def record_transaction(db: Session, **fields) -> WalletTransaction:
+    """Add a wallet transaction and count it in the user's totals; the caller commits."""
+    transaction = WalletTransaction(**fields)
+    db.add(transaction)
+    amount = fields["amount"]
+    bump(db, fields["user_id"], credit=amount if amount > 0 else 0, debit=-amount if amount < 0 else 0)
+    return transaction
+
+
+def totals(db: Session, user_id: int) -> dict:
+    """The user's totals (zeros before their first wallet movement)."""
+    row = db.execute(
+        select(*(WalletAggregate.__table__.c[field] for field in _FIELDS)).where(WalletAggregate.user_id == user_id)
+    ).first()
+    return {field: float(row[i] or 0) if row else 0.0 for i, field in enumerate(_FIELDS)}
@@ -1,25 +1,49 @@
+"""Affiliate transaction import.
+
+Transactions stream from the network clients and are imported in chunks of
+AFFILIATE_SYNC_CHUNK_SIZE, so memory stays flat however many rows a network
+returns. Per chunk:
+
+- one ``IN (...)`` query for the transactions already stored, one for the
+  clicks they reference (merchant maps are prefetched once per run);
+- new rows go in with a single ``INSERT ... ON CONFLICT DO NOTHING RETURNING``,
+  status changes with one executemany UPDATE;
+- one commit, then the per-network row count is checkpointed in Redis so a
+  re-run over the same window skips rows that are already committed, and
+  the new conversions are counted for their merchants' cards.
+
+The importer only records transactions. Cashback for confirmed ones is priced
+by the rule engine and created as pending events by
+``generate_cashback_events`` (app/tasks/cashback.py), which the approval step
+then credits to wallets.
+
+Networks are fetched concurrently, so their rows interleave; each network
+still pages in a stable order, so its count identifies its rows; if one
+ever reorders, the worst case is a row left for the next nightly window.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import AsyncIterator
+
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
-from ..models import AffiliateTransaction, CashbackEvent, AffiliateClick, AffiliateMerchantMap
-from ..services.affiliate_clients import AdmitadClient, VCommissionClient, CueLinksClient
+
+from ..models import AffiliateTransaction, AffiliateClick, AffiliateMerchantMap
+from ..services import merchant_counters
+from ..services.affiliate_clients import fetch_all_networks
 from ..config import get_settings
-from typing import List
-import asyncio
+from ..database import upsert_insert
 from ..metrics import observe_affiliate_sync
+from ..redis_client import redis_client, rk
 
+logger = logging.getLogger(__name__)
 settings = get_settings()
 
-async def fetch_all():
-    admitad = AdmitadClient(settings.ADMITAD_CLIENT_ID, settings.ADMITAD_CLIENT_SECRET, settings.ADMITAD_TOKEN)
-    vcom = VCommissionClient(settings.VCOMMISSION_API_KEY)
-    cuelinks = CueLinksClient(settings.CUELINKS_API_KEY)
-    results = []
-    async for tx in admitad.fetch_transactions():
-        results.append(("admitad", tx))
-    async for tx in vcom.fetch_transactions():
-        results.append(("vcommission", tx))
-    async for tx in cuelinks.fetch_transactions():
-        results.append(("cuelinks", tx))
-    return results
+async def fetch_all(start_date: datetime, end_date: datetime) -> AsyncIterator[tuple[str, dict]]:
+    """Yield (network, transaction) from every network, fetched concurrently, as pages arrive."""
+    async for network, tx in fetch_all_networks(start_date, end_date):
+        yield network, tx
 
 STATUS_MAP = {
     "pending": "pending",
@@ -29,74 +53,167 @@ STATUS_MAP = {
     "declined": "rejected",
 }
 
-def sync_affiliate_transactions(db: Session) -> dict:
-    try:
-        # Use asyncio.run in thread context where no loop exists
-        results = asyncio.run(fetch_all())
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            results = loop.run_until_complete(fetch_all())
-        finally:
-            loop.close()
-    imported = 0
-    updated = 0
-    for network, raw in results:
+
+def _merchant_map(db: Session) -> dict[tuple[str, str], int]:
+    # Ordered by id so the newest mapping wins, as the per-row lookup did
+    rows = db.execute(
+        select(AffiliateMerchantMap.network, AffiliateMerchantMap.external_merchant_id, AffiliateMerchantMap.merchant_id)
+        .order_by(AffiliateMerchantMap.id)
+    ).all()
+    return {(network, ext_id): merchant_id for network, ext_id, merchant_id in rows}
+
+
+def import_chunk(db: Session, chunk: list[tuple[str, dict]], merchant_map: dict[tuple[str, str], int]) -> tuple[int, int]:
+    """Import one chunk and commit it; returns (imported, updated)."""
+    # Last occurrence wins when a network repeats a transaction within the chunk
+    incoming = {(network, raw["external_id"]): (network, raw) for network, raw in chunk}
+
+    # Plain IN lists use the external id index; a chunk is almost always one network
+    existing = {
+        (tx.network, tx.external_transaction_id): tx
+        for tx in db.execute(
+            select(
+                AffiliateTransaction.id, AffiliateTransaction.network, AffiliateTransaction.external_transaction_id,
+                AffiliateTransaction.status, AffiliateTransaction.imported_at, AffiliateTransaction.confirmed_at,
+            ).where(
+                AffiliateTransaction.network.in_({network for network, _ in incoming}),
+                AffiliateTransaction.external_transaction_id.in_({ext_id for _, ext_id in incoming}),
+            )
+        ).all()
+        if (tx.network, tx.external_transaction_id) in incoming
+    }
+
+    click_ext_ids = {raw.get("click_ext_id") for key, (_, raw) in incoming.items() if key not in existing} - {None}
+    clicks = {}
+    if click_ext_ids:
+        for click in db.execute(
+            select(AffiliateClick.id, AffiliateClick.user_id, AffiliateClick.external_click_id)
+            .where(AffiliateClick.external_click_id.in_(click_ext_ids))
+            .order_by(AffiliateClick.id)
+        ).all():
+            clicks[click.external_click_id] = click
+
+    new_rows, status_updates = [], []
+    now = datetime.utcnow()
+    for key, (network, raw) in incoming.items():
         status = STATUS_MAP.get(raw.get("status", "pending"), "pending")
-        external_id = raw["external_id"]
-        click_ext_id = raw.get("click_ext_id")
-        merchant_ext_id = raw.get("merchant_ext_id")
-
-        existing = db.query(AffiliateTransaction).filter_by(external_transaction_id=external_id).first()
-        if existing:
-            if existing.status != status:
-                existing.status = status
-                updated += 1
-                if status == "confirmed" and not existing.confirmed_at:
-                    existing.confirmed_at = existing.imported_at
-                    # Create cashback event if becomes confirmed
-                    if existing.user_id:
-                        db.add(CashbackEvent(user_id=existing.user_id, amount=existing.amount, status="confirmed"))
+        current = existing.get(key)
+        if current:
+            if current.status != status:
+                change = {"id": current.id, "status": status}
+                if status == "confirmed" and not current.confirmed_at:
+                    change["confirmed_at"] = current.imported_at
+                status_updates.append(change)
             continue
 
-        click = None
-        if click_ext_id:
-            click = (
-                db.query(AffiliateClick)
-                .filter_by(external_click_id=click_ext_id)
-                .order_by(AffiliateClick.id.desc())
-                .first()
-            )
+        click = clicks.get(raw.get("click_ext_id"))
+        new_rows.append({
+            "network": network,
+            "external_transaction_id": raw["external_id"],
+            "status": status,
+            # Clients report the commission as commission_amount
+            "amount": raw.get("commission_amount", raw.get("amount", 0)) or 0,
+            "click_id": click.id if click else None,
+            "user_id": click.user_id if click else None,
+            "merchant_id": merchant_map.get((network, raw.get("merchant_ext_id"))),
+            "created_at": now,
+            "imported_at": now,
+        })
 
-        merchant_id = None
-        if merchant_ext_id:
-            m_map = (
-                db.query(AffiliateMerchantMap)
-                .filter_by(network=network, external_merchant_id=merchant_ext_id)
-                .order_by(AffiliateMerchantMap.id.desc())
-                .first()
-            )
-            if m_map:
-                merchant_id = m_map.merchant_id
-
-        tx = AffiliateTransaction(
-            network=network,
-            external_transaction_id=external_id,
-            status=status,
-            amount=raw.get("amount", 0) or 0,
-            click_id=click.id if click else None,
-            user_id=click.user_id if click else None,
-            merchant_id=merchant_id,
-        )
-        db.add(tx)
-        imported += 1
-        if status == "confirmed" and tx.user_id:
-            db.add(CashbackEvent(user_id=tx.user_id, amount=tx.amount, status="confirmed"))
+    imported = 0
+    if new_rows:
+        # A concurrent run may have inserted some of these since the lookup; those are skipped
+        inserted = db.connection().execute(
+            upsert_insert(db, AffiliateTransaction.__table__)
+            .on_conflict_do_nothing(index_elements=["network", "external_transaction_id"])
+            .returning(AffiliateTransaction.__table__.c.merchant_id),
+            new_rows,
+        ).all()
+        imported = len(inserted)
+
+    if status_updates:
+        db.execute(update(AffiliateTransaction), status_updates)
     db.commit()
+    if new_rows:
+        merchant_counters.record_conversions(row.merchant_id for row in inserted)
+    return imported, len(status_updates)
+
+
+def _checkpoint_key(start_date: datetime, end_date: datetime) -> str:
+    return rk("affiliate_sync", "checkpoint", f"{start_date:%Y%m%d}-{end_date:%Y%m%d}")
+
+
+def _load_checkpoint(key: str) -> dict[str, int]:
+    try:
+        return {network: int(count) for network, count in redis_client.hgetall(key).items()}
+    except Exception:
+        # Without a checkpoint the upsert just re-reads committed rows
+        return {}
+
+
+def _save_checkpoint(key: str, committed: dict[str, int]) -> None:
+    try:
+        pipe = redis_client.pipeline()
+        pipe.hset(key, mapping=committed)
+        pipe.expire(key, 86400)
+        pipe.execute()
+    except Exception:
+        return
+
+
+async def import_transactions(db: Session, start_date: datetime, end_date: datetime) -> dict:
+    """Stream every network's transactions for the window into the database."""
+    chunk_size = settings.AFFILIATE_SYNC_CHUNK_SIZE
+    checkpoint_key = _checkpoint_key(start_date, end_date)
+    resume_from = _load_checkpoint(checkpoint_key)
+    committed: dict[str, int] = {}
+    merchant_map = _merchant_map(db)
+    imported = updated = total = skipped = 0
+
+    chunk: list[tuple[str, dict]] = []
+
+    def flush():
+        nonlocal imported, updated
+        chunk_imported, chunk_updated = import_chunk(db, chunk, merchant_map)
+        imported += chunk_imported
+        updated += chunk_updated
+        for network, _ in chunk:
+            committed[network] = committed.get(network, 0) + 1
+        _save_checkpoint(checkpoint_key, committed)
+        chunk.clear()
+
+    seen: dict[str, int] = {}
+    async for network, raw in fetch_all(start_date, end_date):
+        total += 1
+        seen[network] = seen.get(network, 0) + 1
+        if seen[network] <= resume_from.get(network, 0):
+            # Committed by an interrupted earlier run over this window
+            committed[network] = seen[network]
+            skipped += 1
+            continue
+        chunk.append((network, raw))
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+
+    try:
+        redis_client.delete(checkpoint_key)
+    except Exception:
+        pass
+    if skipped:
+        logger.info(f"Affiliate sync resumed past {skipped} already committed transactions")
+    return {"imported": imported, "updated": updated, "total": total}
+
+
+def sync_affiliate_transactions(db: Session, days_back: int | None = None) -> dict:
+    """Blocking entry point for the admin route and schedulers; call it off the event loop."""
+    end_date = datetime.utcnow()
+    start_date = end_date - timedelta(days=days_back or settings.AFFILIATE_SYNC_DAYS_BACK)
+    result = asyncio.run(import_transactions(db, start_date, end_date))
     # Metrics
     try:
-        observe_affiliate_sync(imported=imported, updated=updated, total_fetched=len(results))
+        observe_affiliate_sync(imported=result["imported"], updated=result["updated"], total_fetched=result["total"])
     except Exception:
         pass
-    return {"imported": imported, "updated": updated, "total": len(results)}
+    return result
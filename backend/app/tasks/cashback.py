@@ -0,0 +1,152 @@
+"""Set-based cashback generation and approval.
+
+Both steps work through their backlog in batches of CASHBACK_BATCH_SIZE. Each
+batch claims its rows with ``SELECT ... FOR UPDATE SKIP LOCKED`` and commits,
+so several workers can share the backlog without double-paying anything:
+
+- ``generate_cashback_events``: the claim query resolves each confirmed
+  transaction's user through its click, the compiled rule index
+  (app/services/cashback_rules.py) prices the whole batch in one pass, and
+  one ``INSERT ... ON CONFLICT DO NOTHING`` writes the pending events.
+- ``approve_cashback_events``: pending events older than
+  CASHBACK_AUTO_APPROVE_DAYS are confirmed, and one ``UPDATE ... FROM`` credits
+  each user's wallet with the batch total, recorded as one ``cashback``
+  wallet transaction per user.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import exists, func, insert, literal, select, true, update
+from sqlalchemy.orm import Session
+
+from ..config import get_settings
+from ..database import upsert_insert
+from ..models import AffiliateClick, AffiliateTransaction, CashbackEvent, WalletBalance, WalletTransaction
+from ..services import wallet_ledger
+from ..services.cashback_rules import get_rules
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+def _user_id():
+    # Imported transactions carry the click's user; older rows may only have the click
+    return func.coalesce(AffiliateTransaction.user_id, AffiliateClick.user_id)
+
+
+def _claim_transactions(db: Session, batch_size: int):
+    """Lock the next batch of confirmed transactions that have no cashback event yet."""
+    return db.execute(
+        select(AffiliateTransaction.id, _user_id().label("user_id"), AffiliateTransaction.amount, AffiliateTransaction.merchant_id)
+        .outerjoin(AffiliateClick, AffiliateClick.id == AffiliateTransaction.click_id)
+        .where(
+            AffiliateTransaction.status == "confirmed",
+            _user_id().is_not(None),
+            ~exists().where(CashbackEvent.affiliate_transaction_id == AffiliateTransaction.id),
+        )
+        .order_by(AffiliateTransaction.id)
+        .limit(batch_size)
+        .with_for_update(of=AffiliateTransaction, skip_locked=True)
+    ).all()
+
+
+def generate_cashback_events(db: Session, batch_size: int | None = None) -> int:
+    """Create pending cashback events for confirmed transactions; returns how many were created."""
+    batch_size = batch_size or settings.CASHBACK_BATCH_SIZE
+    created = 0
+    while True:
+        batch = _claim_transactions(db, batch_size)
+        if not batch:
+            break
+        # Transactions carry no category (offers are not categorised), so rules resolve by merchant
+        amounts = get_rules(db).evaluate((tx.amount, tx.merchant_id, None) for tx in batch)
+        now = datetime.utcnow()
+        inserted = db.execute(
+            upsert_insert(db, CashbackEvent.__table__)
+            .on_conflict_do_nothing(index_elements=["affiliate_transaction_id"])
+            .returning(CashbackEvent.__table__.c.id),
+            [
+                {"user_id": tx.user_id, "affiliate_transaction_id": tx.id, "amount": amount, "status": "pending", "created_at": now}
+                for tx, amount in zip(batch, amounts)
+            ],
+        ).all()
+        created += len(inserted)
+        db.commit()
+        if len(batch) < batch_size:
+            break
+    logger.info(f"Created {created} cashback events")
+    return created
+
+
+def _claim_events(db: Session, cutoff: datetime, batch_size: int) -> list[int]:
+    """Lock the next batch of pending events created before ``cutoff``."""
+    return db.scalars(
+        select(CashbackEvent.id)
+        .where(CashbackEvent.status == "pending", CashbackEvent.created_at < cutoff)
+        .order_by(CashbackEvent.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+
+
+def _credit_batch(db: Session, event_ids: list[int], now: datetime) -> None:
+    """Confirm the events and credit each user's wallet with their total, in the caller's transaction."""
+    db.execute(
+        update(CashbackEvent.__table__)
+        .where(CashbackEvent.id.in_(event_ids))
+        .values(status="confirmed", confirmed_at=now)
+    )
+    totals = (
+        select(CashbackEvent.user_id, func.sum(CashbackEvent.amount).label("total"))
+        .where(CashbackEvent.id.in_(event_ids))
+        .group_by(CashbackEvent.user_id)
+        .subquery()
+    )
+    # Users approved for the first time get a wallet row to credit
+    db.execute(
+        upsert_insert(db, WalletBalance.__table__)
+        .from_select(["user_id", "balance"], select(totals.c.user_id, literal(0)).where(true()))
+        .on_conflict_do_nothing(index_elements=["user_id"])
+    )
+    credited = dict(db.execute(select(totals.c.user_id, totals.c.total)).all())
+    balances = db.execute(
+        update(WalletBalance.__table__)
+        .where(WalletBalance.user_id == totals.c.user_id)
+        .values(balance=WalletBalance.balance + totals.c.total)
+        .returning(WalletBalance.user_id, WalletBalance.balance)
+    ).all()
+    db.execute(
+        insert(WalletTransaction),
+        [
+            {
+                "user_id": user_id,
+                "amount": credited[user_id],
+                "type": "cashback",
+                "reference": "cashback_auto_approve",
+                "description": "Confirmed cashback credited to wallet",
+                "balance_after": balance,
+                "created_at": now,
+            }
+            for user_id, balance in balances
+        ],
+    )
+    wallet_ledger.bump_many(db, credited.items())
+
+
+def approve_cashback_events(db: Session, older_than_days: int | None = None, batch_size: int | None = None) -> int:
+    """Confirm pending cashback past the holding period and credit wallets; returns events approved."""
+    batch_size = batch_size or settings.CASHBACK_BATCH_SIZE
+    older_than_days = settings.CASHBACK_AUTO_APPROVE_DAYS if older_than_days is None else older_than_days
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    approved = 0
+    while True:
+        event_ids = _claim_events(db, cutoff, batch_size)
+        if not event_ids:
+            break
+        _credit_batch(db, event_ids, datetime.utcnow())
+        db.commit()
+        approved += len(event_ids)
+        if len(event_ids) < batch_size:
+            break
+    logger.info(f"Auto-approved {approved} cashback events")
+    return approved
@@ -0,0 +1,203 @@
+"""Newsletter campaign fan-out.
+
+Sending a campaign only marks it ``sending`` (``start_campaign``); the cron
+worker then calls ``deliver_campaigns`` every minute, which works through
+campaigns that are sending, or scheduled and due, for up to
+NEWSLETTER_SLICE_SECONDS per run. For each campaign it:
+
+1. streams active subscribers past the campaign's checkpoint
+   (``last_subscriber_id``) in id order through a server-side cursor, in
+   chunks of NEWSLETTER_CHUNK_SIZE;
+2. pushes each chunk as email jobs of NEWSLETTER_RECIPIENTS_PER_JOB
+   recipients in one Redis pipeline. The campaign is rendered once per run
+   with tokens for the per-recipient fields; its subject and body travel once
+   per job and are sent as-is, and each recipient carries only its
+   substitutions (name, unsubscribe link);
+3. COPYs a ``queued`` NewsletterDelivery row per recipient and advances the
+   checkpoint and ``sent_count`` in the same commit;
+4. sleeps as needed to stay under NEWSLETTER_SEND_RATE_PER_SECOND.
+
+A crashed or time-sliced send resumes from the checkpoint on the next run.
+Jobs are pushed before the checkpoint commits, so a crash between the two
+re-sends at most that one chunk rather than skipping it. Progress
+(``campaign_progress``) is readable while the send runs.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import quote
+
+from sqlalchemy import Connection, func, or_, select
+from sqlalchemy.orm import Session
+
+from ..config import get_settings
+from ..database import copy_rows
+from ..models.newsletter import NewsletterCampaign, NewsletterDelivery, NewsletterSubscriber
+from ..queue import EMAIL_QUEUE, email_batch_job, push_email_jobs
+from ..redis_client import redis_client
+from ..templating import Prerendered, prerender_email, token
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+EMAIL_TYPE = "newsletter_campaign"
+RECIPIENT_FIELDS = ("name", "unsubscribe_url")
+DELIVERY_COLUMNS = ["campaign_id", "subscriber_id", "status", "sent_at"]
+
+
+def _active_subscribers():
+    return select(func.count()).select_from(NewsletterSubscriber).where(NewsletterSubscriber.status == "active")
+
+
+def start_campaign(db: Session, campaign: NewsletterCampaign) -> int:
+    """Queue ``campaign`` for fan-out; returns the number of recipients it will reach.
+
+    With no active subscribers the campaign is left as it was and 0 returned.
+    """
+    total = db.scalar(_active_subscribers())
+    if not total:
+        return 0
+    campaign.status = "sending"
+    campaign.total_recipients = total
+    campaign.sent_count = 0
+    campaign.last_subscriber_id = 0
+    campaign.started_at = datetime.utcnow()
+    db.commit()
+    return total
+
+
+def unsubscribe_url(email: str) -> str:
+    return f"{settings.FRONTEND_BASE_URL}/newsletter/unsubscribe?email={quote(email)}"
+
+
+@contextmanager
+def _stream_connection(db: Session):
+    """A connection for the subscriber cursor that outlives the session's per-chunk commits."""
+    bind = db.get_bind()
+    if isinstance(bind, Connection):  # session joined to an outer connection (tests)
+        yield bind
+        return
+    with bind.connect() as connection:
+        yield connection
+
+
+def _campaign_data(campaign: NewsletterCampaign) -> dict:
+    return {
+        "subject": campaign.subject,
+        "preview_text": campaign.preview_text,
+        "html_content": campaign.html_content,
+        "campaign_id": campaign.id,
+        "unsubscribe_url": token("unsubscribe_url"),
+    }
+
+
+def _jobs_for(campaign: NewsletterCampaign, body: Prerendered, subscribers: list) -> list[dict]:
+    recipients = [
+        {
+            "to": email,
+            "substitutions": body.substitutions({"name": name or "there", "unsubscribe_url": unsubscribe_url(email)}),
+        }
+        for _, email, name in subscribers
+    ]
+    size = settings.NEWSLETTER_RECIPIENTS_PER_JOB
+    return [
+        email_batch_job(
+            EMAIL_TYPE,
+            recipients[start:start + size],
+            {"campaign_id": campaign.id},
+            job_id=f"newsletter_{campaign.id}_{subscribers[start][0]}",
+            subject=body.subject,
+            html=body.html,
+        )
+        for start in range(0, len(recipients), size)
+    ]
+
+
+def deliver_campaign(db: Session, campaign: NewsletterCampaign, deadline: float | None = None) -> bool:
+    """Fan ``campaign`` out from its checkpoint until done or ``deadline`` (monotonic); True when done."""
+    chunk_size = settings.NEWSLETTER_CHUNK_SIZE
+    rate = settings.NEWSLETTER_SEND_RATE_PER_SECOND
+    if campaign.status != "sending":
+        start_campaign(db, campaign)
+    body = prerender_email(EMAIL_TYPE, _campaign_data(campaign), RECIPIENT_FIELDS)
+    started, enqueued = time.monotonic(), 0
+
+    query = (
+        select(NewsletterSubscriber.id, NewsletterSubscriber.email, NewsletterSubscriber.name)
+        .where(NewsletterSubscriber.status == "active", NewsletterSubscriber.id > campaign.last_subscriber_id)
+        .order_by(NewsletterSubscriber.id)
+    )
+    with _stream_connection(db) as connection:
+        result = connection.execute(query.execution_options(stream_results=True, yield_per=chunk_size))
+        for chunk in result.partitions(chunk_size):
+            if deadline is not None and time.monotonic() >= deadline:
+                result.close()
+                return False
+
+            push_email_jobs(_jobs_for(campaign, body, chunk))
+            now = datetime.utcnow()
+            copy_rows(db, NewsletterDelivery.__table__, DELIVERY_COLUMNS, [(campaign.id, sid, "queued", now) for sid, _, _ in chunk])
+            campaign.last_subscriber_id = chunk[-1][0]
+            campaign.sent_count += len(chunk)
+            campaign.checkpoint_at = now
+            db.commit()
+
+            enqueued += len(chunk)
+            if rate > 0:
+                ahead = enqueued / rate - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+    campaign.status = "sent"
+    campaign.sent_at = datetime.utcnow()
+    db.commit()
+    logger.info(f"Campaign {campaign.id} enqueued for {campaign.sent_count} subscribers")
+    return True
+
+
+def deliver_campaigns(db: Session, budget_seconds: float | None = None) -> int:
+    """Advance every sending or due campaign within ``budget_seconds``; returns campaigns finished."""
+    deadline = time.monotonic() + (budget_seconds if budget_seconds is not None else settings.NEWSLETTER_SLICE_SECONDS)
+    due = db.scalars(
+        select(NewsletterCampaign)
+        .where(or_(
+            NewsletterCampaign.status == "sending",
+            (NewsletterCampaign.status == "scheduled") & (NewsletterCampaign.send_at <= datetime.utcnow()),
+        ))
+        .order_by(NewsletterCampaign.id)
+    ).all()
+    finished = 0
+    for campaign in due:
+        if time.monotonic() >= deadline:
+            break
+        try:
+            finished += deliver_campaign(db, campaign, deadline)
+        except Exception:
+            db.rollback()
+            logger.exception(f"Campaign {campaign.id} fan-out failed; resuming from its checkpoint next run")
+    return finished
+
+
+def campaign_progress(campaign: NewsletterCampaign) -> dict:
+    """Fan-out progress for the admin dashboard, plus how much of it is still waiting in the email queue."""
+    total = campaign.total_recipients or 0
+    return {
+        "campaign_id": campaign.id,
+        "status": campaign.status,
+        "total_recipients": total,
+        "enqueued": campaign.sent_count,
+        "percent": round(100 * campaign.sent_count / total, 1) if total else (100.0 if campaign.status == "sent" else 0.0),
+        "last_subscriber_id": campaign.last_subscriber_id,
+        "started_at": campaign.started_at.isoformat() if campaign.started_at else None,
+        "checkpoint_at": campaign.checkpoint_at.isoformat() if campaign.checkpoint_at else None,
+        "sent_at": campaign.sent_at.isoformat() if campaign.sent_at else None,
+        "email_queue_pending": _email_queue_depth(),
+    }
+
+
+def _email_queue_depth() -> int | None:
+    try:
+        return redis_client.llen(EMAIL_QUEUE)
+    except Exception:
+        return None
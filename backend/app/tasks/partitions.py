@@ -0,0 +1,180 @@
+"""Partition lifecycle for the range-partitioned tables (see migration 015).
+
+``offer_clicks`` and ``order_items`` are partitioned by month on
+``created_at`` into ``<table>_pYYYYMM``, plus a ``<table>_default`` catch-all
+that should stay empty. ``manage_partitions`` (daily from workers/cron_jobs.py)
+keeps them in shape:
+
+1. creates the partitions for this month and the next PARTITION_MONTHS_AHEAD,
+   so inserts never fall through to the default partition. If the default
+   partition already holds rows for a missing month (Postgres refuses to
+   create the partition then), it is detached, the partition created, those
+   rows moved into it and the default re-attached, in one transaction;
+2. detaches partitions older than a table's PARTITION_RETENTION_MONTHS and
+   moves them to PARTITION_ARCHIVE_SCHEMA, where they stay queryable (and can
+   be dumped and dropped) without weighing on the live table. Tables without
+   a retention are never archived;
+3. reports every attached partition's size and estimated rows, and how many
+   rows sit in the default partition. The report is also stored in Redis for
+   the admin.
+
+Postgres only; elsewhere (SQLite in tests) it does nothing.
+"""
+import json
+import logging
+import re
+from datetime import date, datetime
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..config import get_settings
+from ..redis_client import redis_client, rk
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+PARTITIONED_TABLES = ("offer_clicks", "order_items")
+REPORT_KEY = rk("partitions", "report")
+REPORT_TTL_SECONDS = 7 * 86400
+_MONTHLY = re.compile(r"_p(\d{4})(\d{2})$")
+
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+def partition_month(name: str) -> date | None:
+    """The month a ``<table>_pYYYYMM`` partition holds; None for the default partition."""
+    match = _MONTHLY.search(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def retention_months() -> dict[str, int]:
+    """PARTITION_RETENTION_MONTHS ("offer_clicks=13,...") as {table: months}."""
+    retention = {}
+    for item in settings.PARTITION_RETENTION_MONTHS.split(","):
+        if "=" in item:
+            table, months = item.split("=", 1)
+            retention[table.strip()] = int(months)
+    return retention
+
+
+def attached_partitions(db: Session, table: str) -> list[str]:
+    return list(db.scalars(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :table ORDER BY c.relname"
+        ),
+        {"table": table},
+    ))
+
+
+def columns(db: Session, table: str) -> list[str]:
+    return list(db.scalars(
+        text(
+            "SELECT attname FROM pg_attribute WHERE attrelid = CAST(:table AS regclass) "
+            "AND attnum > 0 AND NOT attisdropped ORDER BY attnum"
+        ),
+        {"table": table},
+    ))
+
+
+def create_partition(db: Session, table: str, month: date) -> None:
+    """Create ``month``'s partition, first moving that month's rows out of the default partition."""
+    name, default = partition_name(table, month), f"{table}_default"
+    bounds = f"FROM ('{month}') TO ('{add_months(month, 1)}')"
+    in_month = f"created_at >= '{month}' AND created_at < '{add_months(month, 1)}'"
+    stranded = db.scalar(text(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_month})"))
+    if not stranded:
+        db.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} FOR VALUES {bounds}"))
+        return
+    logger.warning(f"Moving {table} rows for {month:%Y-%m} out of the default partition into {name}")
+    column_list = ", ".join(columns(db, table))
+    # The detach locks the parent until commit, so no row can land in between
+    db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+    db.execute(text(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES {bounds}"))
+    db.execute(text(f"INSERT INTO {name} ({column_list}) SELECT {column_list} FROM {default} WHERE {in_month}"))
+    db.execute(text(f"DELETE FROM {default} WHERE {in_month}"))
+    db.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+
+
+def ensure_partitions(db: Session, table: str, today: date) -> list[str]:
+    """Create this month's and the next PARTITION_MONTHS_AHEAD months' partitions; returns those created."""
+    existing = set(attached_partitions(db, table))
+    created = []
+    for offset in range(settings.PARTITION_MONTHS_AHEAD + 1):
+        month = add_months(month_start(today), offset)
+        name = partition_name(table, month)
+        if name in existing:
+            continue
+        create_partition(db, table, month)
+        db.commit()
+        created.append(name)
+    return created
+
+
+def archive_partitions(db: Session, table: str, keep_months: int, today: date) -> list[str]:
+    """Detach partitions older than ``keep_months`` months into the archive schema; returns those moved."""
+    cutoff = add_months(month_start(today), -keep_months)
+    archived = []
+    for name in attached_partitions(db, table):
+        month = partition_month(name)
+        if month is None or month >= cutoff:
+            continue
+        db.execute(text(f"CREATE SCHEMA IF NOT EXISTS {settings.PARTITION_ARCHIVE_SCHEMA}"))
+        db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        db.execute(text(f"ALTER TABLE {name} SET SCHEMA {settings.PARTITION_ARCHIVE_SCHEMA}"))
+        db.commit()  # one partition at a time: each detach briefly locks the parent
+        archived.append(name)
+    return archived
+
+
+def partition_sizes(db: Session, table: str) -> list[dict]:
+    rows = db.execute(
+        text(
+            "SELECT c.relname, pg_total_relation_size(c.oid), greatest(c.reltuples, 0)::bigint FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :table ORDER BY c.relname"
+        ),
+        {"table": table},
+    )
+    return [{"partition": name, "bytes": size, "rows_estimate": rows_estimate} for name, size, rows_estimate in rows]
+
+
+def manage_partitions(db: Session, now: datetime | None = None) -> dict:
+    """Create upcoming partitions, archive expired ones and report sizes, for every partitioned table."""
+    if db.get_bind().dialect.name != "postgresql":
+        return {}
+    today = (now or datetime.utcnow()).date()
+    retention = retention_months()
+    report = {"generated_at": (now or datetime.utcnow()).isoformat(), "tables": {}}
+    for table in PARTITIONED_TABLES:
+        created = ensure_partitions(db, table, today)
+        archived = archive_partitions(db, table, retention[table], today) if retention.get(table) else []
+        sizes = partition_sizes(db, table)
+        default_rows = db.scalar(text(f"SELECT count(*) FROM {table}_default"))
+        if default_rows:
+            logger.warning(f"{default_rows} {table} rows are in the default partition; a monthly partition is missing")
+        report["tables"][table] = {
+            "created": created,
+            "archived": archived,
+            "default_rows": default_rows,
+            "total_bytes": sum(part["bytes"] for part in sizes),
+            "partitions": sizes,
+        }
+    try:
+        redis_client.setex(REPORT_KEY, REPORT_TTL_SECONDS, json.dumps(report))
+    except Exception:
+        logger.warning("Could not store the partition report in Redis")
+    return report
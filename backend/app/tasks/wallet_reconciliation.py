@@ -0,0 +1,212 @@
+"""Incremental wallet reconciliation.
+
+``wallet_balances.balance`` should equal the signed sum of the user's
+``wallet_transactions``. Instead of re-reading every user's history, each run:
+
+1. aggregates only transactions newer than the stored checkpoints, with one
+   grouped query over an id range (streamed through a server-side cursor), and
+   folds the per-user sums into ``wallet_checkpoints`` with bulk upserts;
+2. streams the wallets whose balance differs from checkpoint total plus any
+   not-yet-checkpointed transactions, and corrects them with one executemany
+   UPDATE per batch (guarded on the observed balance, so a wallet credited
+   mid-run is left for the next run rather than overwritten);
+3. returns a report of the discrepancies, also stored in Redis for the admin.
+
+Ids are assigned at insert but rows become visible at commit, so a row that
+commits behind the high-water mark would be skipped for good. The mark is
+therefore the newest visible id only once every transaction that could still
+hold a lower id has finished: on PostgreSQL, the other sessions holding
+ROW EXCLUSIVE on wallet_transactions when the mark was read (the lock is taken
+before the insert draws its id). If they do not finish within
+WALLET_RECON_WRITER_WAIT_SECONDS the checkpoints stay where they are for this
+run; newer rows still count toward the expected balances.
+"""
+import json
+import logging
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import bindparam, case, func, select, text, update
+from sqlalchemy.orm import Session
+
+from ..config import get_settings
+from ..database import upsert_insert
+from ..models import WalletBalance, WalletCheckpoint, WalletTransaction
+from ..redis_client import redis_client, rk
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+CREDIT_TYPES = ("credit", "cashback", "refund")
+DEBIT_TYPES = ("debit", "withdrawal")
+TOLERANCE = Decimal("0.01")
+REPORT_KEY = rk("wallet", "reconciliation", "report")
+REPORT_TTL_SECONDS = 7 * 86400
+# Discrepancies kept in full in the report; the count is always exact
+REPORT_MAX_ITEMS = 1000
+WRITER_POLL_SECONDS = 0.1
+
+_WRITERS_SQL = text(
+    "SELECT DISTINCT virtualtransaction FROM pg_locks"
+    " WHERE locktype = 'relation' AND relation = 'wallet_transactions'::regclass"
+    " AND mode = 'RowExclusiveLock' AND granted AND pid <> pg_backend_pid()"
+)
+
+
+def _signed_amount():
+    return case(
+        (WalletTransaction.type.in_(CREDIT_TYPES), WalletTransaction.amount),
+        (WalletTransaction.type.in_(DEBIT_TYPES), -WalletTransaction.amount),
+        else_=0,
+    )
+
+
+def _open_writers(db: Session) -> set[str]:
+    """Virtual transaction ids of other sessions currently writing wallet_transactions."""
+    if db.get_bind().dialect.name != "postgresql":
+        return set()  # SQLite serializes writers: every drawn id is already committed
+    return set(db.scalars(_WRITERS_SQL))
+
+
+def _checkpointed_up_to(db: Session) -> int:
+    return db.scalar(select(func.max(WalletCheckpoint.last_transaction_id))) or 0
+
+
+def _high_water_mark(db: Session) -> int:
+    """Newest transaction id below which no row can still become visible."""
+    mark = db.scalar(select(func.max(WalletTransaction.id))) or 0
+    writers = _open_writers(db)
+    deadline = time.monotonic() + settings.WALLET_RECON_WRITER_WAIT_SECONDS
+    # Writers that started later only draw ids above the mark, so they are not waited for
+    while writers:
+        if time.monotonic() >= deadline:
+            logger.info(f"Wallet checkpoints held back: {len(writers)} ledger writers still open")
+            return _checkpointed_up_to(db)
+        time.sleep(WRITER_POLL_SECONDS)
+        writers &= _open_writers(db)
+    return mark
+
+
+def advance_checkpoints(db: Session, high_water: int, batch_size: int) -> tuple[int, int]:
+    """Fold transactions up to ``high_water`` into the checkpoints; returns (transactions, users)."""
+    low_water = _checkpointed_up_to(db)
+    if high_water <= low_water:
+        return 0, 0
+    new_rows = (
+        select(
+            WalletTransaction.user_id,
+            func.max(WalletTransaction.id).label("last_id"),
+            func.sum(_signed_amount()).label("delta"),
+            func.count().label("rows"),
+        )
+        .outerjoin(WalletCheckpoint, WalletCheckpoint.user_id == WalletTransaction.user_id)
+        .where(
+            WalletTransaction.id > low_water,
+            WalletTransaction.id <= high_water,
+            WalletTransaction.id > func.coalesce(WalletCheckpoint.last_transaction_id, 0),
+        )
+        .group_by(WalletTransaction.user_id)
+    )
+    table = WalletCheckpoint.__table__
+    stmt = upsert_insert(db, WalletCheckpoint.__table__)
+    upsert = stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={
+            "last_transaction_id": stmt.excluded.last_transaction_id,
+            "total": table.c.total + stmt.excluded.total,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    now = datetime.utcnow()
+    transactions = users = 0
+    result = db.execute(new_rows.execution_options(stream_results=True, yield_per=batch_size))
+    for partition in result.partitions():
+        db.execute(upsert, [
+            {"user_id": row.user_id, "last_transaction_id": row.last_id, "total": row.delta or 0, "updated_at": now}
+            for row in partition
+        ])
+        transactions += sum(row.rows for row in partition)
+        users += len(partition)
+    return transactions, users
+
+
+def find_discrepancies(db: Session, high_water: int, batch_size: int):
+    """Stream (user_id, stored balance, expected balance) for wallets that disagree with the ledger."""
+    # Transactions not checkpointed yet still count toward the expected balance
+    recent = (
+        select(WalletTransaction.user_id, func.sum(_signed_amount()).label("delta"))
+        .where(WalletTransaction.id > high_water)
+        .group_by(WalletTransaction.user_id)
+        .subquery()
+    )
+    expected = func.coalesce(WalletCheckpoint.total, 0) + func.coalesce(recent.c.delta, 0)
+    return db.execute(
+        select(WalletBalance.user_id, WalletBalance.balance, expected.label("expected"))
+        .outerjoin(WalletCheckpoint, WalletCheckpoint.user_id == WalletBalance.user_id)
+        .outerjoin(recent, recent.c.user_id == WalletBalance.user_id)
+        .where(func.abs(WalletBalance.balance - expected) > TOLERANCE)
+        .order_by(WalletBalance.user_id)
+        .execution_options(stream_results=True, yield_per=batch_size)
+    )
+
+
+def _store_report(report: dict) -> None:
+    try:
+        redis_client.set(REPORT_KEY, json.dumps(report, default=str), ex=REPORT_TTL_SECONDS)
+    except Exception:
+        return
+
+
+def reconcile_wallets(db: Session, fix: bool = True, batch_size: int | None = None) -> dict:
+    """Checkpoint new ledger rows, then report (and optionally correct) wallets that disagree."""
+    batch_size = batch_size or settings.WALLET_RECON_BATCH_SIZE
+    started = datetime.utcnow()
+    high_water = _high_water_mark(db)
+    transactions, users = advance_checkpoints(db, high_water, batch_size)
+    db.commit()
+
+    fix_balance = (
+        update(WalletBalance.__table__)
+        .where(WalletBalance.user_id == bindparam("uid"), WalletBalance.balance == bindparam("observed"))
+        .values(balance=bindparam("expected"))
+    )
+    discrepancies, found, fixed = [], 0, 0
+    for partition in find_discrepancies(db, high_water, batch_size).partitions():
+        found += len(partition)
+        for row in partition:
+            if len(discrepancies) < REPORT_MAX_ITEMS:
+                discrepancies.append({
+                    "user_id": row.user_id,
+                    "stored": str(row.balance),
+                    "expected": str(row.expected),
+                    "difference": str(Decimal(row.balance) - Decimal(row.expected)),
+                })
+            logger.warning(f"Wallet {row.user_id} balance mismatch: stored={row.balance}, calculated={row.expected}")
+        if fix:
+            result = db.execute(fix_balance, [
+                {"uid": row.user_id, "observed": row.balance, "expected": row.expected} for row in partition
+            ])
+            fixed += max(result.rowcount, 0)
+    db.commit()
+
+    report = {
+        "started_at": started.isoformat(),
+        "finished_at": datetime.utcnow().isoformat(),
+        "high_water_transaction_id": high_water,
+        "transactions_checkpointed": transactions,
+        "users_checkpointed": users,
+        "discrepancies_found": found,
+        "discrepancies_fixed": fixed,
+        "discrepancies": discrepancies,
+    }
+    _store_report(report)
+    return report
+
+
+def last_report() -> dict | None:
+    try:
+        raw = redis_client.get(REPORT_KEY)
+    except Exception:
+        return None
+    return json.loads(raw) if raw else None
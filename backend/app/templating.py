@@ -0,0 +1,152 @@
+"""Email and SMS templates, shared by the API and the email/SMS worker.
+
+Templates are Jinja2 files under ``app/templates``: ``email/<type>.html``
+(extending ``email/base.html`` and using the macros in ``email/partials``) and
+``sms/<type>.txt``. Each renders with ``data``, the job payload; an email
+template sets its subject with a top-level ``{% set subject = ... %}``.
+Unknown types fall back to ``generic``.
+
+A locale's overrides live under ``app/templates/<locale>/`` with the same
+layout, and win over the defaults for that locale, partials included. Each
+locale gets one Environment that keeps its compiled templates (and partials)
+for the life of the process; compiled bytecode is also cached on disk, so
+processes after the first skip compilation. ``precompile`` loads everything
+up front so the first send does not pay for it.
+
+Transactional renders are not memoized: their data carries OTPs, reset links
+and the like, which must not outlive the send. For a campaign whose only
+difference between recipients is a few fields, ``prerender_email`` renders
+once with ``-field-`` tokens for those fields and memoizes that shared body;
+``Prerendered.substitutions`` gives the per-recipient values for SendGrid
+substitutions and ``Prerendered.fill`` substitutes them locally.
+"""
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+from jinja2 import (
+    ChoiceLoader,
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    TemplateNotFound,
+    select_autoescape,
+)
+from markupsafe import escape
+
+from .config import get_settings
+
+settings = get_settings()
+
+TEMPLATE_ROOT = Path(__file__).parent / "templates"
+EMAIL = "email"
+SMS = "sms"
+_EXTENSIONS = {EMAIL: "html", SMS: "txt"}
+
+
+@dataclass(frozen=True)
+class RenderedEmail:
+    subject: str
+    html: str
+
+
+@lru_cache(maxsize=None)
+def _bytecode_cache() -> FileSystemBytecodeCache:
+    directory = settings.TEMPLATE_BYTECODE_CACHE_DIR or None
+    if directory:
+        Path(directory).mkdir(parents=True, exist_ok=True)
+    return FileSystemBytecodeCache(directory)
+
+
+@lru_cache(maxsize=None)
+def environment(locale: str | None = None) -> Environment:
+    """The Environment for ``locale``: its overrides first, then the defaults."""
+    loaders = [FileSystemLoader(TEMPLATE_ROOT / locale)] if locale else []
+    loaders.append(FileSystemLoader(TEMPLATE_ROOT))
+    return Environment(
+        loader=ChoiceLoader(loaders),
+        autoescape=select_autoescape(["html"]),
+        bytecode_cache=_bytecode_cache(),
+        auto_reload=False,
+        cache_size=-1,  # never evict a compiled template
+    )
+
+
+@lru_cache(maxsize=1024)
+def _template(kind: str, name: str, locale: str | None):
+    env = environment(locale)
+    try:
+        return env.get_template(f"{kind}/{name}.{_EXTENSIONS[kind]}")
+    except TemplateNotFound:
+        return env.get_template(f"{kind}/generic.{_EXTENSIONS[kind]}")
+
+
+def precompile(locales: tuple[str, ...] = ()) -> int:
+    """Compile every template for the default and given locales; returns templates loaded."""
+    count = 0
+    for locale in (None, *locales):
+        env = environment(locale)
+        for name in env.list_templates(filter_func=lambda n: n.startswith((f"{EMAIL}/", f"{SMS}/"))):
+            env.get_template(name)
+            count += 1
+    return count
+
+
+def render_email(email_type: str, data: dict | None = None, locale: str | None = None) -> RenderedEmail:
+    """Subject and HTML body of ``email_type`` for ``data``."""
+    module = _template(EMAIL, email_type, locale).make_module({"data": data or {}})
+    return RenderedEmail(subject=str(getattr(module, "subject", "Notification from CouponAli")), html=str(module))
+
+
+def render_sms(sms_type: str, data: dict | None = None, locale: str | None = None) -> str:
+    return _template(SMS, sms_type, locale).render(data=data or {}).strip()
+
+
+def token(field: str) -> str:
+    """Placeholder left in a prerendered body for ``field`` (SendGrid substitution syntax)."""
+    return f"-{field}-"
+
+
+@dataclass(frozen=True)
+class Prerendered:
+    """An email rendered once, with per-recipient fields left as tokens."""
+
+    subject: str
+    html: str
+    fields: tuple[str, ...]
+
+    def substitutions(self, values: dict) -> dict[str, str]:
+        """Token -> escaped value for each field, e.g. for a SendGrid personalization."""
+        return {token(field): str(escape(values.get(field, ""))) for field in self.fields}
+
+    def fill(self, values: dict) -> RenderedEmail:
+        """The email one recipient gets; the subject is plain text, so its values are not escaped."""
+        plain = {token(field): str(values.get(field, "")) for field in self.fields}
+        return RenderedEmail(_substitute(self.subject, plain), _substitute(self.html, self.substitutions(values)))
+
+
+@lru_cache(maxsize=64)
+def _token_pattern(tokens: tuple[str, ...]) -> re.Pattern:
+    return re.compile("|".join(re.escape(t) for t in tokens))
+
+
+def _substitute(text: str, subs: dict[str, str]) -> str:
+    if not subs:
+        return text
+    return _token_pattern(tuple(subs)).sub(lambda match: subs[match.group(0)], text)
+
+
+def prerender_email(email_type: str, data: dict, fields: tuple[str, ...], locale: str | None = None) -> Prerendered:
+    """Render ``email_type`` once for every recipient, leaving ``fields`` of ``data`` as tokens."""
+    return _prerender(email_type, locale, json.dumps(data, sort_keys=True, default=str), tuple(fields))
+
+
+@lru_cache(maxsize=settings.TEMPLATE_PRERENDER_CACHE_SIZE)
+def _prerender(email_type: str, locale: str | None, key: str, fields: tuple[str, ...]) -> Prerendered:
+    shared = {**json.loads(key), **{field: token(field) for field in fields}}
+    rendered = render_email(email_type, shared, locale)
+    return Prerendered(rendered.subject, rendered.html, fields)
@@ -0,0 +1,104 @@
+"""
+Benchmark: sync (threadpool) vs async (AsyncSession) database routes
+Fires N concurrent requests at two otherwise identical routes that each run one
+slow query (pg_sleep), in-process through httpx's ASGI transport, and reports
+requests/sec and latency percentiles. The sync route is capped by the ~40
+threadpool slots; the async one only by the connection pool.
+
+    python scripts/benchmark_async_db.py --concurrency 400 --requests 2000 --query-ms 50
+
+Needs a reachable Postgres at DATABASE_URL. Raise DB_POOL_SIZE / DB_MAX_OVERFLOW
+so the pool is not the bottleneck (e.g. 100 / 100).
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.database import get_async_db, get_db
+
+bench = FastAPI()
+
+
+@bench.get("/sync")
+def sync_route(ms: int, db: Session = Depends(get_db)):
+    db.execute(text("SELECT pg_sleep(:s)"), {"s": ms / 1000})
+    return {"ok": True}
+
+
+@bench.get("/async")
+async def async_route(ms: int, db: AsyncSession = Depends(get_async_db)):
+    await db.execute(text("SELECT pg_sleep(:s)"), {"s": ms / 1000})
+    return {"ok": True}
+
+
+async def run(path: str, concurrency: int, total: int, query_ms: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    transport = httpx.ASGITransport(app=bench)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        async def worker():
+            nonlocal errors
+            while True:
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                start = time.perf_counter()
+                try:
+                    resp = await client.get(path, params={"ms": query_ms})
+                    resp.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+                except Exception:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+    return {
+        "path": path,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "errors": errors,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=400)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--query-ms", type=int, default=50, help="simulated query time per request")
+    args = parser.parse_args()
+
+    print(f"concurrency={args.concurrency} requests={args.requests} query={args.query_ms}ms")
+    for path in ("/sync", "/async"):
+        r = await run(path, args.concurrency, args.requests, args.query_ms)
+        print(
+            f"{r['path']:>7}: {r['rps']:8.1f} req/s  p50={r['p50_ms']:7.1f}ms  "
+            f"p95={r['p95_ms']:7.1f}ms  p99={r['p99_ms']:7.1f}ms  errors={r['errors']}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
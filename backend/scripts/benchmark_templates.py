@@ -0,0 +1,85 @@
+"""
+Benchmark: email template rendering (app/templating.py)
+Times, per email:
+
+- compile + render: what building templates per call amounts to
+- render: the precompiled template, fresh data every time (transactional mail)
+- prerender + fill: one campaign body rendered once (and memoized), per-recipient
+  fields substituted for each of N recipients (newsletter fan-out)
+
+    python scripts/benchmark_templates.py --recipients 200000
+
+Pure in-memory; needs no database or Redis.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app import templating
+
+CAMPAIGN = {
+    "subject": "This week's top deals",
+    "preview_text": "Up to 80% off across 1000+ stores",
+    "html_content": "<h1>Top deals</h1>" + "".join(f"<p>Deal {i}: save big at store {i}</p>" for i in range(200)),
+}
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(i)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--renders", type=int, default=2_000)
+    parser.add_argument("--recipients", type=int, default=200_000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = templating.precompile()
+    seconds = time.perf_counter() - start
+    print(f"precompile: {count} templates in {seconds * 1000:.1f} ms")
+
+    env = templating.environment()
+    source = env.loader.get_source(env, "email/order_confirmation.html")[0]
+
+    def compile_and_render(i):
+        env.from_string(source).render(data={"order_number": f"ORD-{i}", "total_amount": 499.0, "items_count": 2})
+
+    def render(i):
+        templating.render_email("order_confirmation", {"order_number": f"ORD-{i}", "total_amount": 499.0, "items_count": 2})
+
+    for label, fn, repeat in (
+        ("compile + render", compile_and_render, max(args.renders // 10, 1)),
+        ("render", render, args.renders),
+    ):
+        per = timed(fn, repeat)
+        print(f"{label:>17}: {per * 1e6:8.1f} us/email ({1 / per:,.0f}/s)")
+
+    fields = ("name", "unsubscribe_url")
+    start = time.perf_counter()
+    body = templating.prerender_email("newsletter_campaign", CAMPAIGN, fields)
+    for i in range(args.recipients):
+        body.fill({"name": f"Subscriber {i}", "unsubscribe_url": f"https://couponali.com/u/{i}"})
+    seconds = time.perf_counter() - start
+    print(f"prerender + fill: {args.recipients:,} recipients in {seconds:.2f} s "
+          f"({seconds / args.recipients * 1e6:.1f} us each)")
+
+    sample = min(args.recipients, 2_000)
+    per = timed(
+        lambda i: templating.render_email(
+            "newsletter_campaign", {**CAMPAIGN, "name": f"Subscriber {i}", "unsubscribe_url": f"https://couponali.com/u/{i}"}
+        ),
+        sample,
+    )
+    print(f"render per recipient: ~{per * args.recipients:.2f} s for {args.recipients:,} ({per * 1e6:.1f} us each)")
+
+
+if __name__ == "__main__":
+    main()
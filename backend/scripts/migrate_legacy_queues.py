@@ -0,0 +1,44 @@
+"""
+One-off: requeue jobs left in the legacy ``queue:<name>:processing`` SETs.
+
+Workers before app/job_queue.py tracked in-flight jobs in that SET (the Bun
+email/SMS workers still do). Run this once, after every legacy consumer of
+the queues has been stopped; with one still running, its in-flight jobs
+would be sent twice.
+
+    python scripts/migrate_legacy_queues.py --i-stopped-the-legacy-workers
+    python scripts/migrate_legacy_queues.py --queues email --i-stopped-the-legacy-workers
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.job_queue import JobQueue
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--queues", nargs="+", default=["email", "sms"])
+    parser.add_argument(
+        "--i-stopped-the-legacy-workers", dest="confirmed", action="store_true",
+        help="confirm no legacy worker still consumes these queues",
+    )
+    args = parser.parse_args()
+
+    for name in args.queues:
+        queue = JobQueue(name)
+        pending = queue.client.scard(queue.legacy_processing_key)
+        if not args.confirmed:
+            print(f"{queue.legacy_processing_key}: {pending} job(s) would be requeued")
+            continue
+        print(f"{queue.legacy_processing_key}: requeued {queue.migrate_legacy()} job(s)")
+    if not args.confirmed:
+        print("Dry run; stop the legacy workers, then re-run with --i-stopped-the-legacy-workers")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
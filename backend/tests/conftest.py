@@ -1,14 +1,20 @@
 """Test configuration and fixtures."""
+import asyncio
+from contextlib import contextmanager
+
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from fastapi.testclient import TestClient
 import redis
 from app.redis_client import rk
 
+from app import database
 from app.main import app
-from app.database import Base, get_db
+from app.database import AsyncRoutingSession, Base, get_db, get_async_db
 from app.config import get_settings
 
 settings = get_settings()
@@ -50,6 +56,71 @@ def db_session(test_db):
     connection.close()
 
 
+class AsyncSessionAdapter:
+    """Awaitable facade over the sync test session, so async routes see the test transaction."""
+
+    def __init__(self, session):
+        self._session = session
+
+    async def execute(self, *args, **kwargs):
+        return self._session.execute(*args, **kwargs)
+
+    async def scalar(self, *args, **kwargs):
+        return self._session.scalar(*args, **kwargs)
+
+    async def scalars(self, *args, **kwargs):
+        return self._session.scalars(*args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        return self._session.get(*args, **kwargs)
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def committed_session(test_db):
+    """Session whose commits are real, for rows another connection must see; every table is emptied afterwards."""
+    session = TestingSessionLocal()
+    yield session
+    session.close()
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+
+
+@pytest.fixture
+def async_client(committed_session, monkeypatch):
+    """Test client whose async routes get real AsyncSessions from get_async_db / get_async_read_db.
+
+    Both engines point at the test database through its asyncio driver; the
+    second stands in for a read replica, and the statements it runs are kept in
+    ``async_client.replica_statements``. Rows must come from
+    ``committed_session`` to be visible. NullPool: each request runs on its own
+    event loop, so connections are not reused across loops.
+    """
+    url = database._async_url(engine.url.render_as_string(hide_password=False))
+    primary = create_async_engine(url, poolclass=NullPool)
+    replica = create_async_engine(url, poolclass=NullPool)
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(replica.sync_engine, "before_cursor_execute", record)
+    monkeypatch.setattr(database, "async_engine", primary)
+    monkeypatch.setattr(database, "async_replica_engines", [replica])
+    monkeypatch.setattr(database, "AsyncSessionLocal", async_sessionmaker(primary, autoflush=False, expire_on_commit=False))
+    monkeypatch.setattr(database, "AsyncReadSessionLocal", async_sessionmaker(
+        primary, sync_session_class=AsyncRoutingSession, autoflush=False, expire_on_commit=False
+    ))
+    client = TestClient(app)
+    client.replica_statements = statements
+    yield client
+    for async_engine in (primary, replica):
+        asyncio.run(async_engine.dispose())
+
+
 @pytest.fixture
 def client(db_session):
     """Create test client with database session override."""
@@ -59,11 +130,42 @@ def client(db_session):
         finally:
             pass
 
+    async def override_get_async_db():
+        yield AsyncSessionAdapter(db_session)
+
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
     yield TestClient(app)
     app.dependency_overrides.clear()
 
 
+@pytest.fixture
+def count_queries():
+    """Count SQL statements run in a block, failing past a budget.
+
+        with count_queries(budget=3) as statements:
+            client.get("/api/v1/merchants/")
+    """
+    @contextmanager
+    def counter(budget: int | None = None):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+        if budget is not None:
+            assert len(statements) <= budget, (
+                f"{len(statements)} statements over a budget of {budget}:\n" + "\n".join(statements)
+            )
+
+    return counter
+
+
 @pytest.fixture
 def redis_client():
     """Redis client using same DB as application; isolate queue keys each test."""
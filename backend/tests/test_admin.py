@@ -4,6 +4,7 @@ from fastapi import status
 from tests.factories import create_merchant, create_offer, create_product, create_user
 from app.security import create_access_token
 from app.models import Withdrawal, Order
+from app.services import wallet_ledger
 
 
 @pytest.fixture
@@ -66,6 +67,26 @@ class TestWithdrawalManagement:
         withdrawals = resp.json()["data"]["withdrawals"]
         assert len(withdrawals) >= 1
 
+    def test_approve_and_reject_update_wallet_totals(self, client, db_session, admin_header):
+        user = create_user(db_session, "withdrawtotals@example.com")
+        approved = Withdrawal(user_id=user.id, amount=200.0, method="upi", status="pending", upi_id="a@upi")
+        rejected = Withdrawal(user_id=user.id, amount=50.0, method="upi", status="pending", upi_id="a@upi")
+        db_session.add_all([approved, rejected])
+        db_session.commit()
+
+        resp = client.patch(
+            f"/api/v1/admin/withdrawals/{approved.id}/approve", json={"status": "approved"}, headers=admin_header
+        )
+        assert resp.status_code == status.HTTP_200_OK
+        resp = client.patch(
+            f"/api/v1/admin/withdrawals/{rejected.id}/reject", json={"status": "rejected"}, headers=admin_header
+        )
+        assert resp.status_code == status.HTTP_200_OK
+
+        totals = wallet_ledger.totals(db_session, user.id)
+        assert totals["total_withdrawn"] == 200.0
+        assert totals["lifetime_credit"] == 50.0  # the refund
+
 
 class TestAdminAnalytics:
     def test_dashboard_analytics(self, client, db_session, admin_header):
@@ -2,8 +2,11 @@ import pytest
 from fastapi.testclient import TestClient
 from app.main import app
 import uuid
+from decimal import Decimal
 from app.database import SessionLocal
 from app.models import AffiliateMerchantMap, AffiliateClick, AffiliateTransaction, CashbackEvent, Merchant, User
+from app.services.cashback_rules import get_rules
+from app.tasks.cashback import generate_cashback_events
 from sqlalchemy.orm import Session
 
 client = TestClient(app)
@@ -20,7 +23,7 @@ def db_session() -> Session:
 def seed_entities(db_session: Session):
     # Create user and merchant
     suffix = uuid.uuid4().hex[:6]
-    user = User(email=f"affuser-{suffix}@example.com", password_hash="x", is_active=True)
+    user = User(email=f"affuser-{suffix}@example.com", full_name="Affiliate User", password_hash="x", is_active=True)
     suffix2 = uuid.uuid4().hex[:6]
     merchant = Merchant(name=f"Aff Merchant {suffix2}", slug=f"aff-merchant-{suffix2}")
     db_session.add(user)
@@ -43,16 +46,14 @@ def test_affiliate_sync_imports_transactions(db_session: Session, seed_entities,
     from app.tasks import affiliate_sync
     tx_id = f"TX{uuid.uuid4().hex[:8]}"
 
-    async def fake_fetch_all():
-        return [
-            ("admitad", {
-                "external_id": tx_id,
-                "status": "approved",
-                "amount": 42.5,
-                "merchant_ext_id": "EXTM1",
-                "click_ext_id": seed_entities["click"].external_click_id,
-            })
-        ]
+    async def fake_fetch_all(start_date, end_date):
+        yield "admitad", {
+            "external_id": tx_id,
+            "status": "approved",
+            "amount": 42.5,
+            "merchant_ext_id": "EXTM1",
+            "click_ext_id": seed_entities["click"].external_click_id,
+        }
 
     monkeypatch.setattr(affiliate_sync, "fetch_all", fake_fetch_all)
 
@@ -67,11 +68,13 @@ def test_affiliate_sync_imports_transactions(db_session: Session, seed_entities,
     assert tx.merchant_id == seed_entities["merchant"].id
     assert tx.status == "confirmed"  # approved mapped to confirmed
 
-    cashback = (
-        db_session.query(CashbackEvent)
-        .filter(CashbackEvent.user_id == seed_entities["user"].id, CashbackEvent.amount == 42.5)
-        .order_by(CashbackEvent.id.desc())
-        .first()
-    )
-    assert cashback is not None
-    assert cashback.user_id == seed_entities["user"].id
+    # The importer leaves pricing to the rule engine
+    assert db_session.query(CashbackEvent).filter_by(affiliate_transaction_id=tx.id).count() == 0
+
+    generate_cashback_events(db_session)
+    events = db_session.query(CashbackEvent).filter_by(affiliate_transaction_id=tx.id).all()
+    assert len(events) == 1
+    expected = get_rules(db_session).evaluate([(Decimal("42.5"), seed_entities["merchant"].id, None)])[0]
+    assert events[0].status == "pending"
+    assert events[0].user_id == seed_entities["user"].id
+    assert Decimal(str(events[0].amount)) == expected
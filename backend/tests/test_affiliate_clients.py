@@ -0,0 +1,170 @@
+"""Tests for the affiliate network clients (HTTP is served by httpx.MockTransport)."""
+import asyncio
+from datetime import datetime
+
+import httpx
+import pytest
+
+from app.services import affiliate_clients
+from app.services.affiliate_clients import (
+    AdmitadClient,
+    NetworkAPIError,
+    NetworkClient,
+    VCommissionClient,
+    fetch_all_networks,
+    retry_delay,
+)
+
+START, END = datetime(2026, 10, 1), datetime(2026, 10, 8)
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    """Record backoff delays instead of waiting them out."""
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(delay, *args):
+        if delay:
+            delays.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    monkeypatch.setattr(AdmitadClient, "_tokens", {})
+    return delays
+
+
+async def _collect_async(agen):
+    return [item async for item in agen]
+
+
+def _collect(agen):
+    return asyncio.run(_collect_async(agen))
+
+
+def _vcom_page(start, count):
+    return {"transactions": [{"transaction_id": i, "status": "approved", "commission": 1} for i in range(start, start + count)]}
+
+
+def test_retry_delay_honours_rate_limit_headers():
+    now = 1_800_000_000.0
+    assert retry_delay(httpx.Response(429, headers={"Retry-After": "7"}), 1, now) == 7
+    assert retry_delay(httpx.Response(429, headers={"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(now + 12)}), 1, now) == 12
+    assert retry_delay(httpx.Response(429, headers={"RateLimit-Reset": "3"}), 1, now) == 3
+    # Never longer than the configured cap, and plain backoff grows per attempt
+    assert retry_delay(httpx.Response(429, headers={"Retry-After": "3600"}), 1, now) == affiliate_clients.settings.AFFILIATE_HTTP_MAX_BACKOFF_SECONDS
+    assert retry_delay(httpx.Response(503), 3, now) <= 4 * affiliate_clients.settings.AFFILIATE_HTTP_BACKOFF_SECONDS
+
+
+def test_request_retries_throttled_and_failed_responses(no_sleep):
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "2"}),
+        httpx.Response(502),
+        httpx.Response(200, json={"ok": True}),
+    ]
+    client = NetworkClient(transport=httpx.MockTransport(lambda request: responses.pop(0)))
+
+    async def run():
+        async with client:
+            return await client._request("GET", "https://example.test/")
+
+    assert asyncio.run(run()).json() == {"ok": True}
+    assert no_sleep[0] == 2 and len(no_sleep) == 2
+
+
+def test_request_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(affiliate_clients.settings, "AFFILIATE_HTTP_MAX_RETRIES", 2)
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        raise httpx.ConnectError("refused")
+
+    client = NetworkClient(transport=httpx.MockTransport(handler))
+    with pytest.raises(NetworkAPIError):
+        asyncio.run(client._request("GET", "https://example.test/"))
+    assert len(calls) == 3
+
+
+def test_pages_are_fetched_ahead_and_yielded_in_order(monkeypatch):
+    monkeypatch.setattr(affiliate_clients, "PAGE_SIZE", 2)
+    in_flight = peak = 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        page = int(request.url.params["page"])
+        # Later pages answer first; order must still be preserved
+        for _ in range(10 - page):
+            await asyncio.sleep(0)
+        in_flight -= 1
+        return httpx.Response(200, json=_vcom_page((page - 1) * 2, 2 if page < 5 else 1))
+
+    client = VCommissionClient("key", max_concurrency=3, transport=httpx.MockTransport(handler))
+    rows = _collect(client.fetch_transactions(START, END))
+
+    assert [row["external_id"] for row in rows] == [str(i) for i in range(9)]
+    assert peak == 3
+
+
+def test_admitad_token_is_cached_across_clients():
+    token_requests = []
+
+    def handler(request):
+        if request.url.path == "/token/":
+            token_requests.append(request)
+            return httpx.Response(200, json={"access_token": f"tok{len(token_requests)}", "expires_in": 3600})
+        assert request.headers["Authorization"] == "Bearer tok1"
+        return httpx.Response(200, json={"results": [{"action_id": 1, "status": "approved", "payment": 5}]})
+
+    for _ in range(2):
+        client = AdmitadClient("id", "secret", "refresh", transport=httpx.MockTransport(handler))
+        assert [row["external_id"] for row in _collect(client.fetch_transactions(START, END))] == ["1"]
+    assert len(token_requests) == 1
+
+
+def test_admitad_refreshes_token_once_on_401():
+    token_requests = []
+
+    def handler(request):
+        if request.url.path == "/token/":
+            token_requests.append(request)
+            return httpx.Response(200, json={"access_token": f"tok{len(token_requests)}", "expires_in": 3600})
+        if request.headers["Authorization"] == "Bearer tok1":
+            return httpx.Response(401)
+        return httpx.Response(200, json={"results": [{"action_id": 9, "status": "pending"}]})
+
+    client = AdmitadClient("id", "secret", "refresh", transport=httpx.MockTransport(handler))
+    assert [row["external_id"] for row in _collect(client.fetch_transactions(START, END))] == ["9"]
+    assert len(token_requests) == 2
+
+
+def test_fetch_all_networks_runs_networks_concurrently():
+    started = set()
+
+    class SlowClient(NetworkClient):
+        def __init__(self, name, rows):
+            super().__init__()
+            self.network, self.rows, self.closed = name, rows, False
+
+        async def fetch_transactions(self, start_date, end_date):
+            started.add(self.network)
+            # Each network waits until the other has started: sequential fetching would hang
+            while len(started) < 2:
+                await asyncio.sleep(0)
+            for row in self.rows:
+                yield row
+
+        async def aclose(self):
+            self.closed = True
+
+    clients = {"a": SlowClient("a", [{"external_id": "a1"}, {"external_id": "a2"}]), "b": SlowClient("b", [{"external_id": "b1"}])}
+
+    async def run():
+        return await asyncio.wait_for(_collect_async(fetch_all_networks(START, END, clients)), timeout=5)
+
+    items = asyncio.run(run())
+
+    assert sorted((network, tx["external_id"]) for network, tx in items) == [("a", "a1"), ("a", "a2"), ("b", "b1")]
+    assert all(client.closed for client in clients.values())
@@ -0,0 +1,121 @@
+"""Tests for the chunked affiliate transaction importer."""
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event, select
+
+from app.models import AffiliateClick, AffiliateMerchantMap, AffiliateTransaction, CashbackEvent, CashbackRule
+from app.services import cashback_rules
+from app.tasks import affiliate_sync
+from app.tasks.cashback import generate_cashback_events
+from tests.factories import create_merchant, create_user
+
+
+@pytest.fixture
+def checkpoints(monkeypatch):
+    """In-memory stand-in for the Redis checkpoint hash."""
+    saved = {}
+    monkeypatch.setattr(affiliate_sync, "_load_checkpoint", lambda key: dict(saved.get(key, {})))
+    monkeypatch.setattr(affiliate_sync, "_save_checkpoint", lambda key, committed: saved.update({key: dict(committed)}))
+    monkeypatch.setattr(affiliate_sync.redis_client, "delete", lambda *keys: [saved.pop(k, None) for k in keys])
+    return saved
+
+
+def _stream(rows):
+    async def fake_fetch_all(start_date, end_date):
+        for row in rows:
+            yield row
+    return fake_fetch_all
+
+
+def _tx(external_id, status="pending", click=None, merchant="EXT1", amount=10.0):
+    return "admitad", {
+        "external_id": external_id,
+        "status": status,
+        "commission_amount": amount,
+        "merchant_ext_id": merchant,
+        "click_ext_id": click,
+    }
+
+
+def _run(db_session):
+    return asyncio.run(affiliate_sync.import_transactions(db_session, datetime(2026, 10, 1), datetime(2026, 10, 8)))
+
+
+def test_import_is_chunked_and_idempotent(db_session, monkeypatch, checkpoints):
+    user = create_user(db_session, "importer@example.com")
+    merchant = create_merchant(db_session, "Import Mart")
+    db_session.add(AffiliateMerchantMap(network="admitad", external_merchant_id="EXT1", merchant_id=merchant.id))
+    db_session.add(AffiliateClick(user_id=user.id, network="admitad", external_click_id="CLK1"))
+    db_session.commit()
+    monkeypatch.setattr(affiliate_sync.settings, "AFFILIATE_SYNC_CHUNK_SIZE", 2)
+
+    rows = [_tx("A1", "approved", click="CLK1"), _tx("A2"), _tx("A3", "declined"), _tx("A2")]
+    monkeypatch.setattr(affiliate_sync, "fetch_all", _stream(rows))
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+    try:
+        assert _run(db_session) == {"imported": 3, "updated": 0, "total": 4}
+    finally:
+        event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+    # Merchant map once, then at most lookup + clicks + insert per chunk (no per-row queries)
+    assert len([s for s in statements if not s.startswith(("SAVEPOINT", "RELEASE"))]) <= 1 + 2 * 3
+
+    txs = {tx.external_transaction_id: tx for tx in db_session.scalars(select(AffiliateTransaction))}
+    assert txs["A1"].user_id == user.id and txs["A1"].merchant_id == merchant.id
+    assert txs["A1"].status == "confirmed" and float(txs["A1"].amount) == 10.0
+    assert txs["A3"].status == "rejected"
+    # Cashback is left to the rule engine
+    assert db_session.scalar(select(CashbackEvent).where(CashbackEvent.user_id == user.id)) is None
+
+    # Second run over the same data only applies status changes
+    monkeypatch.setattr(affiliate_sync, "fetch_all", _stream([_tx("A1", "approved", click="CLK1"), _tx("A2", "approved")]))
+    assert _run(db_session) == {"imported": 0, "updated": 1, "total": 2}
+    db_session.expire_all()
+    assert db_session.scalar(select(AffiliateTransaction).where(AffiliateTransaction.external_transaction_id == "A2")).status == "confirmed"
+
+
+def test_resume_skips_committed_rows(db_session, monkeypatch, checkpoints):
+    monkeypatch.setattr(affiliate_sync.settings, "AFFILIATE_SYNC_CHUNK_SIZE", 2)
+    key = affiliate_sync._checkpoint_key(datetime(2026, 10, 1), datetime(2026, 10, 8))
+    checkpoints[key] = {"admitad": 2}
+    monkeypatch.setattr(affiliate_sync, "fetch_all", _stream([_tx("R1"), _tx("R2"), _tx("R3")]))
+
+    assert _run(db_session) == {"imported": 1, "updated": 0, "total": 3}
+    # A completed run leaves no checkpoint behind
+    assert key not in checkpoints
+    assert [tx.external_transaction_id for tx in db_session.scalars(select(AffiliateTransaction))] == ["R3"]
+
+
+def test_synced_transactions_get_rule_priced_pending_cashback(db_session, monkeypatch, checkpoints):
+    cashback_rules._drop_local()
+    user = create_user(db_session, "synced@example.com")
+    merchant = create_merchant(db_session, "Synced Mart")
+    db_session.add_all([
+        AffiliateMerchantMap(network="admitad", external_merchant_id="EXT1", merchant_id=merchant.id),
+        AffiliateClick(user_id=user.id, network="admitad", external_click_id="CLK-S1"),
+        AffiliateClick(user_id=user.id, network="admitad", external_click_id="CLK-S2"),
+        CashbackRule(merchant_id=merchant.id, rule_name="synced", rate_percent=50),
+    ])
+    db_session.commit()
+    rows = [_tx("S1", "approved", click="CLK-S1", amount=40.0), _tx("S2", click="CLK-S2", amount=20.0)]
+    monkeypatch.setattr(affiliate_sync, "fetch_all", _stream(rows))
+    _run(db_session)
+
+    try:
+        assert generate_cashback_events(db_session) == 1
+        # S2 is confirmed by a later sync and priced on the next run
+        monkeypatch.setattr(affiliate_sync, "fetch_all", _stream([_tx("S2", "approved", click="CLK-S2", amount=20.0)]))
+        _run(db_session)
+        assert generate_cashback_events(db_session) == 1
+    finally:
+        cashback_rules._drop_local()
+
+    events = db_session.execute(
+        select(AffiliateTransaction.external_transaction_id, CashbackEvent.amount, CashbackEvent.status)
+        .join(CashbackEvent, CashbackEvent.affiliate_transaction_id == AffiliateTransaction.id)
+    ).all()
+    assert {ext: (float(amount), status) for ext, amount, status in events} == {"S1": (20.0, "pending"), "S2": (10.0, "pending")}
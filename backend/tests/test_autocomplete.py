@@ -0,0 +1,112 @@
+"""Tests for the Redis prefix index behind /search/autocomplete (Redis calls are faked)."""
+import asyncio
+import json
+
+from fastapi import status
+
+from app.services import autocomplete
+from tests.factories import create_merchant
+
+
+class FakeAsyncRedis:
+    """Replays a canned reply for the lookup script; any other script finds Redis down."""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = []
+
+    async def evalsha(self, sha, numkeys, *args):
+        if sha != autocomplete._suggest_script.sha:
+            raise ConnectionError("redis down")
+        self.calls.append(args)
+        return self.reply
+
+
+def _doc(text, type):
+    return json.dumps({"text": text, "type": type, "url": None})
+
+
+def test_prefixes_cover_each_word():
+    found = autocomplete.prefixes("Amazon  Echo Dot")
+    assert {"am", "amazon", "amazon echo", "ech", "echo dot", "do"} <= found
+    assert "a" not in found
+    assert not any(p.endswith(" ") for p in found)
+
+
+def test_prefixes_are_capped(monkeypatch):
+    monkeypatch.setattr(autocomplete.settings, "AUTOCOMPLETE_MAX_PREFIX_LENGTH", 5)
+    assert max(len(p) for p in autocomplete.prefixes("Supercalifragilistic")) == 5
+
+
+def test_suggest_looks_up_normalised_prefix(monkeypatch):
+    fake = FakeAsyncRedis([_doc("Amazon", "merchant"), _doc("amazon", "query"), _doc("amazon prime", "query")])
+    monkeypatch.setattr("app.redis_async.get_async_redis", lambda: fake)
+
+    suggestions = asyncio.run(autocomplete.suggest("  AMAZON ", 5))
+
+    assert fake.calls[0][1] == autocomplete.prefix_key("amazon")
+    # The query repeating the merchant name is dropped
+    assert [s["text"] for s in suggestions] == ["Amazon", "amazon prime"]
+
+
+def test_suggest_signals_missing_index(monkeypatch):
+    monkeypatch.setattr("app.redis_async.get_async_redis", lambda: FakeAsyncRedis(None))
+    assert asyncio.run(autocomplete.suggest("am", 5)) is None
+
+    def unavailable():
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr("app.redis_async.get_async_redis", unavailable)
+    assert asyncio.run(autocomplete.suggest("am", 5)) is None
+
+
+def test_endpoint_falls_back_to_sql(client, db_session, monkeypatch):
+    monkeypatch.setattr("app.redis_async.get_async_redis", lambda: FakeAsyncRedis(None))
+    create_merchant(db_session, "Zephyr Outfitters")
+
+    resp = client.get("/api/v1/search/autocomplete", params={"q": "Zeph"})
+
+    assert resp.status_code == status.HTTP_200_OK
+    assert [s["text"] for s in resp.json()["data"]["suggestions"]] == ["Zephyr Outfitters"]
+
+
+class FakeQueryLog:
+    """SET NX markers and the query ZSET, as record_query uses them."""
+
+    def __init__(self):
+        self.markers, self.counts = set(), {}
+
+    async def set(self, key, value, nx=False, ex=None):
+        if key in self.markers:
+            return None
+        self.markers.add(key)
+        return True
+
+    async def zincrby(self, key, amount, member):
+        self.counts[member] = self.counts.get(member, 0) + amount
+
+
+def test_record_query_counts_each_searcher_once(monkeypatch):
+    log = FakeQueryLog()
+    monkeypatch.setattr("app.redis_async.get_async_redis", lambda: log)
+
+    async def search(searcher):
+        await autocomplete.record_query("Echo  Dot", searcher)
+
+    for searcher in ["10.0.0.1"] * 20 + ["u7", "u7", "10.0.0.2"]:
+        asyncio.run(search(searcher))
+
+    assert log.counts == {"echo dot": 3}
+
+
+def test_incremental_add_survives_a_full_prefix():
+    class Pipe:
+        def __init__(self):
+            self.commands = []
+
+        def __getattr__(self, name):
+            return lambda *args, **kwargs: self.commands.append(name)
+
+    pipe = Pipe()
+    autocomplete._add(pipe, "merchant:1", {"text": "Zed", "type": "merchant", "url": "/m/zed"}, 0, keep_score=True)
+    assert "zremrangebyrank" not in pipe.commands
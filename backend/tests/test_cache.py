@@ -0,0 +1,171 @@
+"""Tests for the two-tier read-through cache."""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app import cache
+from app.cache import CacheEntry, LocalCache, read_through
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Replace the Redis tier with a dict so tests run without a server."""
+    store: dict[str, CacheEntry] = {}
+    monkeypatch.setattr(cache, "_redis_get", lambda key: store.get(key))
+    monkeypatch.setattr(cache, "_redis_set", lambda key, entry, ttl: store.__setitem__(key, entry))
+    cache.local_cache.clear()
+    yield store
+    cache.local_cache.clear()
+
+
+class TestLocalCache:
+    def test_evicts_least_recently_used(self):
+        local = LocalCache(max_entries=2, ttl=60)
+        entry = CacheEntry("v", time.time() + 60, time.time() + 120)
+        local.set("a", entry)
+        local.set("b", entry)
+        local.get("a")
+        local.set("c", entry)
+        assert local.get("a") is not None
+        assert local.get("b") is None
+        assert local.get("c") is not None
+
+    def test_expires_after_ttl(self):
+        local = LocalCache(max_entries=10, ttl=5)
+        now = time.time()
+        local.set("a", CacheEntry("v", now + 60, now + 120), now=now)
+        assert local.get("a", now=now + 4) is not None
+        assert local.get("a", now=now + 6) is None
+
+    def test_delete_prefix(self):
+        local = LocalCache(max_entries=10, ttl=60)
+        entry = CacheEntry("v", time.time() + 60, time.time() + 120)
+        local.set("cache:offers:1", entry)
+        local.set("cache:offers:2", entry)
+        local.set("cache:merchants:1", entry)
+        local.delete_prefix("cache:offers")
+        assert len(local) == 1
+
+
+class TestReadThrough:
+    def test_miss_then_local_hit(self, fake_redis):
+        calls = []
+        loader = lambda _db: calls.append(1) or {"n": len(calls)}
+        assert read_through("k", loader, ttl=60) == {"n": 1}
+        assert read_through("k", loader, ttl=60) == {"n": 1}
+        assert len(calls) == 1
+        assert "k" in fake_redis
+
+    def test_redis_hit_populates_local_tier(self, fake_redis):
+        now = time.time()
+        fake_redis["k"] = CacheEntry({"from": "redis"}, now + 60, now + 120)
+        assert read_through("k", lambda _db: {"from": "db"}, ttl=60) == {"from": "redis"}
+        assert cache.local_cache.get("k") is not None
+
+    def test_concurrent_misses_run_loader_once(self, fake_redis):
+        calls = []
+        lock = threading.Lock()
+
+        def slow_loader(_db):
+            with lock:
+                calls.append(1)
+            time.sleep(0.2)
+            return {"ok": True}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(read_through("hot", slow_loader, ttl=60)))
+            for _ in range(50)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(calls) == 1
+        assert results == [{"ok": True}] * 50
+
+    def test_stale_value_served_while_revalidating(self, fake_redis):
+        now = time.time()
+        fake_redis["k"] = CacheEntry("old", now - 1, now + 60)
+        refreshed = threading.Event()
+
+        def loader(_db):
+            refreshed.set()
+            return "new"
+
+        assert read_through("k", loader, ttl=60) == "old"
+        assert refreshed.wait(2)
+        deadline = time.time() + 2
+        while fake_redis["k"].value != "new" and time.time() < deadline:
+            time.sleep(0.01)
+        assert read_through("k", loader, ttl=60) == "new"
+
+    def test_invalidate_prefix_drops_local_entries(self, fake_redis, monkeypatch):
+        monkeypatch.setattr(cache, "cache_invalidate_prefix", lambda prefix: None)
+        monkeypatch.setattr(cache, "publish", lambda channel, payload: None)
+        read_through("cache:offers:1", lambda _db: "v", ttl=60)
+        cache.invalidate_prefix("cache:offers")
+        assert cache.local_cache.get("cache:offers:1") is None
+
+
+class TestTargetedInvalidation:
+    def test_invalidate_tags_drops_only_tagged_entries(self, fake_redis, monkeypatch):
+        monkeypatch.setattr(cache, "publish", lambda channel, payload: None)
+        read_through("cache:merchants:p1", lambda _db: {"ids": [12]}, ttl=60, tags=["merchant:12"])
+        read_through("cache:merchants:p2", lambda _db: {"ids": [13]}, ttl=60, tags=["merchant:13"])
+        cache.invalidate_tags("merchant:12")
+        assert cache.local_cache.get("cache:merchants:p1") is None
+        assert cache.local_cache.get("cache:merchants:p2") is not None
+
+    def test_tags_can_be_derived_from_value(self, fake_redis):
+        read_through("cache:merchant:acme", lambda _db: {"id": 7}, ttl=60, tags=lambda v: [f"merchant:{v['id']}"])
+        assert fake_redis["cache:merchant:acme"].tags == ("merchant:7",)
+
+    def test_tag_sets_prune_expired_members_and_expire(self, redis_client):
+        tag = cache.tag_key("test:prune")
+        redis_client.delete(tag)
+        redis_client.zadd(tag, {"cache:gone": time.time() - 5})
+        entry = CacheEntry("v", time.time() + 60, time.time() + 120, ("test:prune",))
+        cache._redis_set("cache:test:prune", entry, 120)
+        try:
+            assert redis_client.zrange(tag, 0, -1) == ["cache:test:prune"]
+            assert 0 < redis_client.ttl(tag) <= 120
+        finally:
+            redis_client.delete(tag, "cache:test:prune")
+
+    def test_bump_version_orphans_key_family(self, fake_redis, monkeypatch):
+        monkeypatch.setattr(cache, "publish", lambda channel, payload: None)
+        before = cache.versioned_key("homepage", "featured_offers", "8")
+        read_through(before, lambda _db: ["old"], ttl=60)
+        cache.bump_version("homepage")
+        after = cache.versioned_key("homepage", "featured_offers", "8")
+        assert after != before
+        assert cache.local_cache.get(before) is None
+        assert read_through(after, lambda _db: ["new"], ttl=60) == ["new"]
+
+
+class TestReadThroughAsync:
+    def test_concurrent_misses_await_loader_once(self, fake_redis, monkeypatch):
+        async def redis_get(key):
+            return fake_redis.get(key)
+
+        async def redis_set(key, entry, ttl):
+            fake_redis[key] = entry
+
+        monkeypatch.setattr(cache, "_redis_get_async", redis_get)
+        monkeypatch.setattr(cache, "_redis_set_async", redis_set)
+        calls = []
+
+        async def loader(_db):
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"ok": True}
+
+        async def burst():
+            return await asyncio.gather(*(cache.read_through_async("hot", loader, ttl=60) for _ in range(50)))
+
+        assert asyncio.run(burst()) == [{"ok": True}] * 50
+        assert len(calls) == 1
+        assert "hot" in fake_redis
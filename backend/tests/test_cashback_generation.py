@@ -0,0 +1,112 @@
+"""Tests for set-based cashback generation and auto-approval."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update
+
+from app.models import AffiliateClick, AffiliateTransaction, CashbackEvent, CashbackRule, WalletBalance, WalletTransaction
+from app.services import cashback_rules, wallet_ledger
+from app.tasks.cashback import approve_cashback_events, generate_cashback_events
+from tests.factories import create_merchant, create_user
+
+
+@pytest.fixture(autouse=True)
+def fresh_rules():
+    """Each test compiles its own rules rather than a previous test's snapshot."""
+    cashback_rules._drop_local()
+    yield
+    cashback_rules._drop_local()
+
+
+def _tx(db, external_id, amount, status="confirmed", user=None, click=None, merchant=None):
+    tx = AffiliateTransaction(
+        network="admitad",
+        external_transaction_id=external_id,
+        amount=amount,
+        status=status,
+        user_id=user.id if user else None,
+        click_id=click.id if click else None,
+        merchant_id=merchant.id if merchant else None,
+    )
+    db.add(tx)
+    db.flush()
+    return tx
+
+
+def _events(db):
+    return {
+        ev.affiliate_transaction_id: ev
+        for ev in db.scalars(select(CashbackEvent).where(CashbackEvent.affiliate_transaction_id.is_not(None)))
+    }
+
+
+def test_events_apply_cashback_rules(db_session):
+    user = create_user(db_session, "rules@example.com")
+    ruled, plain = create_merchant(db_session, "Ruled Mart"), create_merchant(db_session, "Plain Mart")
+    db_session.add_all([
+        CashbackRule(merchant_id=None, category_id=None, rule_name="global", rate_percent=10),
+        CashbackRule(merchant_id=ruled.id, rule_name="ruled", rate_percent=50, max_cashback=30),
+        CashbackRule(merchant_id=plain.id, rule_name="inactive", rate_percent=90, is_active=False),
+    ])
+    click = AffiliateClick(user_id=user.id, network="admitad", external_click_id="GEN-CLK")
+    db_session.add(click)
+    db_session.flush()
+
+    small = _tx(db_session, "G1", 40, user=user, merchant=ruled)
+    capped = _tx(db_session, "G2", 100, user=user, merchant=ruled)
+    fallback = _tx(db_session, "G3", 25, click=click, merchant=plain)  # user only via the click
+    skipped = [_tx(db_session, "G4", 10, status="pending", user=user), _tx(db_session, "G5", 10)]
+    db_session.commit()
+
+    assert generate_cashback_events(db_session, batch_size=2) == 3
+
+    events = _events(db_session)
+    assert float(events[small.id].amount) == 20.0
+    assert float(events[capped.id].amount) == 30.0
+    assert float(events[fallback.id].amount) == 2.5 and events[fallback.id].user_id == user.id
+    assert all(tx.id not in events for tx in skipped)
+    assert {ev.status for ev in events.values()} == {"pending"}
+
+    # Transactions that already have an event are not paid twice
+    assert generate_cashback_events(db_session) == 0
+
+
+def test_default_rate_without_rules(db_session):
+    user = create_user(db_session, "norule@example.com")
+    tx = _tx(db_session, "D1", 10, user=user)
+    db_session.commit()
+
+    generate_cashback_events(db_session)
+
+    assert float(_events(db_session)[tx.id].amount) == 7.0
+
+
+def test_approval_credits_each_wallet_once_per_batch(db_session):
+    alice, bob = create_user(db_session, "alice-cb@example.com"), create_user(db_session, "bob-cb@example.com")
+    db_session.add(WalletBalance(user_id=alice.id, balance=5))
+    old = datetime.utcnow() - timedelta(days=45)
+    db_session.add_all([
+        CashbackEvent(user_id=alice.id, amount=10, status="pending", created_at=old),
+        CashbackEvent(user_id=alice.id, amount=2.5, status="pending", created_at=old),
+        CashbackEvent(user_id=bob.id, amount=4, status="pending", created_at=old),
+        CashbackEvent(user_id=bob.id, amount=100, status="pending"),  # still in the holding period
+    ])
+    db_session.commit()
+
+    assert approve_cashback_events(db_session) == 3
+
+    balances = dict(db_session.execute(select(WalletBalance.user_id, WalletBalance.balance)).all())
+    assert float(balances[alice.id]) == 17.5 and float(balances[bob.id]) == 4.0
+    ledger = db_session.scalars(select(WalletTransaction).where(WalletTransaction.user_id.in_([alice.id, bob.id]))).all()
+    assert sorted((tx.user_id, float(tx.amount), float(tx.balance_after), tx.type) for tx in ledger) == [
+        (alice.id, 12.5, 17.5, "cashback"),
+        (bob.id, 4.0, 4.0, "cashback"),
+    ]
+    pending = db_session.scalars(select(CashbackEvent).where(CashbackEvent.user_id == bob.id, CashbackEvent.status == "pending")).all()
+    assert [float(ev.amount) for ev in pending] == [100.0]
+    assert wallet_ledger.totals(db_session, alice.id)["lifetime_credit"] == 12.5
+
+    # Nothing left to approve: a second run is a no-op
+    db_session.execute(update(CashbackEvent).where(CashbackEvent.user_id == bob.id).values(created_at=datetime.utcnow()))
+    db_session.commit()
+    assert approve_cashback_events(db_session, batch_size=1) == 0
@@ -0,0 +1,65 @@
+"""Tests for the compiled cashback rule index."""
+from decimal import Decimal
+
+import pytest
+
+from app.models import CashbackRule
+from app.services import cashback_rules
+from app.services.cashback_rules import CompiledRules
+from tests.factories import create_merchant
+
+
+@pytest.fixture(autouse=True)
+def fresh_rules(monkeypatch):
+    published = []
+    monkeypatch.setattr(cashback_rules, "publish", lambda channel, payload: published.append((channel, payload)))
+    cashback_rules._drop_local()
+    yield published
+    cashback_rules._drop_local()
+
+
+def _rules(*rows, default=70):
+    return CompiledRules(rows, Decimal(default))
+
+
+def test_fallback_chain_prefers_most_specific_rule():
+    rules = _rules(
+        (1, None, None, 10, None),
+        (2, None, 7, 20, None),
+        (3, 5, None, 30, None),
+        (4, 5, 7, 40, None),
+    )
+    assert rules.rate_for(5, 7).rule_id == 4
+    assert rules.rate_for(5, 8).rule_id == 3
+    assert rules.rate_for(6, 7).rule_id == 2
+    assert rules.rate_for(6, None).rule_id == 1
+    assert _rules().rate_for(6, None) == (Decimal("0.7"), None, None)
+
+
+def test_newest_rule_wins_a_shared_key():
+    rules = _rules((9, 5, None, 50, None), (3, 5, None, 10, None))
+    assert rules.rate_for(5).rule_id == 9 and len(rules) == 1
+
+
+def test_evaluate_applies_rate_cap_and_rounding():
+    rules = _rules((1, 5, None, 50, 30), (2, None, None, 12.5, None))
+    amounts = rules.evaluate([(Decimal("40"), 5, None), (Decimal("100"), 5, None), (Decimal("0.99"), 6, None), (3, 6, None)])
+    assert amounts == [Decimal("20.00"), Decimal("30"), Decimal("0.12"), Decimal("0.38")]
+
+
+def test_compiled_rules_are_reused_until_a_rule_changes(db_session, fresh_rules):
+    merchant = create_merchant(db_session, "Rule Mart")
+    db_session.add(CashbackRule(merchant_id=merchant.id, rule_name="first", rate_percent=10))
+    db_session.commit()
+
+    first = cashback_rules.get_rules(db_session)
+    assert cashback_rules.get_rules(db_session) is first
+    assert first.rate_for(merchant.id).factor == Decimal("0.1")
+
+    # Committing a rule edit invalidates this process and publishes to the others
+    rule = db_session.query(CashbackRule).filter_by(rule_name="first").one()
+    rule.rate_percent = 25
+    db_session.commit()
+
+    assert fresh_rules == [(cashback_rules.RULES_CHANNEL, {"invalidate": True})] * 2
+    assert cashback_rules.get_rules(db_session).rate_for(merchant.id).factor == Decimal("0.25")
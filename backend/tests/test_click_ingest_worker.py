@@ -0,0 +1,128 @@
+"""Tests for the click ingestion worker against a real Redis (``redis_client`` fixture)."""
+import json
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+
+from app.job_queue import JobQueue
+from app.models import OfferClick
+from app.redis_client import rk
+from app.services import merchant_counters
+from tests.factories import create_merchant, create_offer, create_user
+from workers import click_ingest_worker as worker
+
+BROWSER = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120.0 Safari/537.36"
+
+
+UNKNOWN_OFFER = "00000000-0000-4000-8000-000000000000"
+
+
+def _click(offer_uuid, user_id=None, ip="10.0.0.1", ua=BROWSER, ts=None, referrer=""):
+    return json.dumps({
+        "offerId": offer_uuid, "merchantId": "1", "userId": str(user_id) if user_id else None,
+        "ua": ua, "ip": ip, "referrer": referrer, "ts": ts or int(time.time() * 1000),
+    })
+
+
+@pytest.fixture
+def clicks_queue(redis_client):
+    for pattern in (rk("clicks", "seen", "*"), rk("offer", "*")):
+        for key in redis_client.scan_iter(match=pattern):
+            redis_client.delete(key)
+    return JobQueue("clicks", client=redis_client, worker_id="ingest-test")
+
+
+def _ingest(db, queue, raws, offers=None):
+    queue.client.rpush(queue.key, *raws)
+    claimed = queue.claim_many(len(raws))
+    return worker.ingest(db, queue, claimed, offers or worker.OfferLookup())
+
+
+def _stored(db, offer):
+    return db.scalar(select(func.count()).select_from(OfferClick).where(OfferClick.offer_id == offer.id))
+
+
+def test_batch_dedupes_and_counts(db_session, clicks_queue):
+    shop = create_merchant(db_session, "Ingest Shop")
+    offer = create_offer(db_session, shop, "Ingest deal")
+    user = create_user(db_session)
+    now_ms = int(time.time() * 1000)
+    raws = [
+        _click(offer.uuid, user.id, ts=now_ms, referrer="https://example.com/deals"),
+        _click(offer.uuid, user.id, ts=now_ms + 2000),  # double click
+        _click(offer.uuid, ip="10.0.0.2, 172.16.0.1"),  # X-Forwarded-For chain
+        _click(offer.uuid, ip="not an ip", ua="Mozilla/5.0 (iPhone) Mobile Safari"),
+        _click(offer.uuid, 987654),  # unknown user: stored without it
+        _click(offer.uuid, ua="Googlebot/2.1 (+http://www.google.com/bot.html)"),
+        _click(UNKNOWN_OFFER),
+        _click(str(offer.id)),  # not a uuid
+        "not json",
+    ]
+
+    outcomes = _ingest(db_session, clicks_queue, raws)
+
+    assert outcomes == {"stored": 4, "duplicate": 1, "bot": 1, "invalid": 2, "unknown_offer": 1}
+    assert _stored(db_session, offer) == 4
+    details = set(db_session.execute(
+        select(OfferClick.user_id, OfferClick.ip_address, OfferClick.referrer_url, OfferClick.device_type)
+        .where(OfferClick.offer_id == offer.id)
+    ).all())
+    assert details == {
+        (user.id, "10.0.0.1", "https://example.com/deals", "desktop"),
+        (None, "10.0.0.2", None, "desktop"),
+        (None, None, None, "mobile"),
+        (None, "10.0.0.1", None, "desktop"),
+    }
+    redis = clicks_queue.client
+    assert redis.get(rk("offer", str(offer.id), "clicks")) == "4"
+    assert redis.smembers(rk("offer", str(offer.id), "viewers")) == {str(user.id)}
+    bucket = merchant_counters.bucket_key(merchant_counters.CLICKS, datetime.utcnow())
+    assert redis.zscore(bucket, str(shop.id)) == 4
+    assert redis.llen(clicks_queue.processing_key()) == 0  # acked with the counters
+
+    # the same visitor again, in a later batch
+    assert _ingest(db_session, clicks_queue, [_click(offer.uuid, user.id)]) == {"duplicate": 1}
+    assert _stored(db_session, offer) == 4
+
+
+def test_failed_store_releases_dedupe_keys(db_session, clicks_queue, monkeypatch):
+    offer = create_offer(db_session, create_merchant(db_session, "Retry Shop"), "Retry deal")
+    offer_id, offer_uuid = offer.id, offer.uuid
+
+    def broken(*args):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(worker, "copy_rows", broken)
+    with pytest.raises(RuntimeError):
+        _ingest(db_session, clicks_queue, [_click(offer_uuid, ip="10.1.1.1")])
+
+    assert list(clicks_queue.client.scan_iter(match=rk("clicks", "seen", str(offer_id), "*"))) == []
+    assert clicks_queue.requeue_claimed() == 1  # back on the queue for the retry
+
+
+def test_out_of_range_user_ids_are_dropped():
+    click = worker.parse_click(_click(UNKNOWN_OFFER, 99999999999))
+    assert click.user_id is None and not click.visitor.startswith("u")
+    assert worker.parse_click(_click(UNKNOWN_OFFER, -5)).user_id is None
+
+
+def test_failing_batch_is_split_then_dead_lettered(clicks_queue, monkeypatch):
+    monkeypatch.setattr(worker.settings, "CLICK_INGEST_BATCH_SIZE", 2)
+    monkeypatch.setattr(worker.settings, "CLICK_INGEST_MAX_ATTEMPTS", 2)
+    clicks_queue.client.rpush(clicks_queue.key, "poison", "good")
+    failed_batches = worker.FailedBatches()
+
+    for _ in range(2):
+        assert worker._claim_batch(clicks_queue, failed_batches.batch_size) == ["poison", "good"]
+        failed_batches.failed(clicks_queue, 2)
+    assert failed_batches.batch_size == 1
+    for _ in range(2):
+        assert worker._claim_batch(clicks_queue, failed_batches.batch_size) == ["poison"]
+        failed_batches.failed(clicks_queue, 1)
+
+    assert clicks_queue.client.lrange(clicks_queue.dlq_key, 0, -1) == ["poison"]
+    assert worker._claim_batch(clicks_queue, failed_batches.batch_size) == ["good"]
+    failed_batches.stored(1)
+    assert failed_batches.batch_size == 2
@@ -0,0 +1,38 @@
+"""Tests for connection pool instrumentation and replica routing."""
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, insert, select, text
+
+from app import database
+from app.database import InstrumentedQueuePool, RoutingSession
+from app.models import Merchant
+
+
+def test_pool_exports_checkout_and_saturation(tmp_path):
+    pool_engine = create_engine(
+        f"sqlite:///{tmp_path}/pool.db", poolclass=InstrumentedQueuePool,
+        pool_size=2, max_overflow=2, pool_logging_name="test",
+    )
+    with pool_engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        assert REGISTRY.get_sample_value("app_db_pool_saturation_ratio", {"pool": "test"}) == 0.25
+    assert REGISTRY.get_sample_value("app_db_pool_checked_out", {"pool": "test"}) == 0
+    assert REGISTRY.get_sample_value("app_db_pool_checkout_seconds_count", {"pool": "test"}) >= 1
+
+
+def test_routing_session_sends_reads_to_replicas(monkeypatch):
+    replica = create_engine("sqlite://")
+    monkeypatch.setattr(database, "replica_engines", [replica])
+    session = RoutingSession(bind=database.engine)
+    assert session.get_bind(clause=select(Merchant)) is replica
+    assert session.get_bind(clause=select(Merchant).with_for_update()) is database.engine
+    assert session.get_bind(clause=insert(Merchant)) is database.engine
+
+
+def test_routing_session_keeps_one_replica_until_closed(monkeypatch):
+    replicas = [create_engine("sqlite://") for _ in range(8)]
+    monkeypatch.setattr(database, "replica_engines", replicas)
+    session = RoutingSession(bind=database.engine)
+    chosen = session.get_bind(clause=select(Merchant))
+    assert all(session.get_bind(clause=select(Merchant)) is chosen for _ in range(20))
+    session.close()
+    assert "replica" not in session.info
@@ -0,0 +1,219 @@
+"""Tests for the email/SMS dispatcher (queues in Redis, providers served by httpx.MockTransport)."""
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from app.job_queue import JobQueue
+from app.queue import get_dead_letter_jobs, get_queue_stats, push_email_job, push_sms_job
+from workers import email_sms_worker as worker
+from workers.email_sms_worker import Dispatcher, Msg91Provider, SendGridProvider
+
+
+class FakeApi:
+    """Records request bodies; ``respond`` picks the status for each."""
+
+    def __init__(self, respond=lambda body: 200):
+        self.bodies = []
+        self.respond = respond
+
+    def __call__(self, request):
+        body = json.loads(request.content)
+        self.bodies.append(body)
+        return httpx.Response(self.respond(body), text="")
+
+
+def _dispatcher(redis_client, email_api, sms_api=None, **kwargs):
+    queues = [JobQueue("email", redis_client, "worker-a"), JobQueue("sms", redis_client, "worker-a")]
+    providers = {
+        "email": SendGridProvider("sg-key", rate_per_second=0, transport=httpx.MockTransport(email_api)),
+        "sms": Msg91Provider("msg-key", rate_per_second=0, transport=httpx.MockTransport(sms_api or FakeApi())),
+    }
+    return Dispatcher(queues, providers, **kwargs)
+
+
+def _dispatch(dispatcher):
+    async def run():
+        claimed = await dispatcher.dispatch_once()
+        await dispatcher.drain()
+        for provider in dispatcher.providers.values():
+            await provider.aclose()
+        return claimed
+
+    return asyncio.run(run())
+
+
+def test_same_body_emails_share_a_request(redis_client, monkeypatch):
+    renders = []
+
+    def render_email(email_type, data=None, locale=None):
+        renders.append(email_type)
+        return real_render(email_type, data, locale)
+
+    real_render = worker.render_email
+    monkeypatch.setattr(worker, "render_email", render_email)
+    email_api, sms_api = FakeApi(lambda body: 202), FakeApi()
+    for i in range(5):
+        push_email_job("welcome", f"user{i}@example.com", {})
+    push_email_job("order_confirmation", "buyer@example.com", {"order_number": "A1"})
+    push_sms_job("otp", "+919876543210", {"otp": "111111"})
+    push_sms_job("otp", "+919876543211", {"otp": "222222"})
+
+    assert _dispatch(_dispatcher(redis_client, email_api, sms_api)) == 8
+    sizes = sorted(len(body["personalizations"]) for body in email_api.bodies)
+    assert sizes == [1, 5]
+    assert len(renders) == 6  # once per job, reused for the request
+    (sms_body,) = sms_api.bodies
+    assert [r["mobiles"] for r in sms_body["recipients"]] == ["9876543210", "9876543211"]
+    assert [r["otp"] for r in sms_body["recipients"]] == ["111111", "222222"]
+    stats = get_queue_stats()
+    assert (stats["email"]["pending"], stats["sms"]["pending"]) == (0, 0)
+    assert redis_client.llen(JobQueue("email", redis_client, "worker-a").processing_key()) == 0
+
+
+def test_batches_respect_size_and_in_flight_cap(redis_client):
+    email_api = FakeApi(lambda body: 202)
+    for i in range(7):
+        push_email_job("welcome", f"user{i}@example.com", {})
+    dispatcher = _dispatcher(redis_client, email_api, max_in_flight=10)
+    dispatcher.providers["email"].batch_size = 3
+
+    # 10 in flight split across two queues: 5 emails claimed, in batches of 3 + 2
+    assert _dispatch(dispatcher) == 5
+    assert sorted(len(body["personalizations"]) for body in email_api.bodies) == [2, 3]
+    assert get_queue_stats()["email"]["pending"] == 2
+
+
+def test_rejected_batch_is_resent_one_by_one(redis_client):
+    def respond(body):
+        if len(body["personalizations"]) > 1:
+            return 400
+        return 400 if body["personalizations"][0]["to"][0]["email"] == "bad" else 202
+
+    email_api = FakeApi(respond)
+    for to in ("good1@example.com", "bad", "good2@example.com"):
+        push_email_job("welcome", to, {})
+
+    _dispatch(_dispatcher(redis_client, email_api))
+    assert len(email_api.bodies) == 4  # the batch, then each job alone
+    (scheduled,) = redis_client.zrange(JobQueue("email").scheduled_key, 0, -1)
+    assert json.loads(scheduled)["to"] == "bad" and json.loads(scheduled)["attempts"] == 1
+
+
+def test_failures_retry_then_dead_letter(redis_client):
+    email_api = FakeApi(lambda body: 503)
+    queue = JobQueue("email", redis_client, "worker-a")
+    push_email_job("welcome", "down@example.com", {}, job_id="email_down")
+    _dispatch(_dispatcher(redis_client, email_api))
+    (scheduled,) = redis_client.zrange(queue.scheduled_key, 0, -1)
+    assert json.loads(scheduled)["attempts"] == 1
+
+    redis_client.delete(queue.scheduled_key)
+    redis_client.rpush(queue.key, json.dumps(dict(json.loads(scheduled), attempts=worker.MAX_ATTEMPTS - 1)))
+    _dispatch(_dispatcher(redis_client, email_api))
+    (dead,) = get_dead_letter_jobs("email")
+    assert dead["id"] == "email_down" and dead["attempts"] == worker.MAX_ATTEMPTS
+    assert "503" in dead["error"]
+    assert redis_client.llen(queue.processing_key()) == 0
+
+
+
+def test_unbatchable_jobs_are_dead_lettered_without_stopping_dispatch(redis_client, monkeypatch):
+    real_render = worker.render_email
+
+    def render(email_type, data=None, locale=None):
+        if email_type == "broken":
+            raise ValueError("template blew up")
+        return real_render(email_type, data, locale)
+
+    monkeypatch.setattr(worker, "render_email", render)
+    email_api = FakeApi(lambda body: 202)
+    queue = JobQueue("email", redis_client, "worker-a")
+    redis_client.rpush(queue.key, "[1]")
+    push_email_job("broken", "x@example.com", {}, job_id="email_broken")
+    push_email_job("welcome", "ok@example.com", {})
+
+    assert _dispatch(_dispatcher(redis_client, email_api)) == 3
+    assert len(email_api.bodies) == 1
+    dead = get_dead_letter_jobs("email")
+    assert sorted(job.get("id", job.get("raw")) for job in dead) == ["[1]", "email_broken"]
+    assert redis_client.llen(queue.processing_key()) == 0
+
+
+def test_unexpected_send_errors_settle_jobs_as_retries(redis_client, monkeypatch):
+    def payload(self, items):
+        raise KeyError("missing variable")
+
+    monkeypatch.setattr(Msg91Provider, "payload", payload)
+    queue = JobQueue("sms", redis_client, "worker-a")
+    push_sms_job("otp", "+919876543210", {"otp": "111111"}, job_id="sms_render")
+
+    _dispatch(_dispatcher(redis_client, FakeApi()))
+    (scheduled,) = redis_client.zrange(queue.scheduled_key, 0, -1)
+    assert json.loads(scheduled)["id"] == "sms_render" and json.loads(scheduled)["attempts"] == 1
+    assert redis_client.llen(queue.processing_key()) == 0
+
+
+def test_provider_caps_concurrent_requests():
+    in_flight = peak = 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(202)
+
+    provider = SendGridProvider("sg-key", concurrency=2, rate_per_second=0, transport=httpx.MockTransport(handler))
+    jobs = [{"type": "welcome", "to": f"user{i}@example.com", "data": {}} for i in range(6)]
+
+    async def run():
+        await asyncio.gather(*(provider.send([(job, provider.render(job))]) for job in jobs))
+        await provider.aclose()
+
+    asyncio.run(run())
+    assert peak == 2
+
+
+def test_throttled_provider_pauses():
+    provider = SendGridProvider(
+        "sg-key",
+        transport=httpx.MockTransport(lambda request: httpx.Response(429, headers={"Retry-After": "5"})),
+    )
+    job = {"type": "welcome", "to": "a@example.com", "data": {}}
+    with pytest.raises(worker.ProviderError):
+        asyncio.run(provider.send([(job, provider.render(job))]))
+    assert provider._next_request_at >= time.monotonic() + 4
+
+
+def test_provider_without_payload_cannot_be_built():
+    class Incomplete(worker.Provider):
+        def render(self, job):
+            return ""
+
+        def batch_key(self, job, rendered):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete(concurrency=1, rate_per_second=0, batch_size=1)
+
+
+def test_prerendered_batch_job_is_sent_as_is(redis_client, monkeypatch):
+    from app.queue import email_batch_job, push_email_jobs
+
+    def render_email(*args, **kwargs):
+        raise AssertionError("prerendered jobs are not rendered again")
+
+    monkeypatch.setattr(worker, "render_email", render_email)
+    email_api = FakeApi(lambda body: 202)
+    recipients = [{"to": f"reader{i}@example.com", "substitutions": {"-name-": f"Reader {i}"}} for i in range(3)]
+    push_email_jobs([email_batch_job("newsletter_campaign", recipients, {"campaign_id": 1}, subject="Top deals", html="<p>Hi -name-</p>")])
+
+    assert _dispatch(_dispatcher(redis_client, email_api)) == 1
+    (body,) = email_api.bodies
+    assert body["content"] == [{"type": "text/html", "value": "<p>Hi -name-</p>"}]
+    assert [p["subject"] for p in body["personalizations"]] == ["Top deals"] * 3
+    assert body["personalizations"][2]["substitutions"] == {"-name-": "Reader 2"}
@@ -0,0 +1,129 @@
+"""Tests for the denormalized merchant counters (Redis calls are faked)."""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app.models import Merchant
+from app.services import merchant_counters
+from tests.factories import create_merchant, create_offer
+
+
+class FakeRedis:
+    """Just the sorted-set commands the counters use, pipelined."""
+
+    def __init__(self):
+        self.zsets = defaultdict(dict)
+        self.queued = []
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def zincrby(self, key, amount, member):
+        self.queued.append(lambda: self.zsets[key].__setitem__(member, self.zsets[key].get(member, 0) + amount))
+
+    def expire(self, key, seconds, nx=False):
+        self.queued.append(lambda: True)
+
+    def zunionstore(self, dest, keys):
+        def run():
+            merged = defaultdict(float)
+            for key in keys:
+                for member, score in self.zsets.get(key, {}).items():
+                    merged[member] += score
+            self.zsets[dest] = dict(merged)
+        self.queued.append(run)
+
+    def zmscore(self, key, members):
+        self.queued.append(lambda: [self.zsets.get(key, {}).get(m) for m in members])
+
+    def execute(self):
+        results = [step() for step in self.queued]
+        self.queued = []
+        return results
+
+
+class FakeAsyncRedis:
+    """The asyncio client's view of the same sets, for the routes' reads."""
+
+    def __init__(self, sync):
+        self.sync = sync
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def zmscore(self, key, members):
+        self.sync.zmscore(key, members)
+
+    async def execute(self):
+        return self.sync.execute()
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    from app import redis_async
+
+    fake = FakeRedis()
+    monkeypatch.setattr(merchant_counters, "redis_client", fake)
+    monkeypatch.setattr(redis_async, "get_async_redis", lambda: FakeAsyncRedis(fake))
+    return fake
+
+
+def _count(db, merchant):
+    db.refresh(merchant)
+    return merchant.active_offers_count
+
+
+def test_offer_writes_maintain_active_count(db_session):
+    shop, other = create_merchant(db_session, "Counter Shop"), create_merchant(db_session, "Counter Other")
+    first = create_offer(db_session, shop, "One")
+    second = create_offer(db_session, shop, "Two")
+    create_offer(db_session, shop, "Inactive", active=False)
+    assert _count(db_session, shop) == 2
+
+    first.is_active = False  # admin soft delete
+    db_session.commit()
+    assert _count(db_session, shop) == 1
+
+    second.merchant_id = other.id  # moved to another merchant
+    db_session.commit()
+    assert (_count(db_session, shop), _count(db_session, other)) == (0, 1)
+
+    db_session.delete(second)
+    db_session.commit()
+    assert _count(db_session, other) == 0
+
+
+def test_reconcile_corrects_drift(db_session):
+    shop = create_merchant(db_session, "Drift Shop")
+    create_offer(db_session, shop, "Live")
+    db_session.execute(update(Merchant).where(Merchant.id == shop.id).values(active_offers_count=7))
+    db_session.commit()
+
+    assert merchant_counters.reconcile(db_session) >= 1
+    assert _count(db_session, shop) == 1
+    assert merchant_counters.reconcile(db_session) == 0
+
+
+def test_listing_reads_counters(client, db_session, fake_redis, monkeypatch):
+    from app import cache
+
+    async def miss(*args):
+        return None
+
+    monkeypatch.setattr(cache, "_redis_get_async", miss)
+    monkeypatch.setattr(cache, "_redis_set_async", miss)
+    cache.local_cache.clear()
+    shop = create_merchant(db_session, "Window Shop")
+    create_offer(db_session, shop, "Window deal")
+    now = datetime.utcnow()
+    merchant_counters.record_clicks([shop.id, shop.id], now=now)
+    merchant_counters.record_clicks([shop.id], now=now - timedelta(hours=30))  # outside the window
+    merchant_counters.record_conversions([shop.id], now=now - timedelta(hours=3))
+    merchant_counters.materialize(now)
+
+    body = client.get("/api/v1/merchants/", params={"search": "Window Shop"}).json()
+    cache.local_cache.clear()
+    card = body["data"]["merchants"][0]
+    assert (card["offers_count"], card["clicks_24h"], card["conversions_24h"]) == (1, 2, 1)
@@ -0,0 +1,121 @@
+"""Tests for the chunked, resumable newsletter fan-out (Redis pushes are captured)."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, func, select
+
+from app.models.newsletter import NewsletterCampaign, NewsletterDelivery, NewsletterSubscriber
+from app.tasks import newsletter_delivery
+
+
+@pytest.fixture
+def pushed(monkeypatch):
+    jobs = []
+    monkeypatch.setattr(newsletter_delivery, "push_email_jobs", jobs.extend)
+    monkeypatch.setattr(newsletter_delivery.settings, "NEWSLETTER_CHUNK_SIZE", 4)
+    monkeypatch.setattr(newsletter_delivery.settings, "NEWSLETTER_RECIPIENTS_PER_JOB", 3)
+    monkeypatch.setattr(newsletter_delivery.settings, "NEWSLETTER_SEND_RATE_PER_SECOND", 0)
+    return jobs
+
+
+@pytest.fixture
+def campaign(db_session):
+    db_session.execute(delete(NewsletterSubscriber))
+    db_session.add_all(
+        NewsletterSubscriber(email=f"reader{i}@example.com", name=f"Reader {i}", status="active" if i != 3 else "unsubscribed")
+        for i in range(10)
+    )
+    campaign = NewsletterCampaign(name="Weekly", subject="Top deals", html_content="<p>Deals</p>", status="draft")
+    db_session.add(campaign)
+    db_session.commit()
+    return campaign
+
+
+def _recipients(jobs):
+    return [recipient["to"] for job in jobs for recipient in job["recipients"]]
+
+
+def test_fans_out_in_chunked_batch_jobs(db_session, campaign, pushed):
+    assert newsletter_delivery.start_campaign(db_session, campaign) == 9
+    assert newsletter_delivery.deliver_campaign(db_session, campaign) is True
+
+    # chunks of 4, 4, 1 subscribers -> jobs of 3+1, 3+1, 1 recipients
+    assert [len(job["recipients"]) for job in pushed] == [3, 1, 3, 1, 1]
+    assert len(set(_recipients(pushed))) == 9 and "reader3@example.com" not in _recipients(pushed)
+    job = pushed[0]
+    assert job["type"] == "newsletter_campaign" and job["subject"] == "Top deals"
+    assert "<p>Deals</p>" in job["html"] and "-unsubscribe_url-" in job["html"]
+    assert "html_content" not in job["data"]  # the body travels rendered, once per job
+    first = job["recipients"][0]["substitutions"]
+    assert first["-name-"] == "Reader 0" and "reader0%40example.com" in first["-unsubscribe_url-"]
+
+    assert (campaign.status, campaign.sent_count) == ("sent", 9)
+    rows = db_session.scalar(
+        select(func.count()).select_from(NewsletterDelivery).where(
+            NewsletterDelivery.campaign_id == campaign.id, NewsletterDelivery.status == "queued"
+        )
+    )
+    assert rows == 9
+
+
+def test_resumes_from_checkpoint(db_session, campaign, pushed, monkeypatch):
+    newsletter_delivery.start_campaign(db_session, campaign)
+    clock = iter([0.0, 0.0, 100.0])  # start, first chunk in time, deadline passed before the second
+    monkeypatch.setattr(newsletter_delivery.time, "monotonic", lambda: next(clock, 100.0))
+
+    assert newsletter_delivery.deliver_campaign(db_session, campaign, deadline=50.0) is False
+    assert (campaign.status, campaign.sent_count) == ("sending", 4)
+    assert campaign.last_subscriber_id and campaign.checkpoint_at
+    progress = newsletter_delivery.campaign_progress(campaign)
+    assert (progress["enqueued"], progress["total_recipients"], progress["percent"]) == (4, 9, 44.4)
+
+    monkeypatch.setattr(newsletter_delivery.time, "monotonic", lambda: 0.0)
+    assert newsletter_delivery.deliver_campaign(db_session, campaign) is True
+    recipients = _recipients(pushed)
+    assert len(recipients) == len(set(recipients)) == 9
+    assert campaign.sent_count == 9
+
+
+def test_deliver_campaigns_picks_up_due_scheduled(db_session, campaign, pushed):
+    campaign.status, campaign.send_at = "scheduled", datetime.utcnow() - timedelta(minutes=1)
+    later = NewsletterCampaign(
+        name="Later", subject="Soon", html_content="<p/>", status="scheduled", send_at=datetime.utcnow() + timedelta(days=1)
+    )
+    db_session.add(later)
+    db_session.commit()
+
+    assert newsletter_delivery.deliver_campaigns(db_session, budget_seconds=30) == 1
+    assert (campaign.status, later.status) == ("sent", "scheduled")
+
+
+def test_send_endpoint_queues_and_reports_progress(db_session, campaign, pushed):
+    from fastapi import HTTPException
+
+    from app.api.v1 import newsletter
+
+    response = newsletter.send_campaign(campaign.id, db_session)
+    assert "9 subscribers" in response["message"]
+    assert pushed == []  # fan-out belongs to the cron worker
+
+    progress = newsletter.get_campaign_progress(campaign.id, db_session)["data"]
+    assert (progress["status"], progress["total_recipients"], progress["enqueued"]) == ("sending", 9, 0)
+    with pytest.raises(HTTPException):
+        newsletter.send_campaign(campaign.id, db_session)
+
+
+def test_campaign_routes_are_mounted_for_admins_only(client, db_session, campaign, pushed):
+    from app.security import create_access_token
+    from tests.factories import create_user
+
+    def header(user):
+        return {"Authorization": f"Bearer {create_access_token(str(user.id))}"}
+
+    admin = create_user(db_session, "newsletter-admin@example.com", is_admin=True)
+    reader = create_user(db_session, "newsletter-reader@example.com")
+    url = f"/api/v1/newsletter/admin/campaigns/{campaign.id}/send"
+
+    assert client.post(url).status_code == 401
+    assert client.post(url, headers=header(reader)).status_code == 403
+    assert client.post(url, headers=header(admin)).status_code == 200
+    progress = client.get(f"/api/v1/newsletter/admin/campaigns/{campaign.id}/progress", headers=header(admin))
+    assert progress.status_code == 200
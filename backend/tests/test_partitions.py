@@ -0,0 +1,75 @@
+"""Tests for the partition manager (the DDL is Postgres-only, so it is checked as recorded SQL)."""
+from datetime import date
+
+import pytest
+
+from app.tasks import partitions
+
+
+def test_month_arithmetic_and_names():
+    assert partitions.month_start(date(2026, 10, 18)) == date(2026, 10, 1)
+    assert partitions.add_months(date(2026, 11, 1), 3) == date(2027, 2, 1)
+    assert partitions.add_months(date(2026, 1, 1), -13) == date(2024, 12, 1)
+    assert partitions.partition_name("offer_clicks", date(2027, 2, 1)) == "offer_clicks_p202702"
+    assert partitions.partition_month("offer_clicks_p202702") == date(2027, 2, 1)
+    assert partitions.partition_month("offer_clicks_default") is None
+
+
+def test_retention_only_for_listed_tables(monkeypatch):
+    monkeypatch.setattr(partitions.settings, "PARTITION_RETENTION_MONTHS", "offer_clicks=13, audit=6")
+    assert partitions.retention_months() == {"offer_clicks": 13, "audit": 6}
+
+
+def test_noop_outside_postgres(db_session):
+    if db_session.get_bind().dialect.name != "postgresql":
+        assert partitions.manage_partitions(db_session) == {}
+
+
+class RecordingSession:
+    """Records the SQL the partition manager runs; answers its catalog lookups."""
+
+    def __init__(self, stranded: bool):
+        self.stranded = stranded
+        self.statements = []
+        self.commits = 0
+
+    def scalar(self, statement, params=None):
+        return self.stranded
+
+    def scalars(self, statement, params=None):
+        return ["id", "offer_id", "created_at"] if "pg_attribute" in str(statement) else []
+
+    def execute(self, statement, params=None):
+        self.statements.append(" ".join(str(statement).split()))
+
+    def commit(self):
+        self.commits += 1
+
+
+@pytest.fixture
+def one_month(monkeypatch):
+    monkeypatch.setattr(partitions.settings, "PARTITION_MONTHS_AHEAD", 0)
+
+
+def test_creates_missing_partition_directly(one_month):
+    db = RecordingSession(stranded=False)
+    assert partitions.ensure_partitions(db, "offer_clicks", date(2026, 10, 18)) == ["offer_clicks_p202610"]
+    assert db.statements == [
+        "CREATE TABLE IF NOT EXISTS offer_clicks_p202610 PARTITION OF offer_clicks "
+        "FOR VALUES FROM ('2026-10-01') TO ('2026-11-01')"
+    ]
+
+
+def test_moves_stranded_default_rows_into_the_new_partition(one_month):
+    db = RecordingSession(stranded=True)
+    assert partitions.ensure_partitions(db, "offer_clicks", date(2026, 10, 18)) == ["offer_clicks_p202610"]
+    in_month = "WHERE created_at >= '2026-10-01' AND created_at < '2026-11-01'"
+    assert db.statements == [
+        "ALTER TABLE offer_clicks DETACH PARTITION offer_clicks_default",
+        "CREATE TABLE offer_clicks_p202610 PARTITION OF offer_clicks FOR VALUES FROM ('2026-10-01') TO ('2026-11-01')",
+        "INSERT INTO offer_clicks_p202610 (id, offer_id, created_at) "
+        f"SELECT id, offer_id, created_at FROM offer_clicks_default {in_month}",
+        f"DELETE FROM offer_clicks_default {in_month}",
+        "ALTER TABLE offer_clicks ATTACH PARTITION offer_clicks_default DEFAULT",
+    ]
+    assert db.commits == 1  # all in one transaction
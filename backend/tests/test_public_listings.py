@@ -0,0 +1,151 @@
+"""Public read endpoints served through the async database path."""
+import pytest
+from fastapi import status
+
+from app import cache
+from app.services import autocomplete
+from tests.factories import create_merchant, create_offer
+
+
+@pytest.fixture(autouse=True)
+def cold_cache(monkeypatch):
+    """Bypass the shared Redis tier so each test reads its own rows."""
+    async def redis_get(key):
+        return None
+
+    async def redis_set(key, entry, ttl):
+        return None
+
+    monkeypatch.setattr(cache, "_redis_get_async", redis_get)
+    monkeypatch.setattr(cache, "_redis_set_async", redis_set)
+    cache.local_cache.clear()
+    yield
+    cache.local_cache.clear()
+
+
+def test_list_offers(client, db_session):
+    merchant = create_merchant(db_session, "Async Mart")
+    offer = create_offer(db_session, merchant, "Async 10% off")
+    resp = client.get("/api/v1/offers/", params={"merchant_id": merchant.id})
+    assert resp.status_code == status.HTTP_200_OK
+    body = resp.json()
+    assert [o["id"] for o in body["data"]] == [offer.id]
+    assert body["pagination"]["total"] == 1
+
+
+
+def test_list_offers_cursor_pages(client, db_session):
+    merchant = create_merchant(db_session, "Scroll Mart")
+    offers = [create_offer(db_session, merchant, f"Scroll deal {i}") for i in range(5)]
+    offers[2].priority = 10
+    db_session.commit()
+
+    body = client.get("/api/v1/offers/", params={"merchant_id": merchant.id, "limit": 2}).json()
+    assert body["pagination"]["total"] == 5
+    seen = [o["id"] for o in body["data"]]
+    while body["pagination"]["next_cursor"]:
+        params = {"merchant_id": merchant.id, "limit": 2, "cursor": body["pagination"]["next_cursor"]}
+        body = client.get("/api/v1/offers/", params=params).json()
+        seen += [o["id"] for o in body["data"]]
+        # Cursor pages skip the COUNT
+        assert "total" not in body["pagination"]
+    assert seen[0] == offers[2].id
+    assert sorted(seen) == sorted(o.id for o in offers) and len(seen) == 5
+
+
+def test_list_merchants_cursor_pages(client, db_session):
+    names = ["Keyset C", "Keyset A", "Keyset B"]
+    for name in names:
+        create_merchant(db_session, name)
+
+    first = client.get("/api/v1/merchants/", params={"search": "Keyset", "limit": 2, "include_total": False}).json()
+    page = first["data"]
+    assert [m["name"] for m in page["merchants"]] == ["Keyset A", "Keyset B"]
+    assert "total_items" not in page["pagination"] and page["pagination"]["has_more"] is True
+
+    second = client.get(
+        "/api/v1/merchants/", params={"search": "Keyset", "limit": 2, "cursor": page["pagination"]["next_cursor"]}
+    ).json()["data"]
+    assert [m["name"] for m in second["merchants"]] == ["Keyset C"]
+    assert second["pagination"]["next_cursor"] is None
+
+
+def test_cursor_is_scoped_to_its_listing(client, db_session):
+    for name in ("Scope A", "Scope B"):
+        create_merchant(db_session, name)
+    cursor = client.get(
+        "/api/v1/merchants/", params={"search": "Scope", "limit": 1}
+    ).json()["data"]["pagination"]["next_cursor"]
+    resp = client.get("/api/v1/offers/", params={"cursor": cursor})
+    assert resp.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_get_offer(client, db_session):
+    merchant = create_merchant(db_session, "Async Detail")
+    offer = create_offer(db_session, merchant, "Detail deal")
+    resp = client.get(f"/api/v1/offers/{offer.id}")
+    assert resp.json()["data"]["merchant"]["slug"] == merchant.slug
+
+
+def test_get_merchant(client, db_session):
+    merchant = create_merchant(db_session, "Async Slug")
+    create_offer(db_session, merchant, "One")
+    resp = client.get(f"/api/v1/merchants/{merchant.slug}")
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.json()["data"]["active_offers_count"] == 1
+
+
+def test_homepage_snapshot(client, db_session):
+    create_merchant(db_session, "Async Home")
+    resp = client.get("/api/v1/homepage/")
+    assert resp.status_code == status.HTTP_200_OK
+    assert set(resp.json()["data"]) == {"featured_merchants", "featured_offers", "exclusive_offers", "featured_products"}
+
+
+# The tests below run the routes on real AsyncSessions (``async_client``), so a
+# lazy load raises MissingGreenlet and reads must be routed to the replica.
+
+def test_async_session_lists_offers_from_the_replica(async_client, committed_session):
+    merchant = create_merchant(committed_session, "Real Async Mart")
+    offer = create_offer(committed_session, merchant, "Real async deal")
+    resp = async_client.get("/api/v1/offers/", params={"merchant_id": merchant.id})
+    assert resp.status_code == status.HTTP_200_OK
+    assert [o["id"] for o in resp.json()["data"]] == [offer.id]
+    assert async_client.replica_statements
+
+
+def test_async_session_merchant_detail(async_client, committed_session):
+    merchant = create_merchant(committed_session, "Real Async Slug")
+    create_offer(committed_session, merchant, "One")
+    resp = async_client.get(f"/api/v1/merchants/{merchant.slug}")
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.json()["data"]["active_offers_count"] == 1
+    assert async_client.replica_statements
+
+
+def test_async_session_homepage_snapshot(async_client, committed_session):
+    merchant = create_merchant(committed_session, "Real Async Home")
+    create_offer(committed_session, merchant, "Home deal")
+    resp = async_client.get("/api/v1/homepage/")
+    assert resp.status_code == status.HTTP_200_OK
+    assert set(resp.json()["data"]) == {"featured_merchants", "featured_offers", "exclusive_offers", "featured_products"}
+    assert async_client.replica_statements
+
+
+def test_async_session_autocomplete_falls_back_to_sql(async_client, committed_session, monkeypatch):
+    async def no_index(q, limit):
+        return None
+
+    monkeypatch.setattr(autocomplete, "suggest", no_index)
+    create_merchant(committed_session, "Realasync Store")
+    resp = async_client.get("/api/v1/search/autocomplete", params={"q": "Realasync"})
+    assert resp.status_code == status.HTTP_200_OK
+    assert [s["text"] for s in resp.json()["data"]["suggestions"]] == ["Realasync Store"]
+    assert async_client.replica_statements
+
+
+def test_async_products_need_no_session(async_client):
+    resp = async_client.get("/api/v1/products/")
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.json()["data"]["products"]
+    assert async_client.replica_statements == []
@@ -0,0 +1,149 @@
+"""Tests for web push broadcasts (push services are an httpx MockTransport)."""
+import asyncio
+import base64
+import json
+import os
+
+import httpx
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from sqlalchemy import delete, func, select
+
+from app import push_notifications
+from app.models.push_subscription import PushNotification, PushSubscription
+from app.push_notifications import EXPIRED, FAILED, SENT, WebPushSender
+from workers import push_worker
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).strip(b"=").decode()
+
+
+def _browser_keys() -> tuple[str, str]:
+    key = ec.generate_private_key(ec.SECP256R1())
+    point = key.public_key().public_bytes(serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint)
+    return _b64(point), _b64(os.urandom(16))
+
+
+@pytest.fixture(autouse=True)
+def vapid(monkeypatch):
+    key = ec.generate_private_key(ec.SECP256R1()).private_numbers().private_value.to_bytes(32, "big")
+    monkeypatch.setattr(push_notifications.settings, "VAPID_PRIVATE_KEY", _b64(key))
+    monkeypatch.setattr(push_notifications, "_vapid_key", None)
+    monkeypatch.setattr(push_notifications, "_vapid_headers", {})
+
+
+class FakePushService:
+    """Answers 201, or 410 for endpoints ending in /gone and 500 for /broken."""
+
+    def __init__(self):
+        self.requests = []
+        self.in_flight = self.max_in_flight = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0)
+        self.in_flight -= 1
+        if request.url.path.endswith("/gone"):
+            return httpx.Response(410)
+        if request.url.path.endswith("/broken"):
+            return httpx.Response(500)
+        return httpx.Response(201)
+
+
+def test_vapid_signed_once_per_origin():
+    first = push_notifications.vapid_headers("https://fcm.googleapis.com/fcm/send/a", now=1000)
+    assert push_notifications.vapid_headers("https://fcm.googleapis.com/fcm/send/b", now=2000) is first
+    other = push_notifications.vapid_headers("https://updates.push.services.mozilla.com/wpush/v2/c", now=2000)
+    assert other is not first and other["Authorization"].startswith("vapid t=")
+    # re-signed within an hour of the 12h expiry
+    assert push_notifications.vapid_headers("https://fcm.googleapis.com/fcm/send/a", now=1000 + 11.5 * 3600) is not first
+
+
+def test_send_many_groups_outcomes_within_concurrency():
+    service = FakePushService()
+    sender = WebPushSender(concurrency=2, transport=httpx.MockTransport(service))
+    p256dh, auth = _browser_keys()
+    subscriptions = [
+        {"id": i, "endpoint": f"https://push.example.com/{path}", "p256dh_key": p256dh, "auth_key": auth}
+        for i, path in enumerate(["a", "gone", "b", "broken", "c"])
+    ]
+
+    async def run():
+        try:
+            return await sender.send_many(subscriptions, {"title": "Hi", "body": "Deals"})
+        finally:
+            await sender.aclose()
+
+    outcomes = asyncio.run(run())
+    assert outcomes == {SENT: [0, 2, 4], EXPIRED: [1], FAILED: [3]}
+    assert service.max_in_flight <= 2
+    request = service.requests[0]
+    assert request.headers["Content-Encoding"] == "aes128gcm" and request.headers["Authorization"].startswith("vapid ")
+    assert b"Deals" not in request.content  # encrypted for the browser
+
+
+def test_broadcast_prunes_expired_and_logs_deliveries(db_session, monkeypatch):
+    monkeypatch.setattr(push_worker.settings, "PUSH_BROADCAST_CHUNK_SIZE", 2)
+    db_session.execute(delete(PushSubscription))
+    p256dh, auth = _browser_keys()
+    for user_id, path, active in [(1, "a", True), (1, "gone", True), (2, "b", True), (1, "broken", True), (1, "old", False), (3, "c", True)]:
+        db_session.add(PushSubscription(
+            user_id=user_id, endpoint=f"https://push.example.com/{user_id}/{path}", p256dh_key=p256dh, auth_key=auth, is_active=active
+        ))
+    db_session.commit()
+
+    service = FakePushService()
+    sender = WebPushSender(transport=httpx.MockTransport(service))
+    job = {"id": "push_1", "notification": {"title": "Sale", "body": "50% off", "data": {"offer_id": 7}}, "user_ids": [1, 2]}
+
+    async def run():
+        try:
+            return await push_worker.broadcast(db_session, job, sender)
+        finally:
+            await sender.aclose()
+
+    assert asyncio.run(run()) == {SENT: 2, EXPIRED: 1, FAILED: 1}
+    assert len(service.requests) == 4  # inactive and other users' subscriptions skipped
+
+    def active(path):
+        return db_session.scalar(select(PushSubscription.is_active).where(PushSubscription.endpoint.endswith(path)))
+
+    assert (active("/gone"), active("/broken"), active("/a")) == (False, True, True)
+    assert db_session.scalar(select(PushSubscription.last_used_at).where(PushSubscription.endpoint.endswith("/1/a")))
+    logged = db_session.scalars(select(PushNotification).where(PushNotification.title == "Sale")).all()
+    assert sorted(n.user_id for n in logged) == [1, 2] and logged[0].data == '{"offer_id": 7}'
+
+    # a retried job resumes after the last finished page
+    service.requests.clear()
+    assert asyncio.run(run()) == {SENT: 0, EXPIRED: 0, FAILED: 0}
+    assert service.requests == []
+    assert db_session.scalar(select(func.count()).select_from(PushNotification).where(PushNotification.title == "Sale")) == 2
+
+
+def test_admin_broadcast_route_queues_a_push_job(client, db_session, redis_client):
+    from app.queue import PUSH_QUEUE
+    from app.security import create_access_token
+    from tests.factories import create_user
+
+    admin = create_user(db_session, "push-admin@example.com", is_admin=True)
+    reader = create_user(db_session, "push-reader@example.com")
+    db_session.execute(delete(PushSubscription))
+    p256dh, auth = _browser_keys()
+    db_session.add(PushSubscription(
+        user_id=reader.id, endpoint="https://push.example.com/reader", p256dh_key=p256dh, auth_key=auth, is_active=True
+    ))
+    db_session.commit()
+
+    body = {"payload": {"title": "Sale", "body": "50% off"}, "user_ids": [reader.id]}
+    headers = {"Authorization": f"Bearer {create_access_token(str(admin.id))}"}
+    response = client.post("/api/v1/push/admin/broadcast", json=body, headers=headers)
+
+    assert response.status_code == 200
+    assert response.json()["data"]["total_subscriptions"] == 1
+    queued = [json.loads(raw) for raw in redis_client.lrange(PUSH_QUEUE, 0, -1)]
+    assert [job["id"] for job in queued] == [response.json()["data"]["job_id"]]
+    assert queued[0]["notification"]["title"] == "Sale" and queued[0]["user_ids"] == [reader.id]
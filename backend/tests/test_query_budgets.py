@@ -0,0 +1,96 @@
+"""SQL statement budgets: listings must not issue a query per row."""
+import pytest
+from fastapi import status
+
+from app import cache
+from app.api.v1.cart import validate_cart
+from app.loaders import Loader
+from app.models import Order, OrderItem, Product
+from app.schemas.cart import CartItem, CartValidateRequest
+from app.security import create_access_token
+from tests.factories import create_merchant, create_offer, create_product, create_user
+
+
+@pytest.fixture(autouse=True)
+def cold_cache(monkeypatch):
+    """Bypass the shared Redis tier so every request reaches the database."""
+    async def redis_get(key):
+        return None
+
+    async def redis_set(key, entry, ttl):
+        return None
+
+    monkeypatch.setattr(cache, "_redis_get_async", redis_get)
+    monkeypatch.setattr(cache, "_redis_set_async", redis_set)
+    cache.local_cache.clear()
+    yield
+    cache.local_cache.clear()
+
+
+@pytest.fixture
+def shopper(db_session):
+    user = create_user(db_session, "budget@example.com")
+    return user, {"Authorization": f"Bearer {create_access_token(str(user.id))}"}
+
+
+def test_merchant_listing_counts_offers_inline(client, db_session, count_queries):
+    for i in range(6):
+        merchant = create_merchant(db_session, f"Budget Store {i}")
+        for j in range(i % 3):
+            create_offer(db_session, merchant, f"Budget deal {i}-{j}")
+
+    # Total + page, however many merchants are on it
+    with count_queries(budget=2):
+        resp = client.get("/api/v1/merchants/", params={"search": "Budget Store", "limit": 10})
+    assert resp.status_code == status.HTTP_200_OK
+    counts = {m["name"]: m["offers_count"] for m in resp.json()["data"]["merchants"]}
+    assert counts == {f"Budget Store {i}": i % 3 for i in range(6)}
+
+
+def test_order_listing_counts_items_inline(client, db_session, count_queries, shopper):
+    user, headers = shopper
+    merchant = create_merchant(db_session, "Budget Orders")
+    product = create_product(db_session, merchant, "Budget card")
+    for n in range(5):
+        order = Order(order_number=f"BUDGET-{n}", user_id=user.id, subtotal=10, total_amount=10)
+        db_session.add(order)
+        db_session.flush()
+        db_session.add_all([
+            OrderItem(order_id=order.id, product_id=product.id, product_name=product.name, unit_price=5, subtotal=5)
+            for _ in range(n)
+        ])
+    db_session.commit()
+
+    # Current user + total + page
+    with count_queries(budget=3):
+        resp = client.get("/api/v1/orders/", headers=headers)
+    assert resp.status_code == status.HTTP_200_OK
+    counts = {o["order_number"]: o["items_count"] for o in resp.json()["data"]["orders"]}
+    assert counts == {f"BUDGET-{n}": n for n in range(5)}
+
+
+def test_cart_validation_batches_product_lookups(db_session, count_queries):
+    user = create_user(db_session, "budget-cart@example.com")
+    merchant = create_merchant(db_session, "Budget Cart")
+    products = [create_product(db_session, merchant, f"Budget item {i}") for i in range(5)]
+    items = [CartItem(product_id=p.id, quantity=1) for p in products] + [CartItem(product_id=999999, quantity=1)]
+
+    # Products with their merchants in one query, not one (plus a lazy merchant load) per line
+    with count_queries(budget=1):
+        result = validate_cart(CartValidateRequest(items=items), db=db_session, current_user=user)
+    assert {item.merchant_name for item in result.items} == {"Budget Cart"}
+    assert "Product 999999 not found" in result.errors
+
+
+def test_loader_fetches_each_key_once(db_session, count_queries):
+    merchant = create_merchant(db_session, "Loader Mart")
+    first, second = (create_product(db_session, merchant, name) for name in ("Loader A", "Loader B"))
+    ids = [first.id, second.id, 424242]
+    loader = Loader.for_session(db_session, Product.id)
+
+    with count_queries() as statements:
+        rows = loader.load_many(ids)
+        assert loader.load(ids[0]) is rows[ids[0]]
+    assert len(statements) == 1
+    assert rows[424242] is None
+    assert Loader.for_session(db_session, Product.id) is loader
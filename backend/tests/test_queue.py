@@ -2,6 +2,7 @@
 import json
 import time
 import pytest
+from app.job_queue import JobQueue, blocking_client, retry_delay
 from app.redis_client import rk
 from app.queue import (
     push_email_job,
@@ -175,6 +176,76 @@ class TestDeadLetterQueue:
         assert redis_client.llen(rk("queue", "email", "dlq")) == 0
 
 
+class TestReliableQueue:
+    """Claims, retries, reaping and legacy migration."""
+
+    def test_claim_and_ack(self, redis_client):
+        queue = JobQueue("email", redis_client, "worker-a")
+        push_email_job("test", "claim@example.com", {})
+
+        raw = queue.claim(1)
+        assert json.loads(raw)["to"] == "claim@example.com"
+        assert redis_client.lrange(queue.processing_key(), 0, -1) == [raw]
+        assert get_queue_stats()["email"]["processing"] == 0  # not registered until it heartbeats
+        queue.heartbeat()
+        assert get_queue_stats()["email"]["processing"] == 1
+
+        assert queue.ack(raw) is True
+        assert get_queue_stats()["email"]["processing"] == 0
+        assert queue.claim(1) is None
+
+    def test_blocking_claim_outlasts_the_shared_socket_timeout(self, redis_client):
+        queue = JobQueue("email", blocking_client(1), "worker-a")
+        started = time.monotonic()
+        assert queue.claim(1) is None  # waited out server-side, not a client timeout
+        assert time.monotonic() - started >= 0.9
+
+        push_email_job("test", "blocking@example.com", {})
+        assert json.loads(queue.claim(1))["to"] == "blocking@example.com"
+
+    def test_retry_waits_for_backoff(self, redis_client):
+        queue = JobQueue("email", redis_client, "worker-a")
+        push_email_job("test", "retry@example.com", {})
+        raw = queue.claim(1)
+        job = dict(json.loads(raw), attempts=2)
+
+        now = time.time()
+        assert queue.retry(raw, job, now=now) is True
+        assert get_queue_stats()["email"]["scheduled"] == 1
+        assert queue.promote_due(now=now + retry_delay(2) - 1) == 0
+        assert queue.promote_due(now=now + retry_delay(2) + 1) == 1
+        assert json.loads(redis_client.lpop(queue.key))["attempts"] == 2
+        assert retry_delay(2) == 2 * retry_delay(1)
+
+    def test_reaper_requeues_stalled_worker(self, redis_client):
+        stalled = JobQueue("email", redis_client, "worker-dead")
+        for i in range(3):
+            push_email_job("test", f"user{i}@example.com", {"index": i})
+        first, second = stalled.claim(1), stalled.claim(1)
+        stalled.heartbeat(now=time.time() - 3600)
+        live = JobQueue("email", redis_client, "worker-live")
+        live.heartbeat()
+
+        assert live.reap() == 2
+        # Requeued ahead of the untouched job, in their original order
+        assert [json.loads(r)["data"]["index"] for r in redis_client.lrange(live.key, 0, -1)] == [0, 1, 2]
+        assert redis_client.zrange(live.workers_key, 0, -1) == ["worker-live"]
+        # The stalled worker finishing late does not settle the job a second time
+        assert stalled.ack(first) is False
+        assert stalled.retry(second, json.loads(second)) is False
+        assert redis_client.zcard(stalled.scheduled_key) == 0
+
+    def test_migrate_legacy_processing_set(self, redis_client):
+        job = json.dumps({"id": "legacy_1", "type": "test", "to": "old@example.com", "data": {}, "attempts": 0})
+        redis_client.sadd(rk("queue", "email", "processing"), job)
+
+        queue = JobQueue("email", redis_client, "worker-a")
+        assert queue.migrate_legacy() == 1
+        assert redis_client.lrange(queue.key, 0, -1) == [job]
+        assert not redis_client.exists(queue.legacy_processing_key)
+        assert queue.migrate_legacy() == 0
+
+
 class TestQueueIntegration:
     """Integration tests for queue system."""
 
@@ -0,0 +1,66 @@
+"""Tests for the Lua-backed rate limiting engine (Redis calls are faked)."""
+import asyncio
+
+import pytest
+
+from app import rate_limiter
+from app.rate_limiter import BlockList, RateLimitPolicy, check, parse_policies
+
+
+class FakeScript:
+    """Stands in for a registered Lua script; replays canned replies."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = 0
+
+    def __call__(self, keys, args):
+        self.calls += 1
+        return self.replies.pop(0)
+
+
+@pytest.fixture(autouse=True)
+def clear_blocklist():
+    rate_limiter.blocked.clear()
+    yield
+    rate_limiter.blocked.clear()
+
+
+def test_parse_policies():
+    policies = parse_policies("global=200/60, search=30/10/gcra")
+    assert policies["global"] == RateLimitPolicy(200, 60, "sliding_window")
+    assert policies["search"] == RateLimitPolicy(30, 10, "gcra")
+    with pytest.raises(ValueError):
+        parse_policies("search=30/10/leaky")
+
+
+def test_blocklist_expires():
+    blocks = BlockList(max_entries=10)
+    blocks.block("search:1.2.3.4", 5, now=100.0)
+    assert blocks.blocked_for("search:1.2.3.4", now=102.0) == pytest.approx(3.0)
+    assert blocks.blocked_for("search:1.2.3.4", now=106.0) == 0.0
+
+
+def test_denied_identifier_is_rejected_locally(monkeypatch):
+    script = FakeScript([1, 0, 1000], [0, 0, 30000])
+    monkeypatch.setitem(rate_limiter._sync_scripts, "sliding_window", script)
+    policy = RateLimitPolicy(1, 60)
+    assert check("search", "1.2.3.4", policy) == (True, 0, 1)
+    assert check("search", "1.2.3.4", policy) == (False, 0, 30)
+    # Blocked until the retry time without another script call
+    assert check("search", "1.2.3.4", policy).allowed is False
+    assert script.calls == 2
+
+
+def test_fails_open_when_redis_unavailable(monkeypatch):
+    def broken(keys, args):
+        raise ConnectionError("redis down")
+
+    monkeypatch.setitem(rate_limiter._sync_scripts, "gcra", broken)
+    assert check("search", "1.2.3.4", RateLimitPolicy(10, 60, "gcra")) == (True, 10, 60)
+
+    def unavailable():
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr("app.redis_async.get_async_redis", unavailable)
+    assert asyncio.run(rate_limiter.check_async("global", "1.2.3.4")).allowed is True
@@ -0,0 +1,15 @@
+"""Tests for the asyncio Redis helpers used on the event loop."""
+import asyncio
+
+from app import redis_async
+
+
+def test_client_is_pooled_per_event_loop():
+    async def grab():
+        return redis_async.get_async_redis(), redis_async.get_async_redis()
+
+    first_a, first_b = asyncio.run(grab())
+    second, _ = asyncio.run(grab())
+    assert first_a is first_b
+    assert second is not first_a
+
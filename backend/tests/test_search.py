@@ -35,6 +35,33 @@ class TestUniversalSearch:
         types = {r["type"] for r in data}
         assert {"merchant", "offer", "product"}.issubset(types)
 
+    def test_search_tolerates_typos(self, client, db_session, search_seed):
+        resp = client.get("/api/v1/search/", params={"q": "Alpah", "type": "merchant"})
+        assert resp.status_code == status.HTTP_200_OK
+        ids = [r["id"] for r in resp.json()["data"]["results"]]
+        assert search_seed["merchant"].id in ids
+
+    def test_search_pagination(self, client, db_session, search_seed):
+        first = client.get("/api/v1/search/", params={"q": "Alpha", "limit": 2}).json()["data"]
+        rest = client.get("/api/v1/search/", params={"q": "Alpha", "limit": 2, "offset": 2}).json()["data"]
+        assert first["total"] == rest["total"] >= 3
+        seen = [(r["type"], r["id"]) for r in first["results"] + rest["results"]]
+        assert len(seen) == len(set(seen))
+
+
+class TestSearchSql:
+    def test_like_pattern_escapes_wildcards(self):
+        from app.services.search import _like_pattern
+
+        assert _like_pattern("50%_off") == "%50\\%\\_off%"
+
+    def test_build_search_sql_limits_branches(self):
+        from app.services.search import build_search_sql
+
+        sql = build_search_sql(("offer",))
+        assert "FROM offers" in sql and "FROM merchants m," not in sql
+        assert "UNION ALL" in build_search_sql()
+
 
 class TestAutocomplete:
     def test_autocomplete_basic(self, client, db_session, search_seed):
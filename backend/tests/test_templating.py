@@ -0,0 +1,77 @@
+"""Tests for the shared email/SMS templates."""
+import shutil
+
+import pytest
+
+from app import templating
+from app.templating import prerender_email, render_email, render_sms
+
+
+@pytest.fixture
+def template_root(tmp_path, monkeypatch):
+    """A copy of the templates that tests can add locale overrides to."""
+    root = tmp_path / "templates"
+    shutil.copytree(templating.TEMPLATE_ROOT, root)
+    monkeypatch.setattr(templating, "TEMPLATE_ROOT", root)
+    caches = (templating.environment, templating._template, templating._prerender)
+    for cache in caches:
+        cache.cache_clear()
+    yield root
+    for cache in caches:
+        cache.cache_clear()
+
+
+def test_render_email_sets_subject_and_escapes_data():
+    rendered = render_email("order_confirmation", {
+        "user_name": "<script>",
+        "order_number": "ORD-7",
+        "total_amount": 150,
+        "items": [{"product_name": "Gift card", "quantity": 1, "unit_price": 150, "subtotal": 150}],
+    })
+    assert rendered.subject == "Order Confirmed - ORD-7"
+    assert "&lt;script&gt;" in rendered.html and "<script>" not in rendered.html
+    assert "₹150.00" in rendered.html and "Gift card" in rendered.html
+
+
+def test_unknown_types_fall_back_to_generic():
+    assert render_email("no_such_email", {"message": "Hello"}).html.strip() == "<p>Hello</p>"
+    assert render_sms("no_such_sms", {"message": "Hello"}) == "Hello"
+    assert render_sms("otp", {"otp": "424242"}).startswith("Your OTP for CouponAli is 424242.")
+
+
+def test_only_campaign_bodies_are_memoized():
+    data = {"code": "GIFT-1", "value": 500}
+    assert render_email("gift_card_delivery", data) is not render_email("gift_card_delivery", dict(data))
+
+    data = {"subject": "Deals", "html_content": "<p>Hi</p>"}
+    body = prerender_email("newsletter_campaign", data, ("name",))
+    assert prerender_email("newsletter_campaign", dict(data), ("name",)) is body
+
+
+def test_locale_overrides_templates_and_partials(template_root):
+    (template_root / "hi" / "sms").mkdir(parents=True)
+    (template_root / "hi" / "sms" / "otp.txt").write_text("CouponAli OTP: {{ data.otp }}")
+    (template_root / "hi" / "email" / "partials").mkdir(parents=True)
+    macros = (template_root / "email" / "partials" / "macros.html").read_text()
+    (template_root / "hi" / "email" / "partials" / "macros.html").write_text(
+        macros.replace('<p>Hi {{ data.user_name or data.name or "there" }},</p>', "<p>Namaste {{ data.user_name }},</p>")
+    )
+
+    assert render_sms("otp", {"otp": "1234"}, locale="hi") == "CouponAli OTP: 1234"
+    assert render_sms("otp", {"otp": "1234"}).startswith("Your OTP")
+    assert "Namaste Asha" in render_email("welcome", {"user_name": "Asha"}, locale="hi").html
+    assert "Hi Asha" in render_email("welcome", {"user_name": "Asha"}).html
+    assert templating.precompile(("hi",)) > templating.precompile()
+
+
+def test_prerendered_campaign_is_filled_per_recipient():
+    campaign = {"subject": "Deals for -name-", "html_content": "<p>Hello -name-</p>"}
+    body = prerender_email("newsletter_campaign", campaign, ("name", "unsubscribe_url"))
+    assert "-unsubscribe_url-" in body.html
+
+    values = {"name": "Tom & Jerry", "unsubscribe_url": "https://couponali.com/u/1?t=a&b"}
+    filled = body.fill(values)
+    assert filled.subject == "Deals for Tom & Jerry"
+    assert "<p>Hello Tom &amp; Jerry</p>" in filled.html
+    assert 'href="https://couponali.com/u/1?t=a&amp;b"' in filled.html
+    assert body.substitutions(values)["-name-"] == "Tom &amp; Jerry"
@@ -0,0 +1,65 @@
+"""Tests for the trending offers engine (Redis calls are faked)."""
+import asyncio
+import json
+
+from fastapi import status
+
+from app.services import trending
+from tests.factories import add_offer_clicks, add_offer_views, create_merchant, create_offer
+
+
+class FakeAsyncRedis:
+    def __init__(self, members, built=True):
+        self.members = members
+        self.built = built
+        self.ranges = []
+
+    async def zrevrange(self, key, start, stop):
+        self.ranges.append((key, start, stop))
+        return self.members[start:stop + 1]
+
+    async def exists(self, key):
+        return int(self.built)
+
+
+def _unavailable():
+    raise ConnectionError("redis down")
+
+
+def test_window_rounds_up_to_materialized_window(monkeypatch):
+    monkeypatch.setattr(trending, "WINDOWS_DAYS", (1, 7, 30))
+    assert [trending.window_for(d) for d in (1, 2, 7, 8, 30, 45)] == [1, 7, 7, 30, 30, 30]
+
+
+def test_get_top_is_one_range_read(monkeypatch):
+    fake = FakeAsyncRedis([json.dumps({"id": i}) for i in (3, 1, 2)])
+    monkeypatch.setattr("app.redis_async.get_async_redis", lambda: fake)
+
+    assert asyncio.run(trending.get_top(7, 2)) == [{"id": 3}, {"id": 1}]
+    assert fake.ranges == [(trending.top_key(7), 0, 1)]
+
+
+def test_get_top_distinguishes_empty_from_unbuilt(monkeypatch):
+    monkeypatch.setattr("app.redis_async.get_async_redis", lambda: FakeAsyncRedis([], built=True))
+    assert asyncio.run(trending.get_top(7, 10)) == []
+
+    monkeypatch.setattr("app.redis_async.get_async_redis", lambda: FakeAsyncRedis([], built=False))
+    assert asyncio.run(trending.get_top(7, 10)) is None
+
+
+def test_endpoint_falls_back_to_sql(client, db_session, monkeypatch):
+    monkeypatch.setattr("app.redis_async.get_async_redis", _unavailable)
+    merchant = create_merchant(db_session, "TrendMart")
+    hot = create_offer(db_session, merchant, "Hot Deal")
+    cold = create_offer(db_session, merchant, "Cold Deal")
+    add_offer_views(db_session, hot, 6)
+    add_offer_clicks(db_session, hot, 3)
+    add_offer_views(db_session, cold, 6)
+    add_offer_clicks(db_session, cold, 1)
+
+    resp = client.get("/api/v1/search/trending", params={"days": 7})
+
+    assert resp.status_code == status.HTTP_200_OK
+    offers = resp.json()["data"]["offers"]
+    assert [o["id"] for o in offers] == [hot.id, cold.id]
+    assert offers[0]["stats"] == {"clicks": 3, "views": 6, "ctr": 0.5}
@@ -129,3 +129,51 @@ class TestWithdrawals:
             assert db_count >= 2, f"Expected >=2 withdrawals in DB, found {db_count}"
         else:
             assert len(items) >= 2
+
+
+class TestWalletAggregates:
+    def test_summary_reads_materialized_totals(self, client, auth_header, registered_user):
+        client.post("/api/v1/wallet/convert-cashback", json={"amount": 100.0}, headers=auth_header)
+        client.post(
+            "/api/v1/wallet/withdraw",
+            json={"amount": 120.0, "method": "upi", "upi_id": "test@upi"},
+            headers=auth_header,
+        )
+        data = client.get("/api/v1/wallet/", headers=auth_header).json()["data"]
+        assert data["lifetime_earnings"] == 100.0
+        # Pending withdrawals are held, not yet withdrawn
+        assert data["total_withdrawn"] == 0.0
+
+    def test_transactions_keyset_pages(self, client, auth_header, db_session, registered_user):
+        for i in range(5):
+            db_session.add(WalletTransaction(
+                user_id=registered_user.id, amount=i + 1, type="credit", balance_after=0,
+            ))
+        db_session.commit()
+
+        seen, cursor = [], None
+        for _ in range(3):
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            data = client.get("/api/v1/wallet/transactions", params=params, headers=auth_header).json()["data"]
+            seen += [txn["id"] for txn in data["transactions"]]
+            # Counted for the first page only, as for page-number clients
+            assert data["pagination"].get("total_items") == (None if cursor else 5)
+            cursor = data["pagination"]["next_cursor"]
+        assert cursor is None and data["pagination"]["has_more"] is False
+        assert len(seen) == 5 and seen == sorted(set(seen), reverse=True)
+
+        data = client.get(
+            "/api/v1/wallet/transactions", params={"include_total": False}, headers=auth_header
+        ).json()["data"]
+        assert "total_items" not in data["pagination"]
+
+    def test_transactions_rejects_tampered_cursor(self, client, auth_header, db_session, registered_user):
+        for amount in (1, 2):
+            db_session.add(WalletTransaction(user_id=registered_user.id, amount=amount, type="credit", balance_after=0))
+        db_session.commit()
+        cursor = client.get(
+            "/api/v1/wallet/transactions", params={"limit": 1}, headers=auth_header
+        ).json()["data"]["pagination"]["next_cursor"]
+        tampered = cursor[:-2] + ("AA" if cursor[-2:] != "AA" else "BB")
+        resp = client.get("/api/v1/wallet/transactions", params={"cursor": tampered}, headers=auth_header)
+        assert resp.status_code == status.HTTP_400_BAD_REQUEST
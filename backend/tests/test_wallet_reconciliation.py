@@ -0,0 +1,103 @@
+"""Tests for incremental wallet reconciliation."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from app.models import WalletBalance, WalletCheckpoint, WalletTransaction
+from app.tasks import wallet_reconciliation
+from app.tasks.wallet_reconciliation import reconcile_wallets
+from tests.factories import create_user
+
+
+@pytest.fixture(autouse=True)
+def no_report_store(monkeypatch):
+    reports = []
+    monkeypatch.setattr(wallet_reconciliation, "_store_report", reports.append)
+    monkeypatch.setattr(wallet_reconciliation.settings, "WALLET_RECON_WRITER_WAIT_SECONDS", 0)
+    return reports
+
+
+def _txn(db, user, amount, type_, age_minutes=10):
+    db.add(WalletTransaction(
+        user_id=user.id, amount=amount, type=type_, balance_after=0,
+        created_at=datetime.utcnow() - timedelta(minutes=age_minutes),
+    ))
+
+
+def _balances(db):
+    return {user_id: float(balance) for user_id, balance in db.execute(select(WalletBalance.user_id, WalletBalance.balance))}
+
+
+def test_reconcile_checkpoints_and_fixes_drift(db_session, no_report_store):
+    alice, bob = create_user(db_session, "recon-a@example.com"), create_user(db_session, "recon-b@example.com")
+    db_session.add_all([WalletBalance(user_id=alice.id, balance=70), WalletBalance(user_id=bob.id, balance=999)])
+    _txn(db_session, alice, 100, "credit")
+    _txn(db_session, alice, 30, "withdrawal")
+    _txn(db_session, alice, 5, "cashback_converted")  # not a ledger movement
+    _txn(db_session, bob, 20, "cashback")
+    db_session.commit()
+
+    report = reconcile_wallets(db_session, batch_size=1)
+
+    assert report["transactions_checkpointed"] == 4 and report["users_checkpointed"] == 2
+    assert report["discrepancies_found"] == 1 and report["discrepancies_fixed"] == 1
+    assert report["discrepancies"][0]["user_id"] == bob.id
+    assert float(report["discrepancies"][0]["difference"]) == 979.0
+    assert no_report_store == [report]
+    balances = _balances(db_session)
+    assert balances[alice.id] == 70.0 and balances[bob.id] == 20.0
+    checkpoint = db_session.get(WalletCheckpoint, alice.id)
+    assert float(checkpoint.total) == 70.0
+
+
+def test_later_runs_read_only_new_transactions(db_session):
+    user = create_user(db_session, "recon-inc@example.com")
+    db_session.add(WalletBalance(user_id=user.id, balance=50))
+    _txn(db_session, user, 50, "credit")
+    db_session.commit()
+    reconcile_wallets(db_session)
+
+    _txn(db_session, user, 15, "debit")
+    db_session.commit()
+    report = reconcile_wallets(db_session)
+
+    assert report["transactions_checkpointed"] == 1
+    assert report["discrepancies_found"] == 1 and _balances(db_session)[user.id] == 35.0
+    assert float(db_session.get(WalletCheckpoint, user.id).total) == 35.0
+
+
+def test_open_writers_hold_back_checkpoints(db_session, monkeypatch):
+    user = create_user(db_session, "recon-open@example.com")
+    db_session.add(WalletBalance(user_id=user.id, balance=10))
+    _txn(db_session, user, 10, "credit")
+    db_session.commit()
+    reconcile_wallets(db_session)
+    _txn(db_session, user, 2, "refund")
+    db_session.get(WalletBalance, user.id).balance = 12
+    db_session.commit()
+
+    # A ledger writer that may hold a lower, uncommitted id keeps the mark where it was
+    monkeypatch.setattr(wallet_reconciliation, "_open_writers", lambda db: {"3/42"})
+    report = reconcile_wallets(db_session)
+
+    assert report["transactions_checkpointed"] == 0
+    assert report["discrepancies_found"] == 0
+    assert float(db_session.get(WalletCheckpoint, user.id).total) == 10.0
+
+    # Once it has finished the refund is folded in without double counting
+    monkeypatch.setattr(wallet_reconciliation, "_open_writers", lambda db: set())
+    assert reconcile_wallets(db_session)["transactions_checkpointed"] == 1
+    assert float(db_session.get(WalletCheckpoint, user.id).total) == 12.0
+
+
+def test_mark_waits_only_for_writers_open_when_it_was_read(db_session, monkeypatch):
+    user = create_user(db_session, "recon-wait@example.com")
+    _txn(db_session, user, 10, "credit")
+    db_session.commit()
+    polls = iter([{"3/42", "4/7"}, {"4/7", "5/1"}, {"5/1"}])
+    monkeypatch.setattr(wallet_reconciliation, "_open_writers", lambda db: next(polls))
+    monkeypatch.setattr(wallet_reconciliation, "WRITER_POLL_SECONDS", 0)
+    monkeypatch.setattr(wallet_reconciliation.settings, "WALLET_RECON_WRITER_WAIT_SECONDS", 5)
+
+    assert reconcile_wallets(db_session)["transactions_checkpointed"] == 1
@@ -0,0 +1,367 @@
+"""Click ingestion worker.
+
+The redirector pushes one JSON payload per outbound click onto ``queue:clicks``
+({"offerId", "merchantId", "userId"?, "ua", "ip", "referrer", "ts"}). This
+worker drains it in micro-batches of up to CLICK_INGEST_BATCH_SIZE, claimed
+into its own processing list in one script (see app/job_queue.py), and per
+batch:
+- Drops bot user agents and unparseable payloads
+- Drops double clicks: a repeat click on an offer by the same visitor (user,
+  else IP + user agent) within CLICK_DEDUPE_WINDOW_SECONDS, within the batch
+  and, through SET NX keys in one pipeline, across batches and workers
+- Resolves the offers' uuids (the redirector's ``offerId``) to ids in one
+  query per batch, dropping clicks on unknown offers (offer lookups are
+  cached), and clears unknown user ids
+- COPYs the remaining rows, with the visitor's IP, user agent, referrer and
+  device, into offer_clicks in one transaction
+- Updates the offer, trending and merchant click counters and acks the whole
+  batch in one Redis pipeline
+- Records outcomes, lag (age of the oldest click stored), batch time and
+  queue depth in Prometheus metrics (app/metrics.py), served on
+  CLICK_INGEST_METRICS_PORT when set
+
+A batch that fails to store is rolled back, requeued in order and retried; its
+dedupe keys are released first, so the retry does not drop it as duplicates.
+After CLICK_INGEST_MAX_ATTEMPTS failures in a row the failing clicks are
+retried in halves, down to single clicks, and a single click that still fails
+is moved to ``queue:clicks:dlq`` so it cannot stall ingestion.
+
+Usage:
+    python -m workers.click_ingest_worker
+"""
+from __future__ import annotations
+
+import hashlib
+import ipaddress
+import json
+import logging
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from uuid import UUID
+
+from prometheus_client import start_http_server
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.database import SessionLocal, copy_rows
+from app.job_queue import JobQueue, blocking_client, new_worker_id
+from app.metrics import observe_click_batch
+from app.models import Offer, OfferClick, User
+from app.redis_client import rk
+from app.services import merchant_counters, trending
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+    handlers=[logging.StreamHandler(sys.stdout)],
+)
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+HOUSEKEEPING_INTERVAL_SECONDS = 5  # heartbeat + stalled-worker reaping
+RETRY_SLEEP_SECONDS = 1
+OFFER_CACHE_TTL_SECONDS = 300
+MAX_USER_ID = 2**31 - 1  # users.id is a 32-bit integer
+CLICK_COLUMNS = ["offer_id", "user_id", "ip_address", "user_agent", "referrer_url", "device_type", "created_at"]
+
+BOT_USER_AGENT = re.compile(
+    r"bot|crawl|spider|slurp|preview|facebookexternalhit|headless|lighthouse|"
+    r"python-requests|python-urllib|curl|wget|httpclient|okhttp|scrapy|go-http-client",
+    re.IGNORECASE,
+)
+MOBILE_USER_AGENT = re.compile(r"mobile", re.IGNORECASE)
+TABLET_USER_AGENT = re.compile(r"tablet", re.IGNORECASE)
+
+# Outcomes counted per batch
+STORED, DUPLICATE, BOT, INVALID, UNKNOWN_OFFER = "stored", "duplicate", "bot", "invalid", "unknown_offer"
+
+
+@dataclass
+class Click:
+    offer_uuid: str
+    user_id: int | None
+    visitor: str
+    at: datetime
+    ip_address: str | None
+    user_agent: str
+    referrer_url: str | None
+    device_type: str
+    offer_id: int | None = None  # resolved from offer_uuid by OfferLookup
+
+    def row(self) -> tuple:
+        return (
+            self.offer_id, self.user_id, self.ip_address, self.user_agent,
+            self.referrer_url, self.device_type, self.at,
+        )
+
+
+def _client_ip(forwarded: str) -> str | None:
+    """The client's address from the redirector's X-Forwarded-For value; None if it is not one."""
+    try:
+        return str(ipaddress.ip_address(forwarded.split(",")[0].strip()))
+    except ValueError:
+        return None
+
+
+def _device_type(user_agent: str) -> str:
+    # Same buckets as the redirector's direct-write fallback
+    if MOBILE_USER_AGENT.search(user_agent):
+        return "mobile"
+    if TABLET_USER_AGENT.search(user_agent):
+        return "tablet"
+    return "desktop"
+
+
+def parse_click(raw: str) -> Click | str:
+    """A Click, or the outcome (INVALID, BOT) it is dropped with."""
+    try:
+        payload = json.loads(raw)
+        offer_uuid = str(UUID(payload["offerId"]))
+        user_id = int(payload["userId"]) if payload.get("userId") else None
+        if user_id is not None and not 0 < user_id <= MAX_USER_ID:
+            user_id = None  # cannot be a user; stored without it like unknown ones
+        at = datetime.utcfromtimestamp(payload["ts"] / 1000) if payload.get("ts") else datetime.utcnow()
+    except (ValueError, TypeError, KeyError, AttributeError, OverflowError):
+        return INVALID
+    user_agent = payload.get("ua") or ""
+    if not user_agent or BOT_USER_AGENT.search(user_agent):
+        return BOT
+    ip_address = _client_ip(str(payload.get("ip") or ""))
+    if user_id:
+        visitor = f"u{user_id}"
+    else:
+        visitor = hashlib.blake2b(f"{ip_address or ''}|{user_agent}".encode(), digest_size=8).hexdigest()
+    return Click(
+        offer_uuid, user_id, visitor, at,
+        ip_address=ip_address,
+        user_agent=user_agent,
+        referrer_url=payload.get("referrer") or None,
+        device_type=_device_type(user_agent),
+    )
+
+
+def dedupe_key(click: Click) -> str:
+    return rk("clicks", "seen", str(click.offer_id), click.visitor)
+
+
+class OfferLookup:
+    """offer uuid -> (offer id, merchant id), cached for OFFER_CACHE_TTL_SECONDS."""
+
+    def __init__(self):
+        self._offers: dict[str, tuple[int, int] | None] = {}
+        self._loaded_at = time.monotonic()
+
+    def resolve(self, db: Session, offer_uuids: set[str]) -> dict[str, tuple[int, int] | None]:
+        if time.monotonic() - self._loaded_at > OFFER_CACHE_TTL_SECONDS:
+            self._offers.clear()
+            self._loaded_at = time.monotonic()
+        missing = offer_uuids - self._offers.keys()
+        if missing:
+            found = {
+                offer_uuid: (offer_id, merchant_id)
+                for offer_uuid, offer_id, merchant_id in db.execute(
+                    select(Offer.uuid, Offer.id, Offer.merchant_id).where(Offer.uuid.in_(missing))
+                )
+            }
+            for offer_uuid in missing:
+                self._offers[offer_uuid] = found.get(offer_uuid)  # None: unknown, cached too
+        return {offer_uuid: self._offers[offer_uuid] for offer_uuid in offer_uuids}
+
+
+def _first_in_window(clicks: list[Click]) -> tuple[list[Click], int]:
+    """Drop repeats of (offer, visitor) within the dedupe window, oldest click first."""
+    window = timedelta(seconds=settings.CLICK_DEDUPE_WINDOW_SECONDS)
+    last_kept: dict[tuple[int, str], datetime] = {}
+    kept = []
+    for click in sorted(clicks, key=lambda c: c.at):
+        key = (click.offer_id, click.visitor)
+        if key in last_kept and click.at - last_kept[key] < window:
+            continue
+        last_kept[key] = click.at
+        kept.append(click)
+    return kept, len(clicks) - len(kept)
+
+
+def _claim_unseen(client, clicks: list[Click]) -> tuple[list[Click], list[str]]:
+    """Keep clicks whose visitor has not clicked the offer within the window elsewhere; returns (kept, keys set)."""
+    keys = dict.fromkeys(dedupe_key(click) for click in clicks)
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.set(key, 1, nx=True, ex=settings.CLICK_DEDUPE_WINDOW_SECONDS)
+    claimed = {key for key, fresh in zip(keys, pipe.execute()) if fresh}
+    # Later clicks on a claimed key were already spaced a window apart by _first_in_window
+    return [click for click in clicks if dedupe_key(click) in claimed], list(claimed)
+
+
+def _count(pipe, clicks: list[Click], merchants: dict[int, int]) -> None:
+    per_offer = Counter(click.offer_id for click in clicks)
+    for offer_id, n in per_offer.items():
+        pipe.incrby(rk("offer", str(offer_id), "clicks"), n)
+    viewers = defaultdict(set)
+    for click in clicks:
+        if click.user_id:
+            viewers[click.offer_id].add(str(click.user_id))
+    for offer_id, users in viewers.items():
+        pipe.sadd(rk("offer", str(offer_id), "viewers"), *users)
+    by_hour = defaultdict(list)
+    for click in clicks:
+        by_hour[click.at.replace(minute=0, second=0, microsecond=0)].append(click.offer_id)
+    for hour, offer_ids in by_hour.items():
+        trending.record_clicks(offer_ids, now=hour, pipe=pipe)
+        merchant_counters.record_clicks([merchants[offer_id] for offer_id in offer_ids], now=hour, pipe=pipe)
+
+
+def ingest(db: Session, queue: JobQueue, raws: list[str], offers: OfferLookup, now: datetime | None = None) -> dict[str, int]:
+    """Store one claimed batch and ack it; returns clicks per outcome."""
+    started = time.monotonic()
+    outcomes = Counter()
+    clicks = []
+    for raw in raws:
+        parsed = parse_click(raw)
+        if isinstance(parsed, Click):
+            clicks.append(parsed)
+        else:
+            outcomes[parsed] += 1
+
+    resolved = offers.resolve(db, {click.offer_uuid for click in clicks})
+    known, merchants = [], {}
+    for click in clicks:
+        offer = resolved[click.offer_uuid]
+        if offer is not None:
+            click.offer_id, merchant_id = offer
+            merchants[click.offer_id] = merchant_id
+            known.append(click)
+    outcomes[UNKNOWN_OFFER] += len(clicks) - len(known)
+    known, repeats = _first_in_window(known)
+    fresh, dedupe_keys = _claim_unseen(queue.client, known) if known else ([], [])
+    outcomes[DUPLICATE] += repeats + len(known) - len(fresh)
+
+    try:
+        user_ids = {click.user_id for click in fresh if click.user_id}
+        if user_ids:
+            existing = set(db.scalars(select(User.id).where(User.id.in_(user_ids))))
+            for click in fresh:
+                if click.user_id not in existing:
+                    click.user_id = None
+        copy_rows(db, OfferClick.__table__, CLICK_COLUMNS, [click.row() for click in fresh])
+        db.commit()
+    except Exception:
+        db.rollback()
+        if dedupe_keys:
+            queue.client.delete(*dedupe_keys)
+        raise
+
+    outcomes[STORED] += len(fresh)
+    pipe = queue.client.pipeline(transaction=False)
+    _count(pipe, fresh, merchants)
+    queue.ack_claimed(pipe)
+    pipe.llen(queue.key)
+    depth = pipe.execute()[-1]
+
+    oldest = min((click.at for click in fresh), default=None)
+    lag = ((now or datetime.utcnow()) - oldest).total_seconds() if oldest else 0.0
+    outcomes = {outcome: count for outcome, count in outcomes.items() if count}
+    observe_click_batch(outcomes, max(lag, 0.0), time.monotonic() - started, depth)
+    return outcomes
+
+
+def _claim_batch(queue: JobQueue, size: int) -> list[str]:
+    raws = queue.claim_many(size)
+    if raws:
+        return raws
+    first = queue.claim(settings.CLICK_INGEST_BLOCK_SECONDS)
+    if first is None:
+        return []
+    return [first, *(queue.claim_many(size - 1) or [])]
+
+
+class FailedBatches:
+    """Retry policy for batches that fail to store.
+
+    A failed batch goes back to the head of the queue, so the next claim takes
+    it again. After CLICK_INGEST_MAX_ATTEMPTS failures in a row the clicks it
+    held are claimed in halves until they are all stored, and a single click
+    that keeps failing is dead-lettered instead of requeued.
+    """
+
+    def __init__(self):
+        self.batch_size = settings.CLICK_INGEST_BATCH_SIZE
+        self.failures = 0
+        self.suspect = 0  # clicks at the head of the queue left from a split batch
+
+    def stored(self, count: int) -> None:
+        self.failures = 0
+        self.suspect = max(self.suspect - count, 0)
+        if not self.suspect:
+            self.batch_size = settings.CLICK_INGEST_BATCH_SIZE
+
+    def failed(self, queue: JobQueue, count: int) -> None:
+        """Requeue (or dead-letter) the claimed batch of ``count`` clicks."""
+        self.failures += 1
+        if self.failures < settings.CLICK_INGEST_MAX_ATTEMPTS:
+            queue.requeue_claimed()
+            return
+        self.failures = 0
+        if count > 1:
+            self.suspect = max(self.suspect, count)
+            self.batch_size = count // 2
+            logger.warning(f"Batch of {count} clicks keeps failing; retrying in batches of {self.batch_size}")
+            queue.requeue_claimed()
+            return
+        logger.error(f"Click keeps failing; moved to {queue.dlq_key}")
+        queue.dead_letter_claimed()
+        self.stored(count)
+
+
+def run_worker(max_batches: int | None = None) -> None:
+    queue = JobQueue("clicks", client=blocking_client(settings.CLICK_INGEST_BLOCK_SECONDS), worker_id=new_worker_id())
+    offers = OfferLookup()
+    if settings.CLICK_INGEST_METRICS_PORT:
+        start_http_server(settings.CLICK_INGEST_METRICS_PORT)
+    logger.info(f"🚀 Click ingestion worker {queue.worker_id} started (batches of {settings.CLICK_INGEST_BATCH_SIZE})")
+
+    db = SessionLocal()
+    failed_batches = FailedBatches()
+    next_housekeeping = 0.0
+    batches = 0
+    try:
+        while max_batches is None or batches < max_batches:
+            if time.monotonic() >= next_housekeeping:
+                try:
+                    queue.heartbeat()
+                    queue.reap()
+                except Exception as exc:
+                    logger.error(f"Housekeeping failed: {exc}")
+                next_housekeeping = time.monotonic() + HOUSEKEEPING_INTERVAL_SECONDS
+            raws = _claim_batch(queue, failed_batches.batch_size)
+            if not raws:
+                continue
+            batches += 1
+            try:
+                outcomes = ingest(db, queue, raws, offers)
+            except Exception as exc:
+                logger.error(f"Storing {len(raws)} clicks failed: {exc}", exc_info=True)
+                try:
+                    db.rollback()  # the failure may have aborted the transaction outside ingest's own handling
+                    failed_batches.failed(queue, len(raws))
+                except Exception as cleanup_exc:
+                    logger.error(f"Recovering from the failed batch failed: {cleanup_exc}")
+                time.sleep(RETRY_SLEEP_SECONDS)
+                continue
+            failed_batches.stored(len(raws))
+            logger.debug(f"Click batch: {outcomes}")
+    except KeyboardInterrupt:
+        logger.info("Click ingestion worker stopped by user")
+    finally:
+        queue.release()
+        db.close()
+
+
+if __name__ == "__main__":
+    run_worker()
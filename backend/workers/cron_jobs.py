@@ -5,6 +5,12 @@ This worker runs periodic jobs:
 2. Recalculate wallet balances (daily 3 AM)
 3. Clean old logs (weekly)
 4. Generate sitemap (daily 4 AM)
+5. Rebuild the autocomplete index (hourly)
+6. Materialize trending offers (every few minutes)
+7. Refresh merchant click/conversion windows (every few minutes)
+8. Reconcile merchant offer counters (daily 2:30 AM)
+9. Fan out newsletter campaigns (every minute, time-sliced)
+10. Manage table partitions (daily 1:30 AM, and on startup)
 
 Usage:
     python -m workers.cron_jobs
@@ -13,17 +19,22 @@ from __future__ import annotations
 
 import logging
 import sys
+from collections import Counter
 from datetime import datetime, timedelta, timezone
 
 import schedule
 from sqlalchemy import select, update
 from sqlalchemy.orm import Session
 
+from app.cache import bump_version, invalidate_tags
 from app.database import SessionLocal
-from app.models.merchant import Offer
-from app.models.wallet import WalletBalance, WalletTransaction
-from app.models.admin import AuditLog
+from app.models import AuditLog, Offer
 from app.redis_client import redis_client, rk
+from app.config import get_settings
+from app.services import autocomplete, merchant_counters, trending
+from app.tasks.newsletter_delivery import deliver_campaigns
+from app.tasks.partitions import manage_partitions
+from app.tasks.wallet_reconciliation import reconcile_wallets
 
 # Configure logging
 logging.basicConfig(
@@ -32,6 +43,7 @@ logging.basicConfig(
     handlers=[logging.StreamHandler(sys.stdout)],
 )
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 CRON_LOCK_PREFIX = "lock:cron:"
 
@@ -68,19 +80,27 @@ def expire_old_offers():
         # Update expired offers
         stmt = (
             update(Offer)
-            .where(Offer.expires_at < now)
+            .where(Offer.ends_at < now)
             .where(Offer.is_active == True)
             .values(is_active=False)
+            .returning(Offer.merchant_id)
         )
         
-        result = db.execute(stmt)
+        expired = db.execute(stmt).all()
+        # Bulk UPDATE bypasses the flush hook that maintains the counters
+        merchant_counters.adjust_active_offers(db, {
+            merchant_id: -n for merchant_id, n in Counter(row.merchant_id for row in expired).items()
+        })
         db.commit()
         
-        expired_count = result.rowcount
+        expired_count = len(expired)
+        merchant_ids = {row.merchant_id for row in expired}
         logger.info(f"Expired {expired_count} offers")
         
-        # Invalidate cache
-        redis_client.delete(rk("cache", "offers", "*"))
+        # Invalidate exactly the listings that can show the expired offers
+        if merchant_ids:
+            invalidate_tags("offers:list", *(f"merchant:{mid}" for mid in merchant_ids))
+            bump_version("homepage")
         
     except Exception as e:
         logger.error(f"Failed to expire offers: {e}", exc_info=True)
@@ -96,36 +116,12 @@ def recalculate_wallet_balances():
     
     db = SessionLocal()
     try:
-        # Get all wallets
-        wallets = db.execute(select(WalletBalance)).scalars().all()
-        
-        fixed_count = 0
-        for wallet in wallets:
-            # Sum all transactions
-            stmt = select(WalletTransaction).where(
-                WalletTransaction.user_id == wallet.user_id
-            ).order_by(WalletTransaction.created_at)
-            
-            transactions = db.execute(stmt).scalars().all()
-            
-            calculated_balance = 0.0
-            for txn in transactions:
-                if txn.type in ["credit", "cashback", "refund"]:
-                    calculated_balance += txn.amount
-                elif txn.type in ["debit", "withdrawal"]:
-                    calculated_balance -= txn.amount
-            
-            # Check if balance matches
-            if abs(wallet.balance - calculated_balance) > 0.01:
-                logger.warning(
-                    f"Wallet {wallet.user_id} balance mismatch: "
-                    f"stored={wallet.balance}, calculated={calculated_balance}"
-                )
-                wallet.balance = calculated_balance
-                fixed_count += 1
-        
-        db.commit()
-        logger.info(f"Fixed {fixed_count} wallet balances")
+        report = reconcile_wallets(db)
+        logger.info(
+            f"Checkpointed {report['transactions_checkpointed']} transactions for "
+            f"{report['users_checkpointed']} users; fixed {report['discrepancies_fixed']} of "
+            f"{report['discrepancies_found']} wallet balances"
+        )
         
     except Exception as e:
         logger.error(f"Failed to recalculate wallet balances: {e}", exc_info=True)
@@ -233,6 +229,91 @@ def generate_sitemap():
         db.close()
 
 
+@with_lock("rebuild_autocomplete", timeout=1800)
+def rebuild_autocomplete_index():
+    """Rescore the autocomplete index from clicks, orders and popular queries."""
+    logger.info("=== Rebuilding Autocomplete Index ===")
+    
+    db = SessionLocal()
+    try:
+        indexed = autocomplete.rebuild_index(db)
+        logger.info(f"Indexed {indexed} autocomplete entries")
+    except Exception as e:
+        logger.error(f"Failed to rebuild autocomplete index: {e}", exc_info=True)
+    finally:
+        db.close()
+
+
+@with_lock("materialize_trending", timeout=600)
+def materialize_trending_offers():
+    """Refresh the per-window top trending offers from the hourly counters."""
+    db = SessionLocal()
+    try:
+        written = trending.materialize(db)
+        logger.info(f"Materialized trending offers: {written}")
+    except Exception as e:
+        logger.error(f"Failed to materialize trending offers: {e}", exc_info=True)
+    finally:
+        db.close()
+
+
+@with_lock("refresh_merchant_counters", timeout=300)
+def refresh_merchant_counters():
+    """Fold the hourly merchant click/conversion buckets into their 24h windows."""
+    try:
+        merchant_counters.materialize()
+    except Exception as e:
+        logger.error(f"Failed to refresh merchant counters: {e}", exc_info=True)
+
+
+@with_lock("reconcile_merchant_counters", timeout=1800)
+def reconcile_merchant_counters():
+    """Recount active offers for merchants whose denormalized count drifted."""
+    db = SessionLocal()
+    try:
+        fixed = merchant_counters.reconcile(db)
+        if fixed:
+            logger.warning(f"Corrected active offer counts for {fixed} merchants")
+    except Exception as e:
+        logger.error(f"Failed to reconcile merchant counters: {e}", exc_info=True)
+        db.rollback()
+    finally:
+        db.close()
+
+
+@with_lock("deliver_newsletters", timeout=300)
+def deliver_newsletters():
+    """Advance sending (and due scheduled) newsletter campaigns for one time slice."""
+    db = SessionLocal()
+    try:
+        finished = deliver_campaigns(db)
+        if finished:
+            logger.info(f"Finished fan-out of {finished} newsletter campaign(s)")
+    except Exception as e:
+        logger.error(f"Failed to deliver newsletters: {e}", exc_info=True)
+        db.rollback()
+    finally:
+        db.close()
+
+
+@with_lock("manage_partitions", timeout=1800)
+def manage_table_partitions():
+    """Pre-create upcoming monthly partitions, archive expired ones and log sizes."""
+    db = SessionLocal()
+    try:
+        report = manage_partitions(db)
+        for table, info in report.get("tables", {}).items():
+            logger.info(
+                f"Partitions of {table}: {len(info['partitions'])} attached, {info['total_bytes'] / 2**20:.1f} MiB, "
+                f"created {info['created'] or 'none'}, archived {info['archived'] or 'none'}"
+            )
+    except Exception as e:
+        logger.error(f"Failed to manage partitions: {e}", exc_info=True)
+        db.rollback()
+    finally:
+        db.close()
+
+
 def run_scheduler():
     """Run all scheduled jobs."""
     logger.info("Starting cron jobs scheduler...")
@@ -242,12 +323,31 @@ def run_scheduler():
     schedule.every().day.at("03:00").do(recalculate_wallet_balances)
     schedule.every().day.at("04:00").do(generate_sitemap)
     schedule.every().sunday.at("01:00").do(clean_old_logs)
+    schedule.every().hour.at(":15").do(rebuild_autocomplete_index)
+    schedule.every(settings.TRENDING_REFRESH_MINUTES).minutes.do(materialize_trending_offers)
+    schedule.every(settings.MERCHANT_COUNTERS_REFRESH_MINUTES).minutes.do(refresh_merchant_counters)
+    schedule.every().day.at("02:30").do(reconcile_merchant_counters)
+    schedule.every().minute.do(deliver_newsletters)
+    schedule.every().day.at("01:30").do(manage_table_partitions)
     
     logger.info("Scheduled jobs:")
     logger.info("  - Expire old offers: Daily at 02:00 UTC")
     logger.info("  - Recalculate wallet balances: Daily at 03:00 UTC")
     logger.info("  - Generate sitemap: Daily at 04:00 UTC")
     logger.info("  - Clean old logs: Weekly (Sunday) at 01:00 UTC")
+    logger.info("  - Rebuild autocomplete index: Hourly at :15")
+    logger.info(f"  - Materialize trending offers: Every {settings.TRENDING_REFRESH_MINUTES} minutes")
+    logger.info(f"  - Refresh merchant counters: Every {settings.MERCHANT_COUNTERS_REFRESH_MINUTES} minutes")
+    logger.info("  - Reconcile merchant offer counts: Daily at 02:30 UTC")
+    logger.info(f"  - Deliver newsletters: Every minute ({settings.NEWSLETTER_SLICE_SECONDS}s slices)")
+    logger.info("  - Manage table partitions: Daily at 01:30 UTC")
+    
+    # Inserts land in the default partition if this month's is missing
+    manage_table_partitions()
+    # Autocomplete and trending fall back to SQL until their first build
+    rebuild_autocomplete_index()
+    materialize_trending_offers()
+    refresh_merchant_counters()
     
     # Run immediately on startup (for testing)
     # Uncomment to run all jobs on startup:
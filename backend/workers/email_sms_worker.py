@@ -1,11 +1,23 @@
 """Email & SMS worker for processing jobs from Redis queues with real provider integration.
 
-This worker:
-- Polls email and SMS queues via BLPOP
-- Sends emails via SendGrid API
-- Sends SMS via MSG91 API
-- Retries failed jobs up to MAX_ATTEMPTS
+This worker is an asyncio dispatcher:
+- Claims batches from the email and SMS queues in one round trip, into its own
+  processing list (see app/job_queue.py), up to DISPATCH_MAX_IN_FLIGHT_JOBS
+- Groups emails with the same rendered body into one SendGrid request with a
+  personalization per recipient (per-recipient subject and substitutions);
+  a batch job (app.queue.email_batch_job, e.g. a newsletter chunk) carries
+  many recipients and counts as that many towards SENDGRID_BATCH_SIZE, and
+  its prerendered subject and body, when present, are sent as-is
+- Groups SMS by MSG91 flow into one multi-recipient flow call
+- Keeps up to *_CONCURRENCY requests in flight per provider over a pooled
+  async HTTP client, spaced to *_RATE_PER_SECOND (and paused on Retry-After)
+- Retries failed jobs up to MAX_ATTEMPTS with exponential backoff
 - Moves permanently failed jobs to DLQ
+- Requeues jobs held by stalled workers
+
+A batch the provider rejects as a whole (HTTP 400) is retried one job per
+request, so one bad address does not fail its neighbours. Any number of these
+workers can run side by side; limits are per process.
 
 Usage:
     python -m workers.email_sms_worker
@@ -20,17 +32,20 @@ Environment Variables:
 """
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
 import os
 import sys
 import time
+from abc import ABC, abstractmethod
 from datetime import datetime, timezone
-from typing import Callable
 
 import httpx
 
-from app.redis_client import redis_client, rk
+from app.config import get_settings
+from app.job_queue import ACK, DEAD, RETRY, JobQueue, claim_from, new_worker_id
+from app.templating import RenderedEmail, precompile, render_email, render_sms
 
 # Configure logging
 logging.basicConfig(
@@ -39,342 +54,410 @@ logging.basicConfig(
     handlers=[logging.StreamHandler(sys.stdout)],
 )
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 # Queue configuration
-EMAIL_QUEUE = rk("queue", "email")
-SMS_QUEUE = rk("queue", "sms")
-EMAIL_PROCESSING = rk("queue", "email", "processing")
-SMS_PROCESSING = rk("queue", "sms", "processing")
-EMAIL_DLQ = rk("queue", "email", "dlq")
-SMS_DLQ = rk("queue", "sms", "dlq")
-
 MAX_ATTEMPTS = 3
-POLL_TIMEOUT_SECONDS = 2
+IDLE_SLEEP_SECONDS = (0.01, 0.25)  # poll backoff while both queues are empty
+HOUSEKEEPING_INTERVAL_SECONDS = 5  # heartbeat, retry promotion + stalled-worker reaping
 
 # Provider configuration
 SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
 FROM_EMAIL = os.getenv("FROM_EMAIL", "noreply@couponali.com")
 FROM_NAME = os.getenv("FROM_NAME", "CouponAli")
+SENDGRID_URL = "https://api.sendgrid.com/v3/mail/send"
 
 MSG91_AUTH_KEY = os.getenv("MSG91_AUTH_KEY")
 MSG91_SENDER_ID = os.getenv("MSG91_SENDER_ID", "COUPON")
 MSG91_TEMPLATE_ID = os.getenv("MSG91_TEMPLATE_ID")
+MSG91_FLOW_URL = "https://api.msg91.com/api/v5/flow/"
 
 
 def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat(timespec="seconds")
 
 
-def _process_email(job: dict) -> None:
-    """Send email via SendGrid API."""
-    email_type = job.get("type", "generic")
-    to_email = job.get("to")
-    data = job.get("data", {})
-    
-    logger.info(f"Processing email: type={email_type}, to={to_email}")
-    
-    if not SENDGRID_API_KEY:
-        logger.warning("SendGrid API key not configured - email logged only")
-        logger.info(f"[DEV] Would send {email_type} email to {to_email}")
-        return
-    
-    try:
-        # Get email subject and HTML content
-        subject = _get_email_subject(email_type, data)
-        html_content = _get_email_html(email_type, data)
-        
-        # Send via SendGrid
-        response = httpx.post(
-            "https://api.sendgrid.com/v3/mail/send",
-            headers={
-                "Authorization": f"Bearer {SENDGRID_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "personalizations": [{"to": [{"email": to_email}]}],
+class ProviderError(Exception):
+    """A provider request failed; ``batch_rejected`` when a multi-job request was refused as a whole."""
+
+    def __init__(self, message: str, batch_rejected: bool = False):
+        super().__init__(message)
+        self.batch_rejected = batch_rejected
+
+
+class Provider(ABC):
+    """One outbound API: pooled async client, concurrency cap and request spacing."""
+
+    name = ""
+    url = ""
+    success_statuses = (200,)
+
+    def __init__(
+        self,
+        concurrency: int,
+        rate_per_second: float,
+        batch_size: int,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.concurrency = concurrency
+        self.rate_per_second = rate_per_second
+        self.batch_size = batch_size
+        self._transport = transport
+        self._http: httpx.AsyncClient | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._next_request_at = 0.0
+
+    @property
+    def configured(self) -> bool:
+        return True
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(30, connect=10),
+                limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+                transport=self._transport,
+            )
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    @abstractmethod
+    def render(self, job: dict):
+        """The job's message, rendered once when it is batched and reused for its request."""
+
+    @abstractmethod
+    def batch_key(self, job: dict, rendered):
+        """Jobs with equal keys can share one request."""
+
+    @staticmethod
+    def recipient_count(job: dict) -> int:
+        return len(job["recipients"]) if job.get("recipients") else 1
+
+    def batches(self, claimed: list[tuple[str, dict]]) -> tuple[list[list[tuple]], list[tuple[str, dict, Exception]]]:
+        """Render (raw, job) pairs and split them into provider requests of up to ``batch_size`` recipients
+        of compatible jobs, as (raw, job, rendered) triples.
+
+        Also returns (raw, job, error) for jobs that could not be rendered or keyed (e.g. a template error).
+        """
+        groups: dict = {}
+        unbatchable = []
+        for raw, job in claimed:
+            try:
+                rendered = self.render(job)
+                groups.setdefault(self.batch_key(job, rendered), []).append((raw, job, rendered))
+            except Exception as exc:
+                unbatchable.append((raw, job, exc))
+        batches = []
+        for group in groups.values():
+            batch, size = [], 0
+            for item in group:
+                count = self.recipient_count(item[1])
+                if batch and size + count > self.batch_size:
+                    batches.append(batch)
+                    batch, size = [], 0
+                batch.append(item)
+                size += count
+            batches.append(batch)
+        return batches, unbatchable
+
+    @abstractmethod
+    def payload(self, items: list[tuple[dict, object]]) -> tuple[dict, dict]:
+        """(headers, json body) for one request carrying the (job, rendered) ``items``."""
+
+    async def send(self, items: list[tuple[dict, object]]) -> None:
+        """Deliver (job, rendered) ``items`` in one request; raises ProviderError on failure."""
+        if not self.configured:
+            for job, _ in items:
+                to = job.get("to") or job.get("mobile") or f"{self.recipient_count(job)} recipients"
+                logger.info(f"[DEV] Would send {self.name} {job.get('type', 'generic')} to {to}")
+            return
+        headers, body = self.payload(items)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        async with self._slots:
+            await self._throttle()
+            try:
+                response = await self.http.post(self.url, headers=headers, json=body)
+            except httpx.TransportError as exc:
+                raise ProviderError(f"{self.name} {type(exc).__name__}: {exc}") from exc
+        if response.status_code in self.success_statuses:
+            return
+        if response.status_code == 429:
+            self._pause(response)
+        raise ProviderError(
+            f"{self.name} API error: {response.status_code} - {response.text[:500]}",
+            batch_rejected=response.status_code == 400 and len(items) > 1,
+        )
+
+    async def _throttle(self) -> None:
+        """Space request starts 1/rate apart (per process)."""
+        if self.rate_per_second <= 0:
+            return
+        now = time.monotonic()
+        start = max(now, self._next_request_at)
+        self._next_request_at = start + 1 / self.rate_per_second
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def _pause(self, response: httpx.Response) -> None:
+        try:
+            wait = float(response.headers.get("Retry-After", 1))
+        except ValueError:
+            wait = 1.0
+        self._next_request_at = max(self._next_request_at, time.monotonic() + min(wait, 60))
+
+
+class SendGridProvider(Provider):
+    """Same-body emails share a request, one personalization each."""
+
+    name = "email"
+    url = SENDGRID_URL
+    success_statuses = (200, 202)
+
+    def __init__(self, api_key: str | None = SENDGRID_API_KEY, **kwargs):
+        super().__init__(
+            kwargs.pop("concurrency", settings.SENDGRID_CONCURRENCY),
+            kwargs.pop("rate_per_second", settings.SENDGRID_RATE_PER_SECOND),
+            kwargs.pop("batch_size", settings.SENDGRID_BATCH_SIZE),
+            **kwargs,
+        )
+        self.api_key = api_key
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    def render(self, job: dict) -> RenderedEmail:
+        if job.get("html") is not None:  # prerendered by the producer (newsletter batches)
+            return RenderedEmail(subject=job.get("subject") or "Notification from CouponAli", html=job["html"])
+        return render_email(job.get("type", "generic"), job.get("data", {}), job.get("locale"))
+
+    def batch_key(self, job: dict, rendered: RenderedEmail):
+        return rendered.html
+
+    def payload(self, items: list[tuple[dict, RenderedEmail]]) -> tuple[dict, dict]:
+        personalizations = []
+        for job, rendered in items:
+            for recipient in job.get("recipients") or [job]:
+                personalization = {"to": [{"email": recipient.get("to")}], "subject": rendered.subject}
+                if recipient.get("substitutions"):
+                    personalization["substitutions"] = recipient["substitutions"]
+                personalizations.append(personalization)
+        return (
+            {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"},
+            {
+                "personalizations": personalizations,
                 "from": {"email": FROM_EMAIL, "name": FROM_NAME},
-                "subject": subject,
-                "content": [{"type": "text/html", "value": html_content}],
+                "content": [{"type": "text/html", "value": items[0][1].html}],
             },
-            timeout=30,
         )
-        
-        if response.status_code not in (200, 202):
-            raise Exception(f"SendGrid API error: {response.status_code} - {response.text}")
-        
-        logger.info(f"✅ Email sent successfully to {to_email}")
-    
-    except Exception as e:
-        logger.error(f"Failed to send email to {to_email}: {e}")
-        raise
 
 
-def _process_sms(job: dict) -> None:
-    """Send SMS via MSG91 API."""
-    sms_type = job.get("type", "generic")
-    mobile = job.get("mobile")
-    data = job.get("data", {})
-    
-    logger.info(f"Processing SMS: type={sms_type}, mobile={mobile}")
-    
-    if not MSG91_AUTH_KEY:
-        logger.warning("MSG91 API key not configured - SMS logged only")
-        logger.info(f"[DEV] Would send {sms_type} SMS to {mobile}")
-        return
-    
-    try:
-        # Get SMS message
-        message = _get_sms_message(sms_type, data)
-        
-        # Send via MSG91
-        response = httpx.post(
-            "https://api.msg91.com/api/v5/flow/",
-            headers={
-                "authkey": MSG91_AUTH_KEY,
-                "Content-Type": "application/json",
-            },
-            json={
-                "flow_id": MSG91_TEMPLATE_ID,
-                "sender": MSG91_SENDER_ID,
-                "mobiles": mobile.replace("+91", ""),
-                "VAR1": message,
-                **data,
-            },
-            timeout=30,
+class Msg91Provider(Provider):
+    """SMS for the same flow share one multi-recipient flow call."""
+
+    name = "sms"
+    url = MSG91_FLOW_URL
+
+    def __init__(self, auth_key: str | None = MSG91_AUTH_KEY, **kwargs):
+        super().__init__(
+            kwargs.pop("concurrency", settings.MSG91_CONCURRENCY),
+            kwargs.pop("rate_per_second", settings.MSG91_RATE_PER_SECOND),
+            kwargs.pop("batch_size", settings.MSG91_BATCH_SIZE),
+            **kwargs,
+        )
+        self.auth_key = auth_key
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.auth_key)
+
+    def render(self, job: dict) -> str:
+        return render_sms(job.get("type", "generic"), job.get("data", {}), job.get("locale"))
+
+    def batch_key(self, job: dict, rendered: str):
+        return job.get("flow_id") or MSG91_TEMPLATE_ID
+
+    def payload(self, items: list[tuple[dict, str]]) -> tuple[dict, dict]:
+        recipients = [
+            {"mobiles": (job.get("mobile") or "").replace("+91", ""), "VAR1": text, **job.get("data", {})}
+            for job, text in items
+        ]
+        return (
+            {"authkey": self.auth_key, "Content-Type": "application/json"},
+            {"flow_id": self.batch_key(*items[0]), "sender": MSG91_SENDER_ID, "recipients": recipients},
         )
-        
-        if response.status_code != 200:
-            raise Exception(f"MSG91 API error: {response.status_code} - {response.text}")
-        
-        logger.info(f"✅ SMS sent successfully to {mobile}")
-    
-    except Exception as e:
-        logger.error(f"Failed to send SMS to {mobile}: {e}")
-        raise
 
 
-def _get_email_subject(email_type: str, data: dict) -> str:
-    """Get email subject based on type."""
-    subjects = {
-        "welcome": "Welcome to CouponAli! 🎉",
-        "otp": f"Your OTP: {data.get('otp', 'XXXXXX')}",
-        "order_confirmation": f"Order Confirmed - {data.get('order_number', 'XXXXXX')}",
-        "cashback_confirmed": "Cashback Credited to Your Wallet 💰",
-        "withdrawal_processed": "Withdrawal Processed Successfully ✅",
-        "password_reset": "Reset Your Password",
-        "gift_card_delivery": "Your Gift Card Code is Ready 🎁",
-    }
-    return subjects.get(email_type, "Notification from CouponAli")
-
-
-def _get_email_html(email_type: str, data: dict) -> str:
-    """Get email HTML content based on type."""
-    templates = {
-        "welcome": f"""
-            <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-                <h1 style="color: #4F46E5;">Welcome to CouponAli! 🎉</h1>
-                <p>Hi {data.get('user_name', 'there')},</p>
-                <p>Thank you for joining CouponAli - India's best cashback & coupon platform!</p>
-                <div style="background: #F3F4F6; padding: 20px; border-radius: 8px; margin: 20px 0;">
-                    <h3>Get Started:</h3>
-                    <ul>
-                        <li>Browse 1000+ stores and offers</li>
-                        <li>Get cashback on every purchase</li>
-                        <li>Redeem your earnings via UPI/Bank</li>
-                    </ul>
-                </div>
-                {f'<div style="background: #DBEAFE; padding: 20px; border-radius: 8px; margin: 20px 0;"><h3>Verify Your Email</h3><p>Click the button below to verify your email address:</p><a href="{data.get("verification_url")}" style="background: #4F46E5; color: white; padding: 12px 24px; text-decoration: none; border-radius: 6px; display: inline-block; margin: 10px 0;">Verify Email</a><p style="font-size: 12px; color: #666;">Link expires in 24 hours</p></div>' if data.get('verification_url') else ''}
-                <p>Happy saving!<br>Team CouponAli</p>
-            </div>
-        """,
-        "otp": f"""
-            <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-                <h1 style="color: #4F46E5;">Your OTP Code</h1>
-                <p>Hi {data.get('user_name', 'there')},</p>
-                <p>Your one-time password (OTP) is:</p>
-                <div style="background: #F3F4F6; padding: 20px; border-radius: 8px; margin: 20px 0; text-align: center;">
-                    <h2 style="font-size: 32px; letter-spacing: 8px; color: #4F46E5; margin: 0;">{data.get('otp', 'XXXXXX')}</h2>
-                </div>
-                <p>This OTP is valid for 10 minutes.</p>
-                <p style="color: #DC2626;">⚠️ Do not share this OTP with anyone.</p>
-                <p>Team CouponAli</p>
-            </div>
-        """,
-        "order_confirmation": f"""
-            <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-                <h1 style="color: #059669;">Order Confirmed! ✅</h1>
-                <p>Hi {data.get('user_name', 'there')},</p>
-                <p>Your order <strong>{data.get('order_number', 'XXXXXX')}</strong> has been confirmed.</p>
-                <div style="background: #F3F4F6; padding: 20px; border-radius: 8px; margin: 20px 0;">
-                    <h3>Order Details:</h3>
-                    <p><strong>Order Number:</strong> {data.get('order_number', 'XXXXXX')}</p>
-                    <p><strong>Total Amount:</strong> ₹{data.get('total_amount', '0')}</p>
-                    <p><strong>Items:</strong> {data.get('items_count', 1)}</p>
-                </div>
-                <p><a href="{data.get('order_url', '#')}" style="background: #059669; color: white; padding: 12px 24px; text-decoration: none; border-radius: 6px; display: inline-block;">View Order & Vouchers</a></p>
-                <p style="margin-top: 30px;">Thank you for your purchase!<br>Team CouponAli</p>
-            </div>
-        """,
-        "cashback_confirmed": f"""
-            <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-                <h1 style="color: #059669;">Cashback Credited! 💰</h1>
-                <p>Hi {data.get('user_name', 'there')},</p>
-                <p>Great news! Your cashback has been credited to your wallet.</p>
-                <div style="background: #D1FAE5; padding: 20px; border-radius: 8px; margin: 20px 0;">
-                    <h3>Cashback Details:</h3>
-                    <p><strong>Amount:</strong> ₹{data.get('amount', '0')}</p>
-                    <p><strong>Merchant:</strong> {data.get('merchant_name', 'N/A')}</p>
-                    <p><strong>New Balance:</strong> ₹{data.get('wallet_balance', '0')}</p>
-                </div>
-                <p><a href="{data.get('wallet_url', '#')}" style="background: #059669; color: white; padding: 12px 24px; text-decoration: none; border-radius: 6px; display: inline-block;">View Wallet</a></p>
-                <p style="margin-top: 30px;">Keep shopping and earning!<br>Team CouponAli</p>
-            </div>
-        """,
-        "withdrawal_processed": f"""
-            <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-                <h1 style="color: #059669;">Withdrawal Processed! ✅</h1>
-                <p>Hi {data.get('user_name', 'there')},</p>
-                <p>Your withdrawal request has been processed successfully.</p>
-                <div style="background: #F3F4F6; padding: 20px; border-radius: 8px; margin: 20px 0;">
-                    <h3>Withdrawal Details:</h3>
-                    <p><strong>Amount:</strong> ₹{data.get('amount', '0')}</p>
-                    <p><strong>Method:</strong> {data.get('method', 'UPI')}</p>
-                    <p><strong>Account:</strong> {data.get('account', 'N/A')}</p>
-                </div>
-                <p>The amount will be credited to your account within 24-48 hours.</p>
-                <p style="margin-top: 30px;">Thank you!<br>Team CouponAli</p>
-            </div>
-        """,
-        "gift_card_delivery": f"""
-            <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-                <h1 style="color: #4F46E5;">Your Gift Card 🎁</h1>
-                <p>Hi {data.get('user_name', 'there')},</p>
-                <p>Here is your gift card code. Use it at checkout to redeem its value.</p>
-                <div style="background: #F3F4F6; padding: 24px; border-radius: 10px; margin: 20px 0; text-align: center;">
-                    <h2 style="letter-spacing: 4px; font-size: 28px; color: #4F46E5; margin: 0;">{data.get('code','XXXX-XXXX')}</h2>
-                    <p style="margin-top:12px; font-size:16px;">Value: <strong>₹{data.get('value','0')}</strong></p>
-                </div>
-                {f'<p>This card expires on <strong>{data.get("expires_at")}</strong>.</p>' if data.get('expires_at') else ''}
-                <p style="font-size:12px; color:#555;">Keep this code secure. Treat it like cash.</p>
-                <p>Happy saving!<br>Team CouponAli</p>
-            </div>
-        """,
-        "password_reset": f"""
-            <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-                <h1 style="color: #4F46E5;">Reset Your Password</h1>
-                <p>Hi {data.get('user_name', 'there')},</p>
-                <p>We received a request to reset your password. Click the button below to choose a new one:</p>
-                <div style="background: #EEF2FF; padding: 20px; border-radius: 8px; margin: 20px 0; text-align: center;">
-                    <a href="{data.get('reset_url', '#')}" style="background: #4F46E5; color: white; padding: 12px 24px; text-decoration: none; border-radius: 6px; display: inline-block;">Reset Password</a>
-                    <p style="font-size: 12px; color: #555; margin-top: 12px;">Link expires in 30 minutes.</p>
-                </div>
-                <p>If you did not request this change, you can safely ignore this email.</p>
-                <p>Stay secure,<br>Team CouponAli</p>
-            </div>
-        """,
-    }
-    return templates.get(email_type, f"<p>{data.get('message', 'Notification from CouponAli')}</p>")
-
-
-def _get_sms_message(sms_type: str, data: dict) -> str:
-    """Get SMS message based on type."""
-    templates = {
-        "otp": f"Your OTP for CouponAli is {data.get('otp', 'XXXXXX')}. Valid for 10 minutes. Do not share with anyone.",
-        "order_confirmation": f"Order {data.get('order_number', 'XXXXXX')} confirmed! Amount: ₹{data.get('total_amount', '0')}. Your voucher codes are ready. Check your email or app.",
-        "cashback_credited": f"₹{data.get('amount', '0')} cashback credited to your CouponAli wallet from {data.get('merchant_name', 'merchant')}. Total balance: ₹{data.get('wallet_balance', '0')}",
-        "withdrawal_processed": f"Withdrawal of ₹{data.get('amount', '0')} processed successfully. It will be credited to your account within 24 hours.",
-    }
-    return templates.get(sms_type, data.get("message", "Notification from CouponAli"))
-
-
-def _fail_job(queue_key: str, dlq_key: str, job_str: str, error: str) -> None:
-    """Move a job to the dead letter queue."""
-    job = json.loads(job_str)
-def _fail_job(queue_key: str, dlq_key: str, job_str: str, error: str) -> None:
-    """Move a job to the dead letter queue."""
-    job = json.loads(job_str)
-    job["failed_at"] = _now_iso()
-    job["error"] = str(error)
-    redis_client.rpush(dlq_key, json.dumps(job))
-    logger.warning(f"Job moved to DLQ: {queue_key}")
-
-
-def _work_single(queue_key: str, processing_key: str, dlq_key: str, handler: Callable[[dict], None]) -> bool:
-    """Poll queue, process one job, handle errors and retries.
-    
-    Returns:
-        bool: True if a job was processed, False if queue was empty
-    """
-    popped = redis_client.blpop(queue_key, timeout=POLL_TIMEOUT_SECONDS)
-    if not popped:
-        return False
-    
-    _, raw_job = popped
-    job = json.loads(raw_job)
-    attempts = job.get("attempts", 0)
-    
-    # Add to processing set
-    redis_client.sadd(processing_key, raw_job)
-    
-    try:
-        handler(job)
-        logger.info(f"✅ Job completed successfully")
-        
-    except Exception as exc:
-        attempts += 1
-        logger.error(f"❌ Job failed (attempt {attempts}/{MAX_ATTEMPTS}): {exc}")
-        
-        if attempts >= MAX_ATTEMPTS:
-            # Move to DLQ
-            _fail_job(queue_key, dlq_key, raw_job, str(exc))
+class Dispatcher:
+    """Claims jobs from every queue, sends them through its provider, and settles the outcomes."""
+
+    def __init__(self, queues: list[JobQueue], providers: dict[str, Provider], max_in_flight: int | None = None):
+        self.queues = queues
+        self.providers = providers
+        self.max_in_flight = max_in_flight or settings.DISPATCH_MAX_IN_FLIGHT_JOBS
+        self.in_flight = 0
+        self._tasks: set[asyncio.Task] = set()
+
+    async def run(self, stop: asyncio.Event | None = None) -> None:
+        stop = stop or asyncio.Event()
+        idle = IDLE_SLEEP_SECONDS[0]
+        next_housekeeping = 0.0
+        while not stop.is_set():
+            if time.monotonic() >= next_housekeeping:
+                await asyncio.to_thread(_housekeeping, self.queues)
+                next_housekeeping = time.monotonic() + HOUSEKEEPING_INTERVAL_SECONDS
+
+            if await self.dispatch_once():
+                idle = IDLE_SLEEP_SECONDS[0]
+            else:
+                await asyncio.sleep(idle)
+                idle = min(idle * 2, IDLE_SLEEP_SECONDS[1])
+        await self.drain()
+
+    async def dispatch_once(self) -> int:
+        """Claim what fits under the in-flight cap and start sending it; returns jobs claimed."""
+        room = self.max_in_flight - self.in_flight
+        if room <= 0:
+            return 0
+        # Split the room evenly so a burst on one queue cannot starve the other
+        share = max(room // len(self.queues), 1)
+        claimed = await asyncio.to_thread(claim_from, self.queues, [share] * len(self.queues))
+        for queue, raws in zip(self.queues, claimed):
+            if raws:
+                self._start(queue, raws)
+        return sum(len(raws) for raws in claimed)
+
+    async def drain(self) -> None:
+        """Wait for every started send to be settled."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def _start(self, queue: JobQueue, raws: list[str]) -> None:
+        pairs, rejected = [], []
+        for raw in raws:
+            try:
+                job = json.loads(raw)
+            except ValueError as exc:
+                rejected.append((raw, DEAD, {"raw": raw, "error": f"Invalid job: {exc}", "failed_at": _now_iso()}))
+                continue
+            if isinstance(job, dict):
+                pairs.append((raw, job))
+            else:
+                rejected.append((raw, DEAD, {"raw": raw, "error": "Invalid job: not a JSON object", "failed_at": _now_iso()}))
+        provider = self.providers[queue.name]
+        batches, unbatchable = provider.batches(pairs)
+        rejected += [_failure(raw, job, exc, permanent=True) for raw, job, exc in unbatchable]
+        if rejected:
+            self._spawn(queue, asyncio.to_thread(queue.settle_many, rejected), len(rejected))
+        for batch in batches:
+            self._spawn(queue, self._deliver(queue, provider, batch), len(batch), batch)
+
+    def _spawn(self, queue: JobQueue, work, jobs: int, batch: list[tuple] | None = None) -> None:
+        self.in_flight += jobs
+
+        async def tracked():
+            try:
+                await work
+            except Exception as exc:
+                # The reaper only reclaims dead workers, so settle what is still held here as a failed attempt
+                logger.error(f"Sending {queue.name} jobs failed: {exc}", exc_info=True)
+                if batch:
+                    try:
+                        await asyncio.to_thread(queue.settle_many, [_failure(raw, job, exc) for raw, job, _ in batch])
+                    except Exception as settle_exc:
+                        logger.error(f"Settling {queue.name} jobs failed: {settle_exc}", exc_info=True)
+            finally:
+                self.in_flight -= jobs
+
+        task = asyncio.create_task(tracked())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _deliver(self, queue: JobQueue, provider: Provider, batch: list[tuple]) -> None:
+        try:
+            await provider.send([(job, rendered) for _, job, rendered in batch])
+        except ProviderError as exc:
+            if exc.batch_rejected:
+                logger.warning(f"{provider.name} batch of {len(batch)} rejected; sending one by one")
+                results = await asyncio.gather(
+                    *(self._deliver(queue, provider, [item]) for item in batch), return_exceptions=True
+                )
+                for result in results:
+                    if isinstance(result, Exception):
+                        raise result
+                return
+            outcomes = [_failure(raw, job, exc) for raw, job, _ in batch]
         else:
-            # Retry: re-queue with incremented attempt count
-            job["attempts"] = attempts
-            redis_client.rpush(queue_key, json.dumps(job))
-    
-    finally:
-        # Remove from processing set
-        redis_client.srem(processing_key, raw_job)
-    
-    return True
-
+            outcomes = [(raw, ACK, None) for raw, _, _ in batch]
+            logger.info(f"✅ Sent {len(batch)} {provider.name} job(s)")
+        settled = await asyncio.to_thread(queue.settle_many, outcomes)
+        if not all(settled):
+            logger.warning(f"{settled.count(False)} {queue.name} job(s) were reclaimed by the reaper while in progress")
+
+
+def _failure(raw_job: str, job: dict, exc: Exception, permanent: bool = False) -> tuple[str, str, dict]:
+    """RETRY with one more attempt counted, or DEAD once out of attempts (or at once if ``permanent``)."""
+    job = dict(job, attempts=job.get("attempts", 0) + 1, error=str(exc))
+    logger.error(f"❌ Job {job.get('id')} failed (attempt {job['attempts']}/{MAX_ATTEMPTS}): {exc}")
+    if permanent or job["attempts"] >= MAX_ATTEMPTS:
+        job["failed_at"] = _now_iso()
+        return raw_job, DEAD, job
+    return raw_job, RETRY, job
+
+
+def _housekeeping(queues: list[JobQueue]) -> None:
+    """Heartbeat, promote due retries and requeue jobs from stalled workers; safe in every worker at once."""
+    for queue in queues:
+        try:
+            queue.heartbeat()
+            queue.promote_due()
+            queue.reap()
+        except Exception as exc:
+            logger.error(f"Queue housekeeping failed for {queue.name}: {exc}")
+
+
+async def run_dispatcher(stop: asyncio.Event | None = None) -> None:
+    worker_id = new_worker_id()
+    queues = [JobQueue("email", worker_id=worker_id), JobQueue("sms", worker_id=worker_id)]
+    providers = {"email": SendGridProvider(), "sms": Msg91Provider()}
+    dispatcher = Dispatcher(queues, providers)
 
-def run_forever() -> None:
-    """Main worker loop - polls both email and SMS queues."""
     logger.info("=== Starting Email/SMS Worker ===")
-    logger.info(f"Email queue: {EMAIL_QUEUE}")
-    logger.info(f"SMS queue: {SMS_QUEUE}")
-    logger.info(f"Poll timeout: {POLL_TIMEOUT_SECONDS}s")
+    logger.info(f"Worker id: {worker_id}")
+    logger.info(f"Queues: {', '.join(q.key for q in queues)}")
+    logger.info(f"Max in flight: {dispatcher.max_in_flight} jobs")
     logger.info(f"Max attempts: {MAX_ATTEMPTS}")
-    
+
     if not SENDGRID_API_KEY:
         logger.warning("⚠️  SENDGRID_API_KEY not configured - emails will be logged only")
-    
+
     if not MSG91_AUTH_KEY:
         logger.warning("⚠️  MSG91_AUTH_KEY not configured - SMS will be logged only")
-    
+
+    logger.info(f"Templates compiled: {precompile()}")
     try:
-        while True:
-            # Process email queue
-            email_processed = _work_single(
-                EMAIL_QUEUE,
-                EMAIL_PROCESSING,
-                EMAIL_DLQ,
-                _process_email,
-            )
-            
-            # Process SMS queue
-            sms_processed = _work_single(
-                SMS_QUEUE,
-                SMS_PROCESSING,
-                SMS_DLQ,
-                _process_sms,
-            )
-            
-            # If no jobs were processed, sleep briefly to avoid tight loop
-            if not email_processed and not sms_processed:
-                time.sleep(0.1)
-    
+        await dispatcher.run(stop)
+    finally:
+        await dispatcher.drain()
+        for provider in providers.values():
+            await provider.aclose()
+        for queue in queues:
+            try:
+                await asyncio.to_thread(queue.release)
+            except Exception:
+                pass  # the reaper requeues anything left once the heartbeat goes stale
+
+
+def run_forever() -> None:
+    """Main worker entry point - dispatches both email and SMS queues."""
+    try:
+        asyncio.run(run_dispatcher())
     except KeyboardInterrupt:
         logger.info("=== Worker stopped by user ===")
     except Exception as e:
@@ -384,4 +467,3 @@ def run_forever() -> None:
 
 if __name__ == "__main__":
     run_forever()
-
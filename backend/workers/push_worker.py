@@ -0,0 +1,203 @@
+"""Web push broadcast worker.
+
+Takes broadcast jobs (app.queue.push_broadcast_job) from the reliable ``push``
+queue (see app/job_queue.py), one at a time, and fans each out:
+- Pages through the targeted active subscriptions in id order,
+  PUSH_BROADCAST_CHUNK_SIZE at a time
+- Sends each page concurrently through WebPushSender: one pooled async HTTP
+  client, at most PUSH_CONCURRENCY requests in flight, VAPID signed once per
+  push service origin
+- Per page, in one transaction: deactivates the subscriptions that answered
+  404/410 in one bulk UPDATE, stamps last_used_at on the delivered ones in
+  another, and bulk-loads their PushNotification rows
+- Records sends by outcome, pruned subscriptions, broadcast duration and
+  throughput in Prometheus metrics (app/metrics.py), served on
+  PUSH_WORKER_METRICS_PORT when set
+
+A broadcast that fails part-way is retried with backoff from the last
+finished page (``after_id`` in the job), so devices already reached are not
+notified twice.
+
+Usage:
+    python -m workers.push_worker
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import sys
+import time
+from datetime import datetime, timezone
+
+from prometheus_client import start_http_server
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.database import SessionLocal, copy_rows
+from app.job_queue import JobQueue, blocking_client, new_worker_id
+from app.metrics import observe_push_broadcast, observe_push_chunk
+from app.models.push_subscription import PushNotification, PushSubscription
+from app.push_notifications import EXPIRED, FAILED, SENT, WebPushSender, notification_payload
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+    handlers=[logging.StreamHandler(sys.stdout)],
+)
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+MAX_ATTEMPTS = 3
+CLAIM_TIMEOUT_SECONDS = 5
+HOUSEKEEPING_INTERVAL_SECONDS = 5  # heartbeat, retry promotion + stalled-worker reaping
+
+NOTIFICATION_COLUMNS = ["user_id", "title", "body", "icon", "image", "url", "data", "status", "sent_at", "created_at"]
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def load_page(db: Session, after_id: int, user_ids: list[int] | None, limit: int) -> list[dict]:
+    query = (
+        select(
+            PushSubscription.id,
+            PushSubscription.user_id,
+            PushSubscription.endpoint,
+            PushSubscription.p256dh_key,
+            PushSubscription.auth_key,
+        )
+        .where(PushSubscription.is_active == True, PushSubscription.id > after_id)
+        .order_by(PushSubscription.id)
+        .limit(limit)
+    )
+    if user_ids:
+        query = query.where(PushSubscription.user_id.in_(user_ids))
+    return [dict(row) for row in db.execute(query).mappings()]
+
+
+def record_page(db: Session, page: list[dict], outcomes: dict[str, list[int]], notification: dict) -> None:
+    """Prune expired subscriptions and log deliveries for one page, in one commit."""
+    now = datetime.utcnow()
+    if outcomes[EXPIRED]:
+        db.execute(
+            update(PushSubscription).where(PushSubscription.id.in_(outcomes[EXPIRED])).values(is_active=False)
+        )
+    if outcomes[SENT]:
+        db.execute(update(PushSubscription).where(PushSubscription.id.in_(outcomes[SENT])).values(last_used_at=now))
+        users = {subscription["id"]: subscription["user_id"] for subscription in page}
+        data = json.dumps(notification["data"]) if notification.get("data") else None
+        copy_rows(
+            db,
+            PushNotification.__table__,
+            NOTIFICATION_COLUMNS,
+            [
+                (
+                    users[subscription_id], notification["title"], notification["body"], notification.get("icon"),
+                    notification.get("image"), notification.get("url"), data, "sent", now, now,
+                )
+                for subscription_id in outcomes[SENT]
+            ],
+        )
+    db.commit()
+
+
+async def broadcast(db: Session, job: dict, sender: WebPushSender, queue: JobQueue | None = None) -> dict[str, int]:
+    """Deliver one broadcast job from ``job["after_id"]`` on; returns sends per outcome."""
+    notification = job["notification"]
+    payload = notification_payload(**notification)
+    totals = {SENT: 0, EXPIRED: 0, FAILED: 0}
+    started = time.monotonic()
+
+    while page := load_page(db, job.get("after_id", 0), job.get("user_ids"), settings.PUSH_BROADCAST_CHUNK_SIZE):
+        outcomes = await sender.send_many(page, payload)
+        record_page(db, page, outcomes, notification)
+        job["after_id"] = page[-1]["id"]
+        counts = {outcome: len(ids) for outcome, ids in outcomes.items()}
+        observe_push_chunk(counts)
+        for outcome, count in counts.items():
+            totals[outcome] += count
+        if queue is not None:
+            queue.heartbeat()  # a long broadcast must not look stalled to the reaper
+
+    duration = time.monotonic() - started
+    sends = sum(totals.values())
+    observe_push_broadcast(sends, duration)
+    logger.info(
+        f"Broadcast {job.get('id')}: {totals[SENT]} sent, {totals[EXPIRED]} pruned, {totals[FAILED]} failed "
+        f"in {duration:.1f}s ({sends / duration if duration > 0 else 0:.0f}/s)"
+    )
+    return totals
+
+
+async def process(queue: JobQueue, sender: WebPushSender, raw_job: str) -> None:
+    try:
+        job = json.loads(raw_job)
+    except ValueError as exc:
+        await asyncio.to_thread(queue.dead_letter, raw_job, {"raw": raw_job, "error": f"Invalid job: {exc}", "failed_at": _now_iso()})
+        return
+
+    db = SessionLocal()
+    try:
+        await broadcast(db, job, sender, queue)
+    except Exception as exc:
+        db.rollback()
+        job = dict(job, attempts=job.get("attempts", 0) + 1, error=str(exc))
+        logger.error(f"❌ Broadcast {job.get('id')} failed (attempt {job['attempts']}/{MAX_ATTEMPTS}): {exc}", exc_info=True)
+        if job["attempts"] >= MAX_ATTEMPTS:
+            await asyncio.to_thread(queue.dead_letter, raw_job, dict(job, failed_at=_now_iso()))
+        else:
+            await asyncio.to_thread(queue.retry, raw_job, job)
+    else:
+        await asyncio.to_thread(queue.ack, raw_job)
+    finally:
+        db.close()
+
+
+def _housekeeping(queue: JobQueue) -> None:
+    queue.heartbeat()
+    queue.promote_due()
+    queue.reap()
+
+
+async def run_worker(stop: asyncio.Event | None = None) -> None:
+    queue = JobQueue("push", client=blocking_client(CLAIM_TIMEOUT_SECONDS), worker_id=new_worker_id())
+    sender = WebPushSender()
+    if settings.PUSH_WORKER_METRICS_PORT:
+        start_http_server(settings.PUSH_WORKER_METRICS_PORT)
+    logger.info(f"🚀 Push worker {queue.worker_id} started (concurrency {sender.concurrency})")
+
+    next_housekeeping = 0.0
+    try:
+        while not (stop and stop.is_set()):
+            if time.monotonic() >= next_housekeeping:
+                try:
+                    await asyncio.to_thread(_housekeeping, queue)
+                except Exception as exc:
+                    logger.error(f"Housekeeping failed: {exc}")
+                next_housekeeping = time.monotonic() + HOUSEKEEPING_INTERVAL_SECONDS
+            try:
+                raw_job = await asyncio.to_thread(queue.claim, CLAIM_TIMEOUT_SECONDS)
+            except Exception as exc:
+                logger.error(f"Claim failed: {exc}")
+                await asyncio.sleep(1)
+                continue
+            if raw_job is not None:
+                await process(queue, sender, raw_job)
+    finally:
+        await asyncio.to_thread(queue.release)
+        await sender.aclose()
+
+
+def run_forever() -> None:
+    try:
+        asyncio.run(run_worker())
+    except KeyboardInterrupt:
+        logger.info("Push worker stopped by user")
+
+
+if __name__ == "__main__":
+    run_forever()
@@ -6,9 +6,10 @@
  *
  * Usage:
  *   bun src/index.ts          # Run all workers
- *   bun src/index.ts email    # Run email worker only
- *   bun src/index.ts sms      # Run SMS worker only
  *   bun src/index.ts cashback # Run cashback sync only
+ *
+ * Clicks on queue:clicks are ingested by backend/workers/click_ingest_worker.py,
+ * and queue:email/queue:sms by backend/workers/email_sms_worker.py.
  */
 
 import postgres from "postgres";
@@ -41,36 +42,18 @@ async function startWorkers(): Promise<void> {
   }
 
   switch (workerArg) {
-    case "email":
-      console.log("\n📧 Starting Email Worker...");
-      await import("./email-worker");
-      break;
-
-    case "sms":
-      console.log("\n📱 Starting SMS Worker...");
-      await import("./sms-worker");
-      break;
-
     case "cashback":
       console.log("\n💰 Starting Cashback Sync Worker...");
       await import("./cashback-sync");
       break;
 
-    case "clicks":
-      console.log("\n🎯 Starting Click Worker...");
-      await import("./click-worker");
-      break;
-
     default:
       // Run all workers concurrently
       console.log("\n🔄 Starting all workers...\n");
 
       // Use Promise.all to run workers in parallel
       await Promise.all([
-        import("./email-worker").then(() => console.log("📧 Email worker loaded")),
-        import("./sms-worker").then(() => console.log("📱 SMS worker loaded")),
         import("./cashback-sync").then(() => console.log("💰 Cashback sync loaded")),
-        import("./click-worker").then(() => console.log("🎯 Click worker loaded")),
       ]);
 
       console.log("\n✅ All workers running");